@@ -0,0 +1,155 @@
+# api_guard.py
+import math
+import time
+
+# 全局请求速率 (每秒) 和突发容量：所有调用方 (定时刷新、抢占循环、按钮点击) 共用
+DEFAULT_GLOBAL_RATE = 5.0
+DEFAULT_GLOBAL_BURST = 10
+
+# 各接口的预算 (每秒速率, 突发容量)；未列出的接口只受全局预算限制
+DEFAULT_ENDPOINT_BUDGETS = {
+    "deploy_instance": (1.0, 2),
+    "boot_instance": (1.0, 3),
+    "get_instances": (0.5, 3),
+    "get_images": (0.5, 3),
+    "get_balance": (0.5, 2),
+    "get_whoami": (0.5, 2),
+}
+
+# 网络层失败的典型错误信息 (ApiHandler 捕获异常后返回 success=False 而不是抛出)
+TRANSPORT_ERROR_MARKERS = ("超时", "网络", "请求异常", "连接", "Timeout", "timed out", "Connection")
+
+
+class TokenBucket:
+    """
+    令牌桶。reserve() 立即预订一个令牌并返回需要等待的秒数，
+    令牌可以透支，排队的调用按预订顺序依次放行。
+    """
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self):
+        self._refill()
+        self._tokens -= 1
+        if self._tokens >= 0:
+            return 0.0
+        return -self._tokens / self.rate
+
+    def try_acquire(self):
+        """有令牌时取走一个并返回 True；没有时不透支，返回 False"""
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+
+class RateLimiter:
+    """全局令牌桶 + 每个接口一个令牌桶；一次调用需要同时拿到两者的令牌"""
+
+    def __init__(self, rate=DEFAULT_GLOBAL_RATE, burst=DEFAULT_GLOBAL_BURST, endpoint_budgets=None):
+        self._global = TokenBucket(rate, burst)
+        budgets = DEFAULT_ENDPOINT_BUDGETS if endpoint_budgets is None else endpoint_budgets
+        self._endpoints = {name: TokenBucket(r, b) for name, (r, b) in budgets.items()}
+
+    def reserve(self, endpoint):
+        """预订一次调用，返回调用前需要等待的秒数"""
+        delay = self._global.reserve()
+        bucket = self._endpoints.get(endpoint)
+        if bucket is not None:
+            delay = max(delay, bucket.reserve())
+        return delay
+
+
+class CircuitOpenError(Exception):
+    """熔断器打开时快速失败，不再等待网络超时"""
+
+
+class CircuitBreaker:
+    """
+    API 熔断器 (只在事件循环线程中使用)。
+    连续 failure_threshold 次网络层失败后打开，reset_timeout 秒内的调用直接失败；
+    之后进入半开状态，放行少量探测请求：探测成功则关闭，失败则重新打开。
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, half_open_max=1,
+                 on_state_change=None, clock=time.monotonic):
+        """
+        :param on_state_change: 函数 (state, retry_in)，状态变化时在事件循环线程中调用
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max = half_open_max
+        self.on_state_change = on_state_change
+        self._clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+
+    def _set_state(self, state):
+        if state == self.state:
+            return
+        self.state = state
+        if self.on_state_change:
+            self.on_state_change(state, self.retry_in())
+
+    def retry_in(self):
+        """打开状态下距离下一次探测的秒数"""
+        if self.state != self.OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self.reset_timeout - self._clock())
+
+    def before_call(self):
+        """调用前检查；熔断中抛出 CircuitOpenError"""
+        if self.state == self.OPEN:
+            if self.retry_in() > 0:
+                raise CircuitOpenError(f"API 暂时不可用 (熔断中)，{math.ceil(self.retry_in())} 秒后重试")
+            self._probes = 0
+            self._set_state(self.HALF_OPEN)
+        if self.state == self.HALF_OPEN:
+            if self._probes >= self.half_open_max:
+                raise CircuitOpenError("API 暂时不可用 (正在探测恢复)")
+            self._probes += 1
+
+    def record_success(self):
+        self.failures = 0
+        self._probes = 0
+        self._set_state(self.CLOSED)
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self._opened_at = self._clock()
+            self._probes = 0
+            if self.state == self.OPEN:
+                return
+            self._set_state(self.OPEN)
+
+    def release_probe(self):
+        """调用被取消、没有结果时归还探测名额"""
+        if self.state == self.HALF_OPEN and self._probes > 0:
+            self._probes -= 1
+
+
+def is_transport_failure(result):
+    """判断 ApiHandler 的返回值是否代表网络层失败 (而不是“GPU 不足”之类的业务错误)"""
+    if not isinstance(result, dict) or result.get("success"):
+        return False
+    if result.get("exception_type"):
+        return True
+    msg = str(result.get("msg", ""))
+    return any(marker in msg for marker in TRANSPORT_ERROR_MARKERS)
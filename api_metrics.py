@@ -0,0 +1,170 @@
+# api_metrics.py
+import json
+import time
+import threading
+from bisect import bisect_left
+from collections import deque
+
+# 延迟直方图的桶上界 (秒)，与 Prometheus histogram 的 le 标签对应
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 15.0, 30.0)
+
+# 计算 p50/p95/p99 时使用的最近样本数
+SAMPLE_WINDOW = 1024
+
+METRIC_PREFIX = "xiangongyun_api"
+
+
+def response_size(result):
+    """估算一次 API 返回的大小 (字节)；ApiHandler 返回的是解析后的 dict，按 JSON 重新序列化计算"""
+    if result is None:
+        return 0
+    try:
+        return len(json.dumps(result, ensure_ascii=False, default=str).encode("utf-8"))
+    except (TypeError, ValueError):
+        return 0
+
+
+def is_error_result(result):
+    return isinstance(result, dict) and not result.get("success", True)
+
+
+class LatencyHistogram:
+    """
+    延迟直方图。
+    桶计数和总和覆盖全部样本 (用于导出)；分位数基于最近 SAMPLE_WINDOW 个样本计算，
+    这样抢占窗口期间的延迟变化能及时反映出来。
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, window=SAMPLE_WINDOW):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1) # 最后一个是 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, seconds):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.recent.append(seconds)
+
+    def quantile(self, q):
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+        return ordered[index]
+
+    def cumulative_counts(self):
+        """[(le, 累计数量), ...]，最后一项 le 为 "+Inf" """
+        result, total = [], 0
+        for le, n in zip(self.buckets + ("+Inf",), self.counts):
+            total += n
+            result.append((le, total))
+        return result
+
+
+class EndpointMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.rejected = 0 # 被熔断器直接拒绝、没有发出的请求
+        self.bytes = 0
+        self.latency = LatencyHistogram()
+        self.last_at = None
+
+
+class MetricsRegistry:
+    """
+    按接口统计请求数、错误数、返回字节数和延迟分布 (线程安全)。
+    由 AsyncApiClient 在每次调用后记录；snapshot() 供诊断面板显示，
+    to_prometheus() / to_json_lines() 用于导出。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self.started_at = time.time()
+
+    def _get(self, endpoint):
+        metrics = self._endpoints.get(endpoint)
+        if metrics is None:
+            metrics = self._endpoints[endpoint] = EndpointMetrics()
+        return metrics
+
+    def record(self, endpoint, seconds, ok=True, nbytes=0):
+        with self._lock:
+            metrics = self._get(endpoint)
+            metrics.requests += 1
+            if not ok:
+                metrics.errors += 1
+            metrics.bytes += nbytes
+            metrics.latency.observe(seconds)
+            metrics.last_at = time.time()
+
+    def record_rejected(self, endpoint):
+        with self._lock:
+            metrics = self._get(endpoint)
+            metrics.rejected += 1
+            metrics.last_at = time.time()
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+            self.started_at = time.time()
+
+    def snapshot(self):
+        """返回每个接口的统计字典列表 (按接口名排序)，延迟单位为秒"""
+        rows = []
+        with self._lock:
+            for endpoint in sorted(self._endpoints):
+                metrics = self._endpoints[endpoint]
+                latency = metrics.latency
+                rows.append({
+                    "endpoint": endpoint,
+                    "requests": metrics.requests,
+                    "errors": metrics.errors,
+                    "rejected": metrics.rejected,
+                    "bytes": metrics.bytes,
+                    "mean": latency.sum / latency.count if latency.count else None,
+                    "p50": latency.quantile(0.50),
+                    "p95": latency.quantile(0.95),
+                    "p99": latency.quantile(0.99),
+                    "last_at": metrics.last_at,
+                })
+        return rows
+
+    def to_prometheus(self):
+        """导出为 Prometheus 文本格式"""
+        lines = []
+
+        def counter(name, help_text, attr):
+            lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} counter")
+            for endpoint, metrics in endpoints:
+                lines.append(f'{METRIC_PREFIX}_{name}{{endpoint="{endpoint}"}} {getattr(metrics, attr)}')
+
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+            counter("requests_total", "Number of API requests sent.", "requests")
+            counter("errors_total", "Number of API requests that failed or returned success=false.", "errors")
+            counter("rejected_total", "Number of API requests rejected by the circuit breaker.", "rejected")
+            counter("response_bytes_total", "Approximate size of API responses in bytes.", "bytes")
+
+            name = f"{METRIC_PREFIX}_request_duration_seconds"
+            lines.append(f"# HELP {name} API request latency in seconds.")
+            lines.append(f"# TYPE {name} histogram")
+            for endpoint, metrics in endpoints:
+                for le, total in metrics.latency.cumulative_counts():
+                    lines.append(f'{name}_bucket{{endpoint="{endpoint}",le="{le}"}} {total}')
+                lines.append(f'{name}_sum{{endpoint="{endpoint}"}} {metrics.latency.sum:.6f}')
+                lines.append(f'{name}_count{{endpoint="{endpoint}"}} {metrics.latency.count}')
+        return "\n".join(lines) + "\n"
+
+    def to_json_lines(self):
+        """导出为 JSON Lines，每个接口一行"""
+        exported_at = time.time()
+        return "".join(
+            json.dumps(dict(row, exported_at=exported_at), ensure_ascii=False) + "\n"
+            for row in self.snapshot()
+        )
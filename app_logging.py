@@ -0,0 +1,85 @@
+# app_logging.py
+import os
+import sys
+import queue
+import atexit
+import logging
+import logging.handlers
+from PySide6.QtCore import QStandardPaths
+
+LOG_FILE_NAME = "xiangongyun_gui.log"
+LOG_MAX_BYTES = 2 * 1024 * 1024
+LOG_BACKUP_COUNT = 3
+DEFAULT_LEVEL = "INFO"
+
+# 环境变量或命令行参数可临时打开调试输出，例如:
+#   set XGY_LOG_LEVEL=DEBUG   或   python main.py --debug
+LEVEL_ENV_VAR = "XGY_LOG_LEVEL"
+
+LOG_FORMAT = "%(asctime)s %(levelname)-7s [%(threadName)s] %(name)s: %(message)s"
+
+_listener = None
+
+
+def resolve_level(argv=None, default=DEFAULT_LEVEL):
+    """命令行 --debug > 环境变量 XGY_LOG_LEVEL > 默认级别"""
+    argv = sys.argv if argv is None else argv
+    if "--debug" in argv:
+        return logging.DEBUG
+    name = os.environ.get(LEVEL_ENV_VAR, default).upper()
+    level = logging.getLevelName(name)
+    return level if isinstance(level, int) else logging.getLevelName(default)
+
+
+def default_log_dir():
+    return os.path.join(QStandardPaths.writableLocation(QStandardPaths.StandardLocation.AppDataLocation), "logs")
+
+
+def setup_logging(level=None, log_dir=None, console=True):
+    """
+    配置日志：所有线程的日志记录先进入队列 (QueueHandler)，
+    由单独的监听线程写入轮转日志文件和控制台，调用方线程不做任何 I/O。
+    重复调用只会调整级别。返回日志文件路径 (文件不可写时为 None)。
+    """
+    global _listener
+    root = logging.getLogger()
+    root.setLevel(resolve_level() if level is None else level)
+    if _listener is not None:
+        return getattr(_listener, "log_path", None)
+
+    handlers = []
+    log_path = None
+    try:
+        log_dir = log_dir or default_log_dir()
+        os.makedirs(log_dir, exist_ok=True)
+        log_path = os.path.join(log_dir, LOG_FILE_NAME)
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8")
+        file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        handlers.append(file_handler)
+    except OSError as e:
+        log_path = None
+        sys.stderr.write(f"警告: 无法创建日志文件，只输出到控制台: {e}\n")
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter("%(levelname)s %(name)s: %(message)s"))
+        handlers.append(console_handler)
+
+    log_queue = queue.SimpleQueue()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.log_path = log_path
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+    # 第三方库的调试输出太多，只保留警告
+    logging.getLogger("urllib3").setLevel(logging.WARNING)
+    return log_path
+
+
+def shutdown_logging():
+    """停止监听线程并写完队列中剩余的日志"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,200 @@
+# async_api.py
+import time
+import asyncio
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from api_guard import is_transport_failure, CircuitOpenError
+from api_metrics import response_size, is_error_result
+
+# 优先级通道：用户操作 > 当前页面读取 > 后台轮询/预取
+LANE_HIGH = 0
+LANE_NORMAL = 1
+LANE_LOW = 2
+LANE_NAMES = {LANE_HIGH: "high", LANE_NORMAL: "normal", LANE_LOW: "low"}
+
+# 每个通道独立的线程池大小 (同时进行的阻塞 API 调用上限)
+# 后台通道再繁忙也占不到用户操作的线程
+DEFAULT_LANE_LIMITS = {LANE_HIGH: 3, LANE_NORMAL: 2, LANE_LOW: 1}
+
+# 后台通道让路的最长时间 (秒)，避免前台持续繁忙时后台任务被饿死
+LOW_LANE_MAX_WAIT = 10.0
+
+
+class AsyncLoopThread:
+    """在独立的守护线程中运行一个 asyncio 事件循环"""
+
+    def __init__(self, name="api-loop"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        """从任意线程提交协程，返回 concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def call_soon(self, callback, *args):
+        self.loop.call_soon_threadsafe(callback, *args)
+
+    def is_running(self):
+        return self._thread.is_alive()
+
+    def stop(self, timeout=2.0):
+        if self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+
+
+class AsyncApiClient:
+    """
+    ApiHandler 的异步封装。
+    client.get_instances() 等方法返回可 await 的协程 (在事件循环线程中使用)，
+    submit() 则可以从 GUI 线程提交任意调用并得到 Future。
+    阻塞的 HTTP 调用按优先级通道在各自的有界线程池中执行；
+    高/普通通道有任务排队或执行时，后台通道的新任务会先让路。
+    可选的 rate_limiter / breaker (见 api_guard.py) 对所有通道的调用统一生效，
+    metrics (见 api_metrics.py) 记录每个接口的请求数、错误和延迟。
+    """
+
+    def __init__(self, api_handler, loop_thread=None, lane_limits=None, rate_limiter=None, breaker=None,
+                 metrics=None):
+        self.api_handler = api_handler
+        self.loop_thread = loop_thread or AsyncLoopThread()
+        self.rate_limiter = rate_limiter
+        self.breaker = breaker
+        self.metrics = metrics
+        limits = {**DEFAULT_LANE_LIMITS, **(lane_limits or {})}
+        self._executors = {
+            lane: ThreadPoolExecutor(max_workers=limits[lane], thread_name_prefix=f"api-{LANE_NAMES[lane]}")
+            for lane in LANE_NAMES
+        }
+        # 以下状态只在事件循环线程中访问
+        self._active = {lane: 0 for lane in LANE_NAMES} # 排队 + 执行中的任务数
+        self._foreground_idle = asyncio.Event()
+        self._foreground_idle.set()
+
+    @property
+    def loop(self):
+        return self.loop_thread.loop
+
+    async def call(self, fn, *args, **kwargs):
+        """在普通通道中执行阻塞函数并等待结果"""
+        return await self.call_in_lane(LANE_NORMAL, fn, *args, **kwargs)
+
+    async def call_in_lane(self, lane, fn, *args, **kwargs):
+        """在指定通道的线程池中执行阻塞函数；取消时丢弃结果 (已开始的 HTTP 请求无法中断)"""
+        endpoint = _endpoint_name(fn)
+        if self.breaker is not None:
+            try:
+                self.breaker.before_call() # 熔断中直接抛出 CircuitOpenError
+            except CircuitOpenError:
+                if self.metrics is not None:
+                    self.metrics.record_rejected(endpoint)
+                raise
+        try:
+            if lane == LANE_LOW:
+                await self._yield_to_foreground()
+            if self.rate_limiter is not None:
+                delay = self.rate_limiter.reserve(endpoint)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            if self.metrics is not None:
+                fn = partial(self._timed_call, endpoint, fn)
+            result = await self._run_in_lane(lane, fn, *args, **kwargs)
+        except asyncio.CancelledError:
+            if self.breaker is not None:
+                self.breaker.release_probe()
+            raise
+        except Exception:
+            if self.breaker is not None:
+                self.breaker.record_failure()
+            raise
+        if self.breaker is not None:
+            if is_transport_failure(result):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+        return result
+
+    async def _run_in_lane(self, lane, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        self._active[lane] += 1
+        if lane != LANE_LOW:
+            self._foreground_idle.clear()
+        try:
+            return await loop.run_in_executor(self._executors[lane], partial(fn, *args, **kwargs))
+        finally:
+            self._active[lane] -= 1
+            if self._active[LANE_HIGH] == 0 and self._active[LANE_NORMAL] == 0:
+                self._foreground_idle.set()
+
+    def _timed_call(self, endpoint, fn, *args, **kwargs):
+        """在工作线程中执行并计时 (不含排队和限流等待)"""
+        start = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            self.metrics.record(endpoint, time.perf_counter() - start, ok=False)
+            raise
+        elapsed = time.perf_counter() - start
+        self.metrics.record(endpoint, elapsed, ok=not is_error_result(result), nbytes=response_size(result))
+        return result
+
+    async def _yield_to_foreground(self):
+        """后台任务开始前等待前台通道空闲 (最多 LOW_LANE_MAX_WAIT 秒)"""
+        if self._foreground_idle.is_set():
+            return
+        try:
+            await asyncio.wait_for(self._foreground_idle.wait(), LOW_LANE_MAX_WAIT)
+        except asyncio.TimeoutError:
+            pass
+
+    def lane_stats(self):
+        """各通道当前的排队 + 执行任务数 (诊断用)"""
+        return {LANE_NAMES[lane]: count for lane, count in self._active.items()}
+
+    def __getattr__(self, name):
+        # 只在正常属性查找失败时调用：把 ApiHandler 的方法包装为协程函数
+        if name.startswith("_"):
+            raise AttributeError(name)
+        method = getattr(self.api_handler, name)
+        if not callable(method):
+            raise AttributeError(name)
+
+        async def awaitable(*args, **kwargs):
+            return await self.call(method, *args, **kwargs)
+        awaitable.__name__ = f"{name}_async"
+        return awaitable
+
+    def submit(self, fn, *args, **kwargs):
+        """从任意线程提交一次普通通道的阻塞调用，返回 concurrent.futures.Future"""
+        return self.submit_in_lane(LANE_NORMAL, fn, *args, **kwargs)
+
+    def submit_in_lane(self, lane, fn, *args, **kwargs):
+        """从任意线程提交一次指定通道的阻塞调用，返回 concurrent.futures.Future"""
+        return self.loop_thread.submit(self.call_in_lane(lane, fn, *args, **kwargs))
+
+    def submit_coro(self, coro):
+        """提交一个协程 (其中可以 await 多个 API 调用)，返回 concurrent.futures.Future"""
+        return self.loop_thread.submit(coro)
+
+    def shutdown(self):
+        for executor in self._executors.values():
+            executor.shutdown(wait=False, cancel_futures=True)
+        self.loop_thread.stop()
+
+
+def _endpoint_name(fn):
+    """
+    限流预算和统计按函数名区分 (例如 api_handler.deploy_instance -> "deploy_instance")；
+    包装函数可以用 api_endpoint 属性指定实际调用的接口
+    """
+    while isinstance(fn, partial):
+        if getattr(fn, "api_endpoint", None):
+            return fn.api_endpoint
+        fn = fn.func
+    return getattr(fn, "__name__", "")
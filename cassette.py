@@ -0,0 +1,171 @@
+# cassette.py
+import os
+import copy
+import json
+import time
+import random
+import hashlib
+import logging
+import threading
+from PySide6.QtCore import QStandardPaths
+
+log = logging.getLogger(__name__)
+
+CASSETTE_DIR_NAME = "cassettes"
+
+# 每个请求键最多保留的录制条数 (定时刷新会不断产生新的录制)
+MAX_RECORDINGS_PER_KEY = 5
+
+# 不录制的方法：只改变本地状态、参数里带有令牌
+NOT_RECORDED = frozenset({"set_access_token"})
+
+
+def default_cassette_dir():
+    return os.path.join(QStandardPaths.writableLocation(QStandardPaths.StandardLocation.AppDataLocation),
+                        CASSETTE_DIR_NAME)
+
+
+def request_key(args, kwargs):
+    """同一方法下按参数区分录制 (例如不同实例 ID 的开机请求)"""
+    canonical = json.dumps([list(args), kwargs], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+class Cassette:
+    """
+    录制的 API 响应，每个方法一个 JSON 文件 (<dir>/<method>.json)：
+    {"method": ..., "recordings": {key: [{"args", "kwargs", "result", "elapsed", "recorded_at"}, ...]}}
+    文件可以手工编辑，用于构造演示或测试数据。
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or default_cassette_dir()
+        self._lock = threading.Lock()
+        self._methods = {}
+        self._cursors = {}
+        self._load()
+
+    def _path(self, method):
+        return os.path.join(self.directory, f"{method}.json")
+
+    def _load(self):
+        if not os.path.isdir(self.directory):
+            return
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), "r", encoding="utf-8") as f:
+                    content = json.load(f)
+                self._methods[content["method"]] = content.get("recordings", {})
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                log.warning("录制文件 %s 无法读取，已忽略: %s", name, e)
+
+    def methods(self):
+        with self._lock:
+            return sorted(self._methods)
+
+    def record(self, method, args, kwargs, result, elapsed):
+        entry = {"args": list(args), "kwargs": kwargs, "result": result,
+                 "elapsed": round(elapsed, 4), "recorded_at": time.time()}
+        with self._lock:
+            recordings = self._methods.setdefault(method, {})
+            entries = recordings.setdefault(request_key(args, kwargs), [])
+            entries.append(entry)
+            del entries[:-MAX_RECORDINGS_PER_KEY]
+            content = {"method": method, "recordings": recordings}
+            self._write(method, content)
+
+    def _write(self, method, content):
+        """先写临时文件再替换"""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = self._path(method)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(content, f, ensure_ascii=False, indent=1, default=str)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            log.warning("写入录制文件失败 (%s): %s", method, e)
+
+    def lookup(self, method, args, kwargs):
+        """
+        返回一条录制 (dict) 或 None。
+        参数完全匹配的录制按顺序轮流返回；没有时退回到该方法最近的一条录制。
+        """
+        with self._lock:
+            recordings = self._methods.get(method)
+            if not recordings:
+                return None
+            key = request_key(args, kwargs)
+            entries = recordings.get(key)
+            if not entries:
+                return max((e for es in recordings.values() for e in es), key=lambda e: e.get("recorded_at", 0))
+            cursor = self._cursors.get((method, key), 0)
+            self._cursors[(method, key)] = cursor + 1
+            return entries[cursor % len(entries)]
+
+
+class RecordingApiHandler:
+    """包装真实的 ApiHandler：调用照常发出，同时把参数、结果和耗时写入 Cassette"""
+
+    def __init__(self, api_handler, cassette):
+        self._handler = api_handler
+        self._cassette = cassette
+
+    def __getattr__(self, name):
+        attr = getattr(self._handler, name)
+        if not callable(attr) or name.startswith("_") or name in NOT_RECORDED:
+            return attr
+
+        def recorded(*args, **kwargs):
+            start = time.perf_counter()
+            result = attr(*args, **kwargs)
+            self._cassette.record(name, args, kwargs, result, time.perf_counter() - start)
+            return result
+        recorded.__name__ = name
+        return recorded
+
+
+class ReplayApiHandler:
+    """
+    离线回放：不访问网络，按方法名和参数返回录制的响应。
+    :param latency: "recorded" 使用录制时的耗时；数字为固定秒数；(min, max) 为均匀分布
+    :param failure_rate: 注入网络失败的概率 (返回与 ApiHandler 网络异常相同格式的结果)
+    """
+
+    def __init__(self, cassette, latency="recorded", failure_rate=0.0, seed=None):
+        self.cassette = cassette
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._access_token = None
+
+    def set_access_token(self, token):
+        self._access_token = token
+
+    def _delay(self, recording):
+        if self.latency == "recorded":
+            return recording.get("elapsed", 0) if recording else 0
+        if isinstance(self.latency, (tuple, list)):
+            return self._random.uniform(*self.latency)
+        return float(self.latency or 0)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        def replayed(*args, **kwargs):
+            recording = self.cassette.lookup(name, args, kwargs)
+            delay = self._delay(recording)
+            if delay > 0:
+                time.sleep(delay)
+            if self.failure_rate and self._random.random() < self.failure_rate:
+                log.debug("回放注入失败: %s", name)
+                return {"success": False, "msg": "API请求异常: 回放注入的网络错误 (连接超时)",
+                        "exception_type": "ReplayInjectedError"}
+            if recording is None:
+                return {"success": False, "msg": f"离线模式: 没有 {name} 的录制数据"}
+            return copy.deepcopy(recording["result"]) # 调用方可能修改返回值
+        replayed.__name__ = name
+        return replayed
@@ -0,0 +1,660 @@
+# comfyui_batch.py
+"""
+ComfyUI 批量出图客户端：把本地文件夹中的 API 格式工作流批量提交到实例的 /prompt，
+通过 /ws 推送跟踪进度，每个输出节点执行完 (executed) 立即在后台下载它的图片，不等整批结束。
+websocket 断开时退回轮询 /history。不需要打开浏览器标签页。
+
+命令行用法 (可配合 fake_comfyui_server.py 在本地测试):
+    python comfyui_batch.py --url http://127.0.0.1:8188 --workflows ./workflows --out ./outputs --repeat 100
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit
+import requests
+from PySide6.QtCore import QObject, Signal, QTimer, QUrl, QCoreApplication
+from PySide6.QtWebSockets import QWebSocket
+
+log = logging.getLogger(__name__)
+
+# 这些输入名被视为随机种子，randomize_seed 时每次提交都替换
+SEED_INPUTS = ("seed", "noise_seed")
+
+# 执行完成后查不到历史记录 (写入滞后或请求失败) 时的重试：间隔从 HISTORY_RETRY_DELAY 秒起翻倍，
+# 最多 HISTORY_RETRY_MAX_DELAY 秒，共查询 HISTORY_MAX_ATTEMPTS 次仍查不到则记为失败
+HISTORY_RETRY_DELAY = 0.5
+HISTORY_RETRY_MAX_DELAY = 8.0
+HISTORY_MAX_ATTEMPTS = 8
+
+
+class ComfyUIError(Exception):
+    """ComfyUI 接口返回错误，或工作流格式不正确"""
+
+
+class ComfyUIConnectionError(ComfyUIError):
+    """无法连接到 ComfyUI (实例关机、网络中断或超时)"""
+
+
+def reserve_path(path):
+    """
+    占用一个不存在的文件名：已存在时追加 _1、_2 ...
+    (多个实例的 ComfyUI 各自编号，输出文件名会重复；用 O_EXCL 创建，多个下载线程之间也不会冲突)
+    """
+    base, ext = os.path.splitext(path)
+    candidate, index = path, 0
+    while True:
+        try:
+            os.close(os.open(candidate, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return candidate
+        except FileExistsError:
+            index += 1
+            candidate = f"{base}_{index}{ext}"
+
+
+# ------------------------------------------------------------------------------
+# HTTP 客户端 (阻塞调用，由 ComfyUIBatchRunner 放到线程池中执行)
+# ------------------------------------------------------------------------------
+class ComfyUIClient:
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.session = requests.Session() # 复用连接，批量提交时不必每次重新握手
+
+    def ws_url(self, client_id):
+        parts = urlsplit(self.base_url)
+        scheme = "wss" if parts.scheme == "https" else "ws"
+        return urlunsplit((scheme, parts.netloc, parts.path + "/ws", f"clientId={client_id}", ""))
+
+    def _get(self, path, **kwargs):
+        try:
+            response = self.session.get(self.base_url + path, timeout=self.timeout, **kwargs)
+        except requests.RequestException as e:
+            raise ComfyUIConnectionError(f"请求 {path} 失败: {e}") from e
+        if response.status_code != 200:
+            raise ComfyUIError(f"请求 {path} 失败: HTTP {response.status_code}")
+        return response
+
+    def queue_prompt(self, prompt, client_id):
+        """提交一个工作流，返回 prompt_id"""
+        try:
+            response = self.session.post(self.base_url + "/prompt", json={"prompt": prompt, "client_id": client_id},
+                                         timeout=self.timeout)
+        except requests.RequestException as e:
+            raise ComfyUIConnectionError(f"提交工作流失败: {e}") from e
+        try:
+            body = response.json()
+        except ValueError:
+            body = {}
+        if response.status_code != 200 or "prompt_id" not in body:
+            error = body.get("error")
+            message = error.get("message") if isinstance(error, dict) else error
+            if body.get("node_errors"):
+                message = f"{message or '节点错误'}: {json.dumps(body['node_errors'], ensure_ascii=False)[:300]}"
+            raise ComfyUIError(message or f"提交工作流失败: HTTP {response.status_code}")
+        return body["prompt_id"]
+
+    def get_history(self, prompt_id):
+        """返回该工作流的历史记录；尚未执行完时返回 None"""
+        return self._get(f"/history/{prompt_id}").json().get(prompt_id)
+
+    def get_queue(self):
+        """返回 (运行中数量, 排队数量)"""
+        body = self._get("/queue").json()
+        return len(body.get("queue_running", [])), len(body.get("queue_pending", []))
+
+    def download(self, image, output_dir):
+        """下载一张输出图片到 output_dir (保留 subfolder)，返回本地路径"""
+        params = {"filename": image["filename"], "subfolder": image.get("subfolder", ""),
+                  "type": image.get("type", "output")}
+        target_dir = os.path.join(output_dir, image.get("subfolder") or "")
+        os.makedirs(target_dir, exist_ok=True)
+        response = self._get("/view", params=params, stream=True)
+        path = reserve_path(os.path.join(target_dir, os.path.basename(image["filename"])))
+        tmp_path = path + ".part"
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in response.iter_content(64 * 1024):
+                    f.write(chunk)
+            os.replace(tmp_path, path)
+        except BaseException as e:
+            for leftover in (tmp_path, path):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+            if isinstance(e, requests.RequestException):
+                raise ComfyUIConnectionError(f"下载 {image['filename']} 中断: {e}") from e
+            raise
+        return path
+
+
+# ------------------------------------------------------------------------------
+# 工作流
+# ------------------------------------------------------------------------------
+def is_api_format(workflow):
+    """API 格式是 {节点 ID: {"class_type": ..., "inputs": {...}}}；界面格式带有 nodes/links 列表"""
+    return isinstance(workflow, dict) and bool(workflow) and all(
+        isinstance(node, dict) and "class_type" in node for node in workflow.values())
+
+
+def load_workflows(folder):
+    """读取文件夹中的 *.json 工作流，返回 [(名称, 工作流), ...] (按文件名排序)"""
+    workflows = []
+    for file_name in sorted(os.listdir(folder)):
+        if not file_name.lower().endswith(".json"):
+            continue
+        path = os.path.join(folder, file_name)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                workflow = json.load(f)
+        except (OSError, ValueError) as e:
+            raise ComfyUIError(f"无法读取工作流 {file_name}: {e}") from e
+        if not is_api_format(workflow):
+            raise ComfyUIError(f"{file_name} 不是 API 格式的工作流，请在 ComfyUI 中使用 \"Save (API Format)\" 导出")
+        workflows.append((os.path.splitext(file_name)[0], workflow))
+    if not workflows:
+        raise ComfyUIError(f"文件夹 {folder} 中没有 .json 工作流")
+    return workflows
+
+
+def randomize_seeds(workflow, rng):
+    """返回替换了随机种子的工作流副本 (相同的工作流 ComfyUI 会直接命中缓存，不会重新出图)"""
+    copy = json.loads(json.dumps(workflow))
+    for node in copy.values():
+        inputs = node.get("inputs") or {}
+        for name in SEED_INPUTS:
+            if isinstance(inputs.get(name), int):
+                inputs[name] = rng.randrange(2 ** 48)
+    return copy
+
+
+class PromptJob:
+    """批次中的一次提交"""
+    PENDING = "pending"
+    SUBMITTING = "submitting"
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    def __init__(self, name, workflow):
+        self.name = name
+        self.workflow = workflow
+        self.status = self.PENDING
+        self.prompt_id = None
+        self.error = None
+        self.executed = False # 已收到 executing(node=None) 或历史记录
+        self.awaiting_history = False # 已收到 executing(node=None)，等待历史记录确认
+        self.history_attempts = 0
+        self.history_retry_pending = False
+        self.downloads_pending = 0
+        self.downloaded = set() # 已开始下载的文件 (filename, subfolder)
+        self.files = []
+        self.attempts = 0 # 提交次数 (实例关机后重新排队会增加)
+
+    @property
+    def finished(self):
+        return self.status in (self.DONE, self.FAILED)
+
+    def reset(self):
+        """实例失联后重新排队：清除本次提交的状态"""
+        self.status = self.PENDING
+        self.prompt_id = None
+        self.error = None
+        self.executed = False
+        self.awaiting_history = False
+        self.history_attempts = 0
+        self.history_retry_pending = False
+        self.downloads_pending = 0
+        self.downloaded = set()
+
+
+def build_jobs(workflows, repeat=1, randomize_seed=True, seed=None):
+    """按 repeat 展开工作流列表：a.json ×2, b.json ×2 -> a#1, b#1, a#2, b#2"""
+    rng = random.Random(seed)
+    jobs = []
+    for index in range(1, repeat + 1):
+        for name, workflow in workflows:
+            prompt = randomize_seeds(workflow, rng) if randomize_seed else workflow
+            jobs.append(PromptJob(f"{name}#{index}" if repeat > 1 else name, prompt))
+    return jobs
+
+
+# ------------------------------------------------------------------------------
+# 批量运行器
+# ------------------------------------------------------------------------------
+class ComfyUIBatchRunner(QObject):
+    """
+    在一个实例上运行一批工作流 (在主线程中创建和使用)。
+    - 同时最多 max_in_flight 个已提交未完成的工作流，其余在本地排队，
+      避免一次把几百个工作流塞进实例队列后无法取消；
+    - HTTP 请求 (提交、查询历史、下载) 在线程池中执行，结果通过信号回到主线程；
+    - 收到 executed 立即下载该节点的图片；executing(node=None) 表示工作流执行完，
+      再查询一次历史记录，补下 websocket 断线期间漏掉的输出；
+    - websocket 断开时自动重连，期间每 poll_interval 秒轮询一次历史记录；
+      连续 lost_after 次提交连接失败，或 websocket 断开且超过 lost_timeout 秒没有任何响应，
+      视为实例失联 (关机)：单独使用时剩余工作流记为失败；keep_alive 模式 (由 ComfyUIFarm 调度)
+      发出 connection_lost，由调度器用 take_unfinished() 取回未完成的工作流重新分配。
+    """
+    job_submitted = Signal(object) # PromptJob
+    job_progress = Signal(object, int, int) # PromptJob, 当前步数, 总步数
+    job_finished = Signal(object) # PromptJob (status 为 DONE 或 FAILED)
+    progress = Signal(int, int, int) # 完成数, 失败数, 总数
+    log_message = Signal(str)
+    finished = Signal()
+    connection_lost = Signal()
+
+    # 内部信号：从线程池发出，排队到主线程处理
+    _submitted = Signal(object, str)
+    _submit_failed = Signal(object, str, bool) # PromptJob, 错误, 是否为连接错误
+    _history_ready = Signal(object, object)
+    _history_failed = Signal(object, str)
+    _downloaded = Signal(object, str)
+    _download_failed = Signal(object, object, str, bool) # PromptJob, 图片, 错误, 是否为连接错误
+
+    def __init__(self, base_url, jobs, output_dir, max_in_flight=4, download_workers=4,
+                 poll_interval=2.0, client=None, keep_alive=False, lost_after=3, lost_timeout=30.0, parent=None):
+        super().__init__(parent)
+        self.client = client or ComfyUIClient(base_url)
+        self.jobs = list(jobs)
+        self.output_dir = output_dir
+        self.max_in_flight = max(1, max_in_flight)
+        self.client_id = uuid.uuid4().hex
+        self._pending = list(self.jobs)
+        self._in_flight = {} # prompt_id -> PromptJob
+        self._submitting = set() # 提交请求尚未返回的 PromptJob
+        self._early_messages = {} # 提交请求返回前就收到的 websocket 消息
+        self._executor = ThreadPoolExecutor(max_workers=max(2, download_workers), thread_name_prefix="comfyui")
+        self._running = False
+        self.keep_alive = keep_alive
+        self.lost_after = lost_after
+        self.lost_timeout = lost_timeout
+        self._connection_errors = 0
+        self._last_contact = time.monotonic()
+        self.done_count = 0
+        self.failed_count = 0
+
+        self._submitted.connect(self._on_submitted)
+        self._submit_failed.connect(self._on_submit_failed)
+        self._history_ready.connect(self._on_history)
+        self._history_failed.connect(self._on_history_failed)
+        self._downloaded.connect(self._on_downloaded)
+        self._download_failed.connect(self._on_download_failed)
+
+        self.ws = QWebSocket(parent=self)
+        self.ws.textMessageReceived.connect(self._on_ws_message)
+        self.ws.connected.connect(self._on_ws_connected)
+        self.ws.disconnected.connect(self._on_ws_disconnected)
+        self._ws_retry_delay = 1.0
+
+        self.poll_timer = QTimer(self)
+        self.poll_timer.setInterval(int(poll_interval * 1000))
+        self.poll_timer.timeout.connect(self._poll_history)
+
+    # --- 控制 ---
+    def start(self):
+        self._running = True
+        self._last_contact = time.monotonic()
+        self.ws.open(QUrl(self.client.ws_url(self.client_id)))
+        self.poll_timer.start()
+        if self.jobs:
+            self.log_message.emit(f"开始提交 {len(self.jobs)} 个工作流 (同时最多 {self.max_in_flight} 个)")
+        self._fill()
+
+    def add_jobs(self, jobs):
+        """追加工作流 (keep_alive 模式下由调度器逐个分配)"""
+        self.jobs.extend(jobs)
+        self._pending.extend(jobs)
+        self._fill()
+
+    def cancel(self):
+        """停止提交新的工作流；已提交的工作流在实例上继续执行，但不再下载结果"""
+        if not self._running:
+            return
+        for job in self._pending:
+            job.status = PromptJob.FAILED
+            job.error = "已取消"
+        self.failed_count += len(self._pending)
+        self._pending.clear()
+        self._finish()
+
+    @property
+    def running(self):
+        return self._running
+
+    @property
+    def in_flight(self):
+        return len(self._in_flight) + len(self._submitting)
+
+    @property
+    def queued(self):
+        """本地排队、尚未提交的数量"""
+        return len(self._pending)
+
+    def _fill(self):
+        while self._running and self._pending and self.in_flight < self.max_in_flight:
+            job = self._pending.pop(0)
+            job.status = PromptJob.SUBMITTING
+            job.attempts += 1
+            self._submitting.add(job)
+            self._executor.submit(self._submit_job, job)
+        self._check_finished()
+
+    def _submit_job(self, job):
+        """在线程池中执行"""
+        try:
+            self._submitted.emit(job, self.client.queue_prompt(job.workflow, self.client_id))
+        except ComfyUIError as e:
+            self._submit_failed.emit(job, str(e), isinstance(e, ComfyUIConnectionError))
+
+    def _on_submitted(self, job, prompt_id):
+        if job not in self._submitting:
+            return # 实例已判定失联，工作流已重新排队
+        self._submitting.discard(job)
+        self._touch()
+        job.prompt_id = prompt_id
+        job.status = PromptJob.QUEUED
+        self._in_flight[prompt_id] = job
+        self.job_submitted.emit(job)
+        for message in self._early_messages.pop(prompt_id, []):
+            self._handle_message(message)
+
+    def _on_submit_failed(self, job, message, connection_error):
+        if job not in self._submitting:
+            return
+        self._submitting.discard(job)
+        if not connection_error:
+            self._fail(job, message) # 工作流本身有问题 (例如节点错误)，重试也没用
+            self._fill()
+            return
+        # 连接失败：放回队首，稍后重试；连续失败多次则判定实例失联
+        job.status = PromptJob.PENDING
+        self._pending.insert(0, job)
+        self._connection_errors += 1
+        log.info("提交工作流失败 (%d/%d): %s", self._connection_errors, self.lost_after, message)
+        if self._connection_errors >= self.lost_after:
+            self._lose(message)
+        else:
+            QTimer.singleShot(1000, self._fill)
+
+    def _touch(self):
+        """收到实例的任何响应"""
+        self._last_contact = time.monotonic()
+        self._connection_errors = 0
+
+    # --- websocket ---
+    def _on_ws_message(self, text):
+        try:
+            message = json.loads(text)
+        except ValueError:
+            return
+        self._touch()
+        self._handle_message(message)
+
+    def _handle_message(self, message):
+        kind = message.get("type")
+        data = message.get("data") or {}
+        if kind == "status":
+            return
+        prompt_id = data.get("prompt_id")
+        if prompt_id is None:
+            return
+        job = self._in_flight.get(prompt_id)
+        if job is None:
+            if self._submitting: # 提交请求的响应还没回到主线程
+                self._early_messages.setdefault(prompt_id, []).append(message)
+            return
+        if kind == "execution_start":
+            job.status = PromptJob.RUNNING
+        elif kind == "progress":
+            self.job_progress.emit(job, int(data.get("value", 0)), int(data.get("max", 0)))
+        elif kind == "executed":
+            self._download_outputs(job, (data.get("output") or {}).get("images", []))
+        elif kind == "executing" and data.get("node") is None:
+            # 工作流执行完。查询历史记录，补下漏掉的输出并确认最终状态 (查不到时退避重试)
+            job.awaiting_history = True
+            self._request_history(job)
+        elif kind == "execution_error":
+            self._fail(job, data.get("exception_message") or "执行出错")
+        elif kind == "execution_interrupted":
+            self._fail(job, "执行被中断")
+
+    def _on_ws_connected(self):
+        log.debug("ComfyUI websocket 已连接")
+        self._ws_retry_delay = 1.0
+        self._touch()
+
+    def _on_ws_disconnected(self):
+        if not self._running:
+            return
+        log.info("ComfyUI websocket 断开，%.0f 秒后重连 (期间轮询历史记录)", self._ws_retry_delay)
+        QTimer.singleShot(int(self._ws_retry_delay * 1000), self._reconnect_ws)
+        self._ws_retry_delay = min(30.0, self._ws_retry_delay * 2)
+
+    def _reconnect_ws(self):
+        if self._running:
+            self.ws.open(QUrl(self.client.ws_url(self.client_id)))
+
+    @property
+    def ws_connected(self):
+        return self.ws.isValid()
+
+    # --- 历史记录 ---
+    def _poll_history(self):
+        if self.ws_connected:
+            return
+        if time.monotonic() - self._last_contact > self.lost_timeout:
+            self._lose(f"超过 {self.lost_timeout:.0f} 秒没有响应")
+            return
+        for job in list(self._in_flight.values()):
+            self._request_history(job)
+
+    def _request_history(self, job):
+        if not self._running:
+            return
+        def fetch():
+            try:
+                self._history_ready.emit(job, self.client.get_history(job.prompt_id))
+            except ComfyUIError as e:
+                log.debug("查询历史记录失败: %s", e)
+                self._history_failed.emit(job, str(e))
+        self._executor.submit(fetch)
+
+    def _on_history(self, job, entry):
+        if self._in_flight.get(job.prompt_id) is not job:
+            return
+        self._touch()
+        if entry is None:
+            self._retry_history(job, "历史记录中没有该工作流")
+            return
+        status = entry.get("status") or {}
+        if status.get("status_str") == "error":
+            self._fail(job, "执行出错 (见实例日志)")
+            return
+        for output in (entry.get("outputs") or {}).values():
+            self._download_outputs(job, output.get("images", []))
+        job.executed = True
+        self._maybe_complete(job)
+
+    def _on_history_failed(self, job, message):
+        if self._in_flight.get(job.prompt_id) is job:
+            self._retry_history(job, message)
+
+    def _retry_history(self, job, reason):
+        """
+        已执行完的工作流查不到历史记录：退避后重新查询 (websocket 连接时不会轮询，不重试就会一直挂起)。
+        执行中的工作流查不到是正常的，不重试；已安排重试时不重复安排。
+        """
+        if not self._running or not job.awaiting_history or job.history_retry_pending:
+            return
+        job.history_attempts += 1
+        if job.history_attempts >= HISTORY_MAX_ATTEMPTS:
+            self._fail(job, f"执行完成后 {job.history_attempts} 次查询历史记录失败: {reason}")
+            return
+        delay = min(HISTORY_RETRY_MAX_DELAY, HISTORY_RETRY_DELAY * 2 ** (job.history_attempts - 1))
+        log.debug("%s: %s，%.1f 秒后重新查询历史记录", job.name, reason, delay)
+        job.history_retry_pending = True
+        QTimer.singleShot(int(delay * 1000), lambda: self._retry_history_now(job))
+
+    def _retry_history_now(self, job):
+        if self._in_flight.get(job.prompt_id) is not job:
+            return # 已完成、失败或重新排队
+        job.history_retry_pending = False
+        self._request_history(job)
+
+    # --- 下载 ---
+    def _download_outputs(self, job, images):
+        if not self._running:
+            return # 已取消
+        for image in images:
+            if image.get("type", "output") != "output":
+                continue # 预览图和临时文件不下载
+            key = (image.get("filename"), image.get("subfolder", ""))
+            if key in job.downloaded:
+                continue
+            job.downloaded.add(key)
+            job.downloads_pending += 1
+            self._executor.submit(self._download_job, job, image)
+
+    def _download_job(self, job, image):
+        """在线程池中执行"""
+        try:
+            self._downloaded.emit(job, self.client.download(image, self.output_dir))
+        except (ComfyUIError, OSError) as e:
+            self._download_failed.emit(job, image, f"下载 {image.get('filename')} 失败: {e}",
+                                       isinstance(e, ComfyUIConnectionError))
+
+    def _on_downloaded(self, job, path):
+        if self._in_flight.get(job.prompt_id) is not job:
+            return
+        self._touch()
+        job.downloads_pending -= 1
+        job.files.append(path)
+        self._maybe_complete(job)
+
+    def _on_download_failed(self, job, image, message, connection_error):
+        if self._in_flight.get(job.prompt_id) is not job:
+            return
+        if connection_error:
+            # 连接失败：稍后重试；连续失败多次则判定实例失联 (调度模式下整个工作流会重新分配)
+            self._connection_errors += 1
+            if self._connection_errors >= self.lost_after:
+                self._lose(message)
+            else:
+                QTimer.singleShot(1000, lambda: self._retry_download(job, image))
+            return
+        job.downloads_pending -= 1
+        job.error = message
+        self.log_message.emit(message)
+        self._maybe_complete(job)
+
+    def _retry_download(self, job, image):
+        if self._running and self._in_flight.get(job.prompt_id) is job:
+            self._executor.submit(self._download_job, job, image)
+
+    # --- 完成 ---
+    def _maybe_complete(self, job):
+        if job.finished or not job.executed or job.downloads_pending:
+            return
+        job.status = PromptJob.FAILED if job.error else PromptJob.DONE
+        self._release(job)
+
+    def _fail(self, job, message):
+        if job.finished:
+            return
+        job.status = PromptJob.FAILED
+        job.error = message
+        self.log_message.emit(f"{job.name}: {message}")
+        self._release(job)
+
+    def _release(self, job):
+        self._in_flight.pop(job.prompt_id, None)
+        if job.status == PromptJob.DONE:
+            self.done_count += 1
+        else:
+            self.failed_count += 1
+        self.job_finished.emit(job)
+        self.progress.emit(self.done_count, self.failed_count, len(self.jobs))
+        self._fill()
+
+    def _check_finished(self):
+        if self._running and not self.keep_alive and not self._pending and not self.in_flight:
+            self._finish()
+
+    def _lose(self, reason):
+        """实例失联"""
+        if not self._running:
+            return
+        self.log_message.emit(f"实例无法连接: {reason}")
+        if self.keep_alive:
+            self._stop()
+            self.connection_lost.emit()
+            return
+        for job in self.take_unfinished():
+            job.status = PromptJob.FAILED
+            job.error = "实例无法连接"
+            self.failed_count += 1
+            self.job_finished.emit(job)
+        self.progress.emit(self.done_count, self.failed_count, len(self.jobs))
+        self._finish()
+
+    def take_unfinished(self):
+        """取回所有未完成的工作流 (已重置为待提交状态)，本运行器不再处理它们"""
+        jobs = list(self._submitting) + [job for job in self._in_flight.values() if not job.finished] + self._pending
+        self._submitting.clear()
+        self._in_flight.clear()
+        self._pending = []
+        self._early_messages.clear()
+        for job in jobs:
+            job.reset()
+        return jobs
+
+    def stop(self):
+        """停止运行器 (不改变工作流状态，未完成的先用 take_unfinished() 取回)"""
+        if self._running:
+            self._stop()
+
+    def _stop(self):
+        self._running = False
+        self.poll_timer.stop()
+        self.ws.close()
+        self._executor.shutdown(wait=False)
+
+    def _finish(self):
+        self._stop()
+        self.log_message.emit(f"批次结束: 成功 {self.done_count}，失败 {self.failed_count}，共 {len(self.jobs)}")
+        self.finished.emit()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ComfyUI 批量出图")
+    parser.add_argument("--url", required=True, help="ComfyUI 地址，例如 http://127.0.0.1:8188")
+    parser.add_argument("--workflows", required=True, help="API 格式工作流 (*.json) 所在文件夹")
+    parser.add_argument("--out", default="comfyui_outputs", help="图片保存目录")
+    parser.add_argument("--repeat", type=int, default=1, help="每个工作流提交的次数")
+    parser.add_argument("--max-in-flight", type=int, default=4, help="同时提交到实例的工作流数")
+    parser.add_argument("--keep-seed", action="store_true", help="不随机替换种子")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    app = QCoreApplication.instance() or QCoreApplication(sys.argv)
+    try:
+        jobs = build_jobs(load_workflows(args.workflows), args.repeat, randomize_seed=not args.keep_seed)
+    except ComfyUIError as e:
+        log.error("%s", e)
+        return 1
+    runner = ComfyUIBatchRunner(args.url, jobs, args.out, max_in_flight=args.max_in_flight)
+    runner.log_message.connect(log.info)
+    runner.progress.connect(lambda done, failed, total: log.info("进度 %d/%d (失败 %d)", done + failed, total, failed))
+    runner.finished.connect(app.quit)
+    runner.start()
+    app.exec()
+    return 0 if runner.failed_count == 0 else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
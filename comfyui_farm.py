@@ -0,0 +1,281 @@
+# comfyui_farm.py
+"""
+多实例 ComfyUI 调度：把一批工作流分配到多个运行中的实例 (通常是同一镜像的多台 GPU)。
+每个实例由一个 keep_alive 模式的 ComfyUIBatchRunner 负责提交、跟踪进度和下载，
+调度器只决定“下一个工作流交给谁”：
+- 按实测吞吐 (完成一个工作流的平均耗时) 和实例队列深度 (包括别人在网页上提交的工作流)
+  估算新工作流在每个实例上的完成时间，选最早的；
+- 实例失联 (关机) 或被移除时，取回它未完成的工作流放回队首，交给其他实例。
+
+命令行用法:
+    python comfyui_farm.py --url http://a:8188 --url http://b:8188 --workflows ./workflows --out ./outputs --repeat 50
+"""
+import sys
+import time
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from PySide6.QtCore import QObject, Signal, QTimer, QCoreApplication
+from comfyui_batch import ComfyUIBatchRunner, ComfyUIError, PromptJob, build_jobs, load_workflows
+
+log = logging.getLogger(__name__)
+
+# 还没有测量数据时假定的单个工作流耗时 (秒)；只影响最开始的几次分配
+DEFAULT_SECONDS_PER_PROMPT = 10.0
+# 耗时的指数移动平均系数
+EWMA_ALPHA = 0.3
+
+
+class FarmNode:
+    """调度器眼中的一个实例"""
+
+    def __init__(self, instance_id, name, base_url, runner):
+        self.instance_id = instance_id
+        self.name = name
+        self.base_url = base_url
+        self.runner = runner
+        self.alive = True
+        self.seconds_per_prompt = None # 实测的单个工作流耗时 (EWMA)
+        self.busy_since = None # 本段连续忙碌的开始时间或上一个工作流完成的时间
+        self.foreign_depth = 0 # 实例队列中不属于本批次的工作流数
+        self.done = 0
+        self.failed = 0
+
+    def record_completion(self, now):
+        """GPU 串行执行工作流：忙碌期间相邻两次完成的间隔就是一个工作流的耗时"""
+        if self.busy_since is not None:
+            sample = now - self.busy_since
+            self.seconds_per_prompt = sample if self.seconds_per_prompt is None else \
+                EWMA_ALPHA * sample + (1 - EWMA_ALPHA) * self.seconds_per_prompt
+        self.busy_since = now if self.runner.in_flight else None # 完成后仍有工作流在执行
+
+    def expected_finish(self, default_seconds):
+        """新分配的工作流预计多少秒后完成"""
+        seconds = self.seconds_per_prompt or default_seconds
+        return (self.foreign_depth + self.runner.in_flight + 1) * seconds
+
+    @property
+    def throughput(self):
+        """每分钟完成的工作流数 (无数据时为 None)"""
+        return 60.0 / self.seconds_per_prompt if self.seconds_per_prompt else None
+
+
+class ComfyUIFarm(QObject):
+    """
+    把一批工作流分配到多个 ComfyUI 实例 (在主线程中创建和使用)。
+    :param max_in_flight: 每个实例同时提交的工作流上限
+    :param queue_poll_interval: 查询各实例 /queue 的间隔 (秒)
+    """
+    job_finished = Signal(object) # PromptJob
+    job_progress = Signal(object, int, int)
+    progress = Signal(int, int, int) # 完成数, 失败数, 总数
+    nodes_changed = Signal()
+    log_message = Signal(str)
+    finished = Signal()
+
+    _queue_depth_ready = Signal(object, int) # FarmNode, 实例队列中的工作流总数
+
+    def __init__(self, jobs, output_dir, max_in_flight=2, queue_poll_interval=5.0, runner_options=None,
+                 parent=None):
+        super().__init__(parent)
+        self.jobs = list(jobs)
+        self.output_dir = output_dir
+        self.max_in_flight = max(1, max_in_flight)
+        self.runner_options = dict(runner_options or {})
+        self.nodes = {} # instance_id -> FarmNode
+        self._queue = list(self.jobs)
+        self._running = False
+        self.done_count = 0
+        self.failed_count = 0
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="comfyui-farm")
+        self._queue_depth_ready.connect(self._on_queue_depth)
+
+        self.queue_timer = QTimer(self)
+        self.queue_timer.setInterval(int(queue_poll_interval * 1000))
+        self.queue_timer.timeout.connect(self._poll_queues)
+
+    # --- 实例管理 ---
+    def add_instance(self, instance_id, name, base_url):
+        node = self.nodes.get(instance_id)
+        if node is not None and node.alive:
+            return
+        runner = ComfyUIBatchRunner(base_url, [], self.output_dir, max_in_flight=self.max_in_flight,
+                                    keep_alive=True, parent=self, **self.runner_options)
+        node = self.nodes[instance_id] = FarmNode(instance_id, name, base_url, runner)
+        runner.job_finished.connect(lambda job, node=node: self._on_job_finished(node, job))
+        runner.job_progress.connect(self.job_progress)
+        runner.log_message.connect(lambda text, node=node: self.log_message.emit(f"[{node.name}] {text}"))
+        runner.connection_lost.connect(lambda node=node: self._requeue(node, "无法连接"))
+        if self._running:
+            runner.start()
+            self._dispatch()
+        self.nodes_changed.emit()
+
+    def remove_instance(self, instance_id, reason="已移除"):
+        """实例关机或不再使用：它未完成的工作流重新分配给其他实例"""
+        node = self.nodes.get(instance_id)
+        if node is not None and node.alive:
+            self._requeue(node, reason)
+
+    def _requeue(self, node, reason):
+        node.alive = False
+        jobs = node.runner.take_unfinished()
+        node.runner.stop()
+        self._queue[:0] = jobs # 放回队首，优先于尚未分配的工作流
+        self.log_message.emit(f"实例 {node.name} {reason}，{len(jobs)} 个未完成的工作流重新排队")
+        self.nodes_changed.emit()
+        self._dispatch()
+
+    @property
+    def alive_nodes(self):
+        return [node for node in self.nodes.values() if node.alive]
+
+    # --- 控制 ---
+    def start(self):
+        self._running = True
+        for node in self.alive_nodes:
+            node.runner.start()
+        self.queue_timer.start()
+        self.log_message.emit(f"开始分配 {len(self.jobs)} 个工作流到 {len(self.alive_nodes)} 个实例")
+        self._poll_queues()
+        self._dispatch()
+
+    def cancel(self):
+        """停止分配；已提交到实例的工作流继续执行，但不再下载结果"""
+        if not self._running:
+            return
+        for job in self._queue:
+            job.status = PromptJob.FAILED
+            job.error = "已取消"
+        self.failed_count += len(self._queue)
+        self._queue.clear()
+        self._finish()
+
+    def shutdown(self):
+        """不再使用这个调度器时调用：停止分配，停止所有实例的运行器 (包括已失联的) 并关闭线程池"""
+        self.cancel()
+        self.queue_timer.stop()
+        for node in self.nodes.values():
+            node.runner.stop()
+        self._executor.shutdown(wait=False)
+
+    @property
+    def running(self):
+        return self._running
+
+    @property
+    def queued(self):
+        return len(self._queue)
+
+    # --- 分配 ---
+    def _default_seconds(self):
+        """没有测量数据的实例按已测实例的平均耗时估计"""
+        measured = [node.seconds_per_prompt for node in self.alive_nodes if node.seconds_per_prompt]
+        return sum(measured) / len(measured) if measured else DEFAULT_SECONDS_PER_PROMPT
+
+    def _pick_node(self):
+        default_seconds = self._default_seconds()
+        candidates = [node for node in self.alive_nodes if node.runner.in_flight < self.max_in_flight]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda node: (node.expected_finish(default_seconds), node.runner.in_flight))
+
+    def _dispatch(self):
+        if not self._running:
+            return
+        while self._queue:
+            node = self._pick_node()
+            if node is None:
+                break
+            job = self._queue.pop(0)
+            if node.runner.in_flight == 0:
+                node.busy_since = time.monotonic()
+            node.runner.add_jobs([job])
+        self._check_finished()
+
+    def _on_job_finished(self, node, job):
+        if job.status == PromptJob.DONE:
+            node.done += 1
+            self.done_count += 1
+            node.record_completion(time.monotonic())
+        else:
+            node.failed += 1
+            self.failed_count += 1
+        self.job_finished.emit(job)
+        self.progress.emit(self.done_count, self.failed_count, len(self.jobs))
+        self.nodes_changed.emit()
+        self._dispatch()
+
+    # --- 实例队列深度 ---
+    def _poll_queues(self):
+        for node in self.alive_nodes:
+            self._executor.submit(self._fetch_queue_depth, node)
+
+    def _fetch_queue_depth(self, node):
+        """在线程池中执行"""
+        try:
+            running, pending = node.runner.client.get_queue()
+        except ComfyUIError as e:
+            log.debug("查询 %s 队列失败: %s", node.name, e)
+            return
+        self._queue_depth_ready.emit(node, running + pending)
+
+    def _on_queue_depth(self, node, depth):
+        # 队列中除了本批次已提交的，其余都是别人的工作流，会排在新工作流前面
+        node.foreign_depth = max(0, depth - node.runner.in_flight)
+        self.nodes_changed.emit()
+
+    # --- 完成 ---
+    def _check_finished(self):
+        if not self._running:
+            return
+        if self._queue and not self.alive_nodes:
+            self.log_message.emit("没有可用的实例，剩余工作流记为失败")
+            self.cancel()
+            return
+        if not self._queue and all(node.runner.in_flight == 0 for node in self.alive_nodes):
+            self._finish()
+
+    def _finish(self):
+        self._running = False
+        self.queue_timer.stop()
+        for node in self.alive_nodes:
+            node.runner.stop()
+        self._executor.shutdown(wait=False)
+        self.log_message.emit(f"批次结束: 成功 {self.done_count}，失败 {self.failed_count}，共 {len(self.jobs)}")
+        self.finished.emit()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="多实例 ComfyUI 批量出图")
+    parser.add_argument("--url", action="append", required=True, help="ComfyUI 地址 (可重复)")
+    parser.add_argument("--workflows", required=True, help="API 格式工作流 (*.json) 所在文件夹")
+    parser.add_argument("--out", default="comfyui_outputs", help="图片保存目录")
+    parser.add_argument("--repeat", type=int, default=1, help="每个工作流提交的次数")
+    parser.add_argument("--max-in-flight", type=int, default=2, help="每个实例同时提交的工作流数")
+    parser.add_argument("--keep-seed", action="store_true", help="不随机替换种子")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    app = QCoreApplication.instance() or QCoreApplication(sys.argv)
+    try:
+        jobs = build_jobs(load_workflows(args.workflows), args.repeat, randomize_seed=not args.keep_seed)
+    except ComfyUIError as e:
+        log.error("%s", e)
+        return 1
+    farm = ComfyUIFarm(jobs, args.out, max_in_flight=args.max_in_flight)
+    for url in args.url:
+        farm.add_instance(url, url, url)
+    farm.log_message.connect(log.info)
+    farm.progress.connect(lambda done, failed, total: log.info("进度 %d/%d (失败 %d)", done + failed, total, failed))
+    farm.finished.connect(app.quit)
+    farm.start()
+    app.exec()
+    for node in farm.nodes.values():
+        log.info("%s: 完成 %d，失败 %d，平均 %s 秒/个", node.name, node.done, node.failed,
+                 f"{node.seconds_per_prompt:.2f}" if node.seconds_per_prompt else "-")
+    return 0 if farm.failed_count == 0 else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
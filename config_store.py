@@ -0,0 +1,145 @@
+# config_store.py
+import logging
+from PySide6.QtCore import QObject, QSettings, QTimer, Slot
+from PySide6.QtWidgets import QApplication
+
+log = logging.getLogger(__name__)
+
+# 默认端口配置 (与设置页面的输入框一一对应)
+DEFAULT_PORTS = {
+    "comfyui": 8188, "fengzhuang": 7861, "fluxgym": 7860,
+    "shuchu": 8080, "quanbu": 8081
+}
+
+# 写入 QSettings 前的合并等待时间 (毫秒)
+FLUSH_DELAY_MS = 800
+
+
+class ConfigStore(QObject):
+    """
+    内存中的配置存储 (写回缓存)。
+    读取只访问内存；写入只标记脏键，在防抖间隔后一次性批量写入 QSettings 并 sync，
+    程序退出时也会强制写入一次。
+    """
+
+    def __init__(self, parent=None, flush_delay_ms=FLUSH_DELAY_MS):
+        super().__init__(parent)
+        self._values = {}
+        self._dirty = set()
+        self._settings = QSettings()
+        # 启动时一次性读入所有键，之后不再访问磁盘
+        for key in self._settings.allKeys():
+            self._values[key] = self._settings.value(key)
+
+        self._flush_timer = QTimer(self)
+        self._flush_timer.setSingleShot(True)
+        self._flush_timer.setInterval(flush_delay_ms)
+        self._flush_timer.timeout.connect(self.flush)
+        self._migrate_legacy_ports()
+
+        app = QApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.flush) # 退出前写入剩余的脏键
+
+    # --- 通用读写 ---
+    def value(self, key, default=None):
+        return self._values.get(key, default)
+
+    def set_value(self, key, value):
+        """更新内存中的值；只有值真正改变时才标记为脏并安排写入"""
+        if key in self._values and self._values[key] == value:
+            return
+        if value is None and key not in self._values:
+            return
+        self._values[key] = value
+        self._dirty.add(key)
+        self._flush_timer.start() # 重新开始计时，合并连续写入
+
+    def remove(self, key):
+        self.set_value(key, None)
+
+    def is_dirty(self):
+        return bool(self._dirty)
+
+    @Slot()
+    def flush(self):
+        """将所有脏键一次性写入 QSettings 并同步到磁盘"""
+        self._flush_timer.stop()
+        if not self._dirty:
+            return
+        for key in sorted(self._dirty):
+            value = self._values.get(key)
+            if value is None:
+                self._settings.remove(key)
+                self._values.pop(key, None)
+            else:
+                self._settings.setValue(key, value)
+        self._settings.sync() # 整批只 sync 一次
+        if self._settings.status() != QSettings.Status.NoError:
+            log.warning("写入配置失败 (QSettings 状态: %s)，将在下次修改时重试。", self._settings.status())
+            return
+        self._dirty.clear()
+
+    # --- 类型化读取 ---
+    def get_str(self, key, default=""):
+        value = self._values.get(key)
+        return default if value is None else str(value)
+
+    def get_int(self, key, default=0):
+        value = self._values.get(key)
+        try:
+            return default if value is None else int(value)
+        except (ValueError, TypeError):
+            return default
+
+    def get_bool(self, key, default=False):
+        value = self._values.get(key)
+        if value is None:
+            return default
+        if isinstance(value, str): # ini 格式下布尔值会以字符串形式读回
+            return value.lower() in ("true", "1", "yes")
+        return bool(value)
+
+    def get_list(self, key):
+        value = self._values.get(key)
+        return list(value) if isinstance(value, (list, tuple)) else []
+
+    # --- 端口配置 ---
+    def get_port(self, name):
+        return self.get_int(f"ports/{name}", DEFAULT_PORTS.get(name, 0))
+
+    def get_ports(self):
+        """返回所有服务端口；写入时已校验，这里只做类型转换"""
+        return {name: self.get_port(name) for name in DEFAULT_PORTS}
+
+    def set_port(self, name, port):
+        """校验并保存单个端口，无效时抛出 ValueError"""
+        port = int(port)
+        if not 0 < port < 65536:
+            raise ValueError(f"端口号 {port} 超出范围 1-65535")
+        self.set_value(f"ports/{name}", port)
+
+    def _migrate_legacy_ports(self):
+        """旧版本把端口存成一个字典 ("ports")；首次加载时逐项校验后拆成 ports/<name> 键"""
+        legacy = self._values.get("ports")
+        if legacy is None:
+            return
+        if isinstance(legacy, dict):
+            for name, port in legacy.items():
+                if f"ports/{name}" in self._values:
+                    continue
+                try:
+                    self.set_port(name, port)
+                except (ValueError, TypeError):
+                    log.warning("旧配置中的端口 '%s': '%s' 无效，已忽略。", name, port)
+        self.remove("ports")
+
+
+_store = None
+
+def get_config_store():
+    """返回全局唯一的 ConfigStore (需在设置应用名/组织名之后调用)"""
+    global _store
+    if _store is None:
+        _store = ConfigStore()
+    return _store
@@ -0,0 +1,356 @@
+# fake_comfyui_server.py
+"""
+本地模拟的 ComfyUI 服务 (只依赖标准库)，用于测试批量出图客户端和多实例调度，不需要 GPU。
+支持 POST /prompt、GET /queue、GET /history/<id>、GET /view 和 /ws 推送的执行进度消息。
+
+独立运行:
+    python fake_comfyui_server.py --port 8188 --seconds-per-prompt 0.5 --images 2
+
+在测试或基准脚本中进程内启动:
+    server = FakeComfyUIServer(port=0).start()
+    client = ComfyUIClient(server.base_url)
+"""
+import json
+import time
+import uuid
+import base64
+import queue
+import random
+import socket
+import hashlib
+import logging
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+log = logging.getLogger(__name__)
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+# 带进度消息的节点类型 (其余节点只发送 executing)
+SAMPLER_NODES = ("KSampler", "KSamplerAdvanced", "SamplerCustom")
+OUTPUT_NODES = ("SaveImage", "PreviewImage")
+
+
+def websocket_frame(text):
+    """编码一个服务器发往客户端的文本帧 (服务器帧不加掩码)"""
+    payload = text.encode("utf-8")
+    length = len(payload)
+    if length < 126:
+        header = bytes([0x81, length])
+    elif length < 65536:
+        header = bytes([0x81, 126]) + length.to_bytes(2, "big")
+    else:
+        header = bytes([0x81, 127]) + length.to_bytes(8, "big")
+    return header + payload
+
+
+class FakeComfyUIServer:
+    """
+    单 GPU 的模拟 ComfyUI：提交的工作流排队后依次“执行”。
+    :param seconds_per_prompt: 每个工作流的执行时间
+    :param progress_steps: 采样节点发送的进度消息数
+    :param images_per_prompt: 每个输出节点产生的图片数
+    :param image_bytes: 每张图片的大小 (内容是确定性的伪数据)
+    :param fail_rate: 工作流执行失败 (execution_error) 的概率
+    :param history_delay: 大于 0 时先发送 executing(node=None)，过这么多秒才写入历史记录
+                          (模拟历史记录滞后)；小于 0 表示不写入 (模拟历史记录丢失)
+    """
+
+    def __init__(self, host="127.0.0.1", port=8188, seconds_per_prompt=0.2, progress_steps=4,
+                 images_per_prompt=1, image_bytes=64 * 1024, fail_rate=0.0, history_delay=0.0, seed=None):
+        self.seconds_per_prompt = seconds_per_prompt
+        self.progress_steps = progress_steps
+        self.images_per_prompt = images_per_prompt
+        self.image_bytes = image_bytes
+        self.fail_rate = fail_rate
+        self.history_delay = history_delay
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._pending = [] # [(number, prompt_id, prompt, client_id)]
+        self._running = None
+        self._history = {}
+        self._images = {} # filename -> bytes
+        self._clients = {} # client_id -> [queue.Queue, ...]
+        self._connections = set() # 保持中的连接，stop() 时全部断开
+        self._number = 0
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self.prompts_received = 0
+        self.prompts_completed = 0
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._threads = []
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        for target, name in ((self._httpd.serve_forever, "fake-comfyui-http"), (self._execute_loop, "fake-comfyui-gpu")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        log.info("模拟 ComfyUI 已启动: %s", self.base_url)
+        return self
+
+    def stop(self):
+        """停止服务 (模拟实例关机)：断开所有 websocket，之后的请求连接失败"""
+        self._stopping.set()
+        self._wakeup.set()
+        with self._lock:
+            for queues in self._clients.values():
+                for q in queues:
+                    q.put(None)
+            connections = list(self._connections)
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        for connection in connections: # keep-alive 连接也要断开，否则客户端仍能收到响应
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    # --- 队列 ---
+    def queue_depth(self):
+        with self._lock:
+            return len(self._pending) + (1 if self._running else 0)
+
+    def _submit(self, body):
+        prompt = body.get("prompt")
+        if not isinstance(prompt, dict) or not prompt or not all(
+                isinstance(node, dict) and "class_type" in node for node in prompt.values()):
+            return 400, {"error": {"type": "invalid_prompt", "message": "Cannot execute because the prompt is not in API format"},
+                         "node_errors": {}}
+        with self._lock:
+            self._number += 1
+            prompt_id = str(uuid.uuid4())
+            self._pending.append((self._number, prompt_id, prompt, body.get("client_id")))
+            self.prompts_received += 1
+            number = self._number
+        self._broadcast_status()
+        self._wakeup.set()
+        return 200, {"prompt_id": prompt_id, "number": number, "node_errors": {}}
+
+    def _queue_info(self):
+        with self._lock:
+            running = [[self._running[0], self._running[1], {}, {}, []]] if self._running else []
+            pending = [[number, prompt_id, {}, {}, []] for number, prompt_id, _, _ in self._pending]
+        return {"queue_running": running, "queue_pending": pending}
+
+    # --- websocket 消息 ---
+    def _send(self, client_id, message):
+        text = json.dumps(message)
+        with self._lock:
+            targets = list(self._clients.get(client_id, [])) if client_id else \
+                [q for queues in self._clients.values() for q in queues]
+        for q in targets:
+            q.put(text)
+
+    def _broadcast_status(self):
+        self._send(None, {"type": "status", "data": {"status": {"exec_info": {"queue_remaining": self.queue_depth()}}}})
+
+    def _register(self, client_id):
+        q = queue.Queue()
+        with self._lock:
+            self._clients.setdefault(client_id, []).append(q)
+        return q
+
+    def _unregister(self, client_id, q):
+        with self._lock:
+            queues = self._clients.get(client_id, [])
+            if q in queues:
+                queues.remove(q)
+
+    # --- 执行 ---
+    def _execute_loop(self):
+        while not self._stopping.is_set():
+            with self._lock:
+                item = self._pending.pop(0) if self._pending else None
+                self._running = item
+            if item is None:
+                self._wakeup.wait(0.5)
+                self._wakeup.clear()
+                continue
+            self._execute(*item)
+            with self._lock:
+                self._running = None
+            self._broadcast_status()
+
+    def _execute(self, number, prompt_id, prompt, client_id):
+        send = lambda kind, **data: self._send(client_id, {"type": kind, "data": dict(data, prompt_id=prompt_id)})
+        send("execution_start", timestamp=int(time.time() * 1000))
+        node_ids = sorted(prompt, key=lambda k: (len(k), k))
+        step_time = self.seconds_per_prompt / max(1, len(node_ids))
+        outputs = {}
+        failed = self._random.random() < self.fail_rate
+        for index, node_id in enumerate(node_ids):
+            if self._stopping.is_set():
+                return
+            node = prompt[node_id]
+            send("executing", node=node_id)
+            if node["class_type"] in SAMPLER_NODES:
+                for step in range(1, self.progress_steps + 1):
+                    time.sleep(step_time / self.progress_steps)
+                    send("progress", value=step, max=self.progress_steps, node=node_id)
+            else:
+                time.sleep(step_time)
+            if failed and index == len(node_ids) // 2:
+                send("execution_error", node_id=node_id, node_type=node["class_type"],
+                     exception_message="模拟的执行错误", exception_type="RuntimeError")
+                self._record(prompt_id, number, outputs, "error")
+                return
+            if node["class_type"] in OUTPUT_NODES:
+                prefix = (node.get("inputs") or {}).get("filename_prefix", "ComfyUI")
+                images = [self._make_image(prefix) for _ in range(self.images_per_prompt)]
+                outputs[node_id] = {"images": images}
+                send("executed", node=node_id, output={"images": images})
+        if not self.history_delay:
+            self._record(prompt_id, number, outputs, "success")
+            send("executing", node=None)
+            return
+        send("executing", node=None)
+        if self.history_delay > 0:
+            timer = threading.Timer(self.history_delay, self._record, args=(prompt_id, number, outputs, "success"))
+            timer.daemon = True
+            timer.start()
+
+    def _make_image(self, prefix):
+        with self._lock:
+            filename = f"{prefix}_{len(self._images) + 1:05d}_.png"
+            seed = hashlib.sha256(filename.encode("utf-8")).digest()
+            self._images[filename] = (seed * (self.image_bytes // len(seed) + 1))[:self.image_bytes]
+        return {"filename": filename, "subfolder": "", "type": "output"}
+
+    def _record(self, prompt_id, number, outputs, status):
+        with self._lock:
+            self._history[prompt_id] = {
+                "prompt": [number, prompt_id, {}, {}, list(outputs)],
+                "outputs": outputs,
+                "status": {"status_str": status, "completed": status == "success", "messages": []},
+            }
+            if status == "success":
+                self.prompts_completed += 1
+
+    # --- HTTP ---
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1" # websocket 握手要求 HTTP/1.1
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server._connections.add(self.connection)
+
+            def finish(self):
+                with server._lock:
+                    server._connections.discard(self.connection)
+                super().finish()
+
+            def _reply(self, status, body, content_type="application/json"):
+                payload = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_POST(self):
+                path = urlparse(self.path).path
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    self._reply(400, {"error": "invalid json"})
+                    return
+                if path == "/prompt":
+                    self._reply(*server._submit(body))
+                else:
+                    self._reply(404, {"error": "not found"})
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+                if parsed.path == "/ws":
+                    self._websocket(params.get("clientId") or str(uuid.uuid4()))
+                elif parsed.path == "/queue":
+                    self._reply(200, server._queue_info())
+                elif parsed.path.startswith("/history/"):
+                    prompt_id = parsed.path[len("/history/"):]
+                    with server._lock:
+                        entry = server._history.get(prompt_id)
+                    self._reply(200, {prompt_id: entry} if entry else {})
+                elif parsed.path == "/view":
+                    with server._lock:
+                        data = server._images.get(params.get("filename", ""))
+                    if data is None:
+                        self._reply(404, {"error": "file not found"})
+                    else:
+                        self._reply(200, data, "image/png")
+                else:
+                    self._reply(404, {"error": "not found"})
+
+            def _websocket(self, client_id):
+                key = self.headers.get("Sec-WebSocket-Key", "")
+                accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode("ascii")).digest()).decode("ascii")
+                self.send_response(101, "Switching Protocols")
+                self.send_header("Upgrade", "websocket")
+                self.send_header("Connection", "Upgrade")
+                self.send_header("Sec-WebSocket-Accept", accept)
+                self.end_headers()
+                q = server._register(client_id)
+                self.wfile.write(websocket_frame(json.dumps(
+                    {"type": "status", "data": {"status": {"exec_info": {"queue_remaining": server.queue_depth()}},
+                                                "sid": client_id}})))
+                try:
+                    while not server._stopping.is_set():
+                        try:
+                            text = q.get(timeout=0.5)
+                        except queue.Empty:
+                            continue
+                        if text is None:
+                            break
+                        self.wfile.write(websocket_frame(text))
+                except OSError:
+                    pass # 客户端断开
+                finally:
+                    server._unregister(client_id, q)
+                    self.close_connection = True
+
+            def log_message(self, format, *args):
+                log.debug("%s - %s", self.address_string(), format % args)
+
+        return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="本地模拟的 ComfyUI 服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8188)
+    parser.add_argument("--seconds-per-prompt", type=float, default=0.5)
+    parser.add_argument("--progress-steps", type=int, default=4)
+    parser.add_argument("--images", type=int, default=1, help="每个输出节点的图片数")
+    parser.add_argument("--image-kb", type=int, default=64)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--history-delay", type=float, default=0.0,
+                        help="执行完成后延迟写入历史记录的秒数 (小于 0 表示不写入)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    server = FakeComfyUIServer(args.host, args.port, seconds_per_prompt=args.seconds_per_prompt,
+                               progress_steps=args.progress_steps, images_per_prompt=args.images,
+                               image_bytes=args.image_kb * 1024, fail_rate=args.fail_rate,
+                               history_delay=args.history_delay).start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
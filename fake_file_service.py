@@ -0,0 +1,254 @@
+# fake_file_service.py
+"""
+本地模拟的实例文件服务 (只依赖标准库)，用于测试输出同步 (output_sync.py) 和分块上传 (upload_manager.py)。
+- GET/HEAD /files/<路径>: 目录返回 HTML 列表，文件返回内容 (带 Content-Length、Last-Modified)
+- /tus/: tus 1.0 断点续传上传 (creation、concatenation 扩展)，完成后写入 <根目录>/<path>/<filename>
+
+    python fake_file_service.py --root ./remote --port 8090
+    server = FakeFileService(root, port=0, fail_every=3).start()   # 每 3 个 PATCH 断开一次连接，模拟网络中断
+"""
+import os
+import html
+import uuid
+import base64
+import shutil
+import logging
+import argparse
+import threading
+import time
+from email.utils import formatdate
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, quote, unquote
+
+log = logging.getLogger(__name__)
+
+TUS_VERSION = "1.0.0"
+TUS_EXTENSIONS = "creation,concatenation"
+
+
+def parse_metadata(header):
+    """Upload-Metadata: key base64值,key2 base64值"""
+    metadata = {}
+    for pair in (header or "").split(","):
+        if not pair.strip():
+            continue
+        key, _, value = pair.strip().partition(" ")
+        metadata[key] = base64.b64decode(value).decode("utf-8") if value else ""
+    return metadata
+
+
+class FakeFileService:
+    """
+    :param root: 文件服务的根目录
+    :param fail_every: 每收到这么多个 PATCH 请求就在写入一半时断开一次 (0 表示不断开)
+    :param chunk_delay: 每个 PATCH 请求额外的延迟 (秒)，用于观察并行效果
+    """
+
+    def __init__(self, root, host="127.0.0.1", port=8090, fail_every=0, chunk_delay=0.0):
+        self.root = os.path.abspath(root)
+        self.fail_every = fail_every
+        self.chunk_delay = chunk_delay
+        self._lock = threading.Lock()
+        self._uploads = {} # upload_id -> {"length", "offset", "metadata", "partial", "path"}
+        self._staging = os.path.join(self.root, ".tus")
+        os.makedirs(self._staging, exist_ok=True)
+        self.patch_count = 0
+        self.bytes_received = 0
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self._httpd.serve_forever, name="fake-file-service", daemon=True).start()
+        log.info("模拟文件服务已启动: %s (根目录 %s)", self.base_url, self.root)
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    # --- tus ---
+    def _create(self, length, metadata, concat):
+        upload_id = uuid.uuid4().hex
+        path = os.path.join(self._staging, upload_id)
+        upload = {"length": length, "offset": 0, "metadata": metadata, "partial": concat == "partial", "path": path}
+        if concat and concat.startswith("final;"):
+            ids = [url.rstrip("/").rsplit("/", 1)[-1] for url in concat[len("final;"):].split()]
+            with self._lock:
+                parts = [self._uploads.get(part_id) for part_id in ids]
+            if any(part is None or not part["partial"] or part["offset"] != part["length"] for part in parts):
+                return None
+            with open(path, "wb") as out:
+                for part in parts:
+                    with open(part["path"], "rb") as f:
+                        shutil.copyfileobj(f, out)
+            upload["length"] = upload["offset"] = sum(part["length"] for part in parts)
+            with self._lock:
+                for part_id, part in zip(ids, parts):
+                    self._uploads.pop(part_id, None)
+                    os.remove(part["path"])
+        else:
+            open(path, "wb").close()
+        with self._lock:
+            self._uploads[upload_id] = upload
+        if not upload["partial"] and upload["offset"] == upload["length"]:
+            self._complete(upload_id)
+        return upload_id
+
+    def _complete(self, upload_id):
+        with self._lock:
+            upload = self._uploads[upload_id]
+        metadata = upload["metadata"]
+        relative = "/".join(part for part in (metadata.get("path", "") + "/" + metadata.get("filename", upload_id)).split("/")
+                            if part not in ("", ".", ".."))
+        target = os.path.join(self.root, *relative.split("/"))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(upload["path"], target)
+        upload["path"] = target
+        log.debug("上传完成: %s", relative)
+
+    # --- HTTP ---
+    def _make_handler(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _reply(self, status, headers=None, body=b""):
+                self.send_response(status)
+                for key, value in (headers or {}).items():
+                    self.send_header(key, str(value))
+                self.send_header("Tus-Resumable", TUS_VERSION)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if body and self.command != "HEAD":
+                    self.wfile.write(body)
+
+            def _upload_id(self):
+                path = urlparse(self.path).path
+                return path[len("/tus/"):].strip("/") if path.startswith("/tus/") else None
+
+            # --- 文件 ---
+            def do_GET(self):
+                self._serve_file()
+
+            def do_HEAD(self):
+                upload_id = self._upload_id()
+                if upload_id is None:
+                    self._serve_file()
+                    return
+                with service._lock:
+                    upload = service._uploads.get(upload_id)
+                if upload is None:
+                    self._reply(404)
+                else:
+                    self._reply(200, {"Upload-Offset": upload["offset"], "Upload-Length": upload["length"],
+                                      "Cache-Control": "no-store"})
+
+            def _serve_file(self):
+                path = unquote(urlparse(self.path).path)
+                if not path.startswith("/files/"):
+                    self._reply(404)
+                    return
+                relative = [part for part in path[len("/files/"):].split("/") if part not in ("", ".", "..")]
+                local = os.path.join(service.root, *relative)
+                if os.path.isdir(local):
+                    names = sorted(name for name in os.listdir(local) if not name.startswith("."))
+                    links = "".join(
+                        f'<li><a href="{quote(name)}{"/" if os.path.isdir(os.path.join(local, name)) else ""}">'
+                        f'{html.escape(name)}</a></li>' for name in names)
+                    body = f"<html><body><ul>{links}</ul></body></html>".encode("utf-8")
+                    self._reply(200, {"Content-Type": "text/html; charset=utf-8"}, body)
+                elif os.path.isfile(local):
+                    stat = os.stat(local)
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/octet-stream")
+                    self.send_header("Content-Length", str(stat.st_size))
+                    self.send_header("Last-Modified", formatdate(stat.st_mtime, usegmt=True))
+                    self.end_headers()
+                    if self.command != "HEAD":
+                        with open(local, "rb") as f:
+                            shutil.copyfileobj(f, self.wfile)
+                else:
+                    self._reply(404)
+
+            # --- tus ---
+            def do_OPTIONS(self):
+                self._reply(204, {"Tus-Version": TUS_VERSION, "Tus-Extension": TUS_EXTENSIONS})
+
+            def do_POST(self):
+                if self._upload_id() != "":
+                    self._reply(404)
+                    return
+                concat = self.headers.get("Upload-Concat")
+                length = self.headers.get("Upload-Length")
+                if length is None and not (concat or "").startswith("final;"):
+                    self._reply(400)
+                    return
+                upload_id = service._create(int(length or 0), parse_metadata(self.headers.get("Upload-Metadata")), concat)
+                if upload_id is None:
+                    self._reply(400)
+                    return
+                self._reply(201, {"Location": f"{service.base_url}/tus/{upload_id}"})
+
+            def do_PATCH(self):
+                upload_id = self._upload_id()
+                with service._lock:
+                    upload = service._uploads.get(upload_id)
+                    service.patch_count += 1
+                    fail = service.fail_every and service.patch_count % service.fail_every == 0
+                if upload is None:
+                    self._reply(404)
+                    return
+                offset = int(self.headers.get("Upload-Offset", -1))
+                length = int(self.headers.get("Content-Length", 0))
+                if offset != upload["offset"]:
+                    self._reply(409)
+                    return
+                if service.chunk_delay:
+                    time.sleep(service.chunk_delay)
+                to_read = length // 2 if fail else length
+                data = self.rfile.read(to_read)
+                with open(upload["path"], "r+b") as f:
+                    f.seek(offset)
+                    f.write(data)
+                with service._lock:
+                    upload["offset"] = offset + len(data)
+                    service.bytes_received += len(data)
+                if fail: # 只收下一半就断开，客户端需要用 HEAD 查询偏移后续传
+                    self.close_connection = True
+                    self.connection.shutdown(2)
+                    return
+                if not upload["partial"] and upload["offset"] == upload["length"]:
+                    service._complete(upload_id)
+                self._reply(204, {"Upload-Offset": upload["offset"]})
+
+            def log_message(self, format, *args):
+                log.debug("%s - %s", self.address_string(), format % args)
+
+        return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="本地模拟的实例文件服务 (目录列表 + tus 上传)")
+    parser.add_argument("--root", required=True)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--fail-every", type=int, default=0, help="每 N 个 PATCH 请求中断一次")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    FakeFileService(args.root, args.host, args.port, fail_every=args.fail_every).start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
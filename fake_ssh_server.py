@@ -0,0 +1,184 @@
+# fake_ssh_server.py
+"""
+本地模拟的实例 sshd (基于 paramiko 的服务端实现)，用于测试 ssh_manager.py：
+- 密码认证；
+- direct-tcpip 通道 (本地端口转发)，转发到本机的目标端口；
+- exec 请求在本机用 shell 执行命令。
+
+    python fake_ssh_server.py --port 2222 --password secret
+    server = FakeSSHServer(port=0, password="secret").start()
+"""
+import socket
+import select
+import logging
+import argparse
+import threading
+import subprocess
+import time
+import paramiko
+
+log = logging.getLogger(__name__)
+
+
+class _ServerInterface(paramiko.ServerInterface):
+    def __init__(self, server):
+        self.server = server
+        self.forwards = {} # 通道 ID -> (目标主机, 目标端口)
+        self.commands = {} # 通道 ID -> 命令
+
+    def check_auth_password(self, username, password):
+        if username == self.server.username and password == self.server.password:
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED if kind == "session" else paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_direct_tcpip_request(self, chanid, origin, destination):
+        # 先确认目标端口可连接，与 OpenSSH 一样在打开通道时就报告失败
+        try:
+            upstream = socket.create_connection(destination, timeout=5)
+        except OSError:
+            return paramiko.OPEN_FAILED_CONNECT_FAILED
+        self.forwards[chanid] = upstream
+        return paramiko.OPEN_SUCCEEDED
+
+    def check_channel_exec_request(self, channel, command):
+        self.commands[channel.get_id()] = command.decode("utf-8")
+        return True
+
+
+class FakeSSHServer:
+    """
+    :param drop_after: 每个连接在这么多秒后被服务端断开 (None 表示不断开)，用于测试自动重连
+    """
+
+    def __init__(self, host="127.0.0.1", port=2222, username="root", password="secret", drop_after=None):
+        self.username = username
+        self.password = password
+        self.drop_after = drop_after
+        self.host_key = paramiko.RSAKey.generate(2048)
+        self.connections = 0
+        self.channels = 0
+        self._transports = []
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind((host, port))
+        self._sock.listen(16)
+        self._closed = False
+
+    @property
+    def address(self):
+        return self._sock.getsockname()[:2]
+
+    def start(self):
+        threading.Thread(target=self._accept_loop, name="fake-sshd", daemon=True).start()
+        log.info("模拟 sshd 已启动: %s:%d", *self.address)
+        return self
+
+    def stop(self):
+        self._closed = True
+        self._sock.close()
+        self.drop_all()
+
+    def drop_all(self):
+        """断开所有连接 (模拟网络中断)"""
+        for transport in self._transports:
+            transport.close()
+        self._transports.clear()
+
+    def _accept_loop(self):
+        while not self._closed:
+            try:
+                client, _ = self._sock.accept()
+            except OSError:
+                break
+            self.connections += 1
+            threading.Thread(target=self._serve, args=(client,), daemon=True).start()
+
+    def _serve(self, client):
+        transport = paramiko.Transport(client)
+        transport.add_server_key(self.host_key)
+        interface = _ServerInterface(self)
+        try:
+            transport.start_server(server=interface)
+        except (paramiko.SSHException, EOFError, OSError):
+            return
+        self._transports.append(transport)
+        started = time.monotonic()
+        while transport.is_active():
+            channel = transport.accept(timeout=0.5)
+            if self.drop_after is not None and time.monotonic() - started > self.drop_after:
+                transport.close()
+                break
+            if channel is None:
+                continue
+            self.channels += 1
+            chanid = channel.get_id()
+            if chanid in interface.forwards:
+                threading.Thread(target=self._pump, args=(channel, interface.forwards.pop(chanid)),
+                                 daemon=True).start()
+            else:
+                threading.Thread(target=self._exec, args=(channel, interface), daemon=True).start()
+
+    @staticmethod
+    def _pump(channel, upstream):
+        try:
+            while True:
+                readable, _, _ = select.select([channel, upstream], [], [], 30)
+                if channel in readable:
+                    data = channel.recv(65536)
+                    if not data:
+                        break
+                    upstream.sendall(data)
+                if upstream in readable:
+                    data = upstream.recv(65536)
+                    if not data:
+                        break
+                    channel.sendall(data)
+        except (OSError, EOFError):
+            pass
+        finally:
+            channel.close()
+            upstream.close()
+
+    @staticmethod
+    def _exec(channel, interface):
+        # exec 请求在通道建立后才到达，稍等命令
+        for _ in range(50):
+            command = interface.commands.pop(channel.get_id(), None)
+            if command is not None:
+                break
+            time.sleep(0.02)
+        else:
+            channel.close()
+            return
+        result = subprocess.run(command, shell=True, capture_output=True, timeout=60)
+        channel.sendall(result.stdout)
+        channel.sendall_stderr(result.stderr)
+        channel.send_exit_status(result.returncode)
+        channel.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="本地模拟的实例 sshd (密码认证 + 端口转发)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2222)
+    parser.add_argument("--user", default="root")
+    parser.add_argument("--password", default="secret")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    FakeSSHServer(args.host, args.port, args.user, args.password).start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,17 @@
 # gpu_grabber.py
 import time
+import random
+import logging
 import threading
-import random # 用于模拟
+from concurrent.futures import ThreadPoolExecutor
 from PySide6.QtCore import QObject, Signal, QThread
 from api_handler import ApiHandler # <--- 添加导入
+from async_api import LANE_HIGH
+from api_guard import CircuitOpenError
 
-# ==============================================================================
-# 模拟部署函数 - 在实际应用中替换为真实的 API 调用
-# ==============================================================================
-def simulate_deploy_image(params):
-    """
-    模拟部署镜像到 GPU 的过程。
-    随机模拟成功或失败。
-    成功时返回 True 和模拟的实例 ID。
-    失败时返回 False 和 None。
-    """
-    print(f"[模拟部署] 尝试部署参数: {params}")
-    # 模拟网络延迟和处理时间
-    time.sleep(random.uniform(0.5, 2.0))
-
-    # 模拟 GPU 是否可用 (例如，25% 的概率成功抢到)
-    if random.random() < 0.25:
-        instance_id = f"gpu-instance-{random.randint(1000, 9999)}"
-        print(f"[模拟部署] 成功！获得实例: {instance_id}")
-        return True, instance_id
-    else:
-        print("[模拟部署] GPU 资源不足或冲突，暂时无法部署。")
-        return False, None
+log = logging.getLogger(__name__)
+
+# 本地测试部署/抢占逻辑请使用 mock_api_server.py (模拟的 Open API，可配置 GPU 容量和延迟)
 
 # ==============================================================================
 # 提示音播放函数 - 可根据需要替换实现
@@ -39,11 +24,11 @@ def play_success_sound():
         # from playsound import playsound
         # sound_file = 'path/to/your/success_sound.wav'
         # playsound(sound_file)
-        print("[提示音] 띠링! 部署成功!") # 暂时用打印和特殊字符模拟声音
+        log.info("[提示音] 띠링! 部署成功!") # 暂时用打印和特殊字符模拟声音
     except ImportError:
-        print("[提示音] 警告: 未安装 'playsound' 库，无法播放声音。")
+        log.warning("[提示音] 未安装 'playsound' 库，无法播放声音。")
     except Exception as e:
-        print(f"[提示音] 播放声音时出错: {e}")
+        log.warning("[提示音] 播放声音时出错: %s", e)
 
 # ==============================================================================
 # GPU 抢占 Worker 类 (运行在单独线程)
@@ -58,18 +43,28 @@ class GpuGrabWorker(QObject):
     error = Signal(str)   # 发生无法恢复的错误时发出
     status_update = Signal(str) # 状态更新时发出，用于界面显示
 
-    def __init__(self, api_handler: ApiHandler, deploy_params, interval=5, parent=None): # <--- 添加 api_handler 参数
+    def __init__(self, api_handler: ApiHandler, deploy_params, interval=5, parent=None, api_client=None,
+                 jitter=0.0, parallelism=1): # <--- 添加 api_handler 参数
         """
         初始化 Worker。
         :param api_handler: ApiHandler 的实例，用于执行 API 调用
         :param deploy_params: 部署所需的参数 (dict 或 object)
-        :param interval: 每次尝试之间的间隔时间 (秒)
+        :param interval: 每次尝试之间的间隔时间 (秒，可以是小数)
         :param parent: 父对象 (通常为 None)
+        :param api_client: 可选的 AsyncApiClient；提供时部署请求在其高优先级通道中执行
+        :param jitter: 间隔的随机抖动比例 (0.2 表示 ±20%)，避免与其他客户端同步撞车
+        :param parallelism: 每轮同时发出的部署请求数；大于 1 时可能多部署出实例 (见 extra_instances)
         """
         super().__init__(parent)
         self.api_handler = api_handler # <--- 保存 api_handler 实例
+        self.api_client = api_client
         self.deploy_params = deploy_params
-        self.interval = max(1, interval) # 确保间隔至少为 1 秒
+        self.interval = max(0.01, float(interval)) # 允许小数秒 (界面上的下限为 1 秒)
+        self.jitter = max(0.0, min(1.0, jitter))
+        self.parallelism = max(1, int(parallelism))
+        self.requests_sent = 0 # 已发出的部署请求数 (供基准测试统计)
+        self.extra_instances = [] # 并行请求中除第一个以外也部署成功的实例 ID
+        self._random = random.Random()
         self._is_running = False
         self._request_stop = False
 
@@ -92,30 +87,29 @@ class GpuGrabWorker(QObject):
             self.status_update.emit(f"⏳ 第 {attempt_count} 次尝试部署...")
 
             try:
-                # --- 调用实际的部署函数 ---
-                # 注意：现在调用真实的 API Handler
-                result = self.api_handler.deploy_instance(self.deploy_params)
+                # --- 调用实际的部署函数 (每轮 parallelism 个请求) ---
+                results = self._deploy_round()
                 # --------------------------
 
-                if result.get('success'): # <--- 检查 API 响应的 success 字段
+                succeeded = [r for r in results if r.get('success')] # <--- 检查 API 响应的 success 字段
+                if succeeded:
                     # 假设成功时，实例 ID 在响应的 data 字段中，需要根据实际 API 调整
-                    instance_info = result.get('data', {}) # 获取 data 字典，失败则为空字典
-                    instance_id = instance_info.get('id', '未知ID') # 尝试从 data 获取 id，获取不到则显示未知
+                    instance_ids = [(r.get('data') or {}).get('id', '未知ID') for r in succeeded]
+                    instance_id = instance_ids[0]
+                    self.extra_instances = instance_ids[1:]
+                    if self.extra_instances:
+                        log.warning("并行抢占多部署了 %d 个实例: %s", len(self.extra_instances), self.extra_instances)
+                        self.status_update.emit(f"⚠️ 额外部署了 {len(self.extra_instances)} 个实例，请在实例页面检查")
                     self.status_update.emit(f"✅ 部署请求成功！实例 ID: {instance_id}")
                     play_success_sound() # 播放成功提示音
                     self.success.emit(instance_id) # 发出成功信号，传递实例 ID
                     self._is_running = False # 任务成功，结束运行
                 else:
                     # 从 API 响应获取错误消息
-                    error_msg = result.get('msg', '部署失败，但未提供具体错误信息')
-                    self.status_update.emit(f"❌ {error_msg} (将在 {self.interval} 秒后重试...)")
-                    # 使用 QThread 的 sleep 是首选，因为它允许事件处理
-                    # 但如果在非 GUI 线程直接 time.sleep 也可以
-                    current_thread = QThread.currentThread()
-                    if current_thread:
-                        current_thread.sleep(self.interval)
-                    else: # Fallback if not in a QThread context (less ideal)
-                        time.sleep(self.interval)
+                    error_msg = results[0].get('msg', '部署失败，但未提供具体错误信息')
+                    delay = self._next_delay()
+                    self.status_update.emit(f"❌ {error_msg} (将在 {delay:.1f} 秒后重试...)")
+                    self._wait(delay)
 
             except Exception as e:
                 error_msg = f"💥 部署过程中发生严重错误: {e}"
@@ -126,7 +120,40 @@ class GpuGrabWorker(QObject):
         # 循环结束后发出 finished 信号
         self._is_running = False
         self.finished.emit()
-        print("[Worker] 任务执行完毕。")
+        log.debug("[Worker] 任务执行完毕。")
+
+    def _next_delay(self):
+        if not self.jitter:
+            return self.interval
+        return self.interval * (1 + self._random.uniform(-self.jitter, self.jitter))
+
+    def _wait(self, seconds):
+        """分段睡眠，取消请求可以在 0.1 秒内生效"""
+        deadline = time.monotonic() + seconds
+        while not self._request_stop:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            QThread.msleep(int(min(remaining, 0.1) * 1000))
+
+    def _deploy_round(self):
+        """发出一轮部署请求，返回结果列表"""
+        self.requests_sent += self.parallelism
+        if self.parallelism == 1:
+            return [self._deploy()]
+        with ThreadPoolExecutor(max_workers=self.parallelism, thread_name_prefix="grab") as executor:
+            return list(executor.map(lambda _: self._deploy(), range(self.parallelism)))
+
+    def _deploy(self):
+        """执行一次部署请求 (阻塞当前 worker 线程直到返回)"""
+        if self.api_client is None:
+            return self.api_handler.deploy_instance(self.deploy_params)
+        future = self.api_client.submit_in_lane(LANE_HIGH, self.api_handler.deploy_instance, self.deploy_params)
+        try:
+            return future.result()
+        except CircuitOpenError as e:
+            # 熔断中不终止抢占，按普通失败处理，等待下一次重试
+            return {"success": False, "msg": str(e)}
 
     def stop(self):
         """请求停止抢占循环。"""
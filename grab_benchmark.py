@@ -0,0 +1,220 @@
+# grab_benchmark.py
+"""
+GPU 抢占策略的模拟基准：用 mock_api_server.py 回放合成的 GPU 空闲轨迹，
+在不同的重试间隔、并行请求数和抖动下运行 GpuGrabWorker，
+统计抢到 GPU 的时间、部署请求数和浪费的调用 (失败的请求 + 并行多部署出的实例)。
+
+    python grab_benchmark.py --runs 5 --time-scale 0.1
+    python grab_benchmark.py --trace bursty --strategy 1:1:0 --strategy 0.5:2:0.3
+
+轨迹时间以“模拟秒”为单位，--time-scale 0.1 表示以 10 倍速运行；
+重试间隔按同样比例缩放，结果换算回模拟秒。接口延迟是真实时间，不缩放。
+"""
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+import threading
+from PySide6.QtCore import QCoreApplication, QEvent
+from mock_api_server import MockApiServer, MockApiClient, MockState
+from gpu_grabber import GpuGrabWorker
+
+log = logging.getLogger(__name__)
+
+GPU_MODEL = "NVIDIA GeForce RTX 4090"
+DATA_CENTER_ID = 1
+
+# 默认比较的策略: (重试间隔秒, 每轮并行请求数, 抖动比例)
+DEFAULT_STRATEGIES = [
+    (5.0, 1, 0.0), # 界面默认值
+    (2.0, 1, 0.0),
+    (1.0, 1, 0.0),
+    (1.0, 1, 0.3),
+    (2.0, 2, 0.3),
+    (1.0, 3, 0.3),
+]
+
+
+# ------------------------------------------------------------------------------
+# 合成的空闲轨迹: [(时间, 空闲 GPU 变化量), ...]
+# ------------------------------------------------------------------------------
+def random_trace(rng, duration, release_rate=1 / 20, mean_window=6.0):
+    """GPU 按泊松过程逐个释放，每个空闲指数分布的时间后被其他用户抢走"""
+    events, t = [], 0.0
+    while True:
+        t += rng.expovariate(release_rate)
+        if t >= duration:
+            break
+        events.append((t, +1))
+        events.append((t + rng.expovariate(1 / mean_window), -1))
+    return sorted(events)
+
+
+def bursty_trace(rng, duration, burst_rate=1 / 45, burst_size=(2, 4), mean_window=2.5):
+    """成批释放 (例如一台机器下线后重新上架)，竞争更激烈，空闲窗口更短"""
+    events, t = [], 0.0
+    while True:
+        t += rng.expovariate(burst_rate)
+        if t >= duration:
+            break
+        for _ in range(rng.randint(*burst_size)):
+            start = t + rng.uniform(0, 1.0)
+            events.append((start, +1))
+            events.append((start + rng.expovariate(1 / mean_window), -1))
+    return sorted(events)
+
+
+TRACES = {"random": random_trace, "bursty": bursty_trace}
+
+
+def replay_trace(state, events, time_scale, stop_event):
+    """在后台线程中按时间把轨迹应用到模拟服务器的容量上"""
+    start = time.monotonic()
+    for at, delta in events:
+        if stop_event.wait(max(0.0, start + at * time_scale - time.monotonic())):
+            return
+        state.add_capacity(GPU_MODEL, DATA_CENTER_ID, delta)
+
+
+# ------------------------------------------------------------------------------
+# 单次运行
+# ------------------------------------------------------------------------------
+def run_once(strategy, events, duration, time_scale, latency, rate_limit, seed):
+    interval, parallelism, jitter = strategy
+    state = MockState(capacity={(GPU_MODEL, DATA_CENTER_ID): 0}, balance=1000.0)
+    server = MockApiServer(port=0, state=state, latency=latency, rate_limit=rate_limit).start()
+    client = MockApiClient(server.base_url)
+    worker = GpuGrabWorker(client, {"gpu_model": GPU_MODEL, "gpu_count": 1, "data_center_id": DATA_CENTER_ID},
+                           interval=interval * time_scale, jitter=jitter, parallelism=parallelism)
+    worker._random.seed(seed)
+    acquired = []
+    worker.success.connect(lambda instance_id: acquired.append(instance_id))
+
+    stop_event = threading.Event()
+    driver = threading.Thread(target=replay_trace, args=(state, events, time_scale, stop_event),
+                              name="trace", daemon=True)
+    deadline = threading.Timer(duration * time_scale, worker.stop)
+    started = time.monotonic()
+    driver.start()
+    deadline.start()
+    try:
+        worker.run() # 直接在当前线程中运行抢占循环，直到成功或超时
+        elapsed = (time.monotonic() - started) / time_scale
+    finally:
+        deadline.cancel()
+        stop_event.set()
+        driver.join()
+        server.stop()
+        # 运行结束后立即释放 Worker (QObject)，不要留到解释器退出时由垃圾回收处理
+        worker.success.disconnect()
+        worker.deleteLater()
+        QCoreApplication.sendPostedEvents(None, QEvent.Type.DeferredDelete)
+
+    requests_sent = server.request_counts.get("deploy_instance", 0)
+    extra = max(0, state.deploy_successes - 1)
+    return {
+        "acquired": bool(acquired),
+        "time": elapsed if acquired else None,
+        "requests": requests_sent,
+        "wasted": requests_sent - state.deploy_successes + extra,
+        "extra": extra,
+    }
+
+
+# ------------------------------------------------------------------------------
+# 汇总和输出
+# ------------------------------------------------------------------------------
+def _median(values):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    mid = len(ordered) // 2
+    return ordered[mid] if len(ordered) % 2 else (ordered[mid - 1] + ordered[mid]) / 2
+
+
+def summarize(strategy, results):
+    times = [r["time"] for r in results if r["acquired"]]
+    count = len(results)
+    return {
+        "strategy": "间隔 {:g}s ×{} 抖动 {:.0%}".format(*strategy),
+        "success": f"{len(times)}/{count}",
+        "median_time": _median(times),
+        "max_time": max(times) if times else None,
+        "requests": sum(r["requests"] for r in results) / count,
+        "wasted": sum(r["wasted"] for r in results) / count,
+        "extra": sum(r["extra"] for r in results) / count,
+    }
+
+
+def format_table(rows):
+    headers = ["策略", "成功", "中位耗时(s)", "最长耗时(s)", "请求数", "浪费调用", "多部署实例"]
+    keys = ["strategy", "success", "median_time", "max_time", "requests", "wasted", "extra"]
+
+    def cell(value):
+        if value is None:
+            return "-"
+        return f"{value:.1f}" if isinstance(value, float) else str(value)
+
+    table = [headers] + [[cell(row[k]) for k in keys] for row in rows]
+    # 中文字符在终端中占两列
+    width = lambda text: sum(2 if ord(ch) > 0x2E80 else 1 for ch in text)
+    widths = [max(width(line[i]) for line in table) for i in range(len(headers))]
+    lines = []
+    for n, line in enumerate(table):
+        lines.append("  ".join(text + " " * (widths[i] - width(text)) for i, text in enumerate(line)).rstrip())
+        if n == 0:
+            lines.append("  ".join("-" * w for w in widths))
+    return "\n".join(lines)
+
+
+def parse_strategy(spec):
+    """"间隔:并行数:抖动"，例如 1:2:0.3"""
+    parts = (spec.split(":") + ["1", "0"])[:3]
+    return float(parts[0]), int(parts[1]), float(parts[2])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="GPU 抢占策略模拟基准")
+    parser.add_argument("--trace", choices=sorted(TRACES) + ["all"], default="all")
+    parser.add_argument("--strategy", action="append", type=parse_strategy, metavar="INTERVAL:PARALLEL:JITTER",
+                        help="要比较的策略 (可重复)，默认比较一组常用组合")
+    parser.add_argument("--runs", type=int, default=3, help="每个策略在每种轨迹上运行的次数 (每次使用不同种子)")
+    parser.add_argument("--duration", type=float, default=300.0, help="单次运行的模拟时长上限 (模拟秒)")
+    parser.add_argument("--time-scale", type=float, default=0.1, help="真实秒 / 模拟秒")
+    parser.add_argument("--latency", default="uniform:0.005,0.02", help="接口延迟分布 (真实秒，见 mock_api_server)")
+    parser.add_argument("--rate-limit", type=float, default=None, help="模拟服务器每秒请求上限 (超出返回 429)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(name)s: %(message)s")
+    app = QCoreApplication.instance() or QCoreApplication(sys.argv) # Worker 的信号需要 Qt 应用对象
+    strategies = args.strategy or DEFAULT_STRATEGIES
+    trace_names = sorted(TRACES) if args.trace == "all" else [args.trace]
+
+    for trace_name in trace_names:
+        # 同一种子下所有策略使用相同的轨迹，结果可以直接比较
+        traces = [TRACES[trace_name](random.Random(args.seed + run), args.duration) for run in range(args.runs)]
+        rows = []
+        for strategy in strategies:
+            results = [run_once(strategy, events, args.duration, args.time_scale, args.latency,
+                                args.rate_limit, seed=args.seed + run)
+                       for run, events in enumerate(traces)]
+            rows.append(summarize(strategy, results))
+        print(f"\n轨迹: {trace_name}  (每个策略 {args.runs} 次，时长上限 {args.duration:g} 模拟秒)")
+        print(format_table(rows))
+
+    app.quit()
+    app.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    code = main()
+    # 部分 PySide6 版本的 Signal.emit 每次调用都少计一次 True 的引用，发出大量状态信号后
+    # 解释器在退出清理时会因 bool_dealloc 崩溃；资源已在上面显式释放，这里跳过解释器清理直接退出
+    logging.shutdown()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os._exit(code)
@@ -0,0 +1,126 @@
+# image_cache.py
+import os
+import json
+import time
+import hashlib
+import inspect
+import logging
+import threading
+from PySide6.QtCore import QStandardPaths
+
+log = logging.getLogger(__name__)
+
+CACHE_FILE_NAME = "image_catalog.json"
+
+
+def payload_hash(data):
+    """对 API 返回的 data 做规范化 JSON 序列化后计算 sha256"""
+    canonical = json.dumps(data, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def token_fingerprint(token):
+    """缓存按令牌区分，避免切换账号后显示别人的镜像 (只保存指纹，不保存令牌)"""
+    return hashlib.sha256((token or "").encode("utf-8")).hexdigest()[:16]
+
+
+class ImageCatalogCache:
+    """
+    私有镜像列表的磁盘缓存。
+    启动时可直接用缓存绘制页面；后台重新获取后比较内容哈希，
+    只有内容变化时才写盘并通知界面更新。
+    """
+
+    def __init__(self, cache_dir=None):
+        if cache_dir is None:
+            cache_dir = QStandardPaths.writableLocation(QStandardPaths.StandardLocation.AppDataLocation)
+        self.path = os.path.join(cache_dir, CACHE_FILE_NAME)
+        self._lock = threading.Lock()
+        self._entry = self._read()
+
+    def _read(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            if isinstance(entry, dict) and isinstance(entry.get("data"), dict):
+                return entry
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            log.warning("镜像缓存文件无法读取，将忽略: %s", e)
+        return None
+
+    def _write(self, entry):
+        """先写临时文件再替换，避免写到一半时程序退出留下损坏的缓存"""
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            log.warning("写入镜像缓存失败: %s", e)
+
+    def load(self, token):
+        """返回与令牌匹配的缓存结果 (与 get_images 的返回格式相同)，没有则返回 None"""
+        with self._lock:
+            entry = self._entry
+        if not entry or entry.get("owner") != token_fingerprint(token):
+            return None
+        return {"success": True, "data": entry["data"], "from_cache": True, "fetched_at": entry.get("fetched_at")}
+
+    def store(self, token, data, etag=None):
+        """保存新的列表；内容哈希未变化时不写盘，返回是否发生变化"""
+        digest = payload_hash(data)
+        owner = token_fingerprint(token)
+        with self._lock:
+            old = self._entry
+            if old and old.get("owner") == owner and old.get("hash") == digest:
+                old["fetched_at"] = time.time()
+                if etag:
+                    old["etag"] = etag
+                return False
+            self._entry = {"owner": owner, "hash": digest, "etag": etag, "fetched_at": time.time(), "data": data}
+            entry = self._entry
+        self._write(entry)
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._entry = None
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def revalidate(self, fetch, token):
+        """
+        在后台线程中调用：获取最新列表并与缓存比较。
+        :param fetch: 获取镜像列表的函数 (例如 api_handler.get_images)
+        :return: 内容未变化时返回 {"success": True, "not_modified": True}，否则返回 fetch 的原始结果
+        """
+        kwargs = {}
+        with self._lock:
+            entry = self._entry
+        etag = entry.get("etag") if entry and entry.get("owner") == token_fingerprint(token) else None
+        # 只有 API 封装支持条件请求时才发送 If-None-Match
+        if etag and _accepts_kwarg(fetch, "if_none_match"):
+            kwargs["if_none_match"] = etag
+
+        result = fetch(**kwargs)
+        if result and result.get("not_modified"): # 服务器返回 304
+            return {"success": True, "not_modified": True}
+        if not (result and result.get("success")):
+            return result
+        changed = self.store(token, result.get("data", {}), etag=result.get("etag"))
+        if not changed:
+            return {"success": True, "not_modified": True}
+        return result
+
+
+def _accepts_kwarg(func, name):
+    try:
+        params = inspect.signature(func).parameters
+    except (TypeError, ValueError):
+        return False
+    return name in params
@@ -0,0 +1,92 @@
+# image_registry.py
+
+# 开发者预设的公共/社区镜像 (硬编码)
+# !!! 请在这里添加开发者预设的公共/社区镜像 ID !!!
+DEVELOPER_IMAGES = [
+    {"id": "7b36c1a3-da41-4676-b5b3-03ec25d6e197", "description": "软件作者(推荐): h开发者的镜像 更新于 2025-03-31_160.86GB 镜像描述: free；永久免费，持续开发"},
+    # {"id": "another-preset-id", "description": "另一个预设镜像描述"},
+]
+DEVELOPER_IMAGE_IDS = frozenset(img["id"] for img in DEVELOPER_IMAGES)
+
+
+def normalize_image_record(entry):
+    """把旧的字符串条目或字典条目统一为 {'id': ..., 'name': ...}；无效条目返回 None"""
+    if isinstance(entry, str):
+        image_id, name = entry.strip(), ""
+    elif isinstance(entry, dict):
+        image_id = str(entry.get("id") or "").strip()
+        name = str(entry.get("name") or "").strip()
+    else:
+        return None
+    if not image_id:
+        return None
+    record = {"id": image_id}
+    if name:
+        record["name"] = name
+    return record
+
+
+class CustomImageRegistry:
+    """
+    用户收藏的公共/社区镜像。
+    按 ID 建索引 (dict 保持插入顺序)，查重和删除都是 O(1)；
+    每条记录预先计算小写搜索键，用于输入即搜的过滤。
+    """
+
+    def __init__(self, entries=None):
+        self._records = {}
+        self._search_keys = {}
+        for entry in entries or []:
+            record = normalize_image_record(entry)
+            if record and record["id"] not in self._records:
+                self._insert(record)
+
+    def _insert(self, record):
+        self._records[record["id"]] = record
+        self._search_keys[record["id"]] = f"{record['id']} {record.get('name', '')}".lower()
+
+    def __len__(self):
+        return len(self._records)
+
+    def __iter__(self):
+        return iter(self._records.values())
+
+    def __contains__(self, image_id):
+        return image_id in self._records
+
+    def get(self, image_id):
+        return self._records.get(image_id)
+
+    def is_known(self, image_id):
+        """ID 是否已在开发者预设或用户收藏中"""
+        return image_id in DEVELOPER_IMAGE_IDS or image_id in self._records
+
+    def add(self, image_id, name=""):
+        """添加一条记录并返回它；ID 为空或已存在时返回 None"""
+        record = normalize_image_record({"id": image_id, "name": name})
+        if record is None or self.is_known(record["id"]):
+            return None
+        self._insert(record)
+        return record
+
+    def remove(self, image_id):
+        """删除记录并返回它；不存在时返回 None"""
+        self._search_keys.pop(image_id, None)
+        return self._records.pop(image_id, None)
+
+    def matches(self, image_id, text):
+        """判断记录是否匹配过滤文本 (多个关键词之间为“与”关系)"""
+        key = self._search_keys.get(image_id)
+        if key is None:
+            return False
+        return all(term in key for term in text.lower().split())
+
+    def search(self, text):
+        """返回匹配过滤文本的记录列表；空文本返回全部"""
+        if not text.strip():
+            return list(self._records.values())
+        return [record for image_id, record in self._records.items() if self.matches(image_id, text)]
+
+    def to_list(self):
+        """导出为可写入配置的字典列表"""
+        return [dict(record) for record in self._records.values()]
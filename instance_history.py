@@ -0,0 +1,334 @@
+# instance_history.py
+"""
+实例状态和费用的本地历史 (SQLite，AppDataLocation/instance_history.sqlite3)。
+每次获取实例列表后记录各实例的状态、GPU、每小时价格和时间，按游程压缩存储：
+状态、GPU 和价格都没有变化时只延长上一段的结束时间，变化时才新增一段。
+写入在后台线程中批量执行，超过保留期的记录定期清理。
+
+历史用于：
+- 统计每个实例的运行时长、花费和状态变化 (不需要额外的 API 请求)；
+- 估计过渡状态 (部署中、开机中、关机中等) 通常持续多久，实例列表据此安排下一次刷新。
+"""
+import os
+import time
+import sqlite3
+import logging
+import statistics
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from PySide6.QtCore import QObject, Signal, QTimer, QStandardPaths
+
+log = logging.getLogger(__name__)
+
+DB_NAME = "instance_history.sqlite3"
+FLUSH_INTERVAL = 30.0 # 批量写入的间隔 (秒)
+MAX_BATCH = 500 # 积累的样本超过这个数量时立即写入
+MAX_GAP = 30 * 60 # 相邻两次记录间隔超过这个时间 (例如程序未运行) 视为不连续，间隔内的时间不计入统计
+RETENTION_DAYS = 90
+COMPACT_INTERVAL = 24 * 3600
+# 计费的状态
+BILLED_STATUSES = ("running", "运行中", "工作中")
+# 过渡状态：通常在一段时间后自动变为其他状态
+TRANSITIONAL_STATUSES = ("deploying", "booting", "starting", "rebooting", "shutting_down", "stopping",
+                         "部署中", "创建中", "开机中", "启动中", "重启中", "关机中")
+MIN_ESTIMATE_SAMPLES = 3 # 同一 GPU 型号的样本少于这个数量时使用该状态的整体估计
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS segments (
+    instance_id TEXT NOT NULL,
+    name TEXT,
+    status TEXT NOT NULL,
+    gpu_model TEXT,
+    gpu_used INTEGER,
+    price_per_hour REAL,
+    start_ts REAL NOT NULL,
+    end_ts REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS segments_instance ON segments (instance_id, start_ts);
+CREATE INDEX IF NOT EXISTS segments_end ON segments (end_ts);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+# 一个实例的统计 (时间均为 time.time() 秒数)：
+# uptime 为本次连续运行的时长 (未运行时为 0)；running_seconds 和 spend 为保留期内的累计值；
+# transitions 为 [(时间, 原状态, 新状态)]，按时间排列
+InstanceSummary = namedtuple("InstanceSummary", [
+    "instance_id", "name", "status", "gpu_model", "first_seen", "last_seen",
+    "uptime", "running_seconds", "spend", "transitions",
+])
+
+
+def default_db_path():
+    return os.path.join(QStandardPaths.writableLocation(QStandardPaths.StandardLocation.AppDataLocation), DB_NAME)
+
+
+def format_duration(seconds):
+    """秒数 -> 例如 "2 小时 5 分"、"3 分 20 秒"、"45 秒" """
+    seconds = int(max(0, seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours} 小时 {minutes} 分"
+    if minutes:
+        return f"{minutes} 分 {seconds} 秒"
+    return f"{seconds} 秒"
+
+
+def _sample_key(instance):
+    """决定是否需要新增一段的字段：状态, GPU 型号, GPU 数量, 每小时价格"""
+    try:
+        price = float(instance.get("price_per_hour"))
+    except (TypeError, ValueError):
+        price = None
+    try:
+        gpu_used = int(instance.get("gpu_used"))
+    except (TypeError, ValueError):
+        gpu_used = None
+    return ((instance.get("status") or "").lower(), instance.get("gpu_model"), gpu_used, price)
+
+
+def _walk(rows):
+    """
+    按实例和开始时间排列的段 -> 逐段产出 (段, 有效结束时间, 下一段或 None)。
+    状态一直保持到观察到变化为止，所以与下一段连续时有效结束时间为下一段的开始时间。
+    """
+    for index, row in enumerate(rows):
+        following = rows[index + 1] if index + 1 < len(rows) and rows[index + 1][0] == row[0] else None
+        end = row[7]
+        if following is not None and following[6] - row[7] <= MAX_GAP:
+            end = following[6]
+        yield row, end, following
+
+
+def summarize(rows, now):
+    """由 segments 表的行 (按实例和开始时间排列) 计算每个实例的 InstanceSummary"""
+    summaries = {}
+    run_start = {}
+    for row, end, following in _walk(rows):
+        instance_id, name, status, gpu_model, gpu_used, price, start, _ = row
+        summary = summaries.get(instance_id)
+        if summary is None:
+            summary = summaries[instance_id] = InstanceSummary(instance_id, name, status, gpu_model, start, end,
+                                                               0.0, 0.0, 0.0, [])
+        billed = status in BILLED_STATUSES
+        duration = max(0.0, end - start)
+        if billed:
+            run_start.setdefault(instance_id, start)
+        else:
+            run_start.pop(instance_id, None)
+        summary = summary._replace(
+            name=name or summary.name, status=status, gpu_model=gpu_model, last_seen=end,
+            running_seconds=summary.running_seconds + (duration if billed else 0.0),
+            spend=summary.spend + (duration / 3600 * price if billed and price else 0.0))
+        if following is not None:
+            if following[6] - row[7] > MAX_GAP:
+                run_start.pop(instance_id, None) # 中间没有记录，无法确认一直在运行
+            if following[2] != status:
+                summary.transitions.append((following[6], status, following[2]))
+        summaries[instance_id] = summary
+    result = []
+    for instance_id, summary in summaries.items():
+        if instance_id in run_start and now - summary.last_seen <= MAX_GAP:
+            summary = summary._replace(uptime=summary.last_seen - run_start[instance_id])
+        result.append(summary)
+    return result
+
+
+def estimate_durations(rows):
+    """过渡状态的持续时间中位数: {(状态, GPU 型号): 秒, (状态, None): 秒}"""
+    samples = {}
+    for row, end, following in _walk(rows):
+        status = row[2]
+        # 只统计观察到结束的过渡状态 (下一段连续且状态不同)
+        if status not in TRANSITIONAL_STATUSES or following is None or end != following[6] or following[2] == status:
+            continue
+        duration = following[6] - row[6]
+        samples.setdefault((status, row[3]), []).append(duration)
+        samples.setdefault((status, None), []).append(duration)
+    return {key: statistics.median(values) for key, values in samples.items()
+            if key[1] is None or len(values) >= MIN_ESTIMATE_SAMPLES}
+
+
+class _HistoryDatabase:
+    """只在后台线程中使用的 SQLite 连接"""
+
+    def __init__(self, path, retention_days):
+        self.path = path
+        self.retention = retention_days * 24 * 3600
+        self.conn = None
+        self.open_segments = {} # 实例 ID -> (rowid, 字段, 结束时间)
+
+    def connect(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._load_open_segments()
+
+    def _load_open_segments(self):
+        rows = self.conn.execute(
+            "SELECT rowid, instance_id, status, gpu_model, gpu_used, price_per_hour, end_ts FROM segments s "
+            "WHERE start_ts = (SELECT MAX(start_ts) FROM segments WHERE instance_id = s.instance_id)")
+        self.open_segments = {row[1]: (row[0], tuple(row[2:6]), row[6]) for row in rows}
+
+    def write(self, batch):
+        """写入一批样本 [(实例 ID, 名称, 字段, 时间)]；返回是否新增了段"""
+        if self.conn is None:
+            self.connect()
+        extended = {} # rowid -> (结束时间, 名称)
+        inserted = False
+        with self.conn: # 一个事务
+            for instance_id, name, key, ts in batch:
+                current = self.open_segments.get(instance_id)
+                if current is not None and current[1] == key and 0 <= ts - current[2] <= MAX_GAP:
+                    extended[current[0]] = (ts, name)
+                    self.open_segments[instance_id] = (current[0], key, ts)
+                    continue
+                cursor = self.conn.execute(
+                    "INSERT INTO segments (instance_id, name, status, gpu_model, gpu_used, price_per_hour, start_ts, end_ts) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", (instance_id, name, *key, ts, ts))
+                self.open_segments[instance_id] = (cursor.lastrowid, key, ts)
+                inserted = True
+            self.conn.executemany("UPDATE segments SET end_ts = ?, name = ? WHERE rowid = ?",
+                                  [(end, name, rowid) for rowid, (end, name) in extended.items()])
+        return inserted
+
+    def rows(self):
+        if self.conn is None:
+            self.connect()
+        return self.conn.execute(
+            "SELECT instance_id, name, status, gpu_model, gpu_used, price_per_hour, start_ts, end_ts "
+            "FROM segments ORDER BY instance_id, start_ts").fetchall()
+
+    def compact(self, now, force=False):
+        """删除超过保留期的段 (每天最多一次)；返回删除的行数"""
+        if self.conn is None:
+            self.connect()
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'last_compact'").fetchone()
+        if not force and row is not None and now - float(row[0]) < COMPACT_INTERVAL:
+            return 0
+        with self.conn:
+            deleted = self.conn.execute("DELETE FROM segments WHERE end_ts < ?", (now - self.retention,)).rowcount
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('last_compact', ?)", (str(now),))
+        if deleted:
+            self.conn.execute("VACUUM")
+            self._load_open_segments()
+            log.info("实例历史：清理了 %d 条超过 %d 天的记录", deleted, self.retention // 86400)
+        return deleted
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class InstanceHistory(QObject):
+    """
+    在主线程中创建和使用。record() 只把样本放入内存，每隔 flush_interval 秒 (或样本较多时) 由后台线程批量写入；
+    统计结果通过 summaries_ready 信号返回，过渡状态的估计在内存中，可随时同步查询。
+    """
+    summaries_ready = Signal(object) # [InstanceSummary]
+    estimates_changed = Signal()
+
+    _estimated = Signal(object) # {(状态, GPU 型号): 秒} (从后台线程发出)
+    _summarized = Signal(object)
+
+    def __init__(self, path=None, flush_interval=FLUSH_INTERVAL, retention_days=RETENTION_DAYS, parent=None):
+        super().__init__(parent)
+        self.db = _HistoryDatabase(path or default_db_path(), retention_days)
+        self.estimates = {}
+        self._pending = [] # 未写入的样本
+        self._state_since = {} # 实例 ID -> (状态, 本程序首次看到该状态的时间)
+        self._closed = False
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="instance-history")
+        self._estimated.connect(self._on_estimated)
+        self._summarized.connect(self.summaries_ready)
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setInterval(int(flush_interval * 1000))
+        self.flush_timer.timeout.connect(self.flush)
+        self.flush_timer.start()
+        # 启动时清理过期记录并计算估计
+        self._executor.submit(self._startup)
+
+    def record(self, instances, ts=None):
+        """记录一次实例列表快照"""
+        ts = time.time() if ts is None else ts
+        for instance in instances:
+            instance_id = instance.get("id")
+            if not instance_id:
+                continue
+            key = _sample_key(instance)
+            self._pending.append((instance_id, instance.get("name"), key, ts))
+            since = self._state_since.get(instance_id)
+            if since is None or since[0] != key[0]:
+                self._state_since[instance_id] = (key[0], ts)
+        if len(self._pending) >= MAX_BATCH:
+            self.flush()
+
+    def flush(self):
+        if not self._pending or self._closed:
+            return
+        batch, self._pending = self._pending, []
+        self._executor.submit(self._write, batch)
+
+    def request_summaries(self):
+        """异步计算统计 (先写入未保存的样本)，完成后发出 summaries_ready"""
+        self.flush()
+        if not self._closed:
+            self._executor.submit(self._summarize)
+
+    def expected_remaining(self, instance_id, status, gpu_model=None, now=None):
+        """
+        实例处于过渡状态时，按历史估计还需多少秒结束 (可能为 0 或负数，表示已超过通常的时长)；
+        不是过渡状态或没有历史时返回 None。
+        """
+        status = (status or "").lower()
+        if status not in TRANSITIONAL_STATUSES:
+            return None
+        typical = self.estimates.get((status, gpu_model), self.estimates.get((status, None)))
+        if typical is None:
+            return None
+        since = self._state_since.get(instance_id)
+        elapsed = (now or time.time()) - since[1] if since is not None and since[0] == status else 0.0
+        return typical - elapsed
+
+    # --- 以下在后台线程中执行 ---
+    def _startup(self):
+        try:
+            self.db.connect()
+            self.db.compact(time.time())
+            self._estimated.emit(estimate_durations(self.db.rows()))
+        except sqlite3.Error as e:
+            log.warning("无法打开实例历史数据库 %s: %s", self.db.path, e)
+
+    def _write(self, batch):
+        try:
+            inserted = self.db.write(batch)
+            self.db.compact(time.time())
+            if inserted: # 出现新的状态段时重新估计
+                self._estimated.emit(estimate_durations(self.db.rows()))
+        except sqlite3.Error as e:
+            log.warning("写入实例历史失败 (%d 条样本被丢弃): %s", len(batch), e)
+
+    def _summarize(self):
+        try:
+            self._summarized.emit(summarize(self.db.rows(), time.time()))
+        except sqlite3.Error as e:
+            log.warning("读取实例历史失败: %s", e)
+            self._summarized.emit([])
+
+    def _on_estimated(self, estimates):
+        if estimates != self.estimates:
+            self.estimates = estimates
+            self.estimates_changed.emit()
+
+    def shutdown(self):
+        """退出前写入剩余样本并关闭数据库"""
+        if self._closed:
+            return
+        self.flush_timer.stop()
+        self.flush()
+        self._closed = True
+        self._executor.submit(self.db.close)
+        self._executor.shutdown(wait=True)
@@ -1,13 +1,14 @@
 import sys
-import traceback
+import logging
 import requests
-import pprint
 from PySide6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QLabel,
                              QPushButton, QLineEdit, QComboBox, QDialog, 
                              QMessageBox, QApplication)
 from PySide6.QtCore import Qt, Slot
 from PySide6.QtGui import QIcon
 
+log = logging.getLogger(__name__)
+
 class ApiHandler:
     def __init__(self, api_token):
         self.base_url = "https://api.xiangongyun.com/open/instance"
@@ -15,11 +16,11 @@ class ApiHandler:
             "Authorization": f"Bearer {api_token}",
             "Content-Type": "application/json"
         }
-        print("API处理器初始化完成")
+        log.debug("API处理器初始化完成")
 
     def boot_instance(self, params):
         """修正后的开机API调用方法"""
-        print("\n=== 正在准备开机请求 ===")
+        log.debug("=== 正在准备开机请求 ===")
         instance_id = params.get("id")
         if not instance_id:
             return {"success": False, "msg": "实例ID缺失"}
@@ -39,11 +40,10 @@ class ApiHandler:
         if not api_payload.get("gpu_count"):
             return {"success": False, "msg": "GPU数量未提供"}
 
-        print("✅ 最终请求参数 (将发送给API):")
-        pprint.pprint(api_payload)
+        log.debug("最终请求参数 (将发送给API): %s", api_payload)
 
         try:
-            print("\n正在发送请求到API服务器...")
+            log.debug("正在发送请求到API服务器...")
             response = requests.post(
                 f"{self.base_url}/boot",
                 json=api_payload, # 发送构造好的 payload
@@ -51,14 +51,12 @@ class ApiHandler:
                 timeout=15 # 建议设置超时
             )
 
-            print("\n🔍 服务器响应:")
-            print(f"状态码: {response.status_code}")
+            log.debug("服务器响应 状态码: %s", response.status_code)
             try:
                 response_data = response.json()
-                print("响应内容 (JSON):")
-                pprint.pprint(response_data)
+                log.debug("响应内容 (JSON): %s", response_data)
             except requests.exceptions.JSONDecodeError:
-                print(f"响应内容 (非JSON): {response.text}")
+                log.debug("响应内容 (非JSON): %s", response.text)
                 return {
                     "success": False,
                     "msg": f"API响应格式错误 (状态码: {response.status_code})",
@@ -83,7 +81,7 @@ class ApiHandler:
                 }
 
         except requests.exceptions.Timeout:
-             print("❌ 请求超时")
+             log.warning("开机请求超时")
              return {"success": False, "msg": "API请求超时"}
         except requests.exceptions.RequestException as e:
             error_info = {
@@ -91,8 +89,7 @@ class ApiHandler:
                 "msg": f"API请求异常: {str(e)}",
                 "exception_type": type(e).__name__
             }
-            print(f"❌ 发生网络或请求错误: {error_info}")
-            traceback.print_exc()
+            log.warning("发生网络或请求错误: %s", error_info, exc_info=True)
             return error_info
         except Exception as e: # 捕获其他可能的异常
             error_info = {
@@ -100,8 +97,7 @@ class ApiHandler:
                 "msg": f"处理开机请求时发生未知错误: {str(e)}",
                 "exception_type": type(e).__name__
             }
-            print(f"❌ 发生未知异常: {error_info}")
-            traceback.print_exc()
+            log.error("发生未知异常: %s", error_info, exc_info=True)
             return error_info
 
     def shutdown_instance(self, instance_id):
@@ -163,7 +159,7 @@ class InstanceBootDialog(QDialog):
                 self.gpu_combo.setCurrentIndex(index)
             else:
                 # 如果传入的 current_gpu_model 不在选项中，默认选第一个
-                print(f"警告: 当前GPU型号 '{current_gpu_model}' 不在可选列表中，将默认选中第一个。")
+                log.warning("当前GPU型号 '%s' 不在可选列表中，将默认选中第一个。", current_gpu_model)
                 self.gpu_combo.setCurrentIndex(0) # 或者不设置，让用户必须选
 
         gpu_layout.addWidget(gpu_label)
@@ -257,7 +253,7 @@ class InstanceWidget(QWidget):
         self.boot_btn.setEnabled(is_stopped)
         self.shutdown_btn.setEnabled(is_running)
         
-        print(f"按钮状态更新 - 开机: {'可用' if is_stopped else '禁用'}, 关机: {'可用' if is_running else '禁用'}")
+        log.debug("按钮状态更新 - 开机: %s, 关机: %s", '可用' if is_stopped else '禁用', '可用' if is_running else '禁用')
 
     def update_data(self, new_data):
         self.instance_data = new_data
@@ -268,7 +264,7 @@ class InstanceWidget(QWidget):
 
     @Slot()
     def on_boot_clicked(self):
-        print("\n=== 处理开机请求 ===")
+        log.debug("=== 处理开机请求 ===")
         dialog = InstanceBootDialog(
             self,
             self.instance_data.get('id'),
@@ -278,12 +274,10 @@ class InstanceWidget(QWidget):
         
         if dialog.exec_() == QDialog.Accepted:
             params = dialog.get_selected_params()
-            print("\n用户确认的开机参数:")
-            pprint.pprint(params)
+            log.debug("用户确认的开机参数: %s", params)
             
             result = self.api_handler.boot_instance(params)
-            print("\nAPI调用结果:")
-            pprint.pprint(result)
+            log.debug("API调用结果: %s", result)
             
             if result.get('success'):
                 QMessageBox.information(
@@ -306,7 +300,7 @@ class InstanceWidget(QWidget):
 
     @Slot()
     def on_shutdown_clicked(self):
-        print("\n=== 处理关机请求 ===")
+        log.debug("=== 处理关机请求 ===")
         reply = QMessageBox.question(
             self,
             "确认关机",
@@ -316,8 +310,7 @@ class InstanceWidget(QWidget):
         
         if reply == QMessageBox.Yes:
             result = self.api_handler.shutdown_instance(self.instance_data['id'])
-            print("\n关机API响应:")
-            pprint.pprint(result)
+            log.debug("关机API响应: %s", result)
             
             if result.get('success'):
                 QMessageBox.information(
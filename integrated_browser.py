@@ -1,5 +1,6 @@
 import sys
 import os
+import logging
 import time
 import requests # <-- 添加 requests
 import mimetypes # <-- 用于猜测文件名
@@ -15,6 +16,8 @@ from PySide6.QtWebEngineWidgets import QWebEngineView
 from PySide6.QtWebEngineCore import QWebEngineDownloadRequest, QWebEngineProfile, QWebEnginePage, QWebEngineSettings
 from PySide6.QtGui import QIcon, QAction
 
+log = logging.getLogger(__name__)
+
 
 # --- 自定义 WebEnginePage 以拦截下载 ---
 class CustomWebEnginePage(QWebEnginePage):
@@ -36,12 +39,12 @@ class CustomWebEnginePage(QWebEnginePage):
 
     def acceptNavigationRequest(self, url: QUrl, type: QWebEnginePage.NavigationType, isMainFrame: bool) -> bool:
         """拦截导航请求，检查是否为文件下载"""
-        print(f"DEBUG: acceptNavigationRequest - URL: {url.toString()}, Type: {type}, isMainFrame: {isMainFrame}")
+        log.debug("acceptNavigationRequest - URL: %s, Type: %s, isMainFrame: %s", url.toString(), type, isMainFrame)
         if type == QWebEnginePage.NavigationType.NavigationTypeLinkClicked and isMainFrame:
             path = urlparse(url.toString()).path
             filename, ext = os.path.splitext(path)
             if ext.lower() in self.DOWNLOADABLE_EXTENSIONS:
-                print(f"DEBUG: Detected downloadable extension '{ext}'. Triggering manual download.")
+                log.debug("Detected downloadable extension '%s'. Triggering manual download.", ext)
                 # 异步触发下载，避免阻塞 UI 线程太久 (虽然 requests 仍然会阻塞)
                 # A better approach would use QNetworkAccessManager or run requests in a thread
                 QTimer.singleShot(0, lambda: self._trigger_manual_download(url))
@@ -72,7 +75,7 @@ class CustomWebEnginePage(QWebEnginePage):
             )
 
             if not save_path:
-                print("DEBUG: Manual download cancelled by user.")
+                log.debug("Manual download cancelled by user.")
                 return
 
             # 显示下载提示 (可以改进为更复杂的进度条)
@@ -92,16 +95,16 @@ class CustomWebEnginePage(QWebEnginePage):
                         # 这里可以添加更新进度的代码
 
             QMessageBox.information(parent_widget, "下载完成", f"文件已保存到:\n{save_path}")
-            print(f"DEBUG: File downloaded successfully to {save_path}")
+            log.debug("File downloaded successfully to %s", save_path)
 
         except requests.exceptions.RequestException as e:
-            print(f"ERROR: Manual download failed: {e}")
+            log.warning("Manual download failed: %s", e)
             QMessageBox.warning(parent_widget, "下载失败", f"无法下载文件: {e}")
         except IOError as e:
-             print(f"ERROR: Could not write file: {e}")
+             log.warning("Could not write file: %s", e)
              QMessageBox.warning(parent_widget, "保存失败", f"无法写入文件: {e}")
         except Exception as e:
-             print(f"ERROR: Unexpected error during manual download: {e}")
+             log.warning("Unexpected error during manual download: %s", e)
              QMessageBox.warning(parent_widget, "下载错误", f"发生意外错误: {e}")
 
 
@@ -448,22 +451,22 @@ class IntegratedBrowser(QWidget):
         try:
             # Standard Qt6/PySide6 way
             settings.setAttribute(QWebEngineSettings.WebAttribute.DeveloperExtrasEnabled, True)
-            print("DEBUG: DeveloperExtrasEnabled set using WebAttribute.")
+            log.debug("DeveloperExtrasEnabled set using WebAttribute.")
             settings.setAttribute(QWebEngineSettings.WebAttribute.FullScreenSupportEnabled, True)
-            print("DEBUG: FullScreenSupportEnabled set using WebAttribute.")
+            log.debug("FullScreenSupportEnabled set using WebAttribute.")
         except AttributeError as e:
-            print(f"WARNING: Could not set standard WebAttributes: {e}. Trying WebSettingsAttribute fallback...")
+            log.warning("Could not set standard WebAttributes: %s. Trying WebSettingsAttribute fallback...", e)
             try:
                 # Fallback using WebSettingsAttribute (less common for Qt6)
                 if 'DeveloperExtrasEnabled' not in str(e): # Only try if the first one failed for this specific attribute
                     settings.setAttribute(QWebEngineSettings.WebSettingsAttribute.DeveloperExtrasEnabled, True)
-                    print("DEBUG: DeveloperExtrasEnabled set using WebSettingsAttribute.")
+                    log.debug("DeveloperExtrasEnabled set using WebSettingsAttribute.")
                 if 'FullScreenSupportEnabled' not in str(e): # Only try if the first one failed for this specific attribute
                     settings.setAttribute(QWebEngineSettings.WebSettingsAttribute.FullScreenSupportEnabled, True)
-                    print("DEBUG: FullScreenSupportEnabled set using WebSettingsAttribute.")
+                    log.debug("FullScreenSupportEnabled set using WebSettingsAttribute.")
             except AttributeError as e2:
                  # Give a more specific warning if fallbacks also fail
-                 print(f"WARNING: Fallback using WebSettingsAttribute also failed: {e2}. DevTools or Fullscreen might be unavailable.")
+                 log.warning("Fallback using WebSettingsAttribute also failed: %s. DevTools or Fullscreen might be unavailable.", e2)
 
 
         # --- Tab Widget Setup ---
@@ -507,7 +510,7 @@ class IntegratedBrowser(QWidget):
         # --- Download Handling ---
         self.download_manager = None
         # Ensure the connection is made correctly
-        print("DEBUG: Connecting downloadRequested signal...")
+        log.debug("Connecting downloadRequested signal...")
         self.profile.downloadRequested.connect(self.handle_download)
         # Removed problematic isSignalConnected check
 
@@ -556,7 +559,7 @@ class IntegratedBrowser(QWidget):
         # If still invalid after trying schemes, return potentially invalid QUrl
         # or a default like about:blank
         if not url.isValid():
-             print(f"Warning: Could not create valid QUrl from '{url_string}'. Loading about:blank.")
+             log.warning("Could not create valid QUrl from '%s'. Loading about:blank.", url_string)
              return QUrl("about:blank")
         return url
 
@@ -746,7 +749,7 @@ class IntegratedBrowser(QWidget):
 
     def handle_download(self, download: QWebEngineDownloadRequest):
         """处理下载请求"""
-        print("DEBUG: handle_download function called!") # <--- 添加这行调试打印
+        log.debug("handle_download function called!") # <--- 添加这行调试打印
         if self.download_manager is None:
             self.show_download_manager() # Ensure manager is visible
 
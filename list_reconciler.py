@@ -0,0 +1,113 @@
+# list_reconciler.py
+import logging
+from collections import namedtuple
+
+log = logging.getLogger(__name__)
+
+# 一次对比的结果：新增 / 删除 / 内容变化的键，以及新的顺序
+ListDiff = namedtuple("ListDiff", ["added", "removed", "changed", "order"])
+
+
+def record_key_of(record, index, key="id"):
+    """记录的键；缺少键的记录用位置作为临时键 (仍然显示，但只能按位置对比)"""
+    record_key = record.get(key)
+    if record_key is None:
+        return ("missing", index)
+    return record_key
+
+
+def diff_keyed(old_records, new_records, key="id"):
+    """
+    按键对比两份记录。
+    :param old_records: dict，键 -> 旧记录
+    :param new_records: 新的记录列表 (API 返回的顺序)
+    :return: ListDiff；new_records 中重复的键只保留第一条，缺少键的记录按 record_key_of 处理
+    """
+    order = []
+    seen = set()
+    added, changed = [], []
+    for index, record in enumerate(new_records):
+        record_key = record_key_of(record, index, key)
+        if isinstance(record_key, tuple):
+            log.warning("第 %d 条记录缺少 %r，按位置显示", index, key)
+        if record_key in seen:
+            continue
+        seen.add(record_key)
+        order.append(record_key)
+        if record_key not in old_records:
+            added.append(record_key)
+        elif old_records[record_key] != record:
+            changed.append(record_key)
+    removed = [record_key for record_key in old_records if record_key not in seen]
+    return ListDiff(added, removed, changed, order)
+
+
+class KeyedCardList:
+    """
+    管理一个 QVBoxLayout 中按键排列的卡片部件。
+    卡片始终位于布局开头 (提示标签和底部 stretch 在其后)；
+    reconcile() 只创建新增的卡片、删除消失的卡片、原地更新内容变化的卡片，
+    未变化的卡片不会被触碰。
+    """
+
+    def __init__(self, layout, create_card, update_card, key="id"):
+        """
+        :param layout: 承载卡片的 QVBoxLayout
+        :param create_card: 函数 (record) -> QWidget
+        :param update_card: 函数 (widget, record)，原地更新卡片内容
+        """
+        self.layout = layout
+        self.create_card = create_card
+        self.update_card = update_card
+        self.key = key
+        self.cards = {}
+        self.records = {}
+
+    def __len__(self):
+        return len(self.cards)
+
+    def __contains__(self, record_key):
+        return record_key in self.cards
+
+    def card(self, record_key):
+        return self.cards.get(record_key)
+
+    def reconcile(self, new_records):
+        """把布局同步为 new_records，返回 ListDiff"""
+        diff = diff_keyed(self.records, new_records, self.key)
+        new_by_key = {}
+        for index, record in enumerate(new_records):
+            new_by_key.setdefault(record_key_of(record, index, self.key), record)
+
+        for record_key in diff.removed:
+            self.remove(record_key)
+        for record_key in diff.changed:
+            self.update_card(self.cards[record_key], new_by_key[record_key])
+            self.records[record_key] = new_by_key[record_key]
+        for record_key in diff.added:
+            self.cards[record_key] = self.create_card(new_by_key[record_key])
+            self.records[record_key] = new_by_key[record_key]
+
+        # 只移动位置不对的卡片 (新卡片在这里第一次插入布局)
+        for index, record_key in enumerate(diff.order):
+            widget = self.cards[record_key]
+            current = self.layout.indexOf(widget)
+            if current != index:
+                if current >= 0:
+                    self.layout.removeWidget(widget)
+                self.layout.insertWidget(index, widget)
+        return diff
+
+    def remove(self, record_key):
+        """移除单个卡片，返回是否存在"""
+        widget = self.cards.pop(record_key, None)
+        self.records.pop(record_key, None)
+        if widget is None:
+            return False
+        self.layout.removeWidget(widget)
+        widget.deleteLater()
+        return True
+
+    def clear(self):
+        for record_key in list(self.cards):
+            self.remove(record_key)
@@ -1,26 +1,47 @@
+import os
 import sys
-import re # <--- 添加 re 模块导入
 import requests
 import webbrowser
 import json
-import qrcode # 用于生成二维码
-import io # 用于内存中处理图像数据
 import time # 用于格式化时间戳
+import logging
 from functools import partial # 用于信号连接传递额外参数
-from PySide6.QtCore import Qt, QSize, QTimer, QSettings, QThread, Signal, QObject, Slot # <--- 添加 Slot
+from PySide6.QtCore import Qt, QSize, QTimer, QThread, Signal, Slot, QEvent # <--- 添加 Slot
 
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QSizePolicy, QHBoxLayout, QMessageBox, QMenu,
     QListWidgetItem, QDialog, QLabel, QVBoxLayout, QLineEdit, QFrame,
     QPushButton, QScrollArea, QWidget, QFormLayout, QSpinBox, QComboBox,
     QCheckBox, QDialogButtonBox, QListWidget, QInputDialog, QStyleFactory,
-    QGraphicsDropShadowEffect # <--- 添加阴影效果导入
+    QGraphicsDropShadowEffect, # <--- 添加阴影效果导入
+    QTableWidget, QTableWidgetItem, QFileDialog, QHeaderView, # <--- 诊断面板
+    QProgressBar
 )
-from PySide6.QtGui import QAction, QClipboard, QPixmap, QIcon, QPalette, QColor, QMovie # <--- 添加 QMovie
+from PySide6.QtGui import QAction, QClipboard, QPixmap, QIcon, QColor, QMovie # <--- 添加 QMovie
 from PySide6.QtCore import Qt, QSize, QTimer # <--- 添加 QTimer 导入
 from ui_demo import Ui_MainWindow  # 从生成的 ui_demo.py 导入
 import resources_rc # 确保资源文件被导入
 from gpu_grabber import GpuGrabWorker, play_success_sound # <--- 导入抢占 Worker 和提示音函数
+from config_store import get_config_store # <--- 内存配置存储 (防抖批量写入)
+from image_registry import CustomImageRegistry, DEVELOPER_IMAGES # <--- 自定义镜像索引
+from list_reconciler import KeyedCardList # <--- 按 ID 增量更新卡片列表
+from image_cache import ImageCatalogCache # <--- 镜像列表磁盘缓存
+from async_api import AsyncApiClient, LANE_HIGH, LANE_NORMAL, LANE_LOW # <--- 共享事件循环 + 分优先级通道的异步 API 客户端
+from tasks import TaskHandle # <--- 可取消、带超时的任务句柄
+from api_guard import RateLimiter, CircuitBreaker # <--- 客户端限流和熔断
+from api_metrics import MetricsRegistry # <--- 按接口统计请求数和延迟
+from theme_engine import LIGHT_TOKENS, DARK_TOKENS, build_palette, build_stylesheet, system_prefers_dark # <--- 主题令牌
+from service_urls import build_service_url, service_port, SERVICE_NAMES # <--- 按服务端口改写实例 Web URL
+from service_health import ServiceHealthProber, UP as SERVICE_UP, DOWN as SERVICE_DOWN # <--- 服务在线检测
+from comfyui_batch import ComfyUIError, build_jobs, load_workflows # <--- ComfyUI 批量出图
+from comfyui_farm import ComfyUIFarm # <--- 多实例 ComfyUI 调度
+from output_sync import OutputSyncEngine, OutputSyncWorker, FileServiceClient, DEFAULT_EXCLUDE # <--- 输出文件增量同步
+from upload_manager import UploadManager, UploadTask, HASH_SUFFIX # <--- 分块、断点续传上传
+from ssh_manager import SSHManager, SSHTarget, SSH_AVAILABLE, local_url # <--- 每个实例一条 SSH 连接 + 本地端口转发
+from instance_history import InstanceHistory, format_duration # <--- 实例状态和费用的本地历史 (SQLite)
+from snapshot_store import SnapshotStore, bootstrap, is_success, WHOAMI, BALANCE, INSTANCES, IMAGES # <--- 数据快照 + 启动预取
+from qr_render import QRCodeRenderer # <--- 后台生成二维码 (按支付链接缓存)
+from recharge_watcher import RechargeOrderWatcher, PAID as ORDER_PAID, PENDING as ORDER_PENDING, STATE_TEXT as ORDER_STATE_TEXT # <--- 充值订单自动查询
 
 # --- 辅助函数：应用阴影 ---
 def apply_shadow(widget):
@@ -32,66 +53,48 @@ def apply_shadow(widget):
     shadow.setOffset(5, 5)
     shadow.setColor(QColor(0, 0, 0, 160))
     widget.setGraphicsEffect(shadow)
+
+
+class ServiceBadge(QLabel):
+    """按钮右上角的圆点标记 (绿色在线 / 红色离线 / 灰色未知)，随按钮大小变化移动"""
+    COLORS = {"up": "#2ECC71", "down": "#E74C3C", None: "#95A5A6"}
+    SIZE = 10
+
+    def __init__(self, button):
+        super().__init__(button)
+        self.setFixedSize(self.SIZE, self.SIZE)
+        self.setAttribute(Qt.WidgetAttribute.WA_TransparentForMouseEvents)
+        button.installEventFilter(self)
+        self._place()
+        self.set_state(None, "")
+
+    def set_state(self, state, tooltip):
+        self.setStyleSheet(f"background-color: {self.COLORS.get(state, self.COLORS[None])}; "
+                           f"border-radius: {self.SIZE // 2}px;")
+        self.parentWidget().setToolTip(tooltip)
+
+    def _place(self):
+        self.move(self.parentWidget().width() - self.SIZE - 4, 4)
+        self.raise_()
+
+    def eventFilter(self, watched, event):
+        if event.type() == QEvent.Type.Resize:
+            self._place()
+        return False
 # --- 辅助函数结束 ---
 
 from api_handler import ApiHandler # <--- 添加导入
 from instance_ui import InstanceBootDialog # <--- 导入开机对话框
 from integrated_browser import IntegratedBrowser # <--- 导入集成浏览器
+from app_logging import setup_logging # <--- 分级日志 (队列 + 后台线程写入轮转文件)
+from cassette import Cassette, RecordingApiHandler, ReplayApiHandler # <--- 录制/离线回放
 
-# CONFIG_FILE = "config.json" # <--- 不再需要，使用 QSettings
-# API_BASE_URL = "https://api.xiangongyun.com/open" # <--- 不再需要，移到 ApiHandler
+log = logging.getLogger(__name__)
 
+OFFLINE_TOKEN = "offline-replay" # 离线回放模式下的占位令牌
 
-# --- Worker Thread Class ---
-class WorkerSignals(QObject):
-    '''
-    Defines the signals available from a running worker thread.
-    Supported signals are:
-    finished
-        No data
-    error
-        `str` error message
-    success
-        `object` data returned from processing, anything
-    '''
-    finished = Signal()
-    error = Signal(str)
-    success = Signal(object)
-
-
-class Worker(QThread):
-    '''
-    Worker thread
-    Inherits from QThread to handle worker execution.
-    :param callback: The function callback to run on this worker thread. Supplied args and kwargs will be passed through to the runner.
-    :type callback: function
-    :param args: Arguments to pass to the callback function
-    :param kwargs: Keywords to pass to the callback function
-    '''
-
-    def __init__(self, fn, *args, **kwargs):
-        super(Worker, self).__init__()
-        # Store constructor arguments (re-used for processing)
-        self.fn = fn
-        self.args = args
-        self.kwargs = kwargs
-        self.signals = WorkerSignals()
-
-    def run(self):
-        '''
-        Initialise the runner function with passed args, kwargs.
-        '''
-        try:
-            result = self.fn(*self.args, **self.kwargs)
-        except Exception as e:
-            print(f"Worker Error: {e}") # 调试信息
-            # Ensure error signal emits a string
-            self.signals.error.emit(str(e))
-        else:
-            # Ensure success signal emits the result object
-            self.signals.success.emit(result)
-        finally:
-            self.signals.finished.emit()
+# CONFIG_FILE = "config.json" # <--- 不再需要，使用 QSettings
+# API_BASE_URL = "https://api.xiangongyun.com/open" # <--- 不再需要，移到 ApiHandler
 
 
 # --- 二维码显示对话框 ---
@@ -108,16 +111,16 @@ class ThemeManager:
         if cls._instance is None:
             cls._instance = super().__new__(cls)
             cls._instance.current_theme = cls.Dark
+            cls._instance._applied_tokens = None # 当前已应用的令牌 (用于跳过重复应用)
+            cls._instance._style_applied = False
             cls._instance.load_theme()
         return cls._instance
 
     def load_theme(self):
-        settings = QSettings()
-        self.current_theme = int(settings.value("Theme", self.Dark))
+        self.current_theme = get_config_store().get_int("Theme", self.Dark)
 
     def save_theme(self):
-        settings = QSettings()
-        settings.setValue("Theme", self.current_theme)
+        get_config_store().set_value("Theme", self.current_theme)
 
     def set_theme(self, theme):
         self.current_theme = theme
@@ -125,93 +128,35 @@ class ThemeManager:
         self.save_theme()
 
     def apply_theme(self):
-        if self.current_theme == self.System:
-            self.apply_system_theme()
-        elif self.current_theme == self.Light:
-            self.apply_light_theme()
-        elif self.current_theme == self.Dark:
-            self.apply_dark_theme()
-
-    def apply_system_theme(self):
+        """
+        在应用级别应用当前主题：调色板 + 由主题令牌生成的一份样式表。
+        变化由 Qt 自己传播到所有部件，不需要逐个 unpolish/polish；主题未变化时不做任何事。
+        """
         app = QApplication.instance()
-        # Check if styleHints() exists and is callable
-        if hasattr(app, 'styleHints') and callable(app.styleHints):
-             if app.styleHints().colorScheme() == Qt.ColorScheme.Dark:
-                 print("Applying System Theme -> Dark") # Debug
-                 self.apply_dark_theme()
-             else:
-                 print("Applying System Theme -> Light") # Debug
-                 self.apply_light_theme()
+        if self.current_theme == self.System:
+            dark = system_prefers_dark(app)
+            log.debug("Applying System Theme -> %s", "Dark" if dark else "Light")
         else:
-             print("Warning: app.styleHints() not available, defaulting to Light for System theme.")
-             self.apply_light_theme() # Fallback
-
-    def apply_light_theme(self):
-        print("Applying Light Theme...") # Debug
-        app = QApplication.instance()
-        app.setStyle(QStyleFactory.create("Fusion"))
-
-        palette = QPalette()
-        # Ensure QColor and Qt are imported from PySide6.QtGui and PySide6.QtCore respectively
-        palette.setColor(QPalette.ColorRole.Window, QColor(240, 240, 240))
-        palette.setColor(QPalette.ColorRole.WindowText, Qt.GlobalColor.black)
-        palette.setColor(QPalette.ColorRole.Base, QColor(255, 255, 255))
-        palette.setColor(QPalette.ColorRole.AlternateBase, QColor(240, 240, 240))
-        palette.setColor(QPalette.ColorRole.ToolTipBase, Qt.GlobalColor.white)
-        palette.setColor(QPalette.ColorRole.ToolTipText, Qt.GlobalColor.black)
-        palette.setColor(QPalette.ColorRole.Text, Qt.GlobalColor.black)
-        palette.setColor(QPalette.ColorRole.Button, QColor(240, 240, 240))
-        palette.setColor(QPalette.ColorRole.ButtonText, Qt.GlobalColor.black)
-        palette.setColor(QPalette.ColorRole.BrightText, Qt.GlobalColor.red)
-        palette.setColor(QPalette.ColorRole.Link, QColor(0, 0, 255))
-        palette.setColor(QPalette.ColorRole.Highlight, QColor(0, 120, 215))
-        palette.setColor(QPalette.ColorRole.HighlightedText, Qt.GlobalColor.white)
-        # Add disabled colors
-        palette.setColor(QPalette.ColorGroup.Disabled, QPalette.ColorRole.WindowText, Qt.GlobalColor.darkGray)
-        palette.setColor(QPalette.ColorGroup.Disabled, QPalette.ColorRole.Text, Qt.GlobalColor.darkGray)
-        palette.setColor(QPalette.ColorGroup.Disabled, QPalette.ColorRole.ButtonText, Qt.GlobalColor.darkGray)
-        palette.setColor(QPalette.ColorGroup.Disabled, QPalette.ColorRole.Highlight, QColor(211, 211, 211))
-        palette.setColor(QPalette.ColorGroup.Disabled, QPalette.ColorRole.HighlightedText, Qt.GlobalColor.darkGray)
-
-
-        app.setPalette(palette)
-        app.setStyleSheet("") # Clear any global stylesheet that might override palette
-
-    def apply_dark_theme(self):
-        print("Applying Dark Theme...") # Debug
-        app = QApplication.instance()
-        app.setStyle(QStyleFactory.create("Fusion"))
-
-        palette = QPalette()
-        # Ensure QColor and Qt are imported from PySide6.QtGui and PySide6.QtCore respectively
-        palette.setColor(QPalette.ColorRole.Window, QColor(53, 53, 53))
-        palette.setColor(QPalette.ColorRole.WindowText, Qt.GlobalColor.white)
-        palette.setColor(QPalette.ColorRole.Base, QColor(42, 42, 42)) # Darker base
-        palette.setColor(QPalette.ColorRole.AlternateBase, QColor(66, 66, 66)) # Slightly lighter alt base
-        palette.setColor(QPalette.ColorRole.ToolTipBase, Qt.GlobalColor.white) # Tooltips often light
-        palette.setColor(QPalette.ColorRole.ToolTipText, Qt.GlobalColor.black) # Tooltip text often dark
-        palette.setColor(QPalette.ColorRole.Text, Qt.GlobalColor.white)
-        palette.setColor(QPalette.ColorRole.Button, QColor(75, 75, 75)) # Darker buttons
-        palette.setColor(QPalette.ColorRole.ButtonText, Qt.GlobalColor.white)
-        palette.setColor(QPalette.ColorRole.BrightText, Qt.GlobalColor.red) # Keep bright text red
-        palette.setColor(QPalette.ColorRole.Link, QColor(42, 130, 218)) # Brighter blue link
-        palette.setColor(QPalette.ColorRole.Highlight, QColor(42, 130, 218)) # Highlight color
-        palette.setColor(QPalette.ColorRole.HighlightedText, Qt.GlobalColor.black) # Highlighted text often dark
-         # Add disabled colors
-        palette.setColor(QPalette.ColorGroup.Disabled, QPalette.ColorRole.WindowText, Qt.GlobalColor.gray)
-        palette.setColor(QPalette.ColorGroup.Disabled, QPalette.ColorRole.Text, Qt.GlobalColor.gray)
-        palette.setColor(QPalette.ColorGroup.Disabled, QPalette.ColorRole.ButtonText, Qt.GlobalColor.gray)
-        palette.setColor(QPalette.ColorGroup.Disabled, QPalette.ColorRole.Highlight, QColor(80, 80, 80))
-        palette.setColor(QPalette.ColorGroup.Disabled, QPalette.ColorRole.HighlightedText, Qt.GlobalColor.gray)
-
-        app.setPalette(palette)
-        # Optionally set a global dark stylesheet (e.g., using qdarkstyle or similar)
-        # Or clear any existing one that might conflict
-        app.setStyleSheet("")
+            dark = self.current_theme == self.Dark
+        tokens = DARK_TOKENS if dark else LIGHT_TOKENS
+
+        if not self._style_applied:
+            # 只设置一次：重复 setStyle 会重建所有部件的样式 (设置样式表后 app.style() 是代理，不能按名字判断)
+            app.setStyle(QStyleFactory.create("Fusion"))
+            self._style_applied = True
+        if tokens is self._applied_tokens:
+            return
+        log.debug("Applying %s Theme...", "Dark" if dark else "Light")
+        stylesheet = build_stylesheet(tokens)
+        if app.styleSheet() != stylesheet: # 样式表与主题无关，通常只在启动时设置一次
+            app.setStyleSheet(stylesheet)
+        app.setPalette(build_palette(tokens))
+        self._applied_tokens = tokens
 
 class QRCodeDialog(QDialog):
-    def __init__(self, qr_pixmap, parent=None):
+    def __init__(self, qr_pixmap, parent=None, trade_no=None):
         super().__init__(parent)
+        self.trade_no = trade_no
         self.setWindowTitle("微信支付二维码")
         self.setModal(True)
         layout = QVBoxLayout(self)
@@ -221,9 +166,16 @@ class QRCodeDialog(QDialog):
         info_label = QLabel("请使用微信扫描二维码完成支付", self)
         info_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         layout.addWidget(info_label)
+        # 后台自动查询订单状态，支付完成后窗口自动关闭
+        self.status_label = QLabel("等待支付...", self)
+        self.status_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        layout.addWidget(self.status_label)
         self.setLayout(layout)
         self.adjustSize()
 
+    def set_status(self, text):
+        self.status_label.setText(text)
+
 # --- 图片显示对话框 (支持缩放) ---
 class ImageDialog(QDialog):
     def __init__(self, image_path, title="查看图片", parent=None):
@@ -232,7 +184,7 @@ class ImageDialog(QDialog):
         self.setModal(True)
         self.original_pixmap = QPixmap(image_path)
         if self.original_pixmap.isNull():
-            print(f"错误：无法加载图片 {image_path}")
+            log.warning("无法加载图片 %s", image_path)
             self.image_label = QLabel("无法加载图片", self)
         else:
             self.image_label = QLabel(self)
@@ -256,6 +208,648 @@ class ImageDialog(QDialog):
             scaled_pixmap = self.original_pixmap.scaled(label_size, Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
             self.image_label.setPixmap(scaled_pixmap)
 
+# --- API 诊断面板 ---
+class DiagnosticsDialog(QDialog):
+    """按接口显示请求数、错误、字节数和延迟分位数，每秒刷新，可导出"""
+    COLUMNS = ["接口", "请求数", "错误", "熔断拒绝", "字节数", "平均 (ms)", "p50 (ms)", "p95 (ms)", "p99 (ms)"]
+
+    def __init__(self, metrics, api_client=None, parent=None):
+        super().__init__(parent)
+        self.metrics = metrics
+        self.api_client = api_client
+        self.setWindowTitle("API 诊断")
+        self.resize(820, 360)
+        layout = QVBoxLayout(self)
+
+        self.summary_label = QLabel(self)
+        layout.addWidget(self.summary_label)
+
+        self.table = QTableWidget(0, len(self.COLUMNS), self)
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        layout.addWidget(self.table)
+
+        button_layout = QHBoxLayout()
+        reset_button = QPushButton("清零", self)
+        reset_button.clicked.connect(self.reset_metrics)
+        prometheus_button = QPushButton("导出 Prometheus 文本", self)
+        prometheus_button.clicked.connect(lambda: self.export("prom"))
+        jsonl_button = QPushButton("导出 JSON Lines", self)
+        jsonl_button.clicked.connect(lambda: self.export("jsonl"))
+        button_layout.addWidget(reset_button)
+        button_layout.addStretch()
+        button_layout.addWidget(prometheus_button)
+        button_layout.addWidget(jsonl_button)
+        layout.addLayout(button_layout)
+
+        # 只在窗口显示时每秒刷新 (关闭后窗口被保留复用，只是隐藏)
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(1000)
+        self.refresh_timer.timeout.connect(self.refresh)
+
+    def showEvent(self, event):
+        self.refresh()
+        self.refresh_timer.start()
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.refresh_timer.stop()
+        super().hideEvent(event)
+
+    @staticmethod
+    def _ms(seconds):
+        return "-" if seconds is None else f"{seconds * 1000:.0f}"
+
+    def refresh(self):
+        rows = self.metrics.snapshot()
+        self.table.setRowCount(len(rows))
+        for row_index, row in enumerate(rows):
+            values = [row["endpoint"], row["requests"], row["errors"], row["rejected"], row["bytes"],
+                      self._ms(row["mean"]), self._ms(row["p50"]), self._ms(row["p95"]), self._ms(row["p99"])]
+            for column, value in enumerate(values):
+                item = self.table.item(row_index, column)
+                if item is None:
+                    item = QTableWidgetItem()
+                    if column > 0:
+                        item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+                    self.table.setItem(row_index, column, item)
+                item.setText(str(value))
+
+        summary = f"统计开始于 {time.strftime('%H:%M:%S', time.localtime(self.metrics.started_at))}"
+        if self.api_client is not None:
+            lanes = self.api_client.lane_stats()
+            summary += f"    通道占用 高/普通/低: {lanes['high']}/{lanes['normal']}/{lanes['low']}"
+            if self.api_client.breaker is not None:
+                summary += f"    熔断器: {self.api_client.breaker.state}"
+        self.summary_label.setText(summary)
+
+    def reset_metrics(self):
+        self.metrics.reset()
+        self.refresh()
+
+    def export(self, fmt):
+        if fmt == "prom":
+            path, _ = QFileDialog.getSaveFileName(self, "导出指标", "api_metrics.prom", "Prometheus 文本 (*.prom *.txt)")
+            content = self.metrics.to_prometheus()
+        else:
+            path, _ = QFileDialog.getSaveFileName(self, "导出指标", "api_metrics.jsonl", "JSON Lines (*.jsonl)")
+            content = self.metrics.to_json_lines()
+        if not path:
+            return
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(content)
+        except OSError as e:
+            QMessageBox.warning(self, "导出失败", f"无法写入文件: {e}")
+
+
+class ComfyUIBatchDialog(QDialog):
+    """
+    把文件夹中的 API 格式工作流批量提交到一个或多个实例的 ComfyUI (非模态)。
+    多个实例时由 ComfyUIFarm 按实测吞吐和队列深度分配；实例关机后它未完成的工作流自动交给其他实例。
+    """
+    COLUMNS = ["实例", "ComfyUI 地址", "执行中", "完成", "失败", "秒/个", "队列中其他任务", "状态"]
+
+    def __init__(self, title, instances, parent=None):
+        super().__init__(parent)
+        self.instances = dict(instances) # 实例 ID -> (名称, ComfyUI 地址)
+        self.farm = None
+        self.config = get_config_store()
+        self.setWindowTitle(f"ComfyUI 批量出图 - {title}")
+        self.resize(760, 560)
+        layout = QVBoxLayout(self)
+
+        self.node_table = QTableWidget(0, len(self.COLUMNS), self)
+        self.node_table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.node_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.node_table.verticalHeader().setVisible(False)
+        self.node_table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+        self.node_table.setMaximumHeight(160)
+        layout.addWidget(self.node_table)
+
+        form = QFormLayout()
+        self.workflow_edit = QLineEdit(self.config.get_str("comfyui/workflow_dir"), self)
+        form.addRow("工作流文件夹:", self._with_browse(self.workflow_edit))
+        self.output_edit = QLineEdit(self.config.get_str("comfyui/output_dir"), self)
+        form.addRow("图片保存到:", self._with_browse(self.output_edit))
+        self.repeat_spin = QSpinBox(self)
+        self.repeat_spin.setRange(1, 10000)
+        self.repeat_spin.setValue(self.config.get_int("comfyui/repeat", 1))
+        form.addRow("每个工作流次数:", self.repeat_spin)
+        self.in_flight_spin = QSpinBox(self)
+        self.in_flight_spin.setRange(1, 64)
+        self.in_flight_spin.setValue(self.config.get_int("comfyui/max_in_flight", 2))
+        self.in_flight_spin.setToolTip("每个实例同时提交到队列中的工作流数，其余在本地排队 (可随时取消、可分配给更快的实例)")
+        form.addRow("每个实例同时提交:", self.in_flight_spin)
+        self.seed_check = QCheckBox("每次提交随机替换 seed / noise_seed", self)
+        self.seed_check.setChecked(self.config.get_bool("comfyui/randomize_seed", True))
+        form.addRow("", self.seed_check)
+        layout.addLayout(form)
+
+        self.progress_bar = QProgressBar(self)
+        layout.addWidget(self.progress_bar)
+        self.current_label = QLabel(self)
+        layout.addWidget(self.current_label)
+        self.log_list = QListWidget(self)
+        layout.addWidget(self.log_list)
+
+        button_layout = QHBoxLayout()
+        button_layout.addStretch()
+        self.start_button = QPushButton("开始", self)
+        self.start_button.clicked.connect(self.start_batch)
+        self.cancel_button = QPushButton("取消", self)
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self.cancel_batch)
+        button_layout.addWidget(self.start_button)
+        button_layout.addWidget(self.cancel_button)
+        layout.addLayout(button_layout)
+        self.refresh_nodes()
+
+    def _with_browse(self, line_edit):
+        row = QWidget(self)
+        row_layout = QHBoxLayout(row)
+        row_layout.setContentsMargins(0, 0, 0, 0)
+        row_layout.addWidget(line_edit)
+        browse_button = QPushButton("浏览...", row)
+        browse_button.clicked.connect(lambda: self._browse(line_edit))
+        row_layout.addWidget(browse_button)
+        return row
+
+    def _browse(self, line_edit):
+        folder = QFileDialog.getExistingDirectory(self, "选择文件夹", line_edit.text())
+        if folder:
+            line_edit.setText(folder)
+
+    def _log(self, text):
+        self.log_list.addItem(f"{time.strftime('%H:%M:%S')} {text}")
+        self.log_list.scrollToBottom()
+
+    def set_instances(self, instances):
+        """实例列表刷新后调用：新开机的实例加入调度，已关机的实例退出，它的工作流重新分配"""
+        instances = dict(instances)
+        if self.farm is not None and self.farm.running:
+            for instance_id in self.instances.keys() - instances.keys():
+                self.farm.remove_instance(instance_id, "已关机")
+            for instance_id, (name, url) in instances.items():
+                self.farm.add_instance(instance_id, name, url)
+        self.instances = instances
+        self.refresh_nodes()
+
+    def refresh_nodes(self):
+        if self.farm is not None:
+            rows = []
+            for node in self.farm.nodes.values():
+                state = "运行中" if node.alive else "已退出"
+                seconds = f"{node.seconds_per_prompt:.1f}" if node.seconds_per_prompt else "-"
+                rows.append([node.name, node.base_url, node.runner.in_flight if node.alive else 0,
+                             node.done, node.failed, seconds, node.foreign_depth, state])
+        else:
+            rows = [[name, url, 0, 0, 0, "-", "-", "待开始"] for name, url in self.instances.values()]
+        self.node_table.setRowCount(len(rows))
+        for row_index, row in enumerate(rows):
+            for column, value in enumerate(row):
+                item = self.node_table.item(row_index, column)
+                if item is None:
+                    item = QTableWidgetItem()
+                    self.node_table.setItem(row_index, column, item)
+                item.setText(str(value))
+
+    def start_batch(self):
+        workflow_dir = self.workflow_edit.text().strip()
+        output_dir = self.output_edit.text().strip()
+        if not workflow_dir or not output_dir:
+            QMessageBox.warning(self, "参数不完整", "请选择工作流文件夹和图片保存位置。")
+            return
+        if not self.instances:
+            QMessageBox.warning(self, "没有实例", "没有可用的运行中实例。")
+            return
+        try:
+            jobs = build_jobs(load_workflows(workflow_dir), self.repeat_spin.value(),
+                              randomize_seed=self.seed_check.isChecked())
+        except (ComfyUIError, OSError) as e:
+            QMessageBox.warning(self, "工作流无效", str(e))
+            return
+        for key, value in (("comfyui/workflow_dir", workflow_dir), ("comfyui/output_dir", output_dir),
+                           ("comfyui/repeat", self.repeat_spin.value()),
+                           ("comfyui/max_in_flight", self.in_flight_spin.value()),
+                           ("comfyui/randomize_seed", self.seed_check.isChecked())):
+            self.config.set_value(key, value)
+
+        self.log_list.clear()
+        self.progress_bar.setRange(0, len(jobs))
+        self.progress_bar.setValue(0)
+        if self.farm is not None: # 上一批次的调度器 (及其运行器、websocket) 不再使用
+            self.farm.shutdown()
+            self.farm.deleteLater()
+        self.farm = ComfyUIFarm(jobs, output_dir, max_in_flight=self.in_flight_spin.value(), parent=self)
+        for instance_id, (name, url) in self.instances.items():
+            self.farm.add_instance(instance_id, name, url)
+        self.farm.log_message.connect(self._log)
+        self.farm.progress.connect(self._on_progress)
+        self.farm.nodes_changed.connect(self.refresh_nodes)
+        self.farm.job_progress.connect(
+            lambda job, value, maximum: self.current_label.setText(f"{job.name}: {value}/{maximum}"))
+        self.farm.finished.connect(self._on_finished)
+        self.start_button.setEnabled(False)
+        self.cancel_button.setEnabled(True)
+        self.farm.start()
+
+    def _on_progress(self, done, failed, total):
+        self.progress_bar.setValue(done + failed)
+        self.progress_bar.setFormat(f"%v/%m  失败 {failed}" if failed else "%v/%m")
+
+    def cancel_batch(self):
+        if self.farm is not None:
+            self.farm.cancel()
+
+    def _on_finished(self):
+        self.start_button.setEnabled(True)
+        self.cancel_button.setEnabled(False)
+        self.current_label.clear()
+        self.refresh_nodes()
+
+    def closeEvent(self, event):
+        if self.farm is not None and self.farm.running:
+            reply = QMessageBox.question(self, "批次进行中", "关闭窗口将停止提交剩余的工作流，确定关闭吗？")
+            if reply != QMessageBox.StandardButton.Yes:
+                event.ignore()
+                return
+            self.farm.cancel()
+        super().closeEvent(event)
+
+
+class OutputSyncDialog(QDialog):
+    """把实例文件服务 (shuchu / quanbu) 中的文件增量同步到本地，可持续监视 (非模态)"""
+    SERVICES = {"shuchu": "输出目录 (shuchu)", "quanbu": "全部文件 (quanbu)"}
+
+    def __init__(self, instance_name, web_url, ports, parent=None):
+        super().__init__(parent)
+        self.instance_name = instance_name
+        self.web_url = web_url
+        self.ports = ports
+        self.sync_thread = None
+        self.sync_worker = None
+        self.config = get_config_store()
+        self.setWindowTitle(f"同步输出文件 - {instance_name}")
+        self.resize(620, 440)
+        layout = QVBoxLayout(self)
+
+        form = QFormLayout()
+        self.service_combo = QComboBox(self)
+        for service_name, label in self.SERVICES.items():
+            self.service_combo.addItem(label, service_name)
+        self.service_combo.currentIndexChanged.connect(self._update_url_label)
+        form.addRow("文件服务:", self.service_combo)
+        self.url_label = QLabel(self)
+        form.addRow("地址:", self.url_label)
+        default_dir = os.path.join(self.config.get_str("output_sync/local_root"), instance_name) \
+            if self.config.get_str("output_sync/local_root") else ""
+        self.local_edit = QLineEdit(default_dir, self)
+        browse_button = QPushButton("浏览...", self)
+        browse_button.clicked.connect(self._browse)
+        local_row = QHBoxLayout()
+        local_row.addWidget(self.local_edit)
+        local_row.addWidget(browse_button)
+        form.addRow("本地目录:", local_row)
+        self.workers_spin = QSpinBox(self)
+        self.workers_spin.setRange(1, 32)
+        self.workers_spin.setValue(self.config.get_int("output_sync/workers", 4))
+        form.addRow("并发下载数:", self.workers_spin)
+        self.watch_check = QCheckBox("持续监视，每隔", self)
+        self.watch_check.setChecked(self.config.get_bool("output_sync/watch", False))
+        self.interval_spin = QSpinBox(self)
+        self.interval_spin.setRange(2, 3600)
+        self.interval_spin.setSuffix(" 秒")
+        self.interval_spin.setValue(self.config.get_int("output_sync/watch_interval", 10))
+        watch_row = QHBoxLayout()
+        watch_row.addWidget(self.watch_check)
+        watch_row.addWidget(self.interval_spin)
+        watch_row.addWidget(QLabel("同步一次新文件", self))
+        watch_row.addStretch()
+        form.addRow("", watch_row)
+        layout.addLayout(form)
+
+        self.status_label = QLabel("未开始", self)
+        layout.addWidget(self.status_label)
+        self.file_list = QListWidget(self)
+        layout.addWidget(self.file_list)
+
+        button_layout = QHBoxLayout()
+        button_layout.addStretch()
+        self.start_button = QPushButton("开始同步", self)
+        self.start_button.clicked.connect(self.start_sync)
+        self.stop_button = QPushButton("停止", self)
+        self.stop_button.setEnabled(False)
+        self.stop_button.clicked.connect(self.stop_sync)
+        button_layout.addWidget(self.start_button)
+        button_layout.addWidget(self.stop_button)
+        layout.addLayout(button_layout)
+        self._update_url_label()
+
+    def _service_url(self):
+        service_name = self.service_combo.currentData()
+        return build_service_url(self.web_url, self.ports.get(service_name), service_name)
+
+    def _update_url_label(self):
+        self.url_label.setText(self._service_url() or "无法从实例 Web URL 确定地址")
+
+    def _browse(self):
+        folder = QFileDialog.getExistingDirectory(self, "选择本地目录", self.local_edit.text())
+        if folder:
+            self.local_edit.setText(folder)
+
+    def start_sync(self):
+        url = self._service_url()
+        local_dir = self.local_edit.text().strip()
+        if not url or not local_dir:
+            QMessageBox.warning(self, "参数不完整", "请确认文件服务地址并选择本地目录。")
+            return
+        self.config.set_value("output_sync/local_root", os.path.dirname(local_dir))
+        self.config.set_value("output_sync/workers", self.workers_spin.value())
+        self.config.set_value("output_sync/watch", self.watch_check.isChecked())
+        self.config.set_value("output_sync/watch_interval", self.interval_spin.value())
+
+        workers = self.workers_spin.value()
+        # 上传时写入的 .sha256 旁注文件只用于跳过重复上传，不同步回本地
+        engine = OutputSyncEngine(FileServiceClient(url, pool_size=workers), local_dir, max_workers=workers,
+                                  exclude=DEFAULT_EXCLUDE + (HASH_SUFFIX,))
+        interval = self.interval_spin.value() if self.watch_check.isChecked() else None
+        self.sync_worker = OutputSyncWorker(engine, watch_interval=interval)
+        self.sync_thread = QThread()
+        self.sync_worker.moveToThread(self.sync_thread)
+        self.sync_thread.started.connect(self.sync_worker.run)
+        self.sync_worker.finished.connect(self.sync_thread.quit)
+        self.sync_worker.finished.connect(self.sync_worker.deleteLater)
+        self.sync_thread.finished.connect(self.sync_thread.deleteLater)
+        self.sync_worker.finished.connect(self._on_sync_finished)
+        self.sync_worker.status_update.connect(self.status_label.setText)
+        self.sync_worker.error.connect(lambda message: self.status_label.setText(f"同步失败: {message}"))
+        self.sync_worker.file_synced.connect(self._on_file_synced)
+        self.start_button.setEnabled(False)
+        self.stop_button.setEnabled(True)
+        self.sync_thread.start()
+
+    def _on_file_synced(self, path, size):
+        self.file_list.insertItem(0, f"{time.strftime('%H:%M:%S')}  {path}  ({size / 1024:.0f} KB)")
+        if self.file_list.count() > 500: # 只保留最近的记录
+            self.file_list.takeItem(self.file_list.count() - 1)
+
+    def stop_sync(self):
+        if self.sync_worker is not None:
+            self.sync_worker.stop()
+            self.stop_button.setEnabled(False)
+            self.status_label.setText("正在停止...")
+
+    def _on_sync_finished(self):
+        self.sync_thread = None
+        self.sync_worker = None
+        self.start_button.setEnabled(True)
+        self.stop_button.setEnabled(False)
+
+    def shutdown(self):
+        """程序退出时调用：停止同步并等待线程结束 (QThread 没有父对象，仍在运行时销毁会使程序崩溃)"""
+        if self.sync_worker is not None:
+            self.sync_worker.stop()
+        if self.sync_thread is not None:
+            # finished -> quit 排队在主线程，这里主线程在等待，需要直接调用 quit
+            self.sync_thread.quit()
+            self.sync_thread.wait()
+
+    def closeEvent(self, event):
+        # 只请求停止，不阻塞界面；线程结束后由 _on_sync_finished 清理
+        self.stop_sync()
+        super().closeEvent(event)
+
+
+class UploadDialog(QDialog):
+    """
+    上传队列窗口 (非模态，所有实例共用一个)。从实例卡片打开时把该实例的文件服务 (quanbu) 设为上传目标；
+    队列中其他实例的任务照常显示和继续。关闭窗口不影响后台上传。
+    """
+    COLUMNS = ["本地文件", "远程路径", "状态", "进度"]
+    STATUS_TEXT = {
+        UploadTask.QUEUED: "排队中", UploadTask.HASHING: "计算哈希", UploadTask.UPLOADING: "上传中",
+        UploadTask.PAUSED: "已暂停", UploadTask.DONE: "完成", UploadTask.SKIPPED: "远程相同，已跳过",
+        UploadTask.FAILED: "失败",
+    }
+
+    def __init__(self, manager, parent=None):
+        super().__init__(parent)
+        self.manager = manager
+        self.files_url = None
+        self.upload_url = None
+        self.rows = {} # 任务 ID -> 行号
+        self.config = get_config_store()
+        self.setWindowTitle("上传文件")
+        self.resize(820, 520)
+        layout = QVBoxLayout(self)
+
+        form = QFormLayout()
+        self.target_label = QLabel(self)
+        form.addRow("上传到:", self.target_label)
+        self.remote_dir_edit = QLineEdit(self.config.get_str("upload/remote_dir", "uploads"), self)
+        self.remote_dir_edit.setToolTip("相对文件服务根目录的路径；上传文件夹时保留文件夹结构")
+        form.addRow("远程目录:", self.remote_dir_edit)
+        layout.addLayout(form)
+
+        add_layout = QHBoxLayout()
+        self.add_files_button = QPushButton("添加文件...", self)
+        self.add_files_button.clicked.connect(self._add_files)
+        self.add_folder_button = QPushButton("添加文件夹...", self)
+        self.add_folder_button.clicked.connect(self._add_folder)
+        add_layout.addWidget(self.add_files_button)
+        add_layout.addWidget(self.add_folder_button)
+        add_layout.addStretch()
+        layout.addLayout(add_layout)
+
+        self.table = QTableWidget(0, len(self.COLUMNS), self)
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        self.table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+        layout.addWidget(self.table)
+        self.log_list = QListWidget(self)
+        self.log_list.setMaximumHeight(110)
+        layout.addWidget(self.log_list)
+
+        button_layout = QHBoxLayout()
+        for text, slot in (("暂停", self._pause_selected), ("继续 / 重试", self._resume_selected),
+                           ("移除", self._remove_selected), ("清除已完成", self._clear_finished)):
+            button = QPushButton(text, self)
+            button.clicked.connect(slot)
+            button_layout.addWidget(button)
+        button_layout.addStretch()
+        layout.addLayout(button_layout)
+
+        manager.task_changed.connect(self._on_task_changed)
+        manager.task_progress.connect(self._on_task_progress)
+        manager.log_message.connect(self._log)
+        self._rebuild()
+        self.set_target(None, None, None)
+
+    def set_target(self, instance_name, files_url, upload_url):
+        self.files_url = files_url
+        self.upload_url = upload_url
+        enabled = bool(files_url and upload_url)
+        self.target_label.setText(f"{instance_name}  {files_url}" if enabled else
+                                  "未选择实例 (请从运行中实例的卡片打开，并确认已配置 quanbu 端口)")
+        self.add_files_button.setEnabled(enabled)
+        self.add_folder_button.setEnabled(enabled)
+
+    def _log(self, text):
+        self.log_list.addItem(f"{time.strftime('%H:%M:%S')} {text}")
+        if self.log_list.count() > 500:
+            self.log_list.takeItem(0)
+        self.log_list.scrollToBottom()
+
+    def _add_paths(self, paths):
+        if not paths:
+            return
+        remote_dir = self.remote_dir_edit.text().strip()
+        self.config.set_value("upload/remote_dir", remote_dir)
+        self.manager.add_paths(paths, self.files_url, self.upload_url, remote_dir)
+
+    def _add_files(self):
+        paths, _ = QFileDialog.getOpenFileNames(self, "选择要上传的文件")
+        self._add_paths(paths)
+
+    def _add_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "选择要上传的文件夹")
+        self._add_paths([folder] if folder else [])
+
+    def _selected_ids(self):
+        rows = {index.row() for index in self.table.selectionModel().selectedRows()}
+        return [task_id for task_id, row in self.rows.items() if row in rows]
+
+    def _pause_selected(self):
+        self.manager.pause(self._selected_ids())
+
+    def _resume_selected(self):
+        self.manager.resume(self._selected_ids())
+
+    def _remove_selected(self):
+        self.manager.remove(self._selected_ids())
+
+    def _clear_finished(self):
+        self.manager.clear_finished()
+
+    # --- 表格 ---
+    def _rebuild(self):
+        tasks = list(self.manager.queue.tasks)
+        self.rows = {task.id: row for row, task in enumerate(tasks)}
+        self.table.setRowCount(len(tasks))
+        for row, task in enumerate(tasks):
+            self._fill_row(row, task)
+
+    def _set_cell(self, row, column, text):
+        item = self.table.item(row, column)
+        if item is None:
+            item = QTableWidgetItem()
+            self.table.setItem(row, column, item)
+        item.setText(text)
+
+    def _fill_row(self, row, task):
+        self._set_cell(row, 0, task.local_path)
+        self._set_cell(row, 1, task.remote_path)
+        status = self.STATUS_TEXT.get(task.status, task.status)
+        self._set_cell(row, 2, f"{status}: {task.error}" if task.error else status)
+        if task.finished:
+            self._set_cell(row, 3, "100%")
+        elif task.size and task.bytes_done:
+            self._set_cell(row, 3, f"{task.bytes_done * 100 // task.size}%")
+        else:
+            self._set_cell(row, 3, "")
+
+    def _on_task_changed(self, task_id):
+        task = self.manager.queue.get(task_id)
+        if task is None or task_id not in self.rows:
+            self._rebuild() # 加入或移除任务
+        else:
+            self._fill_row(self.rows[task_id], task)
+
+    def _on_task_progress(self, task_id, done, total):
+        row = self.rows.get(task_id)
+        if row is not None and total:
+            self._set_cell(row, 3, f"{done * 100 // total}%  ({done / 1024 ** 2:.1f} / {total / 1024 ** 2:.1f} MB)")
+
+
+class InstanceHistoryDialog(QDialog):
+    """
+    实例历史 (来自本地 SQLite 记录，不请求 API)：每个实例的本次运行时长、累计运行时长和花费，
+    选中实例后在下方显示其状态变化。
+    """
+    COLUMNS = ["实例", "当前状态", "本次运行", "累计运行", "花费 (元)", "首次记录", "最近记录"]
+
+    def __init__(self, history, parent=None):
+        super().__init__(parent)
+        self.history = history
+        self.summaries = []
+        self.setWindowTitle("实例历史")
+        self.resize(860, 560)
+        layout = QVBoxLayout(self)
+
+        self.table = QTableWidget(0, len(self.COLUMNS), self)
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.table.setSelectionMode(QTableWidget.SelectionMode.SingleSelection)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        self.table.itemSelectionChanged.connect(self._show_transitions)
+        layout.addWidget(self.table)
+        self.transition_list = QListWidget(self)
+        self.transition_list.setMaximumHeight(160)
+        layout.addWidget(self.transition_list)
+        self.total_label = QLabel(self)
+        layout.addWidget(self.total_label)
+
+        button_layout = QHBoxLayout()
+        refresh_button = QPushButton("刷新", self)
+        refresh_button.clicked.connect(self.history.request_summaries)
+        close_button = QPushButton("关闭", self)
+        close_button.clicked.connect(self.close)
+        button_layout.addStretch()
+        button_layout.addWidget(refresh_button)
+        button_layout.addWidget(close_button)
+        layout.addLayout(button_layout)
+
+        self.history.summaries_ready.connect(self._on_summaries)
+        self.history.request_summaries()
+
+    @staticmethod
+    def _format_time(ts):
+        return time.strftime('%Y-%m-%d %H:%M', time.localtime(ts))
+
+    def _on_summaries(self, summaries):
+        self.summaries = sorted(summaries, key=lambda summary: summary.last_seen, reverse=True)
+        self.table.setRowCount(len(self.summaries))
+        for row, summary in enumerate(self.summaries):
+            cells = [summary.name or summary.instance_id, summary.status,
+                     format_duration(summary.uptime) if summary.uptime else "-",
+                     format_duration(summary.running_seconds), f"{summary.spend:.2f}",
+                     self._format_time(summary.first_seen), self._format_time(summary.last_seen)]
+            for column, text in enumerate(cells):
+                self.table.setItem(row, column, QTableWidgetItem(text))
+        total = sum(summary.spend for summary in self.summaries)
+        self.total_label.setText(f"共 {len(self.summaries)} 个实例，记录期内估计花费 {total:.2f} 元 (按每小时价格和运行时长计算)")
+        if self.summaries and not self.table.selectedItems():
+            self.table.selectRow(0)
+        self._show_transitions()
+
+    def _show_transitions(self):
+        self.transition_list.clear()
+        row = self.table.currentRow()
+        if not 0 <= row < len(self.summaries):
+            return
+        for ts, old, new in reversed(self.summaries[row].transitions):
+            self.transition_list.addItem(f"{self._format_time(ts)}  {old} → {new}")
+        if not self.summaries[row].transitions:
+            self.transition_list.addItem("没有记录到状态变化")
+
 # --- 部署镜像对话框 ---
 
 # 镜像类型中英文映射
@@ -416,7 +1010,7 @@ class DeployImageDialog(QDialog):
             if isinstance(self.parent(), MainWindow):
                 self.parent().deploy_image_async(deploy_data)
             else:
-                print("错误：无法获取主窗口实例来执行部署。")
+                log.warning("无法获取主窗口实例来执行部署。")
                 QMessageBox.critical(self, "部署错误", "无法启动部署流程。")
             self.accept() # 提交后关闭对话框
 
@@ -445,7 +1039,9 @@ class DeployImageDialog(QDialog):
             return
         api_handler_instance = main_window.api_handler
 
-        self.gpu_grab_worker = GpuGrabWorker(api_handler_instance, deploy_params, interval=retry_interval)
+        # 每次部署尝试都走主窗口的高优先级通道，不会排在定时刷新之后
+        self.gpu_grab_worker = GpuGrabWorker(api_handler_instance, deploy_params, interval=retry_interval,
+                                             api_client=main_window.api_client)
         self.gpu_grab_thread = QThread()
 
         # 3. 移动 Worker 到 Thread
@@ -480,6 +1076,7 @@ class DeployImageDialog(QDialog):
         QMessageBox.information(self, "抢占成功", f"成功抢占 GPU 并部署实例！\n实例 ID: {instance_id}\n\n对话框即将关闭，请前往实例页面查看。")
         # 可以在这里触发主窗口刷新实例列表的信号
         if isinstance(self.parent(), MainWindow):
+            self.parent().snapshots.invalidate(INSTANCES) # 实例列表已变化
             self.parent().show_shili_page() # 切换到实例页面并刷新
         self.accept() # 关闭对话框
 
@@ -517,7 +1114,7 @@ class DeployImageDialog(QDialog):
     @Slot()
     def reset_ui_after_grab(self):
         """任务结束后重置 UI 状态"""
-        print("[DeployDialog] Resetting UI after grab task finished.") # Debug
+        log.debug("[DeployDialog] Resetting UI after grab task finished.")
         self.deploy_button.setEnabled(True)
         self.grab_deploy_button.setEnabled(True)
         self.cancel_grab_button.setEnabled(False)
@@ -533,7 +1130,7 @@ class DeployImageDialog(QDialog):
     def closeEvent(self, event):
         """在关闭对话框时确保停止后台任务"""
         if self.gpu_grab_thread and self.gpu_grab_thread.isRunning():
-            print("[DeployDialog] Close event triggered while grab task running. Stopping task...") # Debug
+            log.debug("[DeployDialog] Close event triggered while grab task running. Stopping task...")
             self.cancel_gpu_grabbing()
             # 可以选择等待线程结束，但可能导致 UI 卡顿
             # self.gpu_grab_thread.quit()
@@ -553,9 +1150,16 @@ class DeployImageDialog(QDialog):
 class MainWindow(QMainWindow, Ui_MainWindow):
     # --- 添加一个信号，用于部署成功后触发实例列表刷新 ---
     instance_deployed_signal = Signal()
-
-    def __init__(self):
+    # 熔断器状态变化 (state, retry_in)；从事件循环线程发出，排队到主线程更新状态栏
+    api_breaker_changed = Signal(str, float)
+
+    def __init__(self, api_handler=None, offline=False):
+        """
+        :param api_handler: 可替换的 API 处理器 (例如录制或回放用的包装)，默认使用 ApiHandler
+        :param offline: 离线回放模式；没有保存令牌时使用占位令牌，使各页面可以直接加载
+        """
         super().__init__()
+        self.offline = offline
         # === 新增主题初始化 ===
         app = QApplication.instance()
         app.setApplicationName("顺势ai")
@@ -571,12 +1175,67 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             else None
         )
         self.setupUi(self)
-        self.api_handler = ApiHandler() # <--- 实例化 ApiHandler
-        self.custom_public_images = [] # <--- 初始化自定义公共镜像列表
+        self.config = get_config_store() # <--- 内存配置存储 (防抖批量写入)
+        self.api_handler = api_handler if api_handler is not None else ApiHandler() # <--- 实例化 ApiHandler
+        # 所有后台调用共享一个事件循环和线程池，并统一经过限流和熔断
+        self.api_breaker = CircuitBreaker(on_state_change=self.api_breaker_changed.emit)
+        self.api_metrics = MetricsRegistry()
+        # 普通通道放宽到 4 个线程：启动预取的四项读取可以同时进行
+        self.api_client = AsyncApiClient(self.api_handler, lane_limits={LANE_NORMAL: 4}, rate_limiter=RateLimiter(),
+                                         breaker=self.api_breaker, metrics=self.api_metrics)
+        self.api_status_label = QLabel("")
+        self.statusbar.addPermanentWidget(self.api_status_label)
+        self.api_breaker_changed.connect(self._update_api_status_label)
+        app.aboutToQuit.connect(self.api_client.shutdown)
+        self.custom_images = CustomImageRegistry() # <--- 初始化自定义公共镜像索引
+        self.public_image_rows = {} # <--- 镜像 ID -> 公共镜像页面中的行部件
         self.ports = {} # <--- 初始化端口配置字典
-        self.thread_pool = [] # <--- 用于保持 Worker 对象的引用
+        self.comfyui_dialogs = {} # 镜像 (或实例 ID) -> ComfyUIBatchDialog
+        self.latest_instances = [] # 最近一次获取的实例列表
+        self.snapshots = SnapshotStore(parent=self) # 最近一次成功获取的账户、余额、实例和镜像数据
+        self.is_bootstrapping = False # 启动预取是否进行中
+        self.output_sync_dialogs = {} # 实例 ID -> OutputSyncDialog
+        app.aboutToQuit.connect(self._shutdown_output_sync)
+        # 上传队列保存在应用数据目录，启动后继续上次未完成的上传
+        self.upload_manager = UploadManager(max_files=self.config.get_int("upload/max_files", 2),
+                                            parallel_parts=self.config.get_int("upload/parallel_parts", 4), parent=self)
+        self.upload_dialog = None
+        app.aboutToQuit.connect(self.upload_manager.shutdown)
+        QTimer.singleShot(0, self.upload_manager.resume_pending)
+        # 每个运行中的实例一条 SSH 连接，按需转发服务端口 (ComfyUI、FluxGym、Jupyter 共用)
+        self.ssh_manager = SSHManager(self)
+        self.ssh_pending_urls = {} # (实例 ID, 远程端口) -> 服务的公网地址 (转发建立后按其路径打开)
+        self.ssh_manager.forward_ready.connect(self._on_ssh_forward_ready)
+        self.ssh_manager.forward_failed.connect(self._on_ssh_forward_failed)
+        app.aboutToQuit.connect(self.ssh_manager.shutdown)
+        # 实例快照变化时预先计算各服务地址并检测在线状态 (左侧服务按钮上的标记)
+        self.service_prober = ServiceHealthProber(parent=self)
+        app.aboutToQuit.connect(self.service_prober.shutdown)
+        # 充值订单创建后在后台自动查询支付状态 (可同时跟踪多笔)
+        self.recharge_watcher = RechargeOrderWatcher(self.api_client, self.api_handler.query_recharge_order, parent=self)
+        self.recharge_watcher.order_updated.connect(self._on_recharge_order_updated)
+        self.recharge_watcher.order_finished.connect(self._on_recharge_order_finished)
+        app.aboutToQuit.connect(self.recharge_watcher.stop)
+        self.qr_dialogs = {} # 订单号 -> 正在显示的 QRCodeDialog
+        self.qr_renderer = QRCodeRenderer(parent=self)
+        self.qr_renderer.rendered.connect(self._show_recharge_qr)
+        self.qr_renderer.failed.connect(self._on_recharge_qr_failed)
+        app.aboutToQuit.connect(self.qr_renderer.shutdown)
+        self.qr_requests = {} # 支付链接 -> 订单号 (等待二维码生成)
+        # 每次获取实例列表后记录状态和价格；过渡状态按历史估计的时长提前刷新
+        self.instance_history = InstanceHistory(parent=self)
+        app.aboutToQuit.connect(self.instance_history.shutdown)
+        self.instance_history_dialog = None
+        self.transition_refresh_timer = QTimer(self)
+        self.transition_refresh_timer.setSingleShot(True)
+        self.transition_refresh_timer.timeout.connect(self._refresh_for_transition)
+        self.transition_overdue_delay = None # 过渡状态已超过估计时长时的刷新间隔 (每次翻倍)
+        self.thread_pool = [] # <--- 用于保持任务句柄的引用
+        self.page_tasks = {} # <--- 页面 -> 该页面的后台任务 (切换页面时取消)
         self.is_refreshing_instances = False # <--- 添加实例刷新状态标志
         self.is_refreshing_images = False # <--- 添加镜像刷新状态标志
+        self.image_cache = ImageCatalogCache() # <--- 镜像列表磁盘缓存 (按内容哈希重新验证)
+        self.image_view_stale = True # <--- 镜像页面当前显示的内容是否与缓存不一致
         self.browser_preference = "integrated" # <--- 添加浏览器偏好设置, 默认内置
         self.browser_preference = "integrated" # <--- 添加浏览器偏好设置, 默认内置
 
@@ -595,6 +1254,8 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
         # 加载保存的配置 (令牌和自定义镜像)
         self.load_config()
+        # 先用缓存绘制镜像页面，首次进入时再在后台重新验证
+        self._paint_images_from_cache()
 
 
         # 确保必要的 UI 元素存在
@@ -618,11 +1279,14 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                         if widget:
                             setattr(self, element, widget)
                         else:
-                            print(f"警告: UI中缺少设置页面元素: {element}") # 打印警告而不是抛出错误
+                            log.warning("UI中缺少设置页面元素: %s", element) # 打印警告而不是抛出错误
                             # raise AttributeError(f"UI中缺少元素: {element}")
                             raise AttributeError(f"UI中缺少元素: {element}")
 
 
+        # --- 页面切换时取消不再显示页面的后台任务 ---
+        self.body.currentChanged.connect(self._cancel_hidden_page_tasks)
+
         # --- 页面切换连接 ---
         self.jingxiang.clicked.connect(self.show_jingxiang_page)
         self.home.clicked.connect(self.show_zhuye_page)
@@ -663,6 +1327,9 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.shuchu.clicked.connect(partial(self.open_service_url, 'shuchu'))
         if hasattr(self, 'quanbu'):
             self.quanbu.clicked.connect(partial(self.open_service_url, 'quanbu'))
+        self.service_badges = {name: ServiceBadge(getattr(self, name)) for name in SERVICE_NAMES if hasattr(self, name)}
+        self.service_prober.health_changed.connect(self._update_service_badges)
+        self.service_prober.table_changed.connect(self._update_service_badges)
         # --- 添加浏览器按钮连接 ---
         if hasattr(self, 'quanbu_2'):
             # self.quanbu_2.clicked.connect(partial(self.open_service_url, 'quanbu_2')) # 旧的连接，注释掉或删除
@@ -673,6 +1340,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.pushButton_3.clicked.connect(self.get_balance)
         self.pushButton_2.clicked.connect(self.create_recharge_order)
         self.pushButton_4.clicked.connect(self.query_recharge_order)
+        self.listWidget_4.itemDoubleClicked.connect(self._reopen_recharge_qr)
         self.coffee.clicked.connect(self.show_sponsor_dialog)
 
         # --- 用户信息列表右键复制 ---
@@ -695,8 +1363,8 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         # 初始显示主页
         self.show_zhuye_page()
         if self.api_token:
-            self.get_user_info()
-            self.get_balance()
+            # 一次并发获取账户、余额、实例和镜像，各页面首次打开时直接显示
+            self.bootstrap_data()
 
         # --- 添加定时刷新 ---
         self.refresh_timer = QTimer(self)
@@ -735,83 +1403,37 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         """处理浏览器选择下拉框变化"""
         if index == 0:
             self.browser_preference = "integrated"
-            print("浏览器偏好设置为: 内置浏览器")
+            log.info("浏览器偏好设置为: 内置浏览器")
         else:
             self.browser_preference = "system"
-            print("浏览器偏好设置为: 系统浏览器")
+            log.info("浏览器偏好设置为: 系统浏览器")
         self.save_config() # 保存设置
 
     # === 主题相关方法 ===
     def change_theme(self, theme):
-        # 取消其他选项的选中状态
-        # 确保动作已在 _setup_theme_settings 中创建
-        if hasattr(self, 'system_action') and hasattr(self, 'light_action') and hasattr(self, 'dark_action'):
-            for action in [self.system_action, self.light_action, self.dark_action]:
-                action.setChecked(False)
-
-            # 设置当前选中
-            if theme == ThemeManager.System:
-                self.system_action.setChecked(True)
-            elif theme == ThemeManager.Light:
-                self.light_action.setChecked(True)
-            else: # Dark
-                self.dark_action.setChecked(True)
-        else:
-            print("警告: 主题动作尚未初始化，无法更新选中状态。")
-
-        # 应用主题
-        ThemeManager().set_theme(theme) # Calls ThemeManager.apply_theme()
-        self.update_all_styles()      # Calls self.style().polish()
-
-    def update_all_styles(self):
-        print("Updating styles...") # Debug
-        app = QApplication.instance()
-        # Re-apply the current palette (might help ensure consistency)
-        # app.setPalette(app.palette()) # Re-applying same palette might not trigger update
-        # Instead of polishing self, polish the application instance
-        app.style().unpolish(app)
-        app.style().polish(app)
-        # Also polish the main window
-        self.style().unpolish(self)
-        self.style().polish(self)
-        # Polish existing dialogs and all child widgets
-        for child in self.findChildren(QWidget): # Polish all child widgets
-            if isinstance(child, QDialog):
-                print(f"Polishing dialog: {child.windowTitle()}") # Debug
-            # 检查控件是否有可调用的style方法
-            if hasattr(child, 'style') and callable(child.style):
-                try:
-                    child.style().unpolish(child)
-                    child.style().polish(child)
-                except Exception as e:
-                    print(f"  - Failed to polish widget {child.objectName()}: {e}") # Debug
-        self.update()  # 更新当前控件
-        app.processEvents()  # 处理事件队列，确保更新可见
-
-        # 处理完事件后再次更新所有子控件
-        for child in self.findChildren(QWidget):
-            if hasattr(child, 'update') and callable(child.update):
-                try:
-                    child.update()
-                except Exception as e:
-                     print(f"  - Failed to update widget {child.objectName()}: {e}") # Debug
-
-        print("Style update finished.")  # 调试信息
+        """切换主题：更新菜单的选中状态，然后由 ThemeManager 在应用级别一次性应用"""
+        # 菜单动作在首次打开设置页面时才创建
+        if hasattr(self, 'system_action'):
+            for action, value in ((self.system_action, ThemeManager.System),
+                                  (self.light_action, ThemeManager.Light),
+                                  (self.dark_action, ThemeManager.Dark)):
+                action.setChecked(value == theme)
+        ThemeManager().set_theme(theme)
 
     def _setup_theme_settings(self):
         """添加主题设置到设置页面"""
-        print("--- Setting up theme settings ---") # 确认函数被调用
+        log.debug("--- Setting up theme settings ---") # 确认函数被调用
         # Ensure shezhi_page2 exists and is a QWidget
         if not hasattr(self, 'shezhi_page2') or not isinstance(self.shezhi_page2, QWidget):
-            print("ERROR: self.shezhi_page2 not found or not a QWidget!")
+            log.warning("self.shezhi_page2 not found or not a QWidget!")
             return
 
-        print(f"shezhi_page2 object: {self.shezhi_page2}") # 确认对象存在
+        log.debug("shezhi_page2 object: %s", self.shezhi_page2) # 确认对象存在
         page_layout = self.shezhi_page2.layout()
-        print(f"shezhi_page2 layout: {page_layout}") # 检查是否有布局
+        log.debug("shezhi_page2 layout: %s", page_layout) # 检查是否有布局
 
         if not page_layout:
-            print("ERROR: shezhi_page2 has no layout! Cannot add theme settings.")
+            log.warning("shezhi_page2 has no layout! Cannot add theme settings.")
             # Optionally, create a layout here if it's missing, though it's better fixed in Designer
             # page_layout = QVBoxLayout(self.shezhi_page2)
             # self.shezhi_page2.setLayout(page_layout)
@@ -821,20 +1443,20 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         # 查找或创建主题设置容器
         theme_frame = self.findChild(QFrame, "theme_frame")
         if not theme_frame:
-            print("Creating theme_frame...")
+            log.debug("Creating theme_frame...")
             theme_frame = QFrame(self.shezhi_page2) # Set parent
             theme_frame.setObjectName("theme_frame")
             # theme_frame.setStyleSheet("QFrame#theme_frame { background-color: red; border: 2px solid yellow; padding: 10px; min-height: 80px; }") # Removed hardcoded style
             # theme_frame.setMinimumHeight(80)
 
             layout = QVBoxLayout(theme_frame) # Set layout for the frame
-            print("Theme frame layout created.")
+            log.debug("Theme frame layout created.")
 
             # 主题设置标题
             theme_label = QLabel("外观(只能应用弹窗)")
             # theme_label.setStyleSheet("font-size: 14pt; font-weight: bold; color: white;") # Removed hardcoded style
             layout.addWidget(theme_label)
-            print(f"Theme label added: {theme_label.text()}")
+            log.debug("Theme label added: %s", theme_label.text())
 
             # 主题选择按钮
             self.theme_btn = QPushButton("选择主题")
@@ -864,50 +1486,142 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             # 添加到布局
             layout.addWidget(self.theme_btn)
             apply_shadow(self.theme_btn) # 为主题按钮添加阴影
-            print(f"Theme button added: {self.theme_btn.text()}")
+            log.debug("Theme button added: %s", self.theme_btn.text())
+
+            # API 诊断面板入口
+            self.diagnostics_btn = QPushButton("API 诊断")
+            self.diagnostics_btn.clicked.connect(self.show_diagnostics_dialog)
+            layout.addWidget(self.diagnostics_btn)
+            apply_shadow(self.diagnostics_btn)
 
             # 检查是否设置了布局到 theme_frame (QVBoxLayout constructor does this)
-            print(f"theme_frame's layout: {theme_frame.layout()}")
+            log.debug("theme_frame's layout: %s", theme_frame.layout())
 
             # 插入到现有设置页面布局
-            print(f"Inserting theme_frame into page layout ({page_layout}) at index 0...")
+            log.debug("Inserting theme_frame into page layout (%s) at index 0...", page_layout)
             page_layout.insertWidget(0, theme_frame)
             # theme_frame.show() # Generally not needed when inserted into a visible layout
-            print("Insertion done. Checking geometry...")
+            log.debug("Insertion done. Checking geometry...")
             # Force layout recalculation (might help, might not be needed)
             # self.shezhi_page2.layout().activate()
             # Give Qt a chance to process events, then check geometry
             QApplication.processEvents()
-            print(f"theme_frame.isVisible(): {theme_frame.isVisible()}")
-            print(f"theme_frame.geometry(): {theme_frame.geometry()}") # More informative than size
+            log.debug("theme_frame.isVisible(): %s", theme_frame.isVisible())
+            log.debug("theme_frame.geometry(): %s", theme_frame.geometry()) # More informative than size
 
         else:
-            print("theme_frame already exists.")
+            log.debug("theme_frame already exists.")
             # DEBUG: If it exists, ensure it's visible
             # theme_frame.setStyleSheet("QFrame#theme_frame { background-color: red; border: 2px solid yellow; padding: 10px; min-height: 80px; }") # Removed hardcoded style
             theme_frame.setVisible(True)
             QApplication.processEvents()
-            print(f"Existing theme_frame.isVisible(): {theme_frame.isVisible()}")
-            print(f"Existing theme_frame.geometry(): {theme_frame.geometry()}")
-
-    def change_theme(self, theme):
-        # 取消其他选项的选中状态
-        for action in [self.system_action, self.light_action, self.dark_action]:
-            action.setChecked(False)
-    
-        # 设置当前选中
-        if theme == ThemeManager.System:
-            self.system_action.setChecked(True)
-        elif theme == ThemeManager.Light:
-            self.light_action.setChecked(True)
-        else: # Dark
-            self.dark_action.setChecked(True)
-    
-        # 应用主题
-        ThemeManager().set_theme(theme) # Calls ThemeManager.apply_theme()
-        self.update_all_styles()      # Calls self.style().polish()
-
-
+            log.debug("Existing theme_frame.isVisible(): %s", theme_frame.isVisible())
+            log.debug("Existing theme_frame.geometry(): %s", theme_frame.geometry())
+
+    def show_diagnostics_dialog(self):
+        """打开 (或激活已打开的) API 诊断面板 (非模态)"""
+        dialog = getattr(self, 'diagnostics_dialog', None)
+        if dialog is None:
+            dialog = self.diagnostics_dialog = DiagnosticsDialog(self.api_metrics, self.api_client, self)
+        dialog.show()
+        dialog.raise_()
+        dialog.activateWindow()
+
+    @staticmethod
+    def _instance_image_key(instance_data):
+        return instance_data.get('image') or instance_data.get('image_id')
+
+    def _comfyui_group(self, group_key):
+        """同一镜像的所有运行中实例: {实例 ID: (名称, ComfyUI 地址)}；镜像未知时分组键就是实例 ID"""
+        running_statuses = ['running', '运行中']
+        group = {}
+        for inst in self.latest_instances:
+            if str(inst.get('status', '')).lower() not in running_statuses:
+                continue
+            if group_key not in (inst.get('id'), self._instance_image_key(inst)):
+                continue
+            url = build_service_url(inst.get('web_url'), self.ports.get('comfyui'))
+            if url:
+                group[inst.get('id')] = (inst.get('name') or inst.get('id'), url)
+        return group
+
+    def show_comfyui_batch_dialog(self, instance_id, instance_name, web_url, *, checked=False):
+        """打开 ComfyUI 批量出图窗口 (非模态)；同一镜像的运行中实例共用一个窗口，工作流分配到所有实例"""
+        comfyui_url = build_service_url(web_url, self.ports.get('comfyui'))
+        if not comfyui_url:
+            QMessageBox.warning(self, "URL 格式未知", f"实例的 Web URL '{web_url}' 格式无法识别，无法确定 ComfyUI 地址。")
+            return
+        instance_data = next((inst for inst in self.latest_instances if inst.get('id') == instance_id), {})
+        group_key = self._instance_image_key(instance_data) or instance_id
+        group = self._comfyui_group(group_key)
+        group.setdefault(instance_id, (instance_name, comfyui_url))
+        dialog = self.comfyui_dialogs.get(group_key)
+        if dialog is None:
+            title = instance_name if len(group) == 1 else f"{len(group)} 个实例"
+            dialog = self.comfyui_dialogs[group_key] = ComfyUIBatchDialog(title, group, self)
+        else:
+            dialog.set_instances(group)
+        dialog.show()
+        dialog.raise_()
+        dialog.activateWindow()
+
+    def _shutdown_output_sync(self):
+        for dialog in self.output_sync_dialogs.values():
+            dialog.shutdown()
+
+    def show_output_sync_dialog(self, instance_id, instance_name, web_url, *, checked=False):
+        """打开实例的输出文件同步窗口 (非模态，每个实例一个)"""
+        dialog = self.output_sync_dialogs.get(instance_id)
+        if dialog is None or dialog.web_url != web_url:
+            dialog = self.output_sync_dialogs[instance_id] = OutputSyncDialog(instance_name, web_url, self.ports, self)
+        dialog.show()
+        dialog.raise_()
+        dialog.activateWindow()
+
+    def show_upload_dialog(self, instance_name, web_url, *, checked=False):
+        """打开上传窗口，上传目标设为该实例的全部文件服务 (quanbu)"""
+        if self.upload_dialog is None:
+            self.upload_dialog = UploadDialog(self.upload_manager, self)
+        service_root = build_service_url(web_url, self.ports.get('quanbu'))
+        files_url = build_service_url(web_url, self.ports.get('quanbu'), 'quanbu')
+        upload_url = UploadManager.endpoint_for(service_root) if service_root else None
+        self.upload_dialog.set_target(instance_name, files_url, upload_url)
+        self.upload_dialog.show()
+        self.upload_dialog.raise_()
+        self.upload_dialog.activateWindow()
+
+    def open_via_ssh(self, instance_id, target, service_label, remote_port, public_url, *, checked=False):
+        """通过实例的 SSH 连接转发服务端口后打开；已有转发时直接打开"""
+        if not remote_port:
+            QMessageBox.warning(self, "端口未知", f"无法确定 {service_label} 在实例上的端口，请在设置中检查。")
+            return
+        local_port = self.ssh_manager.local_port(instance_id, remote_port)
+        if local_port is not None:
+            self.open_url(local_url(public_url, local_port))
+            return
+        self.ssh_pending_urls[(instance_id, remote_port)] = public_url
+        self.statusbar.showMessage(f"正在通过 SSH 转发 {service_label} (端口 {remote_port})...", 0)
+        self.ssh_manager.open_forward(instance_id, target, remote_port)
+
+    def _on_ssh_forward_ready(self, instance_id, remote_port, local_port):
+        public_url = self.ssh_pending_urls.pop((instance_id, remote_port), None)
+        self.statusbar.showMessage(f"SSH 转发已建立: 127.0.0.1:{local_port} -> 实例端口 {remote_port}", 5000)
+        if public_url is not None:
+            self.open_url(local_url(public_url, local_port))
+
+    def _on_ssh_forward_failed(self, instance_id, remote_port, message):
+        self.ssh_pending_urls.pop((instance_id, remote_port), None)
+        self.statusbar.showMessage(f"SSH 转发失败: {message}", 5000)
+        QMessageBox.warning(self, "SSH 转发失败", message)
+
+    def close_ssh(self, instance_id, *, checked=False):
+        self.ssh_manager.close(instance_id)
+        self.statusbar.showMessage("已断开 SSH 连接，该实例的本地转发端口已关闭", 3000)
+
+    def _sync_comfyui_dialogs(self):
+        """实例列表刷新后更新各批量出图窗口的实例 (关机的实例退出调度)"""
+        for group_key, dialog in self.comfyui_dialogs.items():
+            dialog.set_instances(self._comfyui_group(group_key))
 
     # --- 令牌管理 ---
     def load_token(self):
@@ -929,65 +1643,62 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         except json.JSONDecodeError:
             QMessageBox.warning(self, "配置错误", f"无法解析配置文件 {CONFIG_FILE}")
             self.radioButton.setChecked(False)
-            self.custom_public_images = [] # 加载失败则清空
+            self.custom_images = CustomImageRegistry() # 加载失败则清空
         except Exception as e:
             QMessageBox.warning(self, "加载配置错误", f"加载配置时出错: {e}")
             self.radioButton.setChecked(False)
-            self.custom_public_images = [] # 加载失败则清空
+            self.custom_images = CustomImageRegistry() # 加载失败则清空
             self.ports = { # 加载失败，使用默认端口
                 "comfyui": 8188, "fengzhuang": 7861, "fluxgym": 7860,
                 "shuchu": 8080, "quanbu": 8081
             }
 
     def save_config(self):
-        """使用 QSettings 保存配置"""
-        settings = QSettings()
-        settings.setValue("api_token", self.lingpai.text() if self.radioButton.isChecked() else None)
-        settings.setValue("remember_token", self.radioButton.isChecked())
+        """更新内存配置；ConfigStore 会在防抖间隔后批量写入 QSettings"""
+        self.config.set_value("api_token", self.lingpai.text() if self.radioButton.isChecked() else None)
+        self.config.set_value("remember_token", self.radioButton.isChecked())
         # QSettings 可以保存列表和字典
-        settings.setValue("custom_public_images", self.custom_public_images)
-        settings.setValue("ports", self.ports)
-        settings.setValue("browser_preference", self.browser_preference) # <--- 保存浏览器偏好
+        self.config.set_value("custom_public_images", self.custom_images.to_list())
+        for port_name, port_value in self.ports.items():
+            self.config.set_port(port_name, port_value) # 端口在 save_port_setting 中已校验
+        self.config.set_value("browser_preference", self.browser_preference) # <--- 保存浏览器偏好
         # 主题由 ThemeManager 单独保存，这里不再重复保存
-        # settings.setValue("theme", ThemeManager().current_theme)
-        settings.sync() # 确保写入磁盘
-        print("配置已使用 QSettings 保存")
 
     def show_shezhi_page(self):
         """显示设置页面并加载当前端口配置"""
-        print("--- Entering show_shezhi_page ---") # Debug
+        log.debug("--- Entering show_shezhi_page ---")
         self.update_button_state(self.settings)
         self.body.setCurrentWidget(self.shezhi_page2)
 
         page_layout = self.shezhi_page2.layout()
         if not page_layout:
-            print("CRITICAL ERROR: shezhi_page2 has no layout! Cannot add settings.")
+            log.error("shezhi_page2 has no layout! Cannot add settings.")
             # Attempt to create a layout (though this indicates a deeper issue)
             page_layout = QVBoxLayout(self.shezhi_page2)
             self.shezhi_page2.setLayout(page_layout)
-            print("WARNING: Dynamically added QVBoxLayout to shezhi_page2.")
+            log.warning("Dynamically added QVBoxLayout to shezhi_page2.")
             # If we added a layout, continue, otherwise return or raise error
             if not page_layout:
-                print("CRITICAL ERROR: Failed to ensure layout for shezhi_page2.")
+                log.error("Failed to ensure layout for shezhi_page2.")
                 return # Cannot proceed
 
-        print(f"Initial page_layout count: {page_layout.count()}") # Debug
+        log.debug("Initial page_layout count: %s", page_layout.count())
 
         # Call theme setup FIRST
         self._setup_theme_settings() # Adds theme frame at index 0 if needed
-        print(f"Page_layout count after theme setup: {page_layout.count()}") # Debug
+        log.debug("Page_layout count after theme setup: %s", page_layout.count())
         theme_frame_widget = self.findChild(QFrame, "theme_frame") # Re-find after potential creation
         if theme_frame_widget:
-             print(f"Theme frame found: visible={theme_frame_widget.isVisible()}, geometry={theme_frame_widget.geometry()}")
+             log.debug("Theme frame found: visible=%s, geometry=%s", theme_frame_widget.isVisible(), theme_frame_widget.geometry())
         else:
-             print("Theme frame NOT found after setup.")
+             log.debug("Theme frame NOT found after setup.")
 
 
         # --- 添加浏览器选择控件 ---
         browser_frame = self.findChild(QFrame, "browser_settings_frame")
 
         if not browser_frame:
-            print("Creating browser_settings_frame...")
+            log.debug("Creating browser_settings_frame...")
             browser_frame = QFrame(self.shezhi_page2) # Parent is the page itself
             browser_frame.setObjectName("browser_settings_frame")
             # browser_frame.setStyleSheet("QFrame#browser_settings_frame { border: 1px solid lime; padding: 5px; }") # Debug style
@@ -1006,13 +1717,13 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             apply_shadow(self.browser_combo)
 
             # --- Simplified Add Widget Logic ---
-            print(f"Adding NEW browser_settings_frame to page layout (at the end)") # Debug
+            log.debug("Adding NEW browser_settings_frame to page layout (at the end)")
             page_layout.addWidget(browser_frame)
             # --- End Simplified Add Widget Logic ---
 
         else:
             # Frame exists, update its value and ensure visibility
-            print("browser_settings_frame already exists. Updating value and visibility.")
+            log.debug("browser_settings_frame already exists. Updating value and visibility.")
             if hasattr(self, 'browser_combo'):
                 current_index = 1 if self.browser_preference == "system" else 0
                 if self.browser_combo.currentIndex() != current_index:
@@ -1042,7 +1753,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         page_layout = self.shezhi_page2.layout() # Get layout *after* theme setup potentially modified it
 
         if not page_layout:
-            print("严重错误: 设置页面 (shezhi_page2) 没有布局。无法添加任何设置。")
+            log.error("设置页面 (shezhi_page2) 没有布局。无法添加任何设置。")
             # Maybe try to add a default layout?
             # page_layout = QVBoxLayout(self.shezhi_page2)
             # self.shezhi_page2.setLayout(page_layout)
@@ -1051,7 +1762,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             if not page_layout: return # Cannot proceed
 
         if not browser_frame:
-            print("Creating browser_settings_frame...") # Debug
+            log.debug("Creating browser_settings_frame...")
             browser_frame = QFrame(self.shezhi_page2)
             browser_frame.setObjectName("browser_settings_frame")
             # browser_frame.setStyleSheet("QFrame#browser_settings_frame { border: 1px solid red; padding: 5px; }") # Debug style
@@ -1071,14 +1782,14 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             browser_layout.addStretch()
 
             # --- Simplified Add Widget Logic ---
-            print(f"Adding NEW browser_settings_frame to page layout (at the end)") # Debug
+            log.debug("Adding NEW browser_settings_frame to page layout (at the end)")
             page_layout.addWidget(browser_frame)
             # --- End Simplified Add Widget Logic ---
 
             apply_shadow(self.browser_combo)
         else:
             # Frame exists, update its value and ensure visibility
-            print("browser_settings_frame already exists. Updating value and visibility.") # Debug
+            log.debug("browser_settings_frame already exists. Updating value and visibility.")
             if hasattr(self, 'browser_combo'):
                 current_index = 1 if self.browser_preference == "system" else 0
                 if self.browser_combo.currentIndex() != current_index:
@@ -1097,17 +1808,15 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             # Force layout update maybe?
             # page_layout.activate()
             # QApplication.processEvents()
-            print(f"Existing browser_frame.isVisible(): {browser_frame.isVisible()}") # Debug
-            print(f"Existing browser_frame.geometry(): {browser_frame.geometry()}") # Debug
+            log.debug("Existing browser_frame.isVisible(): %s", browser_frame.isVisible())
+            log.debug("Existing browser_frame.geometry(): %s", browser_frame.geometry())
 
 
     def load_config(self):
-        """使用 QSettings 加载配置"""
-        settings = QSettings()
-
+        """从 ConfigStore (启动时已读入内存) 加载配置"""
         # 加载令牌
-        saved_token = settings.value("api_token")
-        remember_token = settings.value("remember_token", False, type=bool) # 指定类型和默认值
+        saved_token = self.config.get_str("api_token", None)
+        remember_token = self.config.get_bool("remember_token", False)
 
         if saved_token and remember_token:
             self.api_token = saved_token
@@ -1120,53 +1829,32 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.api_token = None # 确保清除
             self.lingpai.clear() # 清空输入框
 
-        # 加载自定义镜像列表
-        loaded_images = settings.value("custom_public_images", []) # 提供默认空列表
-        # QSettings 返回的可能是 QVariantList 或其他类型，需要确保是 Python list of dicts/strs
-        if isinstance(loaded_images, list):
-             # 进一步验证列表内容是否符合预期 (字典或字符串)
-             self.custom_public_images = [img for img in loaded_images if isinstance(img, (dict, str))]
-             if len(self.custom_public_images) != len(loaded_images):
-                 print("警告：从 QSettings 加载的 custom_public_images 列表中包含无效类型的数据。")
-        else:
-             print(f"警告：从 QSettings 加载的 custom_public_images 类型不是 list: {type(loaded_images)}")
-             self.custom_public_images = []
+        if self.offline:
+            # 回放不校验令牌；占位令牌只存在于内存中，不会写入配置
+            if not self.api_token:
+                self.api_token = OFFLINE_TOKEN
+                self.api_handler.set_access_token(OFFLINE_TOKEN)
+            self.statusbar.showMessage("离线模式：API 响应来自录制文件", 5000)
 
+        # 加载自定义镜像列表
+        loaded_images = self.config.get_list("custom_public_images")
+        # 旧的字符串条目和字典条目统一为 {'id', 'name'} 记录，无效条目被丢弃
+        self.custom_images = CustomImageRegistry(loaded_images)
+        if len(self.custom_images) != len(loaded_images):
+            log.warning("从 QSettings 加载的 custom_public_images 列表中包含无效或重复的数据。")
 
-        # 加载端口配置
-        loaded_ports = settings.value("ports", {}) # 提供默认空字典
-        default_ports = {
-            "comfyui": 8188, "fengzhuang": 7861, "fluxgym": 7860,
-            "shuchu": 8080, "quanbu": 8081
-        }
-        self.ports = default_ports.copy()
-        # 确保加载的是字典且值是整数
-        if isinstance(loaded_ports, dict):
-            valid_loaded_ports = {}
-            for key, value in loaded_ports.items():
-                # 尝试将值转换为整数，处理可能的类型问题
-                try:
-                    port_int = int(value)
-                    if isinstance(key, str) and 0 < port_int < 65536: # 检查 key 类型和端口范围
-                         valid_loaded_ports[key] = port_int
-                    else:
-                         print(f"警告：从 QSettings 加载的端口配置 '{key}': '{value}' 无效 (类型或范围错误)，已忽略。")
-                except (ValueError, TypeError):
-                     print(f"警告：从 QSettings 加载的端口值 '{key}': '{value}' 无法转换为整数，已忽略。")
-            self.ports.update(valid_loaded_ports)
-        else:
-            print(f"警告：从 QSettings 加载的 ports 类型不是 dict: {type(loaded_ports)}")
-            # 保留默认端口
+        # 加载端口配置 (写入时已校验，缺失的端口使用默认值)
+        self.ports = self.config.get_ports()
 
         # 主题由 ThemeManager 单独加载，这里不再处理
         # theme = settings.value("theme", ThemeManager.System, type=int)
         # self.change_theme(theme)
 
         # 加载浏览器偏好设置
-        self.browser_preference = settings.value("browser_preference", "integrated") # 默认内置
-        print(f"加载的浏览器偏好: {self.browser_preference}")
+        self.browser_preference = self.config.get_str("browser_preference", "integrated") # 默认内置
+        log.debug("加载的浏览器偏好: %s", self.browser_preference)
 
-        print("配置已从 QSettings 加载")
+        log.debug("配置已从 QSettings 加载")
 
     def confirm_token(self):
         token = self.lingpai.text().strip()
@@ -1177,8 +1865,8 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.api_handler.set_access_token(token) # <--- 设置 Handler 的令牌
         self.statusbar.showMessage("访问令牌已设置", 3000)
         self.save_config() # <--- 保存配置 (包括令牌状态)
-        self.get_user_info()
-        self.get_balance()
+        self.snapshots.clear() # 令牌变化，旧数据作废
+        self.bootstrap_data()
         self.show_zhanghao_page() 
 
     def clear_token(self):
@@ -1187,6 +1875,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.api_handler.set_access_token(None) # <--- 清除 Handler 的令牌
         self.radioButton.setChecked(False)
         self.save_config() # <--- 保存配置 (清除令牌状态)
+        self.snapshots.clear()
         self.statusbar.showMessage("访问令牌已清除", 3000)
         self.listWidget.item(0).setText(" 昵称：")
         self.listWidget.item(1).setText(" uuid:")
@@ -1194,47 +1883,149 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.listWidget_2.item(0).setText(" 余额：")
 
     # --- 异步 API 调用封装 ---
-    def _run_task(self, api_call, success_handler, error_handler=None, finished_handler=None, *args, **kwargs):
-        """通用函数，用于在后台线程中运行 API 调用"""
+    def _run_task(self, api_call, success_handler, error_handler=None, finished_handler=None, *args,
+                  task_timeout=None, page=None, lane=None, **kwargs):
+        """
+        通用函数，用于在共享的 API 线程池中运行 API 调用，返回 TaskHandle。
+        :param task_timeout: 超时秒数，超时后按错误处理
+        :param page: 任务所属页面；切换离开该页面时任务被取消，结果在更新界面前丢弃
+        :param lane: 优先级通道；默认属于页面的读取走 LANE_NORMAL，其余 (用户操作) 走 LANE_HIGH，
+                     定时刷新和预取应显式传入 LANE_LOW
+        """
         if not self.api_token:
             self.statusbar.showMessage("错误：请先设置访问令牌", 3000)
             if error_handler:
                 error_handler("访问令牌未设置") # 调用错误处理
             return
 
-        worker = Worker(api_call, *args, **kwargs)
-        worker.signals.success.connect(success_handler)
+        if lane is None:
+            lane = LANE_NORMAL if page is not None else LANE_HIGH
+        return self._run_coroutine(self.api_client.call_in_lane(lane, api_call, *args, **kwargs),
+                                   success_handler, error_handler, finished_handler,
+                                   task_timeout=task_timeout, page=page,
+                                   name=getattr(api_call, '__name__', ''))
+
+    def _run_coroutine(self, coro, success_handler, error_handler=None, finished_handler=None,
+                       task_timeout=None, page=None, name=""):
+        """
+        在 API 事件循环中运行协程 (其中可以 await self.api_client.xxx())，
+        结果通过 TaskHandle 的信号回到主线程。
+        """
+        is_relevant = (lambda: self.body.currentWidget() is page) if page is not None else None
+        handle = TaskHandle(name=name, timeout=task_timeout, is_relevant=is_relevant) # 在主线程创建
+        handle.success.connect(success_handler)
         # 使用通用的错误处理或特定的错误处理
-        worker.signals.error.connect(error_handler if error_handler else self._handle_api_error)
+        handle.error.connect(error_handler if error_handler else self._handle_api_error)
         if finished_handler:
-            worker.signals.finished.connect(finished_handler)
+            handle.finished.connect(finished_handler)
+        # 完成时从线程池和页面任务表中移除
+        handle.finished.connect(lambda h=handle: self._forget_task(h))
+        self.thread_pool.append(handle) # 保留引用直到完成
+        if page is not None:
+            self.page_tasks.setdefault(page, []).append(handle)
+        return handle.start(self.api_client.loop_thread, coro)
+
+    def _forget_task(self, handle):
+        if handle in self.thread_pool:
+            self.thread_pool.remove(handle)
+        for tasks in self.page_tasks.values():
+            if handle in tasks:
+                tasks.remove(handle)
+
+    def _cancel_hidden_page_tasks(self, index):
+        """body 切换页面时取消其他页面的后台任务"""
+        current = self.body.widget(index)
+        for page, tasks in self.page_tasks.items():
+            if page is current:
+                continue
+            for handle in list(tasks):
+                if handle.cancel():
+                    self.statusbar.clearMessage() # 清除 "正在获取..." 之类的持续提示
+
+    def _update_api_status_label(self, state, retry_in):
+        """在状态栏右侧显示熔断器状态 (正常时不显示)"""
+        if state == CircuitBreaker.OPEN:
+            self.api_status_label.setText(f"⛔ API 熔断中 ({retry_in:.0f} 秒后探测)")
+            self.api_status_label.setStyleSheet("color: #e53e3e;")
+        elif state == CircuitBreaker.HALF_OPEN:
+            self.api_status_label.setText("⚠ API 探测恢复中")
+            self.api_status_label.setStyleSheet("color: #dd6b20;")
         else:
-            # 默认完成时从线程池移除
-             worker.signals.finished.connect(lambda w=worker: self.thread_pool.remove(w) if w in self.thread_pool else None)
-
-
-        self.thread_pool.append(worker) # 保留引用
-        worker.start()
-        return worker # 可以返回 worker 实例以便于管理 (例如取消)
+            self.api_status_label.setText("")
+            self.api_status_label.setStyleSheet("")
 
     def _handle_api_error(self, error_message):
         """通用的 API 错误处理"""
-        print(f"API Error Handler: {error_message}") # 调试信息
+        log.warning("API Error Handler: %s", error_message)
         QMessageBox.warning(self, "API 错误", f"操作失败: {error_message}")
         self.statusbar.showMessage(f"操作失败: {error_message}", 5000)
         # 可能需要在这里重置一些 UI 状态，例如重新启用按钮
 
+    # --- 启动预取 ---
+    def bootstrap_data(self):
+        """在一个任务中并发获取账户信息、余额、实例和镜像列表，结果写入快照并绘制各页面"""
+        if self.is_bootstrapping or not self.api_token:
+            return
+        self.is_bootstrapping = True
+        # 预取期间打开实例/镜像页面不重复请求，预取完成后页面直接显示结果
+        self.is_refreshing_instances = True
+        self.is_refreshing_images = True
+        revalidate = partial(self.image_cache.revalidate, fetch=self.api_handler.get_images, token=self.api_token)
+        revalidate.api_endpoint = "get_images"
+        fetchers = {
+            WHOAMI: self.api_handler.get_whoami,
+            BALANCE: self.api_handler.get_balance,
+            INSTANCES: self.api_handler.get_instances,
+            IMAGES: revalidate,
+        }
+        self.statusbar.showMessage("正在加载账户数据...", 0)
+        self._run_coroutine(bootstrap(self.api_client, fetchers, LANE_NORMAL),
+                            self._handle_bootstrap_success, error_handler=self._handle_bootstrap_error,
+                            finished_handler=self._handle_bootstrap_finished, name="bootstrap")
+
+    def _handle_bootstrap_success(self, results):
+        """各项结果交给对应的处理函数 (与单独获取时相同)"""
+        self.statusbar.clearMessage()
+        for key, result in results.items():
+            if isinstance(result, Exception):
+                log.warning("启动预取 %s 失败: %s", key, result)
+        if not isinstance(results.get(WHOAMI), Exception):
+            self._handle_get_user_info_success(results[WHOAMI])
+        if not isinstance(results.get(BALANCE), Exception):
+            self._handle_get_balance_success(results[BALANCE])
+        # 列表获取失败时不在页面上显示错误，打开页面时会重新获取
+        if is_success(results.get(INSTANCES)):
+            self._handle_get_instances_success(results[INSTANCES])
+        if is_success(results.get(IMAGES)):
+            self._handle_get_images_success(results[IMAGES])
+
+    def _handle_bootstrap_error(self, error_message):
+        log.warning("启动预取失败: %s", error_message)
+        self.statusbar.showMessage(f"加载账户数据失败: {error_message}", 5000)
+
+    def _handle_bootstrap_finished(self):
+        self.is_bootstrapping = False
+        self.is_refreshing_instances = False
+        self.is_refreshing_images = False
+        # 预取期间已打开的页面如果没有得到数据，现在补充获取
+        current = self.body.currentWidget()
+        if current is self.shili_page6 and not self.snapshots.is_fresh(INSTANCES):
+            self.get_and_display_instances_async()
+        elif current is self.jingxiang_page7 and not self.snapshots.is_fresh(IMAGES):
+            self.get_and_display_images_async()
+
     # --- 功能实现 (改为异步) ---
-    def get_user_info(self):
+    def get_user_info(self, *, lane=None):
         """异步获取用户信息"""
         self.statusbar.showMessage("正在获取用户信息...", 2000)
-        self._run_task(self.api_handler.get_whoami, self._handle_get_user_info_success)
+        self._run_task(self.api_handler.get_whoami, self._handle_get_user_info_success, lane=lane)
 
     def _handle_get_user_info_success(self, result):
         """处理获取用户信息成功的结果"""
         if result and result.get("success"):
             data = result.get("data", {})
             # 检查 data 是否存在且非空
+            self.snapshots.put(WHOAMI, result)
             if data:
                 self.listWidget.item(0).setText(f" 昵称：{data.get('nickname', 'N/A')}")
                 self.listWidget.item(1).setText(f" uuid: {data.get('uuid', 'N/A')}")
@@ -1249,7 +2040,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         else:
             # 处理 API 调用失败或业务逻辑未成功的情况
             error_msg = result.get("msg", "无法获取用户信息") if result else "无法连接或获取响应" # 处理 result 为 None 的情况
-            print(f"获取用户信息失败: {error_msg}") # 打印错误信息到控制台
+            log.warning("获取用户信息失败: %s", error_msg) # 打印错误信息到控制台
 
             # --- 新增：根据错误消息判断原因 ---
             display_msg = f"获取用户信息失败: {error_msg}" # 默认显示原始错误
@@ -1279,21 +2070,22 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.listWidget.item(1).setText(" uuid: 获取失败")
             self.listWidget.item(2).setText(" 电话：获取失败")
 
-    def get_balance(self):
-        """异步获取账户余额"""
+    def get_balance(self, *, lane=None):
+        """异步获取账户余额 (关键字参数避免 clicked 信号的 checked 被当作 lane)"""
         self.statusbar.showMessage("正在获取账户余额...", 2000)
-        self._run_task(self.api_handler.get_balance, self._handle_get_balance_success)
+        self._run_task(self.api_handler.get_balance, self._handle_get_balance_success, lane=lane)
 
     def _handle_get_balance_success(self, result):
         """处理获取余额成功的结果"""
         if result and result.get("success"):
             data = result.get("data", {})
             balance_str = f"{data.get('balance', 0.0):.6f}"
+            self.snapshots.put(BALANCE, result)
             self.listWidget_2.item(0).setText(f" 余额：{balance_str}")
             self.statusbar.showMessage("账户余额已更新", 3000)
         else:
             error_msg = result.get("msg", "无法获取余额")
-            print(f"获取余额失败: {error_msg}")
+            log.warning("获取余额失败: %s", error_msg)
             self.statusbar.showMessage(f"获取余额失败: {error_msg}", 5000)
             self.listWidget_2.item(0).setText(" 余额：获取失败")
 
@@ -1332,19 +2124,20 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             if not url:
                 QMessageBox.warning(self, "订单信息不完整", "API 未返回支付信息 (URL/二维码内容)")
                 return
+            trade_no = self.last_trade_no
             if payment_returned == 'wechat':
-                try:
-                    qr_img = qrcode.make(url)
-                    buffer = io.BytesIO(); qr_img.save(buffer, "PNG"); buffer.seek(0)
-                    qr_pixmap = QPixmap(); qr_pixmap.loadFromData(buffer.getvalue())
-                    qr_dialog = QRCodeDialog(qr_pixmap, self); qr_dialog.exec()
-                    self.statusbar.showMessage("请扫描微信二维码完成支付", 5000)
-                except Exception as e:
-                    QMessageBox.critical(self, "生成二维码错误", f"无法生成或显示微信支付二维码: {e}")
+                if trade_no:
+                    self.recharge_watcher.watch(trade_no, amount_returned, payment_returned, url)
+                # 二维码在后台生成，完成后由 _show_recharge_qr 显示
+                self.qr_requests[url] = trade_no
+                self.statusbar.showMessage("正在生成微信支付二维码...", 3000)
+                self.qr_renderer.request(url)
             elif payment_returned == 'alipay':
                 reply = QMessageBox.information(self, "订单创建成功", f"订单创建成功！\n交易号: {self.last_trade_no}\n金额: {amount_returned}\n支付方式: {payment_returned}\n\n点击 'OK' 将打开支付页面。", QMessageBox.StandardButton.Ok | QMessageBox.StandardButton.Cancel)
                 if reply == QMessageBox.StandardButton.Ok:
                     self.open_url(url)
+                    if trade_no: # 支付页面在浏览器中，无法知道何时关闭，由跟踪器按时间放慢查询
+                        self.recharge_watcher.watch(trade_no, amount_returned, payment_returned)
             else:
                 QMessageBox.warning(self, "未知支付方式", f"不支持的支付方式: {payment_returned}")
         else:
@@ -1365,6 +2158,12 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         if not self.last_trade_no:
             QMessageBox.information(self, "无法查询", "没有可查询的最近充值订单号。请先成功发起一笔充值。")
             return
+        order = self.recharge_watcher.orders.get(self.last_trade_no)
+        if order is not None and order.state == ORDER_PENDING:
+            # 订单正在后台跟踪：立即查询一次，结果显示在订单列表中，不阻塞按钮
+            self.recharge_watcher.poll_now(self.last_trade_no)
+            self.statusbar.showMessage(f"正在查询订单 {self.last_trade_no}...", 2000)
+            return
 
         # 禁用按钮
         self.pushButton_4.setEnabled(False)
@@ -1410,6 +2209,68 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.statusbar.showMessage(f"订单查询失败: {error_message}", 5000)
 
 
+    def _show_recharge_qr(self, url, image):
+        """二维码生成完成 (或命中缓存) 后显示支付窗口"""
+        if url not in self.qr_requests:
+            return
+        trade_no = self.qr_requests.pop(url)
+        if trade_no in self.qr_dialogs: # 该订单的二维码已经打开
+            return
+        qr_dialog = QRCodeDialog(QPixmap.fromImage(image), self, trade_no=trade_no)
+        if trade_no:
+            self.qr_dialogs[trade_no] = qr_dialog
+            self.recharge_watcher.set_foreground(trade_no, True)
+        self.statusbar.showMessage("请扫描微信二维码完成支付", 5000)
+        qr_dialog.exec()
+        # 窗口关闭后继续查询 (可能刚扫码支付)，但间隔放慢
+        self.qr_dialogs.pop(trade_no, None)
+        self.recharge_watcher.set_foreground(trade_no, False)
+
+    def _on_recharge_qr_failed(self, url, error_message):
+        self.qr_requests.pop(url, None)
+        QMessageBox.critical(self, "生成二维码错误", f"无法生成或显示微信支付二维码: {error_message}")
+
+    def _reopen_recharge_qr(self, item):
+        """双击订单列表中等待支付的微信订单，重新显示二维码"""
+        order = self.recharge_watcher.orders.get(item.data(Qt.ItemDataRole.UserRole))
+        if order is None or order.state != ORDER_PENDING or order.payment != 'wechat' or not order.url:
+            return
+        self.qr_requests[order.url] = order.trade_no
+        self.qr_renderer.request(order.url)
+
+    def _on_recharge_order_updated(self, trade_no):
+        """订单跟踪器每次查询后刷新订单列表 (最新的订单在前)"""
+        self.listWidget_4.clear()
+        for order in reversed(list(self.recharge_watcher.orders.values())):
+            amount = f"  ¥{order.amount}" if order.amount is not None else ""
+            text = f"订单 {order.trade_no}{amount}  {ORDER_STATE_TEXT[order.state]}"
+            if order.message and order.state == ORDER_PENDING and order.errors:
+                text += f" ({order.message})"
+            elif order.queries:
+                text += f" (已查询 {order.queries} 次)"
+            item = QListWidgetItem(text)
+            item.setData(Qt.ItemDataRole.UserRole, order.trade_no)
+            if order.state == ORDER_PENDING and order.payment == 'wechat' and order.url:
+                item.setToolTip("双击重新显示支付二维码")
+            self.listWidget_4.addItem(item)
+        order = self.recharge_watcher.orders.get(trade_no)
+        dialog = self.qr_dialogs.get(trade_no)
+        if order is not None and dialog is not None:
+            dialog.set_status(order.message or "等待支付...")
+
+    def _on_recharge_order_finished(self, trade_no, state):
+        order = self.recharge_watcher.orders[trade_no]
+        dialog = self.qr_dialogs.pop(trade_no, None)
+        if state == ORDER_PAID:
+            if dialog is not None:
+                dialog.accept()
+            self.statusbar.showMessage(f"订单 {trade_no} 支付成功，正在刷新余额", 5000)
+            self.get_balance(lane=LANE_NORMAL) # 每笔订单只刷新一次
+        else:
+            if dialog is not None:
+                dialog.set_status(order.message)
+            self.statusbar.showMessage(f"订单 {trade_no}: {order.message}", 5000)
+
     def open_url(self, url):
         """根据偏好设置打开 URL"""
         try:
@@ -1428,7 +2289,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                          self.update_button_state(sender_button)
                 else:
                     # Fallback to system browser if integrated one is not ready
-                    print("警告: 内置浏览器未初始化，将使用系统浏览器打开。")
+                    log.warning("内置浏览器未初始化，将使用系统浏览器打开。")
                     webbrowser.open(url)
                     self.statusbar.showMessage(f"内置浏览器不可用，已在系统浏览器中打开链接", 3000)
 
@@ -1480,6 +2341,15 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         scroll_content_widget.setLayout(self.image_list_layout)
         self.image_scroll_area.setWidget(scroll_content_widget)
         page_layout.addWidget(self.image_scroll_area)
+
+        # 镜像卡片按 ID 管理，刷新时只更新变化的卡片
+        self.image_cards = KeyedCardList(self.image_list_layout, self._create_image_widget, self._update_image_widget)
+        self.image_total = 0
+        # 空列表/错误提示标签常驻在卡片之后，按需显示
+        self.image_list_message_label = QLabel("", scroll_content_widget)
+        self.image_list_message_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.image_list_message_label.setVisible(False)
+        self.image_list_layout.insertWidget(self.image_list_layout.count() - 1, self.image_list_message_label)
         # self.jingxiang_page7.setLayout(page_layout) # 这一步可能不需要，因为 page_layout 的 parent 已经是 jingxiang_page7
 
 
@@ -1488,7 +2358,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         """初始化公共镜像列表页面的滚动布局和添加区域"""
         # 检查 list_jingxiang 页面是否存在
         if not hasattr(self, 'list_jingxiang') or not isinstance(self.list_jingxiang, QWidget):
-            print("错误: UI 中未找到 list_jingxiang 页面。")
+            log.warning("UI 中未找到 list_jingxiang 页面。")
             widget = self.findChild(QWidget, "list_jingxiang")
             if widget:
                 setattr(self, 'list_jingxiang', widget)
@@ -1536,6 +2406,19 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
         page_layout.addWidget(add_frame) # 添加到主布局顶部
 
+        # --- 输入即搜的过滤框 ---
+        self.public_image_filter_input = QLineEdit(self.list_jingxiang)
+        self.public_image_filter_input.setPlaceholderText("搜索已添加的镜像 (ID 或名称)")
+        self.public_image_filter_input.setClearButtonEnabled(True)
+        self.public_image_filter_input.setStyleSheet("QLineEdit { background-color: #4a5568; border-radius: 5px; padding: 5px; color: white; }")
+        page_layout.addWidget(self.public_image_filter_input)
+        # 合并连续按键，停止输入后再过滤
+        self.public_image_filter_timer = QTimer(self)
+        self.public_image_filter_timer.setSingleShot(True)
+        self.public_image_filter_timer.setInterval(150)
+        self.public_image_filter_timer.timeout.connect(self.apply_public_image_filter)
+        self.public_image_filter_input.textChanged.connect(self.public_image_filter_timer.start)
+
         # --- 镜像列表滚动区域 ---
         self.public_image_scroll_area = QScrollArea(self.list_jingxiang)
         self.public_image_scroll_area.setWidgetResizable(True)
@@ -1557,15 +2440,10 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
     # --- 公共镜像相关方法 ---
 
-    def _create_public_image_widget(self, image_data, is_custom=False):
-        """为单个公共/社区镜像数据创建显示部件 (QFrame)"""
-        # image_data 可以是字符串 (旧格式) 或字典 {'id': ..., 'name': ...}
-        if isinstance(image_data, dict):
-            image_id = image_data.get('id', 'N/A')
-            image_name = image_data.get('name') # 可能为 None
-        else: # 兼容旧的字符串列表格式
-            image_id = str(image_data)
-            image_name = None
+    def _create_public_image_widget(self, image_record, is_custom=False):
+        """为单个公共/社区镜像记录 {'id': ..., 'name': ...} 创建显示部件 (QFrame)"""
+        image_id = image_record.get('id', 'N/A')
+        image_name = image_record.get('name') # 可能为 None
 
         frame = QFrame()
         frame.setObjectName(f"public_image_frame_{image_id}")
@@ -1622,7 +2500,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             delete_button = QPushButton("删除")
             delete_button.setIcon(QIcon(":/ico/ico/trash-2.svg"))
             delete_button.setStyleSheet("QPushButton { background-color: #e53e3e; border-radius: 5px; padding: 5px 10px; color: white; min-width: 60px; } QPushButton:hover { background-color: #c53030; } QPushButton:pressed { background-color: #9b2c2c; }")
-            delete_button.clicked.connect(partial(self.delete_custom_public_image, image_id, frame))
+            delete_button.clicked.connect(partial(self.delete_custom_public_image, image_id))
             apply_shadow(delete_button) # 为删除按钮添加阴影
             layout.addWidget(delete_button)
         else:
@@ -1632,30 +2510,20 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         return frame
 
     def get_and_display_public_images(self):
-        """加载并显示开发者预设和用户自定义的公共/社区镜像"""
-        # 清空旧的镜像部件
-        while self.public_image_list_layout.count() > 1: # 保留最后的 stretch item
-            item = self.public_image_list_layout.takeAt(0)
-            widget = item.widget()
-            if widget:
-                widget.deleteLater()
-
-        # --- 开发者预设镜像 (硬编码) ---
-        # !!! 请在这里添加开发者预设的公共/社区镜像 ID !!!
-        developer_images = [
-            {"id": "7b36c1a3-da41-4676-b5b3-03ec25d6e197", "description": "软件作者(推荐): h开发者的镜像 更新于 2025-03-31_160.86GB 镜像描述: free；永久免费，持续开发"},
-            # {"id": "another-preset-id", "description": "另一个预设镜像描述"},
-        ]
+        """显示开发者预设和用户自定义的公共/社区镜像 (只在首次进入页面时构建，之后增量更新)"""
+        if getattr(self, '_public_images_built', False):
+            self.apply_public_image_filter()
+            return
 
         # 显示开发者预设镜像
-        for img_data in developer_images:
+        for img_data in DEVELOPER_IMAGES:
             # 可以创建一个更复杂的部件来显示描述信息，这里先用简单的
             desc_label = QLabel(img_data["description"])
             desc_label.setStyleSheet("color: #a0aec0; padding-left: 5px; font-size: 9pt;")
             desc_label.setWordWrap(True)
             self.public_image_list_layout.insertWidget(self.public_image_list_layout.count() - 1, desc_label)
 
-            image_widget = self._create_public_image_widget(img_data["id"], is_custom=False) # is_custom=False
+            image_widget = self._create_public_image_widget({"id": img_data["id"]}, is_custom=False) # is_custom=False
             self.public_image_list_layout.insertWidget(self.public_image_list_layout.count() - 1, image_widget)
             # 添加分隔线
             line = QFrame()
@@ -1664,27 +2532,52 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             line.setStyleSheet("color: #4a5568;")
             self.public_image_list_layout.insertWidget(self.public_image_list_layout.count() - 1, line)
 
+        # --- 用户自定义镜像 (标题和空列表提示常驻，按需显示/隐藏) ---
+        self.custom_images_title = QLabel("--- 用户添加的镜像 ---")
+        self.custom_images_title.setStyleSheet("color: #cbd5e0; font-size: 10pt; margin-top: 10px; margin-bottom: 5px;")
+        self.custom_images_title.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.public_image_list_layout.insertWidget(self.public_image_list_layout.count() - 1, self.custom_images_title)
+
+        self.no_custom_images_label = QLabel("您还没有添加自定义镜像", self.public_image_scroll_area.widget())
+        self.no_custom_images_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.no_custom_images_label.setStyleSheet("color: #718096; margin-top: 10px;") # 灰色提示
+        self.public_image_list_layout.insertWidget(self.public_image_list_layout.count() - 1, self.no_custom_images_label)
+
+        content = self.public_image_scroll_area.widget()
+        content.setUpdatesEnabled(False) # 批量插入期间暂停重绘
+        for image_record in self.custom_images:
+            self._insert_public_image_row(image_record)
+        content.setUpdatesEnabled(True)
+
+        self._public_images_built = True
+        self._update_custom_images_placeholder()
+        self.apply_public_image_filter()
+        self.statusbar.showMessage("公共镜像列表已加载", 3000)
 
-        # --- 用户自定义镜像 ---
-        if self.custom_public_images:
-            custom_title = QLabel("--- 用户添加的镜像 ---")
-            custom_title.setStyleSheet("color: #cbd5e0; font-size: 10pt; margin-top: 10px; margin-bottom: 5px;")
-            custom_title.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.public_image_list_layout.insertWidget(self.public_image_list_layout.count() - 1, custom_title)
+    def _insert_public_image_row(self, image_record):
+        """在列表末尾 (stretch 之前) 插入单个自定义镜像行"""
+        row = self._create_public_image_widget(image_record, is_custom=True)
+        self.public_image_list_layout.insertWidget(self.public_image_list_layout.count() - 1, row)
+        self.public_image_rows[image_record['id']] = row
+        return row
 
-            # 遍历用户自定义镜像列表 (现在可能是字典列表或旧的字符串列表)
-            for image_data in self.custom_public_images:
-                # 传递整个 image_data (可能是 dict 或 str) 给创建函数
-                image_widget = self._create_public_image_widget(image_data, is_custom=True)
-                self.public_image_list_layout.insertWidget(self.public_image_list_layout.count() - 1, image_widget)
-        else:
-             no_custom_label = QLabel("您还没有添加自定义镜像", self.public_image_scroll_area.widget())
-             no_custom_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-             no_custom_label.setStyleSheet("color: #718096; margin-top: 10px;") # 灰色提示
-             self.public_image_list_layout.insertWidget(self.public_image_list_layout.count() - 1, no_custom_label)
+    def _update_custom_images_placeholder(self):
+        """根据是否有自定义镜像切换标题和空列表提示"""
+        has_custom = len(self.custom_images) > 0
+        self.custom_images_title.setVisible(has_custom)
+        self.no_custom_images_label.setVisible(not has_custom)
 
-
-        self.statusbar.showMessage("公共镜像列表已加载", 3000)
+    @Slot()
+    def apply_public_image_filter(self):
+        """按过滤框中的文本显示/隐藏自定义镜像行 (开发者预设镜像始终显示)"""
+        if not self.public_image_rows:
+            return
+        text = self.public_image_filter_input.text()
+        content = self.public_image_scroll_area.widget()
+        content.setUpdatesEnabled(False)
+        for image_id, row in self.public_image_rows.items():
+            row.setVisible(not text.strip() or self.custom_images.matches(image_id, text))
+        content.setUpdatesEnabled(True)
 
     def add_custom_public_image(self):
         """添加用户输入的公共/社区镜像 ID 和名称"""
@@ -1696,65 +2589,40 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             return
 
         # 检查 ID 是否已存在 (包括开发者预设和用户自定义的)
-        developer_ids = ["7b36c1a3-da41-4676-b5b3-03ec25d6e197"] # !!! 和上面保持一致 !!!
-        # 检查用户自定义列表中的 ID
-        existing_custom_ids = [img.get('id') for img in self.custom_public_images if isinstance(img, dict)]
-        if image_id in existing_custom_ids or image_id in developer_ids:
+        image_record = self.custom_images.add(image_id, image_name)
+        if image_record is None:
             QMessageBox.information(self, "提示", f"镜像 ID '{image_id}' 已存在列表中")
             return
-
-        # 创建新的镜像条目 (字典)
-        new_image_entry = {"id": image_id}
-        if image_name: # 如果用户输入了名称，则添加
-            new_image_entry["name"] = image_name
-
-        # 添加到列表并保存配置
-        # 确保 self.custom_public_images 是列表
-        if not isinstance(self.custom_public_images, list):
-            self.custom_public_images = [] # 如果不是列表（例如旧配置是None），则初始化
-        self.custom_public_images.append(new_image_entry)
         self.save_config()
 
-        # 清空输入框并刷新列表
+        # 清空输入框，只插入新的一行
         self.custom_image_id_input.clear()
         self.custom_image_name_input.clear()
-        self.get_and_display_public_images()
+        if getattr(self, '_public_images_built', False):
+            row = self._insert_public_image_row(image_record)
+            text = self.public_image_filter_input.text()
+            row.setVisible(not text.strip() or self.custom_images.matches(image_id, text))
+            self._update_custom_images_placeholder()
+        else:
+            self.get_and_display_public_images()
         self.statusbar.showMessage(f"已添加镜像 ID: {image_id}" + (f" (名称: {image_name})" if image_name else ""), 3000)
 
-    def delete_custom_public_image(self, image_id, widget_to_remove):
+    def delete_custom_public_image(self, image_id):
         """删除用户添加的自定义镜像 ID"""
         reply = QMessageBox.question(self, "确认删除", f"您确定要从列表中删除镜像 ID '{image_id}' 吗？\n（这不会销毁实际镜像，只是从您的收藏中移除）",
                                      QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
                                      QMessageBox.StandardButton.No)
 
         if reply == QMessageBox.StandardButton.Yes:
-            # 查找要删除的镜像条目
-            image_to_remove = None
-            # 确保 self.custom_public_images 是列表
-            if not isinstance(self.custom_public_images, list):
-                self.custom_public_images = []
-
-            for img_data in self.custom_public_images:
-                current_id = None
-                if isinstance(img_data, dict):
-                    current_id = img_data.get('id')
-                elif isinstance(img_data, str): # 兼容旧格式
-                    current_id = img_data
-
-                if current_id == image_id:
-                    image_to_remove = img_data
-                    break
-
-            if image_to_remove is not None:
-                self.custom_public_images.remove(image_to_remove)
+            if self.custom_images.remove(image_id) is not None:
                 self.save_config()
-                # 从布局中移除部件
-                self.public_image_list_layout.removeWidget(widget_to_remove)
-                widget_to_remove.deleteLater()
+                # 只从布局中移除这一行
+                row = self.public_image_rows.pop(image_id, None)
+                if row is not None:
+                    self.public_image_list_layout.removeWidget(row)
+                    row.deleteLater()
+                self._update_custom_images_placeholder()
                 self.statusbar.showMessage(f"已删除自定义镜像 ID: {image_id}", 3000)
-                # 如果删除的是最后一个自定义镜像，可能需要刷新以显示提示信息
-                if not self.custom_public_images:
-                    self.get_and_display_public_images()
             else:
                 QMessageBox.warning(self, "错误", f"无法找到要删除的镜像 ID: {image_id}")
 
@@ -1764,7 +2632,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         """初始化实例页面的滚动布局"""
         # 检查 shili_page6 是否存在并且是 QWidget
         if not hasattr(self, 'shili_page6') or not isinstance(self.shili_page6, QWidget):
-             print("错误: UI 中未找到 shili_page6 或类型不正确。")
+             log.warning("UI 中未找到 shili_page6 或类型不正确。")
              # 尝试从 UI 对象查找 shili_page6
              widget = self.findChild(QWidget, "shili_page6")
              if widget:
@@ -1794,7 +2662,13 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.instance_count_label = QLabel("实例总数：0", self.shili_page6)
         self.instance_count_label.setObjectName("instance_count_label")
         self.instance_count_label.setStyleSheet("QLabel { background-color: #3F454F; border-radius: 5px; padding: 5px; color: white; }")
-        page_layout.addWidget(self.instance_count_label)
+        header_layout = QHBoxLayout()
+        header_layout.addWidget(self.instance_count_label, 1)
+        history_button = QPushButton("历史记录", self.shili_page6)
+        history_button.setToolTip("本机记录的实例运行时长、花费和状态变化")
+        history_button.clicked.connect(self.show_instance_history)
+        header_layout.addWidget(history_button)
+        page_layout.addLayout(header_layout)
 
         # 滚动区域
         self.instance_scroll_area = QScrollArea(self.shili_page6)
@@ -1818,15 +2692,8 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         # self.shili_page6.setLayout(page_layout) # 这一步是多余的，因为 page_layout 的 parent 已经是 shili_page6
 
     def _create_image_widget(self, image_data):
-        """为单个镜像数据创建显示部件 (QFrame)"""
+        """为单个镜像数据创建显示部件 (QFrame)；内容由 _update_image_widget 填充"""
         image_id = image_data.get('id', 'N/A')
-        image_name = image_data.get('name', 'N/A')
-        image_size_bytes = image_data.get('size', 0)
-        image_status = image_data.get('status', 'N/A')
-        is_original = image_data.get('original_owner', False)
-        create_timestamp = image_data.get('create_timestamp')
-        # 尝试获取 image_type，如果 API 没返回，给个默认值或标记
-        image_type = image_data.get('image_type', 'private') # 假设默认为 private
 
         frame = QFrame()
         frame.setObjectName(f"image_frame_{image_id}")
@@ -1841,24 +2708,14 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         list_widget = QListWidget()
         list_widget.setStyleSheet("QListWidget { border: none; background-color: transparent; color: white; }")
         list_widget.setSpacing(2)
-
-        size_gb = f"{image_size_bytes / (1024**3):.2f} GB" if image_size_bytes else "N/A"
-        create_time_str = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(create_timestamp)) if create_timestamp else "N/A"
-        owner_str = "是" if is_original else "否"
-
-        list_widget.addItem(f"   镜像ID：{image_id}")
-        list_widget.addItem(f"镜像名字：{image_name}")
-        list_widget.addItem(f"镜像大小：{size_gb}")
-        list_widget.addItem(f"可用状态：{image_status}")
-        list_widget.addItem(f"是否原主：{owner_str}")
-        list_widget.addItem(f"创建时间：{create_time_str}")
-
-        for i in range(list_widget.count()):
-            item = list_widget.item(i)
+        for _ in range(6): # 6 行信息，文本在 _update_image_widget 中设置
+            item = QListWidgetItem()
             item.setFlags(item.flags() & ~Qt.ItemFlag.ItemIsSelectable & ~Qt.ItemFlag.ItemIsEnabled)
+            list_widget.addItem(item)
         # 移除固定高度设置，让 QListWidget 自适应内容高度
         # list_widget.setFixedHeight(list_widget.sizeHintForRow(0) * list_widget.count() + 10)
         layout.addWidget(list_widget)
+        frame.details_list = list_widget # 保存引用，供原地更新
 
         button_frame = QFrame()
         button_layout = QHBoxLayout(button_frame)
@@ -1879,71 +2736,119 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         deploy_button = QPushButton("部署此镜像")
         deploy_button.setIcon(QIcon(":/ico/ico/shopping-bag.svg"))
         deploy_button.setStyleSheet("QPushButton { background-color: #48bb78; border-radius: 5px; padding: 5px 10px; color: white; } QPushButton:hover { background-color: #38a169; } QPushButton:pressed { background-color: #2f855a; }")
-        # 传递 image_type
-        deploy_button.clicked.connect(partial(self.show_deploy_dialog, image_id, image_type))
+        # image_type 在刷新时可能变化，点击时再从卡片属性读取
+        deploy_button.clicked.connect(lambda: self.show_deploy_dialog(frame.property("image_id"), frame.property("image_type")))
         apply_shadow(deploy_button) # 添加阴影
         button_layout.addWidget(deploy_button, alignment=Qt.AlignmentFlag.AlignRight)
 
         layout.addWidget(button_frame)
         # frame.setLayout(layout) # QVBoxLayout 的 parent 已经是 frame，不需要再设置
+        self._update_image_widget(frame, image_data)
         return frame
 
+    def _update_image_widget(self, frame, image_data):
+        """原地更新镜像卡片的文本 (不重建部件)"""
+        image_id = image_data.get('id', 'N/A')
+        image_name = image_data.get('name', 'N/A')
+        image_size_bytes = image_data.get('size', 0)
+        image_status = image_data.get('status', 'N/A')
+        is_original = image_data.get('original_owner', False)
+        create_timestamp = image_data.get('create_timestamp')
+        # 尝试获取 image_type，如果 API 没返回，给个默认值或标记
+        frame.setProperty("image_type", image_data.get('image_type', 'private')) # 假设默认为 private
+
+        size_gb = f"{image_size_bytes / (1024**3):.2f} GB" if image_size_bytes else "N/A"
+        create_time_str = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(create_timestamp)) if create_timestamp else "N/A"
+        owner_str = "是" if is_original else "否"
+
+        lines = [
+            f"   镜像ID：{image_id}",
+            f"镜像名字：{image_name}",
+            f"镜像大小：{size_gb}",
+            f"可用状态：{image_status}",
+            f"是否原主：{owner_str}",
+            f"创建时间：{create_time_str}",
+        ]
+        for row, text in enumerate(lines):
+            item = frame.details_list.item(row)
+            if item.text() != text:
+                item.setText(text)
+
+    def _paint_images_from_cache(self):
+        """用磁盘缓存立即绘制镜像列表 (不发起网络请求)"""
+        if not self.api_token:
+            return False
+        cached = self.image_cache.load(self.api_token)
+        if not cached:
+            return False
+        self._handle_get_images_success(cached)
+        return True
+
+    def _show_image_list_message(self, text, color):
+        """在卡片下方显示提示信息；text 为空时隐藏"""
+        self.image_list_message_label.setText(text)
+        self.image_list_message_label.setStyleSheet(f"color: {color};")
+        self.image_list_message_label.setVisible(bool(text))
+
     # --- 异步获取和显示镜像 ---
-    def get_and_display_images_async(self):
-        """异步获取镜像列表并更新 UI"""
+    def get_and_display_images_async(self, *, lane=None):
+        """异步获取镜像列表并更新 UI；定时刷新时 lane=LANE_LOW"""
         if self.is_refreshing_images:
-            print("获取镜像列表 - 跳过（正在刷新）")
+            log.debug("获取镜像列表 - 跳过（正在刷新）")
             return
         if not self.api_token:
             # 如果没有 token，清空列表并提示 (主线程安全)
-            while self.image_list_layout.count() > 1:
-                item = self.image_list_layout.takeAt(0)
-                widget = item.widget()
-                if widget: widget.deleteLater()
+            self.image_cards.clear()
+            self.image_view_stale = True
+            self._show_image_list_message("", "#a0aec0")
             if hasattr(self, 'label_5'): self.label_5.setText("镜像总数：0 (请先设置令牌)")
             return
 
         self.is_refreshing_images = True # 设置刷新标志
         self.statusbar.showMessage("正在获取镜像列表...", 0) # 持续显示直到完成或错误
 
-        # 注意：清空列表的操作已移动到 _handle_get_images_success
+        # 注意：列表的增量更新在 _handle_get_images_success 中进行
 
+        # 后台获取并与缓存比较哈希，内容未变化时返回 not_modified
+        revalidate = partial(self.image_cache.revalidate, fetch=self.api_handler.get_images, token=self.api_token)
+        revalidate.api_endpoint = "get_images" # 限流预算和统计按 get_images 计
         self._run_task(
-            self.api_handler.get_images,
+            revalidate,
             self._handle_get_images_success,
             error_handler=self._handle_get_images_error,
-            finished_handler=self._handle_get_images_finished
+            finished_handler=self._handle_get_images_finished,
+            page=self.jingxiang_page7,
+            lane=lane
         )
 
     def _handle_get_images_success(self, result):
-        """处理获取镜像成功的结果 (在主线程中更新 UI)"""
-        # --- 在添加新内容前，清空旧的镜像部件 ---
-        while self.image_list_layout.count() > 1: # 保留最后的 stretch item
-            item = self.image_list_layout.takeAt(0)
-            widget = item.widget()
-            if widget:
-                widget.deleteLater()
-        # --- 清空结束 ---
-
+        """处理获取镜像成功的结果 (在主线程中按 ID 增量更新 UI)"""
+        if result and result.get("not_modified"):
+            # 内容与缓存一致；只有界面显示的不是缓存内容时才需要重绘
+            if not self.image_view_stale or not self._paint_images_from_cache():
+                self.snapshots.touch(IMAGES)
+                self.statusbar.clearMessage()
+            return
         if result and result.get("success"):
+            self.image_view_stale = False
+            self.snapshots.put(IMAGES, result)
             data = result.get("data", {})
             images = data.get('list', [])
-            total = data.get('total', len(images))
+            self.image_total = data.get('total', len(images))
 
             if hasattr(self, 'label_5'):
-                 self.label_5.setText(f"镜像总数：{total}")
+                 self.label_5.setText(f"镜像总数：{self.image_total}")
 
+            diff = self.image_cards.reconcile(images)
             if not images:
-                 no_image_label = QLabel("您还没有任何镜像。", self.image_scroll_area.widget())
-                 no_image_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-                 no_image_label.setStyleSheet("color: #a0aec0;") # 灰色提示
-                 self.image_list_layout.insertWidget(self.image_list_layout.count() - 1, no_image_label)
+                 self._show_image_list_message("您还没有任何镜像。", "#a0aec0") # 灰色提示
                  self.statusbar.showMessage("未找到镜像", 3000)
             else:
-                for image_data in images:
-                    image_widget = self._create_image_widget(image_data)
-                    self.image_list_layout.insertWidget(self.image_list_layout.count() - 1, image_widget)
-                self.statusbar.showMessage(f"成功加载 {len(images)} 个镜像", 3000)
+                self._show_image_list_message("", "#a0aec0")
+                if diff.added or diff.removed or diff.changed:
+                    self.statusbar.showMessage(f"成功加载 {len(images)} 个镜像", 3000)
+                else:
+                    self.statusbar.clearMessage() # 列表无变化
         else:
             # API 请求成功但业务逻辑失败
             error_msg = result.get("msg", "获取镜像列表失败") if result else "未知错误"
@@ -1951,29 +2856,24 @@ class MainWindow(QMainWindow, Ui_MainWindow):
 
     def _handle_get_images_error(self, error_message):
         """处理获取镜像列表时的错误 (主线程)"""
-        print(f"获取镜像列表错误: {error_message}")
-        # 清空加载提示和旧内容
-        while self.image_list_layout.count() > 1:
-            item = self.image_list_layout.takeAt(0)
-            widget = item.widget()
-            if widget: widget.deleteLater()
+        log.warning("获取镜像列表错误: %s", error_message)
+        # 清空旧内容
+        self.image_cards.clear()
+        self.image_view_stale = True
 
         if hasattr(self, 'label_5'):
              self.label_5.setText("镜像总数：获取失败")
-        error_label = QLabel(f"无法加载镜像列表: {error_message}", self.image_scroll_area.widget())
-        error_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        error_label.setStyleSheet("color: #f56565;") # 红色错误提示
-        self.image_list_layout.insertWidget(self.image_list_layout.count() - 1, error_label)
+        self._show_image_list_message(f"无法加载镜像列表: {error_message}", "#f56565") # 红色错误提示
         self.statusbar.showMessage(f"获取镜像列表失败: {error_message}", 5000)
 
     def _handle_get_images_finished(self):
         """获取镜像列表任务完成后的处理 (主线程)"""
         self.is_refreshing_images = False # 清除刷新标志
-        # 从线程池移除 worker (如果 _run_task 中没有设置 finished_handler)
-        sender_worker = self.sender().parent() # QSignalMapper or Worker itself? Let's assume Worker
-        if isinstance(sender_worker, Worker) and sender_worker in self.thread_pool:
-             self.thread_pool.remove(sender_worker)
-        print("获取镜像列表任务完成")
+        handle = self.sender()
+        if isinstance(handle, TaskHandle) and handle.is_cancelled():
+            # 结果被丢弃，但缓存可能已更新；下次验证时需要从缓存重绘
+            self.image_view_stale = True
+        log.debug("获取镜像列表任务完成")
 
 
     def destroy_image(self, image_id, widget_to_remove):
@@ -2001,12 +2901,14 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         if result and result.get("success"):
             success_msg = result.get("msg", f"镜像 {image_id} 已成功销毁。")
             QMessageBox.information(self, "销毁成功", success_msg)
-            # 从布局中移除并删除部件
-            self.image_list_layout.removeWidget(widget_to_remove)
-            widget_to_remove.deleteLater()
+            # 只移除这一张卡片并更新总数，不再重新获取整个列表
+            if self.image_cards.remove(image_id):
+                self.image_total = max(0, self.image_total - 1)
+                if hasattr(self, 'label_5'):
+                    self.label_5.setText(f"镜像总数：{self.image_total}")
+                if not len(self.image_cards):
+                    self._show_image_list_message("您还没有任何镜像。", "#a0aec0")
             self.statusbar.showMessage(f"镜像 {image_id} 已销毁", 3000)
-            # 重新获取列表以更新总数和列表状态
-            self.get_and_display_images_async()
         else:
             # API 调用成功但业务逻辑失败
             error_msg = result.get("msg", "销毁失败") if result else "未知错误"
@@ -2016,7 +2918,8 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         """处理销毁镜像失败"""
         QMessageBox.warning(self, "销毁失败", f"无法销毁镜像 {image_id}: {error_message}")
         self.statusbar.showMessage(f"销毁镜像 {image_id} 失败", 5000)
-        widget_to_remove.setEnabled(True) # 重新启用卡片
+        if image_id in self.image_cards: # 卡片可能已被刷新移除
+            widget_to_remove.setEnabled(True) # 重新启用卡片
 
     def show_deploy_dialog(self, image_id, image_type):
         """显示部署镜像对话框"""
@@ -2049,11 +2952,13 @@ class MainWindow(QMainWindow, Ui_MainWindow):
                 QMessageBox.information(self, "部署成功", f"镜像 {image_id} 已成功部署！\n实例 ID: {instance_id}")
                 self.statusbar.showMessage(f"实例 {instance_id} 部署成功", 3000)
                 # 部署成功后切换到实例页面并异步刷新
+                self.snapshots.invalidate(INSTANCES)
                 self.show_shili_page() # show_shili_page 内部会调用异步刷新
             else:
                 # 成功但未返回 ID？
                  QMessageBox.warning(self, "部署部分成功", f"镜像 {image_id} 部署请求成功，但未返回实例ID。请稍后在实例列表查看。")
                  self.statusbar.showMessage(f"镜像 {image_id} 部署请求成功，但未返回实例ID", 5000)
+                 self.snapshots.invalidate(INSTANCES)
                  self.show_shili_page() # 仍然切换并刷新
             # --- 触发刷新信号 ---
             self.instance_deployed_signal.emit()
@@ -2174,7 +3079,13 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         name_status_layout = QHBoxLayout()
         name_label = QLabel(f"<b>{instance_name}</b>")
         name_label.setStyleSheet("font-size: 14pt;")
-        status_label = QLabel(f"({status})")
+        remaining = self.instance_history.expected_remaining(instance_id, status, instance_data.get('gpu_model'))
+        if remaining is None:
+            status_label = QLabel(f"({status})")
+        elif remaining > 0:
+            status_label = QLabel(f"({status}，预计约 {format_duration(remaining)}后完成)")
+        else:
+            status_label = QLabel(f"({status}，已超过通常的时长)")
         status_color = "#2ECC71" if status == "running" else ("#F39C12" if status == "starting" or status == "stopping" else "#E74C3C") # 绿/橙/红
         status_label.setStyleSheet(f"color: {status_color}; font-weight: bold;")
         name_status_layout.addWidget(name_label)
@@ -2215,6 +3126,33 @@ class MainWindow(QMainWindow, Ui_MainWindow):
              apply_shadow(ssh_copy_btn) # 添加阴影
              conn_info_layout.addRow("SSH:", ssh_label)
              conn_info_layout.addRow("", ssh_copy_btn) # 按钮单独一行
+             # 端口缺失 ('N/A') 或不是数字时只显示复制按钮，不提供隧道
+             ssh_port_number = int(ssh_port) if str(ssh_port).strip().isdigit() else None
+             if status.lower() == 'running' and password != 'N/A' and ssh_port_number:
+                 ssh_target = SSHTarget(ssh_domain, ssh_port_number, ssh_user, password)
+                 tunnel_btn = QPushButton("SSH 隧道")
+                 tunnel_btn.setIcon(QIcon(":/ico/ico/link.svg"))
+                 tunnel_btn.setStyleSheet("background-color: #3498DB;")
+                 tunnel_menu = QMenu(tunnel_btn)
+                 for service_name, label in (('comfyui', "ComfyUI"), ('fluxgym', "FluxGym")):
+                     action = tunnel_menu.addAction(label)
+                     action.triggered.connect(partial(self.open_via_ssh, instance_id, ssh_target, label,
+                                                      self.ports.get(service_name),
+                                                      build_service_url(web_url, self.ports.get(service_name))))
+                 if jupyter_url != 'N/A':
+                     action = tunnel_menu.addAction("Jupyter")
+                     action.triggered.connect(partial(self.open_via_ssh, instance_id, ssh_target, "Jupyter",
+                                                      service_port(jupyter_url), jupyter_url))
+                 tunnel_menu.addSeparator()
+                 tunnel_menu.addAction("断开 SSH").triggered.connect(partial(self.close_ssh, instance_id))
+                 tunnel_btn.setMenu(tunnel_menu)
+                 if not SSH_AVAILABLE:
+                     tunnel_btn.setEnabled(False)
+                     tunnel_btn.setToolTip("需要安装 paramiko (pip install paramiko)")
+                 else:
+                     tunnel_btn.setToolTip("通过 SSH 连接访问实例上的服务，不经过公网代理")
+                 apply_shadow(tunnel_btn)
+                 conn_info_layout.addRow("", tunnel_btn)
         if password != 'N/A': # 仅当有密码时显示
              pwd_label = QLabel("******") # 隐藏密码
              pwd_copy_btn = QPushButton("复制密码")
@@ -2238,6 +3176,25 @@ class MainWindow(QMainWindow, Ui_MainWindow):
              web_btn.clicked.connect(lambda: self.open_url(web_url))
              apply_shadow(web_btn) # 添加阴影
              conn_info_layout.addRow("", web_btn) # 添加到链接行
+             if status.lower() == 'running':
+                 comfyui_btn = QPushButton("ComfyUI 批量")
+                 comfyui_btn.setIcon(QIcon(":/ico/ico/layers.svg"))
+                 comfyui_btn.setStyleSheet("background-color: #8E44AD;") # 紫色
+                 comfyui_btn.clicked.connect(partial(self.show_comfyui_batch_dialog, instance_id, instance_name, web_url))
+                 apply_shadow(comfyui_btn)
+                 conn_info_layout.addRow("", comfyui_btn)
+                 sync_btn = QPushButton("同步输出")
+                 sync_btn.setIcon(QIcon(":/ico/ico/download.svg"))
+                 sync_btn.setStyleSheet("background-color: #16A085;") # 青色
+                 sync_btn.clicked.connect(partial(self.show_output_sync_dialog, instance_id, instance_name, web_url))
+                 apply_shadow(sync_btn)
+                 conn_info_layout.addRow("", sync_btn)
+                 upload_btn = QPushButton("上传文件")
+                 upload_btn.setIcon(QIcon(":/ico/ico/link.svg"))
+                 upload_btn.setStyleSheet("background-color: #2980B9;") # 蓝色
+                 upload_btn.clicked.connect(partial(self.show_upload_dialog, instance_name, web_url))
+                 apply_shadow(upload_btn)
+                 conn_info_layout.addRow("", upload_btn)
 
         left_v_layout.addLayout(conn_info_layout)
         left_v_layout.addStretch() # 把信息推到顶部
@@ -2333,7 +3290,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         # --- 根据实例状态启用/禁用按钮 ---
         # 转换为小写以便进行不区分大小写的比较
         status_lower = status.lower()
-        print(f"Instance {instance_id}: Status received = '{status}', Lowercase = '{status_lower}'") # 调试打印
+        log.debug("Instance %s: Status received = '%s', Lowercase = '%s'", instance_id, status, status_lower)
 
         # 定义可运行和可开机的状态列表
         running_statuses = ['running', 'starting', 'rebooting', '运行中', '启动中', '重启中', '开机中', '工作中']
@@ -2346,7 +3303,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         is_bootable = status_lower in bootable_statuses
         is_pending = status_lower in pending_statuses
 
-        print(f"  - is_running: {is_running}, is_bootable: {is_bootable}, is_pending: {is_pending}") # 调试打印
+        log.debug("Instance %s: is_running=%s, is_bootable=%s, is_pending=%s", instance_id, is_running, is_bootable, is_pending)
 
         # 设置按钮的启用状态
         btn_boot.setEnabled(is_bootable and not is_pending)
@@ -2369,12 +3326,10 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         }
 
         for btn, enabled_style in all_buttons.items():
-            if btn.isEnabled():
-                btn.setStyleSheet(enabled_style)
-                print(f"  - Button '{btn.text()}' ENABLED, Style: {enabled_style}") # 调试
-            else:
-                btn.setStyleSheet(btn_disabled_style)
-                print(f"  - Button '{btn.text()}' DISABLED, Style: {btn_disabled_style}") # 调试
+            btn.setStyleSheet(enabled_style if btn.isEnabled() else btn_disabled_style)
+        if log.isEnabledFor(logging.DEBUG): # 按钮状态汇总只在调试级别下构造，刷新时不产生额外开销
+            log.debug("Instance %s buttons: %s", instance_id,
+                      ", ".join(f"{btn.text()}={'on' if btn.isEnabled() else 'off'}" for btn in all_buttons))
 
         right_v_layout.addStretch() # 将按钮推到顶部
 
@@ -2383,10 +3338,10 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         return frame
 
     # --- 异步获取和显示实例 ---
-    def get_and_display_instances_async(self):
-        """异步获取实例列表并更新 UI"""
+    def get_and_display_instances_async(self, *, lane=None):
+        """异步获取实例列表并更新 UI；定时刷新时 lane=LANE_LOW"""
         if self.is_refreshing_instances:
-            print("获取实例列表 - 跳过（正在刷新）")
+            log.debug("获取实例列表 - 跳过（正在刷新）")
             return
         # 确保 ApiHandler 有 token
         if not self.api_handler._access_token:
@@ -2407,7 +3362,9 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.api_handler.get_instances,
             self._handle_get_instances_success,
             error_handler=self._handle_get_instances_error,
-            finished_handler=self._handle_get_instances_finished
+            finished_handler=self._handle_get_instances_finished,
+            page=self.shili_page6,
+            lane=lane
         )
 
     def _handle_get_instances_success(self, result):
@@ -2422,6 +3379,14 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             data = result.get("data", {})
             instances = data.get('list', [])
             total = data.get('total', len(instances))
+            self.latest_instances = instances
+            self.snapshots.put(INSTANCES, result)
+            self.instance_history.record(instances)
+            self._schedule_transition_refresh(instances)
+            self._sync_comfyui_dialogs()
+            self.ssh_manager.retain({inst.get('id') for inst in instances
+                                     if (inst.get('status') or '').lower() == 'running'}) # 关机的实例断开 SSH
+            self.service_prober.update_snapshot(instances, self.ports)
 
             if hasattr(self, 'instance_count_label'):
                  self.instance_count_label.setText(f"实例总数：{total}")
@@ -2442,9 +3407,46 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             error_msg = result.get("msg", "获取实例列表失败") if result else "未知错误"
             self._handle_get_instances_error(error_msg)
 
+    def _schedule_transition_refresh(self, instances):
+        """
+        有实例处于过渡状态时，按历史估计的剩余时间安排一次提前刷新 (不早于 2 秒，不晚于定时刷新)。
+        已超过估计时长的实例不再每 2 秒刷新一次：间隔从 2 秒起每次翻倍，直到定时刷新的间隔。
+        """
+        estimates = [self.instance_history.expected_remaining(inst.get('id'), inst.get('status'), inst.get('gpu_model'))
+                     for inst in instances]
+        estimates = [remaining for remaining in estimates if remaining is not None]
+        if not estimates:
+            self.transition_overdue_delay = None
+            self.transition_refresh_timer.stop()
+            return
+        limit = self.refresh_timer.interval() / 1000
+        upcoming = [remaining for remaining in estimates if remaining > 0]
+        delay = max(min(upcoming) + 1.0, 2.0) if upcoming else limit
+        if len(upcoming) < len(estimates):
+            previous = self.transition_overdue_delay
+            self.transition_overdue_delay = min(previous * 2, limit) if previous else 2.0
+            delay = min(delay, self.transition_overdue_delay)
+        else:
+            self.transition_overdue_delay = None
+        self.transition_refresh_timer.start(int(min(delay, limit) * 1000))
+
+    def _refresh_for_transition(self):
+        if self.body.currentWidget() is self.shili_page6 and not self.is_refreshing_instances:
+            log.debug("过渡状态预计已结束，提前刷新实例列表")
+            self.get_and_display_instances_async(lane=LANE_LOW)
+
+    def show_instance_history(self, *, checked=False):
+        """显示实例历史窗口 (非模态)"""
+        if self.instance_history_dialog is None:
+            self.instance_history_dialog = InstanceHistoryDialog(self.instance_history, self)
+        else:
+            self.instance_history.request_summaries()
+        self.instance_history_dialog.show()
+        self.instance_history_dialog.raise_()
+
     def _handle_get_instances_error(self, error_message):
         """处理获取实例列表错误 (主线程)"""
-        print(f"获取实例列表错误: {error_message}")
+        log.warning("获取实例列表错误: %s", error_message)
         # 清空加载提示和旧内容
         while self.instance_list_layout.count() > 1:
             item = self.instance_list_layout.takeAt(0)
@@ -2462,11 +3464,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
     def _handle_get_instances_finished(self):
         """获取实例列表任务完成后的处理 (主线程)"""
         self.is_refreshing_instances = False # 清除刷新标志
-        # 从线程池移除 worker
-        sender_worker = self.sender().parent()
-        if isinstance(sender_worker, Worker) and sender_worker in self.thread_pool:
-             self.thread_pool.remove(sender_worker)
-        print("获取实例列表任务完成")
+        log.debug("获取实例列表任务完成")
 
     # --- 实例操作方法 (改为异步) ---
 
@@ -2686,8 +3684,9 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         """显示镜像页面并刷新列表"""
         self.update_button_state(self.jingxiang)
         self.body.setCurrentWidget(self.jingxiang_page7)
-        # 切换时异步刷新
-        self.get_and_display_images_async()
+        # 切换时异步刷新 (快照足够新时页面已是最新内容)
+        if not self.snapshots.is_fresh(IMAGES):
+            self.get_and_display_images_async()
 
     def show_zhuye_page(self):
         self.update_button_state(self.home)
@@ -2697,16 +3696,19 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         """显示实例页面并刷新列表"""
         self.update_button_state(self.shiliBt)
         self.body.setCurrentWidget(self.shili_page6)
-        # 切换时异步刷新实例列表
-        self.get_and_display_instances_async()
+        # 切换时异步刷新实例列表 (快照足够新时页面已是最新内容)
+        if not self.snapshots.is_fresh(INSTANCES):
+            self.get_and_display_instances_async()
 
     def show_zhanghao_page(self):
         self.update_button_state(self.menubtn)
         self.body.setCurrentWidget(self.zhanghao_page5)
         # 切换页面后异步获取信息
-        if self.api_token:
-            self.get_user_info() # 已经是异步的
-            self.get_balance()   # 已经是异步的
+        if self.api_token and not self.is_bootstrapping:
+            if not self.snapshots.is_fresh(WHOAMI):
+                self.get_user_info(lane=LANE_NORMAL) # 当前页面的读取
+            if not self.snapshots.is_fresh(BALANCE):
+                self.get_balance(lane=LANE_NORMAL)
 
     def show_shezhi_page(self):
         """显示设置页面并加载当前端口配置"""
@@ -2732,7 +3734,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.update_button_state(self.info)
             self.body.setCurrentWidget(self.xinxi_page3)
         except Exception as e:
-            print(f"切换信息页面失败: {e}")
+            log.warning("切换信息页面失败: %s", e)
             self.body.setCurrentWidget(self.zhuye_page1)
 
     def show_bangzhu_page(self):
@@ -2740,7 +3742,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             self.update_button_state(self.help)
             self.body.setCurrentWidget(self.bangzhu_page4)
         except Exception as e:
-            print(f"切换帮助页面失败: {e}")
+            log.warning("切换帮助页面失败: %s", e)
             self.body.setCurrentWidget(self.zhuye_page1)
 
     # --- 新增：显示浏览器页面 ---
@@ -2760,7 +3762,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         selected_style = base_style + "QPushButton { background-color: #46006e; }"
         for button in self.left_buttons:
             if button is None or not hasattr(button, 'style') or not callable(button.style):
-                print(f"警告: 按钮 {button} 无效或缺少 style()")
+                log.warning("按钮 %s 无效或缺少 style()", button)
                 continue
             is_selected = (button == clicked_button)
             button.setProperty("selected", is_selected)
@@ -2774,17 +3776,17 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         if current_widget == self.shili_page6:
             # 使用异步刷新，并检查刷新标志
             if not self.is_refreshing_instances:
-                print("定时刷新：实例列表") # 调试信息
-                self.get_and_display_instances_async()
+                log.debug("定时刷新：实例列表")
+                self.get_and_display_instances_async(lane=LANE_LOW) # 后台轮询走低优先级通道
             else:
-                print("定时刷新：实例列表 - 跳过（正在刷新）")
+                log.debug("定时刷新：实例列表 - 跳过（正在刷新）")
         elif current_widget == self.jingxiang_page7:
              # 使用异步刷新，并检查刷新标志
             if not self.is_refreshing_images:
-                print("定时刷新：镜像列表") # 调试信息
-                self.get_and_display_images_async()
+                log.debug("定时刷新：镜像列表")
+                self.get_and_display_images_async(lane=LANE_LOW)
             else:
-                print("定时刷新：镜像列表 - 跳过（正在刷新）")
+                log.debug("定时刷新：镜像列表 - 跳过（正在刷新）")
         # 可以根据需要添加其他页面的刷新逻辑
         # else:
         #     print(f"定时刷新：当前页面 ({current_widget.objectName() if current_widget else 'None'}) 无需刷新")
@@ -2802,6 +3804,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             if 0 < port_value_int < 65536: # 验证端口范围
                 self.ports[port_name] = port_value_int
                 self.save_config()
+                self.service_prober.update_snapshot(self.latest_instances, self.ports) # 服务地址随端口变化
                 self.statusbar.showMessage(f"{port_name.capitalize()} 端口已更新为 {port_value_int}", 3000)
             else:
                 QMessageBox.warning(self, "端口无效", f"端口号 {port_value_int} 无效，请输入 1 到 65535 之间的数字。")
@@ -2866,8 +3869,61 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         else:
             return None
 
+    def _open_service_from_table(self, service_name, candidates, button):
+        """从预先计算的地址表中打开服务；服务离线时先说明原因 (主线程)"""
+        if len(candidates) == 1:
+            chosen = candidates[0]
+        else:
+            labels = {}
+            for candidate in candidates:
+                health = candidate[3]
+                state = "检测中" if health is None else ("在线" if health.state == SERVICE_UP else "离线")
+                labels[candidate[0]] = {'id': candidate[0], 'name': f"{candidate[1]} [{state}]"}
+            selected_id = self.show_instance_selection_dialog(list(labels.values()))
+            if not selected_id:
+                self.statusbar.showMessage("操作已取消", 2000)
+                return
+            chosen = next(candidate for candidate in candidates if candidate[0] == selected_id)
+        instance_id, instance_name, url, health = chosen
+        if health is not None and health.state == SERVICE_DOWN:
+            self.service_prober.probe(instance_id, service_name) # 顺便重新检测
+            checked_ago = max(0, int(time.time() - health.checked_at))
+            reply = QMessageBox.question(
+                self, "服务不可用",
+                f"实例 {instance_name} 上的 {service_name.capitalize()} 当前无法访问：\n{health.detail}\n"
+                f"({checked_ago} 秒前检测，地址 {url})\n\n请确认服务已在实例中启动。仍然打开吗？")
+            if reply != QMessageBox.StandardButton.Yes:
+                return
+        self._open_service_final_url(service_name, url, button)
+
+    def _update_service_badges(self, *args):
+        """左侧服务按钮的在线标记：任一实例在线为绿色，全部离线为红色，未检测或无实例为灰色"""
+        for service_name, badge in self.service_badges.items():
+            candidates = self.service_prober.instances_for(service_name)
+            states = [health.state if health is not None else None for _, _, _, health in candidates]
+            if SERVICE_UP in states:
+                state = SERVICE_UP
+            elif states and all(s == SERVICE_DOWN for s in states):
+                state = SERVICE_DOWN
+            else:
+                state = None
+            lines = []
+            for _, name, url, health in candidates:
+                if health is None:
+                    lines.append(f"{name}: 检测中")
+                elif health.state == SERVICE_UP:
+                    lines.append(f"{name}: 在线 ({health.detail}，{health.latency * 1000:.0f} ms)")
+                else:
+                    lines.append(f"{name}: 离线 ({health.detail})")
+            badge.set_state(state, "\n".join(lines) or "没有运行中的实例 (打开实例页面后更新)")
+
     def open_service_url(self, service_name):
         """异步处理左侧服务按钮点击事件"""
+        # 已有实例快照时直接使用预先计算的地址和检测结果，不再重新获取实例列表
+        candidates = self.service_prober.instances_for(service_name)
+        if candidates:
+            self._open_service_from_table(service_name, candidates, self.sender())
+            return
         # --- UI 交互部分 (主线程) ---
         self.statusbar.showMessage(f"正在获取运行实例以打开 {service_name.capitalize()}...", 0)
         # 禁用对应的按钮
@@ -2890,6 +3946,7 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         running_instances = []
         if result and result.get("success"):
             instances = result.get('data', {}).get('list', [])
+            self.service_prober.update_snapshot(instances, self.ports) # 下次点击直接使用
             running_statuses = ['running', 'starting', 'rebooting', '运行中', '启动中', '重启中', '开机中', '工作中']
             for inst in instances:
                 status = inst.get('status', '').lower()
@@ -2955,74 +4012,44 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             return
 
         # --- 构建最终 URL (主线程) ---
-        final_url = None
-        try:
-            # 正则表达式匹配基础 URL 和端口号
-            # 匹配 https://<any-non-slash-chars>-<digits>.<any-chars>
-            match = re.match(r'^(https?://[^/]+-)(\d+)(\..*)$', selected_instance_web_url, re.IGNORECASE)
-            if match:
-                base_url_part1 = match.group(1) # e.g., "https://abc-"
-                base_url_part2 = match.group(3) # e.g., ".domain.com/" or ".container.x-gpu.com/"
-                # 替换端口号
-                intermediate_url = f"{base_url_part1}{target_port}{base_url_part2}"
-
-                # 添加 /files/ 后缀（如果需要）
-                if service_name in ['shuchu', 'quanbu']:
-                    # 确保 URL 以 / 结尾，然后再添加 files/
-                    if not intermediate_url.endswith('/'):
-                        intermediate_url += '/'
-                    final_url = intermediate_url + 'files/'
-                else:
-                    final_url = intermediate_url
-
-                print(f"原始 Web URL: {selected_instance_web_url}") # 调试
-                print(f"目标端口: {target_port}") # 调试
-                print(f"构建的最终 URL: {final_url}") # 调试
-
-            else:
-                 QMessageBox.warning(self, "URL 格式未知", f"实例的 Web URL '{selected_instance_web_url}' 格式无法识别，无法自动替换端口。请检查实例信息或手动访问。")
-                 if isinstance(button, QPushButton): button.setEnabled(True) # 重新启用按钮
-                 return
-
-        except Exception as e:
-            QMessageBox.critical(self, "URL 构建错误", f"构建 {service_name.capitalize()} 的 URL 时出错: {e}")
+        final_url = build_service_url(selected_instance_web_url, target_port, service_name)
+        if not final_url:
+            QMessageBox.warning(self, "URL 格式未知", f"实例的 Web URL '{selected_instance_web_url}' 格式无法识别，无法自动替换端口。请检查实例信息或手动访问。")
             if isinstance(button, QPushButton): button.setEnabled(True) # 重新启用按钮
             return
+        log.debug("原始 Web URL: %s, 目标端口: %s, 构建的最终 URL: %s", selected_instance_web_url, target_port, final_url)
 
-        # 打开最终 URL (主线程)
-        if final_url:
-            # --- 根据偏好设置打开 URL ---
-            if self.browser_preference == "system":
+        self._open_service_final_url(service_name, final_url, button)
+
+    def _open_service_final_url(self, service_name, final_url, button):
+        """按浏览器偏好打开服务地址，并恢复服务按钮 (主线程)"""
+        if isinstance(button, QPushButton):
+            button.setEnabled(True)
+        # --- 根据偏好设置打开 URL ---
+        if self.browser_preference == "system":
+            try:
+                webbrowser.open(final_url)
+                self.statusbar.showMessage(f"已在系统浏览器中打开 {service_name.capitalize()} 服务", 3000)
+            except Exception as e:
+                QMessageBox.critical(self, "打开链接错误", f"无法在系统浏览器中打开链接 {final_url}: {e}")
+                self.statusbar.showMessage(f"打开链接失败: {e}", 5000)
+        else: # 默认或 "integrated"
+            if hasattr(self, 'shared_browser') and self.shared_browser:
+                self.body.setCurrentWidget(self.browser_page) # 切换到浏览器页面
+                self.shared_browser.open_url_in_new_tab(final_url) # 在新标签页打开
+                self.statusbar.showMessage(f"已在内置浏览器中打开 {service_name.capitalize()} 服务", 3000)
+            else:
+                log.warning("内置浏览器未初始化，将尝试使用系统浏览器打开。")
                 try:
                     webbrowser.open(final_url)
-                    self.statusbar.showMessage(f"已在系统浏览器中打开 {service_name.capitalize()} 服务", 3000)
+                    self.statusbar.showMessage(f"内置浏览器不可用，已在系统浏览器中打开 {service_name.capitalize()} 服务", 3000)
                 except Exception as e:
-                    QMessageBox.critical(self, "打开链接错误", f"无法在系统浏览器中打开链接 {final_url}: {e}")
-                    self.statusbar.showMessage(f"打开链接失败: {e}", 5000)
-            else: # 默认或 "integrated"
-                if hasattr(self, 'shared_browser') and self.shared_browser:
-                    self.body.setCurrentWidget(self.browser_page) # 切换到浏览器页面
-                    self.shared_browser.open_url_in_new_tab(final_url) # 在新标签页打开
-                    self.statusbar.showMessage(f"已在内置浏览器中打开 {service_name.capitalize()} 服务", 3000)
-                else:
-                    print("警告: 内置浏览器未初始化，将尝试使用系统浏览器打开。")
-                    try:
-                        webbrowser.open(final_url)
-                        self.statusbar.showMessage(f"内置浏览器不可用，已在系统浏览器中打开 {service_name.capitalize()} 服务", 3000)
-                    except Exception as e:
-                         QMessageBox.critical(self, "打开链接错误", f"内置浏览器不可用，且无法在系统浏览器中打开链接 {final_url}: {e}")
-                         self.statusbar.showMessage(f"打开链接失败: {e}", 5000)
+                     QMessageBox.critical(self, "打开链接错误", f"内置浏览器不可用，且无法在系统浏览器中打开链接 {final_url}: {e}")
+                     self.statusbar.showMessage(f"打开链接失败: {e}", 5000)
 
-            # 更新左侧按钮状态 (高亮最后点击的按钮)
-            if isinstance(button, QPushButton):
-                 self.update_button_state(button)
-            # --- 修改结束 ---
-        else:
-             QMessageBox.warning(self, "无法打开", f"未能成功构建 {service_name.capitalize()} 的 URL。")
-
-        # 无论成功失败，最后都尝试恢复按钮状态 (如果之前禁用了)
-        # 注意：这里不再禁用按钮，所以不需要恢复
-        # if isinstance(button, QPushButton): button.setEnabled(True)
+        # 更新左侧按钮状态 (高亮最后点击的按钮)
+        if isinstance(button, QPushButton):
+             self.update_button_state(button)
 
     def _handle_get_running_instances_error(self, error_message, service_name, button, original_state):
         """处理获取实例列表失败，用于打开服务 URL (主线程)"""
@@ -3032,8 +4059,50 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             button.setEnabled(original_state) # 恢复按钮原始状态
 
 
+def parse_cli_args(argv):
+    """
+    解析本程序自己的命令行参数 (其余参数留给 Qt)：
+      --record               正常联网运行，同时把 API 响应录制到 cassette 目录
+      --offline              不联网，用录制的响应回放 (可配合下面的参数注入延迟和失败)
+      --cassette DIR         录制文件目录 (默认在应用数据目录下的 cassettes)
+      --replay-latency S     回放延迟：recorded (默认，使用录制时的耗时)、固定秒数或 "min,max"
+      --replay-failure-rate P  回放时注入网络失败的概率 (0~1)
+    """
+    import argparse
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--record", action="store_true")
+    parser.add_argument("--offline", action="store_true")
+    parser.add_argument("--cassette", default=None)
+    parser.add_argument("--replay-latency", default="recorded")
+    parser.add_argument("--replay-failure-rate", type=float, default=0.0)
+    parser.add_argument("--debug", action="store_true") # 由 setup_logging 处理
+    args, qt_args = parser.parse_known_args(argv[1:])
+    return args, [argv[0]] + qt_args
+
+
+def build_api_handler(args):
+    """根据命令行参数返回 API 处理器 (None 表示使用默认的 ApiHandler)"""
+    if args.offline:
+        latency = args.replay_latency
+        if latency != "recorded":
+            parts = [float(part) for part in latency.split(",")]
+            latency = tuple(parts) if len(parts) == 2 else parts[0]
+        cassette = Cassette(args.cassette)
+        log.info("离线模式：从 %s 回放 (%s)", cassette.directory, ", ".join(cassette.methods()) or "无录制")
+        return ReplayApiHandler(cassette, latency=latency, failure_rate=args.replay_failure_rate)
+    if args.record:
+        cassette = Cassette(args.cassette)
+        log.info("录制模式：API 响应将写入 %s", cassette.directory)
+        return RecordingApiHandler(ApiHandler(), cassette)
+    return None
+
+
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    window = MainWindow()
+    cli_args, qt_argv = parse_cli_args(sys.argv)
+    app = QApplication(qt_argv)
+    app.setApplicationName("顺势ai") # 日志目录依赖应用名称，需在 setup_logging 之前设置
+    app.setOrganizationName("顺势ai")
+    setup_logging() # 默认 INFO；调试输出用 --debug 或环境变量 XGY_LOG_LEVEL=DEBUG 打开
+    window = MainWindow(api_handler=build_api_handler(cli_args), offline=cli_args.offline)
     window.show()
     sys.exit(app.exec())
@@ -0,0 +1,552 @@
+# mock_api_server.py
+"""
+本地模拟的仙宫云 Open API，用于压测抢占调度和轮询逻辑 (不需要令牌余额，也不产生费用)。
+
+独立运行:
+    python mock_api_server.py --port 8765 --latency lognormal:-1.5,0.5 \
+        --capacity "NVIDIA GeForce RTX 4090@1=2" --rate-limit 10
+
+也可以在测试或基准脚本中进程内启动:
+    server = MockApiServer(port=0).start()
+    client = MockApiClient(server.base_url)
+    server.state.set_capacity("NVIDIA GeForce RTX 4090", 1, 4)
+"""
+import json
+import time
+import uuid
+import random
+import logging
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+import requests
+from api_guard import TokenBucket
+
+log = logging.getLogger(__name__)
+
+DEFAULT_GPU_MODELS = ["NVIDIA GeForce RTX 4090", "NVIDIA GeForce RTX 4090 D"]
+DEFAULT_DATA_CENTERS = {1: "模拟数据中心 A", 2: "模拟数据中心 B"}
+DEFAULT_PRICE_PER_GPU = {"NVIDIA GeForce RTX 4090": 1.98, "NVIDIA GeForce RTX 4090 D": 1.68}
+
+# 实例状态切换所需的时间 (秒)，在读取时按时间戳推进，不需要后台线程
+TRANSITION_SECONDS = {"deploying": 3.0, "booting": 2.0, "shutting_down": 2.0}
+RECHARGE_PAID_AFTER = 5.0 # 模拟用户扫码后多少秒订单变为已支付
+
+
+# ------------------------------------------------------------------------------
+# 延迟分布
+# ------------------------------------------------------------------------------
+def parse_latency(spec):
+    """
+    解析延迟分布，返回无参函数 (每次调用得到一个秒数)：
+      fixed:0.1 / uniform:0.05,0.3 / normal:0.2,0.05 / lognormal:mu,sigma / exp:0.2
+    """
+    if spec in (None, "", "0", "none"):
+        return lambda: 0.0
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v.strip()]
+    rng = random.Random()
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: rng.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda: max(0.0, rng.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        return lambda: rng.lognormvariate(values[0], values[1])
+    if kind == "exp":
+        return lambda: rng.expovariate(1.0 / values[0])
+    raise ValueError(f"未知的延迟分布: {spec}")
+
+
+# ------------------------------------------------------------------------------
+# 模拟的账户和资源状态
+# ------------------------------------------------------------------------------
+class MockApiError(Exception):
+    def __init__(self, msg, code=400, http_status=200):
+        super().__init__(msg)
+        self.code = code
+        self.http_status = http_status
+
+
+class MockState:
+    """模拟服务器的全部状态 (线程安全)；容量按 (GPU 型号, 数据中心 ID) 记录空闲 GPU 数"""
+
+    def __init__(self, capacity=None, balance=100.0, clock=time.time):
+        self._lock = threading.RLock()
+        self._clock = clock
+        self.balance = balance
+        self.instances = {}
+        self.images = {}
+        self.orders = {}
+        self.capacity = dict(capacity) if capacity else {
+            (model, dc): 2 for model in DEFAULT_GPU_MODELS for dc in DEFAULT_DATA_CENTERS}
+        self.deploy_attempts = 0
+        self.deploy_successes = 0
+        self._charged_at = clock()
+
+    # --- 容量 ---
+    def set_capacity(self, gpu_model, data_center_id, free_gpus):
+        with self._lock:
+            self.capacity[(gpu_model, int(data_center_id))] = max(0, int(free_gpus))
+
+    def add_capacity(self, gpu_model, data_center_id, delta):
+        """释放 (delta > 0) 或被其他用户抢走 (delta < 0) 若干 GPU，空闲数不会小于 0"""
+        with self._lock:
+            key = (gpu_model, int(data_center_id))
+            self.capacity[key] = max(0, self.capacity.get(key, 0) + int(delta))
+            return self.capacity[key]
+
+    def free_gpus(self, gpu_model, data_center_id):
+        with self._lock:
+            return self.capacity.get((gpu_model, int(data_center_id)), 0)
+
+    def _take_gpus(self, gpu_model, data_center_id, count):
+        key = (gpu_model, int(data_center_id))
+        if self.capacity.get(key, 0) < count:
+            raise MockApiError("GPU 资源不足，请稍后重试或更换型号/数据中心", code=4001)
+        self.capacity[key] -= count
+
+    def _release_gpus(self, instance):
+        if instance.get("gpu_held"):
+            key = (instance["gpu_model"], instance["data_center_id"])
+            self.capacity[key] = self.capacity.get(key, 0) + instance["gpu_used"]
+            instance["gpu_held"] = False
+
+    # --- 时间推进 ---
+    def _advance(self):
+        """推进实例状态并按运行时间扣费"""
+        now = self._clock()
+        for instance in self.instances.values():
+            status = instance["status"]
+            if status in TRANSITION_SECONDS and now - instance["_changed_at"] >= TRANSITION_SECONDS[status]:
+                instance["status"] = "stopped" if status == "shutting_down" else "running"
+                instance["_changed_at"] = now
+                if instance["status"] == "running":
+                    instance["start_timestamp"] = int(now * 1000)
+        elapsed_hours = (now - self._charged_at) / 3600
+        self._charged_at = now
+        for instance in self.instances.values():
+            if instance["status"] == "running":
+                self.balance -= instance["price_per_hour"] * elapsed_hours
+
+    def _instance(self, instance_id):
+        instance = self.instances.get(instance_id)
+        if instance is None:
+            raise MockApiError(f"实例不存在: {instance_id}", code=4004)
+        return instance
+
+    @staticmethod
+    def _public(record):
+        return {k: v for k, v in record.items() if not k.startswith("_") and k != "gpu_held"}
+
+    # --- 账户 ---
+    def whoami(self):
+        return {"nickname": "模拟用户", "uuid": "00000000-mock-user", "phone": "138****0000"}
+
+    def get_balance(self):
+        with self._lock:
+            self._advance()
+            return {"balance": round(self.balance, 4)}
+
+    # --- 实例 ---
+    def list_instances(self):
+        with self._lock:
+            self._advance()
+            items = [self._public(i) for i in self.instances.values()]
+            return {"list": items, "total": len(items)}
+
+    def deploy(self, params):
+        gpu_model = params.get("gpu_model") or DEFAULT_GPU_MODELS[0]
+        gpu_count = int(params.get("gpu_count") or 1)
+        data_center_id = int(params.get("data_center_id") or 1)
+        with self._lock:
+            self._advance()
+            self.deploy_attempts += 1
+            if self.balance <= 0:
+                raise MockApiError("账户余额不足", code=4002)
+            self._take_gpus(gpu_model, data_center_id, gpu_count)
+            self.deploy_successes += 1
+            now = self._clock()
+            instance_id = uuid.uuid4().hex[:12]
+            self.instances[instance_id] = {
+                "id": instance_id,
+                "name": params.get("name") or f"mock-{instance_id[:6]}",
+                "status": "deploying",
+                "gpu_model": gpu_model,
+                "gpu_used": gpu_count,
+                "gpu_count": gpu_count,
+                "cpu_model": "Mock CPU",
+                "cpu_core_count": 16 * gpu_count,
+                "memory_size": 64 * gpu_count * 1024 ** 3,
+                "system_disk_size": 100 * 1024 ** 3,
+                "data_disk_size": 0,
+                "price_per_hour": round(DEFAULT_PRICE_PER_GPU.get(gpu_model, 2.0) * gpu_count, 2),
+                "data_center_id": data_center_id,
+                "data_center_name": DEFAULT_DATA_CENTERS.get(data_center_id, f"数据中心 {data_center_id}"),
+                "image": params.get("image"),
+                "ssh_domain": "ssh.mock.local",
+                "ssh_port": 20000 + len(self.instances),
+                "ssh_user": "root",
+                "password": "mock-password",
+                "web_url": f"https://{instance_id}-8888.mock.local",
+                "jupyter_url": f"https://{instance_id}-8888.mock.local/lab",
+                "create_timestamp": int(now * 1000),
+                "start_timestamp": None,
+                "gpu_held": True,
+                "_changed_at": now,
+            }
+            return {"id": instance_id}
+
+    def boot(self, params):
+        with self._lock:
+            self._advance()
+            instance = self._instance(params.get("id"))
+            if instance["status"] != "stopped":
+                raise MockApiError(f"实例当前状态 {instance['status']} 不能开机", code=4003)
+            gpu_model = params.get("gpu_model") or instance["gpu_model"]
+            gpu_count = int(params.get("gpu_count") or instance["gpu_used"])
+            if not instance["gpu_held"] or gpu_model != instance["gpu_model"] or gpu_count != instance["gpu_used"]:
+                self._release_gpus(instance)
+                self._take_gpus(gpu_model, instance["data_center_id"], gpu_count)
+                instance.update(gpu_model=gpu_model, gpu_used=gpu_count, gpu_count=gpu_count, gpu_held=True)
+            instance["status"] = "booting"
+            instance["_changed_at"] = self._clock()
+            return {}
+
+    def shutdown(self, instance_id, release_gpu=False, destroy=False):
+        with self._lock:
+            self._advance()
+            instance = self._instance(instance_id)
+            if instance["status"] != "running":
+                raise MockApiError(f"实例当前状态 {instance['status']} 不能关机", code=4003)
+            if destroy:
+                self._release_gpus(instance)
+                del self.instances[instance_id]
+                return {}
+            if release_gpu:
+                self._release_gpus(instance)
+            instance["status"] = "shutting_down"
+            instance["_changed_at"] = self._clock()
+            return {}
+
+    def destroy(self, instance_id):
+        with self._lock:
+            self._advance()
+            instance = self._instance(instance_id)
+            self._release_gpus(instance)
+            del self.instances[instance_id]
+            return {}
+
+    def save_image(self, instance_id, image_name=None, destroy=False):
+        with self._lock:
+            self._advance()
+            instance = self._instance(instance_id)
+            image_id = uuid.uuid4().hex[:12]
+            self.images[image_id] = {
+                "id": image_id, "name": image_name or f"{instance['name']}-image", "size": 20 * 1024 ** 3,
+                "status": "available", "original_owner": True, "image_type": "private",
+                "create_timestamp": int(self._clock() * 1000),
+            }
+            if destroy:
+                self._release_gpus(instance)
+                del self.instances[instance_id]
+            return {"id": image_id}
+
+    # --- 镜像 ---
+    def list_images(self):
+        with self._lock:
+            items = list(self.images.values())
+            return {"list": items, "total": len(items)}
+
+    def destroy_image(self, image_id):
+        with self._lock:
+            if self.images.pop(image_id, None) is None:
+                raise MockApiError(f"镜像不存在: {image_id}", code=4004)
+            return {}
+
+    # --- 充值 ---
+    def create_recharge(self, amount, payment="wechat"):
+        with self._lock:
+            trade_no = f"MOCK{int(self._clock() * 1000)}{random.randint(100, 999)}"
+            self.orders[trade_no] = {"trade_no": trade_no, "amount": float(amount), "payment": payment,
+                                     "status": "pending", "created_at": self._clock()}
+            return {"trade_no": trade_no, "amount": float(amount), "payment": payment,
+                    "url": f"weixin://wxpay/bizpayurl?pr=mock{trade_no}"}
+
+    def query_recharge(self, trade_no):
+        with self._lock:
+            order = self.orders.get(trade_no)
+            if order is None:
+                raise MockApiError(f"订单不存在: {trade_no}", code=4004)
+            if order["status"] == "pending" and self._clock() - order["created_at"] >= RECHARGE_PAID_AFTER:
+                order["status"] = "paid"
+                self.balance += order["amount"]
+            return {k: v for k, v in order.items() if k != "created_at"}
+
+
+# ------------------------------------------------------------------------------
+# HTTP 层
+# ------------------------------------------------------------------------------
+# (HTTP 方法, 路径) -> (接口名, 处理函数 (state, params) -> data)
+ROUTES = {
+    ("GET", "/open/whoami"): ("get_whoami", lambda s, p: s.whoami()),
+    ("GET", "/open/balance"): ("get_balance", lambda s, p: s.get_balance()),
+    ("GET", "/open/instances"): ("get_instances", lambda s, p: s.list_instances()),
+    ("POST", "/open/instance/deploy"): ("deploy_instance", lambda s, p: s.deploy(p)),
+    ("POST", "/open/instance/boot"): ("boot_instance", lambda s, p: s.boot(p)),
+    ("POST", "/open/instance/shutdown"): ("shutdown_instance", lambda s, p: s.shutdown(p.get("id"))),
+    ("POST", "/open/instance/shutdown_release_gpu"):
+        ("shutdown_release_gpu", lambda s, p: s.shutdown(p.get("id"), release_gpu=True)),
+    ("POST", "/open/instance/shutdown_destroy"):
+        ("shutdown_destroy", lambda s, p: s.shutdown(p.get("id"), destroy=True)),
+    ("POST", "/open/instance/destroy"): ("destroy_instance", lambda s, p: s.destroy(p.get("id"))),
+    ("POST", "/open/instance/save_image"):
+        ("save_image", lambda s, p: s.save_image(p.get("id"), p.get("image_name"))),
+    ("POST", "/open/instance/save_image_destroy"):
+        ("save_image_destroy", lambda s, p: s.save_image(p.get("id"), p.get("image_name"), destroy=True)),
+    ("GET", "/open/images"): ("get_images", lambda s, p: s.list_images()),
+    ("POST", "/open/image/destroy"): ("destroy_image", lambda s, p: s.destroy_image(p.get("id"))),
+    ("POST", "/open/recharge/create"):
+        ("create_recharge_order", lambda s, p: s.create_recharge(p.get("amount", 0), p.get("payment", "wechat"))),
+    ("GET", "/open/recharge/query"): ("query_recharge_order", lambda s, p: s.query_recharge(p.get("trade_no"))),
+}
+
+
+class MockApiServer:
+    """
+    在后台线程中运行的模拟 API 服务器。
+    :param latency: 默认延迟分布 (见 parse_latency)
+    :param endpoint_latency: {接口名: 延迟分布}，覆盖默认值
+    :param rate_limit: 每个令牌每秒允许的请求数 (None 不限流)，超出返回 HTTP 429
+    :param error_rate: 随机返回 HTTP 500 的概率
+    :param token: 只接受这个令牌；None 表示接受任意非空令牌
+    """
+
+    def __init__(self, host="127.0.0.1", port=8765, state=None, latency=None, endpoint_latency=None,
+                 rate_limit=None, rate_burst=None, error_rate=0.0, token=None):
+        self.state = state or MockState()
+        self.default_latency = parse_latency(latency)
+        self.endpoint_latency = {name: parse_latency(spec) for name, spec in (endpoint_latency or {}).items()}
+        self.rate_limit = rate_limit
+        self.rate_burst = rate_burst or (rate_limit * 2 if rate_limit else None)
+        self.error_rate = error_rate
+        self.token = token
+        self.request_counts = {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._random = random.Random()
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="mock-api", daemon=True)
+        self._thread.start()
+        log.info("模拟 API 已启动: %s", self.base_url)
+        return self
+
+    def serve_forever(self):
+        log.info("模拟 API 已启动: %s", self.base_url)
+        self._httpd.serve_forever()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _rate_limited(self, token):
+        if not self.rate_limit:
+            return False
+        with self._lock:
+            bucket = self._buckets.get(token)
+            if bucket is None:
+                bucket = self._buckets[token] = TokenBucket(self.rate_limit, self.rate_burst)
+            return not bucket.try_acquire()
+
+    def handle(self, method, path, headers, params):
+        """处理一次请求，返回 (HTTP 状态码, 响应 dict)；HTTP 层和测试都通过这里"""
+        route = ROUTES.get((method, path))
+        if route is None:
+            return 404, {"success": False, "code": 404, "msg": f"未知接口: {method} {path}"}
+        name, handler = route
+        with self._lock:
+            self.request_counts[name] = self.request_counts.get(name, 0) + 1
+
+        delay = self.endpoint_latency.get(name, self.default_latency)()
+        if delay > 0:
+            time.sleep(delay)
+
+        auth = headers.get("Authorization", "")
+        token = auth[7:] if auth.startswith("Bearer ") else ""
+        if not token or (self.token is not None and token != self.token):
+            return 401, {"success": False, "code": 401, "msg": "访问令牌无效"}
+        if self._rate_limited(token):
+            return 429, {"success": False, "code": 429, "msg": "请求过于频繁，请稍后再试"}
+        if self.error_rate and self._random.random() < self.error_rate:
+            return 500, {"success": False, "code": 500, "msg": "服务器内部错误 (模拟)"}
+        try:
+            data = handler(self.state, params)
+        except MockApiError as e:
+            return e.http_status, {"success": False, "code": e.code, "msg": str(e)}
+        return 200, {"success": True, "code": 200, "msg": "ok", "data": data}
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _dispatch(self, method):
+                parsed = urlparse(self.path)
+                params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+                if method == "POST":
+                    length = int(self.headers.get("Content-Length") or 0)
+                    if length:
+                        try:
+                            params.update(json.loads(self.rfile.read(length)))
+                        except ValueError:
+                            self._reply(400, {"success": False, "code": 400, "msg": "请求体不是有效的 JSON"})
+                            return
+                status, body = server.handle(method, parsed.path, self.headers, params)
+                self._reply(status, body)
+
+            def _reply(self, status, body):
+                payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def log_message(self, format, *args):
+                log.debug("%s - %s", self.address_string(), format % args)
+
+        return Handler
+
+
+# ------------------------------------------------------------------------------
+# 客户端：方法名与 ApiHandler 相同，用于基准和压测脚本
+# ------------------------------------------------------------------------------
+class MockApiClient:
+    """通过 HTTP 调用模拟服务器，返回格式与 ApiHandler 相同 (网络异常时 success=False 并带 exception_type)"""
+
+    def __init__(self, base_url, token="mock-token", timeout=15):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self._session = requests.Session()
+        self._access_token = None
+        self.set_access_token(token)
+
+    def set_access_token(self, token):
+        self._access_token = token
+        self._session.headers["Authorization"] = f"Bearer {token}" if token else ""
+
+    def _request(self, method, path, params=None):
+        try:
+            if method == "GET":
+                response = self._session.get(self.base_url + path, params=params, timeout=self.timeout)
+            else:
+                response = self._session.post(self.base_url + path, json=params or {}, timeout=self.timeout)
+        except requests.exceptions.RequestException as e:
+            return {"success": False, "msg": f"API请求异常: {e}", "exception_type": type(e).__name__}
+        # requests.JSONDecodeError 同时是 RequestException 的子类，必须在上面的网络异常之外单独处理
+        try:
+            return response.json()
+        except ValueError:
+            return {"success": False, "msg": f"API响应格式错误 (状态码: {response.status_code})"}
+
+    def get_whoami(self):
+        return self._request("GET", "/open/whoami")
+
+    def get_balance(self):
+        return self._request("GET", "/open/balance")
+
+    def get_instances(self):
+        return self._request("GET", "/open/instances")
+
+    def get_images(self):
+        return self._request("GET", "/open/images")
+
+    def deploy_instance(self, deploy_data):
+        return self._request("POST", "/open/instance/deploy", deploy_data)
+
+    def boot_instance(self, params):
+        return self._request("POST", "/open/instance/boot", params)
+
+    def shutdown_instance(self, instance_id):
+        return self._request("POST", "/open/instance/shutdown", {"id": instance_id})
+
+    def shutdown_release_gpu(self, instance_id):
+        return self._request("POST", "/open/instance/shutdown_release_gpu", {"id": instance_id})
+
+    def shutdown_destroy(self, instance_id):
+        return self._request("POST", "/open/instance/shutdown_destroy", {"id": instance_id})
+
+    def destroy_instance(self, instance_id):
+        return self._request("POST", "/open/instance/destroy", {"id": instance_id})
+
+    def save_image(self, instance_id, image_name=None):
+        return self._request("POST", "/open/instance/save_image", {"id": instance_id, "image_name": image_name})
+
+    def save_image_destroy(self, instance_id, image_name=None):
+        return self._request("POST", "/open/instance/save_image_destroy", {"id": instance_id, "image_name": image_name})
+
+    def destroy_image(self, image_id):
+        return self._request("POST", "/open/image/destroy", {"id": image_id})
+
+    def create_recharge_order(self, amount, payment="wechat"):
+        return self._request("POST", "/open/recharge/create", {"amount": amount, "payment": payment})
+
+    def query_recharge_order(self, trade_no):
+        return self._request("GET", "/open/recharge/query", {"trade_no": trade_no})
+
+
+def _parse_capacity(specs):
+    """"型号@数据中心=数量" 列表 -> {(型号, 数据中心): 数量}"""
+    capacity = {}
+    for spec in specs:
+        key, _, count = spec.rpartition("=")
+        model, _, dc = key.rpartition("@")
+        capacity[(model, int(dc))] = int(count)
+    return capacity
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="本地模拟的仙宫云 Open API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", default="uniform:0.05,0.3", help="默认延迟分布，例如 lognormal:-1.5,0.5")
+    parser.add_argument("--endpoint-latency", action="append", default=[], metavar="NAME=SPEC",
+                        help="单个接口的延迟分布，例如 deploy_instance=normal:0.8,0.2 (可重复)")
+    parser.add_argument("--capacity", action="append", default=[], metavar="MODEL@DC=N",
+                        help="空闲 GPU 数，例如 \"NVIDIA GeForce RTX 4090@1=2\" (可重复)")
+    parser.add_argument("--balance", type=float, default=100.0)
+    parser.add_argument("--rate-limit", type=float, default=None, help="每个令牌每秒请求数上限")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--token", default=None, help="只接受这个令牌 (默认接受任意非空令牌)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    state = MockState(capacity=_parse_capacity(args.capacity) or None, balance=args.balance)
+    endpoint_latency = dict(item.split("=", 1) for item in args.endpoint_latency)
+    server = MockApiServer(args.host, args.port, state=state, latency=args.latency,
+                           endpoint_latency=endpoint_latency, rate_limit=args.rate_limit,
+                           error_rate=args.error_rate, token=args.token)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,390 @@
+# output_sync.py
+"""
+实例输出文件 (shuchu / quanbu 文件服务) 的增量同步：
+遍历远程目录列表，与本地清单 (大小、修改时间、sha256) 比较，只下载新增或变化的文件，
+多个文件并行下载 (有并发上限)。监视模式下按间隔重复同步，适合长时间的 ComfyUI 批量出图。
+
+支持两种目录列表格式：
+- nginx autoindex_format json: [{"name": ..., "type": "file"/"directory", "size": ..., "mtime": ...}]
+- HTML 目录页 (nginx/Apache autoindex、python -m http.server)：解析链接，文件的大小和修改时间用 HEAD 获取
+
+本地测试可直接用标准库的目录服务作为文件服务:
+    python -m http.server 8000 --directory ./some_outputs
+    python output_sync.py --url http://127.0.0.1:8000/ --out ./synced --watch 5
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from email.utils import parsedate_to_datetime
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlsplit, quote, unquote
+import requests
+from PySide6.QtCore import QObject, Signal
+
+log = logging.getLogger(__name__)
+
+MANIFEST_FILE_NAME = ".sync_manifest.json"
+DEFAULT_EXCLUDE = (".tmp", ".part") # 正在写入的文件
+CHUNK_SIZE = 256 * 1024
+
+# 远程条目：path 为相对同步根目录的路径 (使用 /)，mtime 为 Unix 时间戳 (未知时为 None)
+RemoteEntry = namedtuple("RemoteEntry", ["path", "size", "mtime"])
+
+
+class SyncError(Exception):
+    """目录列表无法获取或解析"""
+
+
+class _LinkParser(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.links = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "a":
+            href = dict(attrs).get("href")
+            if href:
+                self.links.append(href)
+
+
+# ------------------------------------------------------------------------------
+# 远程文件服务
+# ------------------------------------------------------------------------------
+class FileServiceClient:
+    """
+    读取实例上的目录服务。base_url 为同步根目录 (以 / 结尾)，
+    例如 build_service_url(web_url, ports['shuchu'], 'shuchu') 得到的 .../files/
+    """
+
+    def __init__(self, base_url, timeout=30, pool_size=8):
+        self.base_url = base_url if base_url.endswith("/") else base_url + "/"
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def url_for(self, path):
+        return urljoin(self.base_url, quote(path))
+
+    def list_dir(self, path=""):
+        """返回 (文件列表, 子目录列表)；HTML 目录页中的文件 size/mtime 为 None，由 stat() 补全"""
+        url = self.url_for(path)
+        try:
+            response = self.session.get(url, timeout=self.timeout, headers={"Accept": "application/json, text/html"})
+            response.raise_for_status()
+        except requests.RequestException as e:
+            raise SyncError(f"无法获取目录 /{path}: {e}") from e
+        if "json" in response.headers.get("Content-Type", ""):
+            return self._parse_json_listing(path, response.json())
+        return self._parse_html_listing(path, url, response.text)
+
+    @staticmethod
+    def _parse_json_listing(path, items):
+        files, dirs = [], []
+        for item in items:
+            name = item.get("name", "")
+            if not name or name in (".", ".."):
+                continue
+            if item.get("type") == "directory":
+                dirs.append(path + name + "/")
+            else:
+                mtime = item.get("mtime")
+                files.append(RemoteEntry(path + name, item.get("size"), _parse_http_date(mtime) if mtime else None))
+        return files, dirs
+
+    def _parse_html_listing(self, path, url, html):
+        parser = _LinkParser()
+        parser.feed(html)
+        root = urlsplit(url)
+        files, dirs, seen = [], [], set()
+        for href in parser.links:
+            target = urlsplit(urljoin(url, href))
+            # 只接受当前目录的直接子项 (排除上级目录、排序链接、外部链接)
+            if target.netloc != root.netloc or target.query or not target.path.startswith(root.path):
+                continue
+            name = unquote(target.path[len(root.path):])
+            if not name or name in seen or "/" in name.rstrip("/"):
+                continue
+            seen.add(name)
+            if name.endswith("/"):
+                dirs.append(path + name)
+            else:
+                files.append(RemoteEntry(path + name, None, None))
+        return files, dirs
+
+    def stat(self, entry):
+        """用 HEAD 获取文件大小和修改时间"""
+        try:
+            response = self.session.head(self.url_for(entry.path), timeout=self.timeout, allow_redirects=True)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            raise SyncError(f"无法获取文件信息 {entry.path}: {e}") from e
+        size = response.headers.get("Content-Length")
+        modified = response.headers.get("Last-Modified")
+        return entry._replace(size=int(size) if size and size.isdigit() else None,
+                              mtime=_parse_http_date(modified) if modified else None)
+
+    def download(self, entry, local_path, should_stop=None):
+        """下载到 local_path (先写 .part 再替换)，返回 (字节数, sha256)"""
+        os.makedirs(os.path.dirname(local_path) or ".", exist_ok=True)
+        tmp_path = local_path + ".part"
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with self.session.get(self.url_for(entry.path), stream=True, timeout=self.timeout) as response:
+                response.raise_for_status()
+                with open(tmp_path, "wb") as f:
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        if should_stop is not None and should_stop():
+                            raise SyncError("已停止")
+                        f.write(chunk)
+                        digest.update(chunk)
+                        size += len(chunk)
+            os.replace(tmp_path, local_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        if entry.mtime:
+            os.utime(local_path, (entry.mtime, entry.mtime)) # 本地文件保留远程修改时间
+        return size, digest.hexdigest()
+
+
+def _parse_http_date(value):
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+# ------------------------------------------------------------------------------
+# 本地清单
+# ------------------------------------------------------------------------------
+class SyncManifest:
+    """
+    已同步文件的清单 {相对路径: {"size", "mtime", "sha256"}}，保存在本地同步目录中。
+    远程大小和修改时间都与清单一致、且本地文件仍在 (大小一致) 时跳过下载。
+    """
+
+    def __init__(self, local_dir):
+        self.path = os.path.join(local_dir, MANIFEST_FILE_NAME)
+        self._lock = threading.Lock()
+        self.entries = self._read()
+        self._dirty = False
+
+    def _read(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict) and isinstance(data.get("files"), dict):
+                return data["files"]
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            log.warning("同步清单无法读取，将重新同步全部文件: %s", e)
+        return {}
+
+    def is_current(self, entry, local_path):
+        with self._lock:
+            known = self.entries.get(entry.path)
+        if not known or known.get("size") != entry.size or known.get("mtime") != entry.mtime:
+            return False
+        try:
+            return os.path.getsize(local_path) == known.get("size")
+        except OSError:
+            return False # 本地文件被删除或移动
+
+    def record(self, entry, sha256):
+        with self._lock:
+            self.entries[entry.path] = {"size": entry.size, "mtime": entry.mtime, "sha256": sha256}
+            self._dirty = True
+
+    def save(self):
+        """先写临时文件再替换；没有变化时不写"""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {"version": 1, "files": dict(self.entries)}
+            self._dirty = False
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            log.warning("写入同步清单失败: %s", e)
+
+
+# ------------------------------------------------------------------------------
+# 同步引擎
+# ------------------------------------------------------------------------------
+class OutputSyncEngine:
+    """
+    一轮同步 = 并行遍历目录 -> 比较清单 -> 并行下载变化的文件。
+    目录列表、HEAD 和下载共用一个有并发上限的线程池 (max_workers)。
+    :param exclude: 不同步的文件名后缀 (例如正在写入的 .tmp)
+    """
+
+    def __init__(self, client, local_dir, max_workers=4, exclude=DEFAULT_EXCLUDE):
+        self.client = client
+        self.local_dir = local_dir
+        self.max_workers = max(1, max_workers)
+        self.exclude = tuple(exclude)
+        self.manifest = SyncManifest(local_dir)
+
+    def local_path(self, entry):
+        parts = [part for part in entry.path.split("/") if part not in ("", ".", "..")]
+        return os.path.join(self.local_dir, *parts)
+
+    def walk(self, executor, should_stop):
+        """并行遍历所有目录，返回远程文件列表 (HTML 列表中的文件已补全大小和修改时间)"""
+        root = executor.submit(self.client.list_dir, "")
+        files, pending = [], {root}
+        while pending:
+            future = next(as_completed(pending))
+            pending.discard(future)
+            if should_stop():
+                break
+            try:
+                dir_files, dirs = future.result()
+            except SyncError as e:
+                if future is root:
+                    raise # 根目录都无法列出，本轮同步失败
+                log.warning("%s", e) # 子目录失败不影响其余文件，下一轮再试
+                continue
+            files.extend(entry for entry in dir_files if not entry.path.endswith(self.exclude))
+            pending.update(executor.submit(self.client.list_dir, path) for path in dirs)
+        unknown = [entry for entry in files if entry.size is None]
+        if unknown:
+            stats = dict(zip(unknown, executor.map(self._safe_stat, unknown)))
+            files = [stats.get(entry, entry) for entry in files]
+        return files
+
+    def _safe_stat(self, entry):
+        try:
+            return self.client.stat(entry)
+        except SyncError as e:
+            log.warning("%s", e)
+            return entry
+
+    def sync_once(self, should_stop=lambda: False, on_file=None):
+        """
+        同步一轮，返回统计 {"files", "downloaded", "skipped", "failed", "bytes", "seconds"}。
+        :param on_file: 每下载完一个文件调用 on_file(相对路径, 字节数) (在线程池中调用)
+        """
+        started = time.monotonic()
+        stats = {"files": 0, "downloaded": 0, "skipped": 0, "failed": 0, "bytes": 0}
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="output-sync") as executor:
+            files = self.walk(executor, should_stop)
+            stats["files"] = len(files)
+            changed = [entry for entry in files if not self.manifest.is_current(entry, self.local_path(entry))]
+            stats["skipped"] = len(files) - len(changed)
+            futures = {executor.submit(self._download, entry, should_stop): entry for entry in changed}
+            for future in as_completed(futures):
+                entry = futures[future]
+                try:
+                    size = future.result()
+                except (SyncError, requests.RequestException, OSError) as e:
+                    if not should_stop():
+                        log.warning("同步 %s 失败: %s", entry.path, e)
+                    stats["failed"] += 1
+                    continue
+                stats["downloaded"] += 1
+                stats["bytes"] += size
+                if on_file is not None:
+                    on_file(entry.path, size)
+        self.manifest.save()
+        stats["seconds"] = time.monotonic() - started
+        return stats
+
+    def _download(self, entry, should_stop):
+        size, sha256 = self.client.download(entry, self.local_path(entry), should_stop)
+        self.manifest.record(entry._replace(size=entry.size if entry.size is not None else size), sha256)
+        return size
+
+
+class OutputSyncWorker(QObject):
+    """
+    在后台线程中运行同步 (moveToThread 后由 QThread.started 调用 run)。
+    watch_interval 为 None 时只同步一轮，否则每隔 watch_interval 秒重复，直到 stop()。
+    """
+    finished = Signal()
+    error = Signal(str)
+    status_update = Signal(str)
+    file_synced = Signal(str, int) # 相对路径, 字节数
+    round_finished = Signal(dict) # sync_once 的统计
+
+    def __init__(self, engine, watch_interval=None, parent=None):
+        super().__init__(parent)
+        self.engine = engine
+        self.watch_interval = watch_interval
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        try:
+            while not self._stop_event.is_set():
+                self.status_update.emit("正在同步...")
+                try:
+                    stats = self.engine.sync_once(self._stop_event.is_set, self.file_synced.emit)
+                except SyncError as e:
+                    if self.watch_interval is None:
+                        raise
+                    self.status_update.emit(f"同步失败，{self.watch_interval:g} 秒后重试: {e}")
+                else:
+                    self.round_finished.emit(stats)
+                    self.status_update.emit(
+                        f"同步完成: 下载 {stats['downloaded']} 个 ({stats['bytes'] / 1024 ** 2:.1f} MB)，"
+                        f"跳过 {stats['skipped']} 个，失败 {stats['failed']} 个，用时 {stats['seconds']:.1f} 秒")
+                if self.watch_interval is None or self._stop_event.wait(self.watch_interval):
+                    break
+        except Exception as e:
+            log.warning("输出同步出错: %s", e)
+            self.error.emit(str(e))
+        finally:
+            self.finished.emit()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="增量同步实例输出文件")
+    parser.add_argument("--url", required=True, help="文件服务地址，例如 https://xxx-<端口>.<域名>/files/")
+    parser.add_argument("--out", required=True, help="本地同步目录")
+    parser.add_argument("--workers", type=int, default=4, help="并发数")
+    parser.add_argument("--watch", type=float, default=None, metavar="SECONDS", help="监视模式：每隔多少秒同步一次")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    engine = OutputSyncEngine(FileServiceClient(args.url, pool_size=args.workers), args.out, max_workers=args.workers)
+    while True:
+        try:
+            stats = engine.sync_once()
+        except SyncError as e:
+            log.error("%s", e)
+            if args.watch is None:
+                return 1
+        else:
+            log.info("文件 %d，下载 %d (%.1f MB)，跳过 %d，失败 %d，用时 %.2f 秒", stats["files"], stats["downloaded"],
+                     stats["bytes"] / 1024 ** 2, stats["skipped"], stats["failed"], stats["seconds"])
+        if args.watch is None:
+            return 0 if stats["failed"] == 0 else 2
+        try:
+            time.sleep(args.watch)
+        except KeyboardInterrupt:
+            return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+# qr_render.py
+"""
+在后台线程中生成二维码并直接绘制为 QImage (不经过 PNG 编码再解码)。
+QImage 可以在任意线程中创建，界面线程只需 QPixmap.fromImage。
+结果按内容 (支付链接) 缓存，重新打开同一订单的二维码无需重新生成。
+"""
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import qrcode
+from PySide6.QtCore import QObject, Signal
+from PySide6.QtGui import QImage
+
+log = logging.getLogger(__name__)
+
+BOX_SIZE = 10 # 每个模块的像素数
+BORDER = 4 # 静区宽度 (模块数)，与 qrcode.make 的默认值一致
+CACHE_SIZE = 16
+
+
+def render_qr_image(data, box_size=BOX_SIZE, border=BORDER):
+    """生成二维码并返回灰度 QImage (黑色模块 0，白色 255)"""
+    qr = qrcode.QRCode(box_size=box_size, border=border)
+    qr.add_data(data)
+    qr.make(fit=True)
+    dark, light = b"\x00" * box_size, b"\xff" * box_size
+    matrix = qr.get_matrix() # 已包含静区
+    rows = []
+    for row in matrix:
+        line = b"".join(dark if module else light for module in row)
+        rows.append(line * box_size)
+    width = len(matrix) * box_size
+    buffer = b"".join(rows)
+    # QImage 不持有 buffer 的所有权，copy() 得到独立的图像
+    return QImage(buffer, width, width, width, QImage.Format.Format_Grayscale8).copy()
+
+
+class QRCodeRenderer(QObject):
+    """
+    在主线程中创建和使用：request(data) 后通过 rendered 信号返回图像；
+    已缓存的内容立即 (同步) 发出信号。
+    """
+    rendered = Signal(str, QImage) # 内容, 图像
+    failed = Signal(str, str) # 内容, 错误信息
+
+    _done = Signal(str, object, str) # 内容, QImage 或 None, 错误信息 (从线程池发出)
+
+    def __init__(self, cache_size=CACHE_SIZE, parent=None):
+        super().__init__(parent)
+        self.cache_size = cache_size
+        self._cache = OrderedDict() # 内容 -> QImage (最近使用的在后)
+        self._pending = set()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="qr-render")
+        self._done.connect(self._on_done)
+
+    def cached(self, data):
+        image = self._cache.get(data)
+        if image is not None:
+            self._cache.move_to_end(data)
+        return image
+
+    def request(self, data):
+        image = self.cached(data)
+        if image is not None:
+            self.rendered.emit(data, image)
+            return
+        if data in self._pending:
+            return
+        self._pending.add(data)
+        self._executor.submit(self._render, data)
+
+    def _render(self, data):
+        """在线程池中执行"""
+        try:
+            self._done.emit(data, render_qr_image(data), "")
+        except Exception as e: # qrcode 对超长内容抛出 DataOverflowError 等
+            log.warning("生成二维码失败: %s", e)
+            self._done.emit(data, None, str(e))
+
+    def _on_done(self, data, image, error):
+        self._pending.discard(data)
+        if image is None:
+            self.failed.emit(data, error)
+            return
+        self._cache[data] = image
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        self.rendered.emit(data, image)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
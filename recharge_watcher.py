@@ -0,0 +1,187 @@
+# recharge_watcher.py
+"""
+充值订单支付状态的自动查询：订单创建后在后台按退避间隔调用 query_recharge_order，
+支付成功、关闭或超时后停止。可以同时跟踪多笔订单。
+二维码窗口 (或支付页面) 打开期间查询较快，窗口关闭后放慢，直到超时。
+"""
+import time
+import logging
+from PySide6.QtCore import QObject, Signal, QTimer
+from async_api import LANE_NORMAL
+
+log = logging.getLogger(__name__)
+
+PENDING = "pending"
+PAID = "paid"
+CLOSED = "closed"
+TIMEOUT = "timeout"
+ERROR = "error"
+FINAL_STATES = (PAID, CLOSED, TIMEOUT, ERROR)
+STATE_TEXT = {PENDING: "等待支付", PAID: "已支付", CLOSED: "已关闭", TIMEOUT: "停止查询", ERROR: "查询失败"}
+
+# 订单状态字段的取值 (不区分大小写)；其余值都按等待支付处理
+PAID_VALUES = {"paid", "success", "succeeded", "completed", "finished", "trade_success", "1", "已支付", "支付成功"}
+CLOSED_VALUES = {"closed", "expired", "cancelled", "canceled", "failed", "refunded", "trade_closed",
+                 "已关闭", "已取消", "已过期", "支付失败"}
+
+FOREGROUND_INTERVALS = (2.0, 10.0) # 窗口打开时：首次间隔, 最大间隔 (秒)
+BACKGROUND_MAX_INTERVAL = 60.0
+FOREGROUND_WINDOW = 5 * 60 # 支付页面在浏览器中打开时无法知道何时关闭，超过这个时间按后台间隔查询
+BACKOFF = 1.5
+WATCH_TIMEOUT = 30 * 60 # 订单创建后最多跟踪多久
+MAX_ERRORS = 8 # 连续查询失败次数上限
+
+
+def order_state(result):
+    """从 query_recharge_order 的返回中取出订单状态 (PENDING / PAID / CLOSED)，无法识别时返回 None"""
+    if not isinstance(result, dict) or not result.get("success"):
+        return None
+    data = result.get("data")
+    if not isinstance(data, dict):
+        return None
+    for key in ("status", "trade_status", "state", "pay_status"):
+        value = data.get(key)
+        if value is None:
+            continue
+        value = str(value).strip().lower()
+        if value in PAID_VALUES:
+            return PAID
+        if value in CLOSED_VALUES:
+            return CLOSED
+        return PENDING
+    return None
+
+
+class RechargeOrder:
+    """一笔被跟踪的订单"""
+
+    def __init__(self, trade_no, amount=None, payment=None, url=None):
+        self.trade_no = trade_no
+        self.amount = amount
+        self.payment = payment
+        self.url = url # 支付链接 (微信为二维码内容)
+        self.state = PENDING
+        self.created_at = time.monotonic()
+        self.foreground = True # 二维码窗口或支付页面是否打开
+        self.interval = FOREGROUND_INTERVALS[0]
+        self.next_poll_at = self.created_at + self.interval
+        self.queries = 0
+        self.errors = 0
+        self.in_flight = False
+        self.last_result = None
+        self.message = ""
+
+    @property
+    def finished(self):
+        return self.state in FINAL_STATES
+
+
+class RechargeOrderWatcher(QObject):
+    """
+    通过共享的 AsyncApiClient 查询订单 (经过限流和熔断)，在主线程中创建和使用。
+    :param query: 查询函数，默认为 api_client.api_handler.query_recharge_order
+    """
+    order_updated = Signal(str) # 订单号 (每次查询后)
+    order_finished = Signal(str, str) # 订单号, 最终状态
+
+    _result_ready = Signal(str, object, str) # 订单号, 返回结果, 异常信息 (从事件循环线程发出)
+
+    def __init__(self, api_client, query=None, tick_interval=0.5, parent=None):
+        super().__init__(parent)
+        self.api_client = api_client
+        self.query = query or api_client.api_handler.query_recharge_order
+        self.orders = {} # 订单号 -> RechargeOrder
+        self._result_ready.connect(self._on_result)
+        self.timer = QTimer(self)
+        self.timer.setInterval(int(tick_interval * 1000))
+        self.timer.timeout.connect(self._tick)
+
+    def watch(self, trade_no, amount=None, payment=None, url=None):
+        """开始跟踪订单 (重复调用只把它恢复为前台)"""
+        order = self.orders.get(trade_no)
+        if order is None:
+            order = self.orders[trade_no] = RechargeOrder(trade_no, amount, payment, url)
+            log.info("开始跟踪充值订单 %s", trade_no)
+        self.set_foreground(trade_no, True)
+        self.timer.start()
+        self.order_updated.emit(trade_no)
+        return order
+
+    def set_foreground(self, trade_no, foreground):
+        """二维码窗口打开时查询较快；关闭后按更长的间隔继续查询"""
+        order = self.orders.get(trade_no)
+        if order is None or order.finished:
+            return
+        order.foreground = foreground
+        if foreground:
+            order.interval = FOREGROUND_INTERVALS[0]
+            order.next_poll_at = min(order.next_poll_at, time.monotonic() + order.interval)
+
+    def poll_now(self, trade_no):
+        order = self.orders.get(trade_no)
+        if order is not None and not order.finished:
+            order.next_poll_at = time.monotonic()
+            self._tick()
+
+    @property
+    def pending_orders(self):
+        return [order for order in self.orders.values() if not order.finished]
+
+    def _tick(self):
+        now = time.monotonic()
+        for order in self.pending_orders:
+            if now - order.created_at > WATCH_TIMEOUT:
+                self._finish(order, TIMEOUT, "超过跟踪时间，请稍后手动查询")
+            elif not order.in_flight and now >= order.next_poll_at:
+                self._submit(order)
+        if not self.pending_orders:
+            self.timer.stop()
+
+    def _submit(self, order):
+        order.in_flight = True
+        order.queries += 1
+        trade_no = order.trade_no
+        future = self.api_client.submit_in_lane(LANE_NORMAL, self.query, trade_no=trade_no)
+
+        def done(future):
+            try:
+                self._result_ready.emit(trade_no, future.result(), "")
+            except Exception as e: # 网络错误、熔断等：按失败计数并退避
+                self._result_ready.emit(trade_no, None, str(e) or e.__class__.__name__)
+        future.add_done_callback(done)
+
+    def _on_result(self, trade_no, result, error):
+        order = self.orders.get(trade_no)
+        if order is None or order.finished:
+            return
+        order.in_flight = False
+        order.last_result = result
+        state = order_state(result)
+        if state is None:
+            order.errors += 1
+            order.message = error or (result or {}).get("msg") or "查询失败"
+            if order.errors >= MAX_ERRORS:
+                self._finish(order, ERROR, f"连续 {order.errors} 次查询失败: {order.message}")
+                return
+        else:
+            order.errors = 0
+            if state != PENDING:
+                self._finish(order, state, "支付成功" if state == PAID else "订单已关闭")
+                return
+            order.message = "等待支付"
+        foreground = order.foreground and time.monotonic() - order.created_at < FOREGROUND_WINDOW
+        maximum = FOREGROUND_INTERVALS[1] if foreground else BACKGROUND_MAX_INTERVAL
+        order.interval = min(order.interval * BACKOFF, maximum)
+        order.next_poll_at = time.monotonic() + order.interval
+        self.order_updated.emit(trade_no)
+
+    def _finish(self, order, state, message):
+        order.state = state
+        order.in_flight = False
+        order.message = message
+        log.info("充值订单 %s: %s (查询 %d 次)", order.trade_no, message, order.queries)
+        self.order_updated.emit(order.trade_no)
+        self.order_finished.emit(order.trade_no, state)
+
+    def stop(self):
+        self.timer.stop()
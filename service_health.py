@@ -0,0 +1,142 @@
+# service_health.py
+"""
+实例服务健康检查：实例列表 (快照) 变化时为每个运行中的实例预先计算各服务地址 (service_urls.build_service_table)，
+在线程池中用短超时并发探测，状态变化时发出信号，界面据此显示在线/离线标记。
+点击服务按钮时直接使用预先计算的地址，不再重新获取实例列表；服务离线时可以说明原因。
+"""
+import time
+import logging
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from PySide6.QtCore import QObject, Signal, QTimer
+from service_urls import build_service_table
+
+log = logging.getLogger(__name__)
+
+UP = "up"
+DOWN = "down"
+# (连接超时, 读取超时)，只等响应头，不下载页面
+PROBE_TIMEOUT = (3.05, 5)
+PROBE_INTERVAL = 20.0
+# 与 open_service_url 一致：这些状态的实例可以打开服务
+RUNNING_STATUSES = ('running', 'starting', 'rebooting', '运行中', '启动中', '重启中', '开机中', '工作中')
+# 网关返回这些状态码说明服务进程没有在监听
+GATEWAY_ERRORS = {
+    502: "代理返回 502：服务未启动或已崩溃",
+    503: "代理返回 503：服务暂不可用",
+    504: "代理返回 504：服务无响应",
+}
+
+# state 为 UP / DOWN；detail 为说明文字；latency 为响应耗时 (秒)；checked_at 为检测时间 (time.time())
+ServiceHealth = namedtuple("ServiceHealth", ["state", "detail", "latency", "checked_at"])
+
+
+def probe_url(session, url, timeout=PROBE_TIMEOUT):
+    """请求一次服务地址；4xx (例如需要登录) 也说明服务在运行"""
+    started = time.monotonic()
+    try:
+        with session.get(url, timeout=timeout, stream=True, allow_redirects=True) as response:
+            latency = time.monotonic() - started
+            code = response.status_code
+    except requests.Timeout:
+        return ServiceHealth(DOWN, "连接超时", time.monotonic() - started, time.time())
+    except requests.ConnectionError:
+        return ServiceHealth(DOWN, "无法连接到服务地址 (实例网络或代理不可达)", time.monotonic() - started, time.time())
+    except requests.RequestException as e:
+        return ServiceHealth(DOWN, str(e), time.monotonic() - started, time.time())
+    if code in GATEWAY_ERRORS:
+        return ServiceHealth(DOWN, GATEWAY_ERRORS[code], latency, time.time())
+    if code >= 500:
+        return ServiceHealth(DOWN, f"服务返回 HTTP {code}", latency, time.time())
+    return ServiceHealth(UP, f"HTTP {code}", latency, time.time())
+
+
+class ServiceHealthProber(QObject):
+    """
+    维护 {实例 ID: {服务名: 地址}} 和每个地址的最新检测结果 (在主线程中创建和使用)。
+    有运行中的实例时每隔 interval 秒重新检测一轮。
+    """
+    health_changed = Signal(str, str) # 实例 ID, 服务名
+    table_changed = Signal()
+
+    _probed = Signal(str, str, str, object) # 实例 ID, 服务名, 地址, ServiceHealth (从线程池发出)
+
+    def __init__(self, interval=PROBE_INTERVAL, timeout=PROBE_TIMEOUT, max_workers=8, parent=None):
+        super().__init__(parent)
+        self.timeout = timeout
+        self.table = {} # 实例 ID -> {服务名: 地址}
+        self.names = {} # 实例 ID -> 实例名称
+        self._health = {} # (实例 ID, 服务名) -> ServiceHealth
+        self._in_progress = set()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="service-probe")
+        self._session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._probed.connect(self._on_probed)
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(int(interval * 1000))
+        self.timer.timeout.connect(self.probe_all)
+
+    def update_snapshot(self, instances, ports):
+        """实例列表或端口设置变化后调用；地址表没有变化时什么也不做"""
+        running = [inst for inst in instances if (inst.get('status') or '').lower() in RUNNING_STATUSES]
+        self.names = {inst.get('id'): inst.get('name') or f"实例 {str(inst.get('id'))[:6]}..." for inst in running}
+        table = build_service_table(running, ports)
+        if table == self.table:
+            return
+        # 地址变了 (重新开机、改了端口) 的旧结果作废
+        self._health = {key: health for key, health in self._health.items()
+                        if self.table.get(key[0], {}).get(key[1]) == table.get(key[0], {}).get(key[1])}
+        self.table = table
+        self.table_changed.emit()
+        if table:
+            self.probe_all()
+            self.timer.start()
+        else:
+            self.timer.stop()
+
+    def probe_all(self):
+        for instance_id, urls in self.table.items():
+            for service_name in urls:
+                self.probe(instance_id, service_name)
+
+    def probe(self, instance_id, service_name):
+        """检测一个服务 (同一服务的检测未完成时不重复提交)"""
+        url = self.table.get(instance_id, {}).get(service_name)
+        key = (instance_id, service_name)
+        if url is None or key in self._in_progress:
+            return
+        self._in_progress.add(key)
+        self._executor.submit(self._probe, instance_id, service_name, url)
+
+    def _probe(self, instance_id, service_name, url):
+        """在线程池中执行"""
+        self._probed.emit(instance_id, service_name, url, probe_url(self._session, url, self.timeout))
+
+    def _on_probed(self, instance_id, service_name, url, health):
+        key = (instance_id, service_name)
+        self._in_progress.discard(key)
+        if self.table.get(instance_id, {}).get(service_name) != url:
+            return # 检测期间地址表已更新
+        previous = self._health.get(key)
+        self._health[key] = health
+        if previous is None or previous.state != health.state or previous.detail != health.detail:
+            log.debug("%s %s: %s (%s)", self.names.get(instance_id), service_name, health.state, health.detail)
+            self.health_changed.emit(instance_id, service_name)
+
+    def health(self, instance_id, service_name):
+        """最新检测结果，还没有检测过时返回 None"""
+        return self._health.get((instance_id, service_name))
+
+    def instances_for(self, service_name):
+        """能打开该服务的实例: [(实例 ID, 名称, 地址, ServiceHealth 或 None)]"""
+        return [(instance_id, self.names.get(instance_id, instance_id), urls[service_name],
+                 self._health.get((instance_id, service_name)))
+                for instance_id, urls in self.table.items() if service_name in urls]
+
+    def shutdown(self):
+        self.timer.stop()
+        self._executor.shutdown(wait=False, cancel_futures=True)
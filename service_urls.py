@@ -0,0 +1,54 @@
+# service_urls.py
+import re
+
+# 实例 Web URL 形如 https://<实例标识>-<端口>.<域名>/，把端口段替换为目标服务的端口即可访问该服务
+WEB_URL_PATTERN = re.compile(r'^(https?://[^/]+-)(\d+)(\..*)$', re.IGNORECASE)
+
+# 这些服务打开的是文件浏览页面
+FILE_SERVICES = ("shuchu", "quanbu")
+
+
+def build_service_url(web_url, port, service_name=None):
+    """
+    把实例 web_url 的端口替换为 port，返回服务地址；web_url 格式无法识别时返回 None。
+    文件服务 (shuchu/quanbu) 追加 files/ 路径。
+    """
+    match = WEB_URL_PATTERN.match(web_url or "")
+    if not match:
+        return None
+    url = f"{match.group(1)}{port}{match.group(3)}"
+    if service_name in FILE_SERVICES:
+        if not url.endswith('/'):
+            url += '/'
+        url += 'files/'
+    return url
+
+
+def service_port(url):
+    """从 build_service_url 格式的地址 (例如实例的 jupyter_url) 中取出端口，无法识别时返回 None"""
+    match = WEB_URL_PATTERN.match(url or "")
+    return int(match.group(2)) if match else None
+
+
+# 左侧服务按钮对应的服务 (端口在设置页配置)
+SERVICE_NAMES = ("comfyui", "fengzhuang", "fluxgym", "shuchu", "quanbu")
+
+
+def build_service_table(instances, ports, services=SERVICE_NAMES):
+    """
+    为每个实例预先计算各服务的地址: {实例 ID: {服务名: 地址}}。
+    端口未配置或 web_url 无法识别的服务不出现在表中。
+    """
+    table = {}
+    for inst in instances:
+        instance_id = inst.get('id')
+        if not instance_id:
+            continue
+        urls = {}
+        for service_name in services:
+            port = ports.get(service_name)
+            url = build_service_url(inst.get('web_url'), port, service_name) if port else None
+            if url:
+                urls[service_name] = url
+        table[instance_id] = urls
+    return table
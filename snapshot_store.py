@@ -0,0 +1,81 @@
+# snapshot_store.py
+"""
+最近一次成功获取的账户信息、余额、实例和镜像列表 (快照)，以及启动时的预取任务。
+有访问令牌时，启动阶段在一个任务中并发获取这四项 (bootstrap)，结果写入快照并预先绘制各页面；
+首次打开页面时快照足够新就不再重复请求。
+"""
+import time
+import asyncio
+import logging
+from PySide6.QtCore import QObject, Signal
+
+log = logging.getLogger(__name__)
+
+WHOAMI = "whoami"
+BALANCE = "balance"
+INSTANCES = "instances"
+IMAGES = "images"
+BOOTSTRAP_KEYS = (WHOAMI, BALANCE, INSTANCES, IMAGES)
+
+# 快照在这段时间内视为最新，打开页面时不再请求 (与定时刷新的间隔一致)
+WARM_SECONDS = 15.0
+
+
+class SnapshotStore(QObject):
+    """按名称保存最近一次成功的 API 结果 (在主线程中使用)"""
+    updated = Signal(str) # 快照名称
+
+    def __init__(self, clock=time.monotonic, parent=None):
+        super().__init__(parent)
+        self._clock = clock
+        self._entries = {} # 名称 -> (结果, 获取时间)
+
+    def put(self, key, result):
+        self._entries[key] = (result, self._clock())
+        self.updated.emit(key)
+
+    def touch(self, key):
+        """内容未变化 (例如镜像列表 304)：只更新获取时间"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries[key] = (entry[0], self._clock())
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key)
+        return entry[0] if entry is not None else default
+
+    def age(self, key):
+        """距上次更新的秒数，没有快照时返回 None"""
+        entry = self._entries.get(key)
+        return self._clock() - entry[1] if entry is not None else None
+
+    def is_fresh(self, key, max_age=WARM_SECONDS):
+        age = self.age(key)
+        return age is not None and age <= max_age
+
+    def invalidate(self, key):
+        """数据已知过期 (例如刚部署了实例)：下次打开页面时重新获取"""
+        self._entries.pop(key, None)
+
+    def clear(self):
+        """令牌变化后调用：旧账户的数据全部作废"""
+        self._entries.clear()
+
+
+def is_success(result):
+    return isinstance(result, dict) and bool(result.get("success"))
+
+
+async def bootstrap(api_client, fetchers, lane):
+    """
+    在 API 事件循环中并发执行各项获取 (各自经过限流和熔断)，一项失败不影响其他项。
+    :param fetchers: {快照名称: 阻塞的获取函数}
+    :return: {快照名称: 结果或异常}
+    """
+    started = time.monotonic()
+    keys = list(fetchers)
+    results = await asyncio.gather(*(api_client.call_in_lane(lane, fetchers[key]) for key in keys),
+                                   return_exceptions=True)
+    log.info("启动预取完成 (%.2f 秒): %s", time.monotonic() - started,
+             ", ".join(f"{key}={'成功' if is_success(result) else '失败'}" for key, result in zip(keys, results)))
+    return dict(zip(keys, results))
@@ -0,0 +1,337 @@
+# ssh_manager.py
+"""
+实例 SSH 连接管理：每个运行中的实例只保持一条 SSH 连接 (paramiko Transport)，
+在这条连接上按需建立本地端口转发 (127.0.0.1:<本地端口> -> 实例上的 comfyui / fluxgym / jupyter 端口)，
+所有转发和远程命令复用同一条连接 (多路复用)。通过转发访问服务不经过公网代理。
+
+paramiko 是可选依赖 (pip install paramiko)，未安装时 SSH_AVAILABLE 为 False，界面中的相关功能不可用。
+
+本地测试可用 fake_ssh_server.py 作为 sshd:
+    python fake_ssh_server.py --port 2222 --password secret
+    python ssh_manager.py --host 127.0.0.1 --port 2222 --user root --password secret --forward 8188
+"""
+import sys
+import time
+import socket
+import select
+import logging
+import argparse
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit
+from PySide6.QtCore import QObject, Signal
+
+try:
+    import paramiko
+except ImportError: # 可选依赖
+    paramiko = None
+
+log = logging.getLogger(__name__)
+
+SSH_AVAILABLE = paramiko is not None
+CONNECT_TIMEOUT = 15
+KEEPALIVE_INTERVAL = 30
+BUFFER_SIZE = 64 * 1024
+
+# 连接参数 (来自实例信息的 ssh_domain / ssh_port / ssh_user / password)
+SSHTarget = namedtuple("SSHTarget", ["host", "port", "username", "password"])
+
+
+class SSHError(Exception):
+    """连接、认证或转发失败"""
+
+
+def local_url(public_url, local_port):
+    """把服务的公网地址换成本地转发地址，保留路径和查询参数 (例如 Jupyter 的 token)"""
+    parts = urlsplit(public_url or "")
+    return urlunsplit(("http", f"127.0.0.1:{local_port}", parts.path or "/", parts.query, parts.fragment))
+
+
+class LocalForward:
+    """本地监听端口；每个接入的 TCP 连接在 SSH 连接上打开一个 direct-tcpip 通道"""
+
+    def __init__(self, connection, remote_port, remote_host="127.0.0.1"):
+        self.connection = connection
+        self.remote_host = remote_host
+        self.remote_port = remote_port
+        self.active_clients = 0
+        self.total_clients = 0
+        self._closed = False
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.bind(("127.0.0.1", 0))
+        self._sock.listen(64)
+        self.local_port = self._sock.getsockname()[1]
+        threading.Thread(target=self._accept_loop, name=f"ssh-forward-{remote_port}", daemon=True).start()
+
+    def close(self):
+        self._closed = True
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR) # 唤醒阻塞在 accept 的线程
+        except OSError:
+            pass
+        self._sock.close()
+
+    def _accept_loop(self):
+        while not self._closed:
+            try:
+                client, address = self._sock.accept()
+            except OSError:
+                break # 监听端口已关闭
+            self.total_clients += 1
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self._handle, args=(client, address), daemon=True).start()
+
+    def _handle(self, client, address):
+        try:
+            channel = self.connection.open_channel(self.remote_host, self.remote_port, address)
+        except SSHError as e:
+            log.warning("转发到端口 %d 失败: %s", self.remote_port, e)
+            client.close()
+            return
+        self.active_clients += 1
+        try:
+            self._pump(client, channel)
+        finally:
+            self.active_clients -= 1
+            channel.close()
+            client.close()
+
+    @staticmethod
+    def _pump(client, channel):
+        """双向复制数据，直到任一端关闭"""
+        while True:
+            readable, _, _ = select.select([client, channel], [], [], KEEPALIVE_INTERVAL)
+            try:
+                if client in readable:
+                    data = client.recv(BUFFER_SIZE)
+                    if not data:
+                        break
+                    channel.sendall(data)
+                if channel in readable:
+                    data = channel.recv(BUFFER_SIZE)
+                    if not data:
+                        break
+                    client.sendall(data)
+            except (OSError, EOFError):
+                break
+            if channel.closed:
+                break
+
+
+class SSHConnection:
+    """
+    一个实例的 SSH 连接。断开后在下一次打开通道时自动重连，已建立的本地转发端口不变。
+    主机密钥在本次运行中首次连接时记录，之后变化则拒绝连接 (实例重装系统后需重新打开窗口)。
+    """
+
+    def __init__(self, target, connect_timeout=CONNECT_TIMEOUT):
+        if not SSH_AVAILABLE:
+            raise SSHError("未安装 paramiko，无法使用内置 SSH (pip install paramiko)")
+        self.target = target
+        self.connect_timeout = connect_timeout
+        self.host_key = None
+        self.connected_at = None
+        self.forwards = {} # (远程主机, 远程端口) -> LocalForward
+        self._transport = None
+        self._closed = False
+        self._lock = threading.RLock()
+
+    @property
+    def active(self):
+        return self._transport is not None and self._transport.is_active()
+
+    def connect(self):
+        with self._lock:
+            if self._closed:
+                raise SSHError("SSH 连接已关闭")
+            if self.active:
+                return
+            target = self.target
+            transport = None
+            try:
+                sock = socket.create_connection((target.host, int(target.port)), timeout=self.connect_timeout)
+                transport = paramiko.Transport(sock)
+                transport.start_client(timeout=self.connect_timeout)
+                key = transport.get_remote_server_key()
+                fingerprint = f"{key.get_name()} {key.get_base64()}"
+                if self.host_key is not None and fingerprint != self.host_key:
+                    raise SSHError("实例的 SSH 主机密钥已变化，拒绝连接")
+                transport.auth_password(target.username, target.password)
+                transport.set_keepalive(KEEPALIVE_INTERVAL)
+            except paramiko.AuthenticationException as e:
+                transport.close()
+                raise SSHError(f"SSH 认证失败: {e}") from e
+            except (paramiko.SSHException, OSError, EOFError) as e:
+                if transport is not None:
+                    transport.close()
+                raise SSHError(f"无法连接 {target.host}:{target.port}: {e}") from e
+            except SSHError:
+                transport.close()
+                raise
+            self.host_key = fingerprint
+            self._transport = transport
+            self.connected_at = time.time()
+            log.info("SSH 已连接 %s@%s:%s", target.username, target.host, target.port)
+
+    def open_channel(self, host, port, origin=("127.0.0.1", 0)):
+        """在连接上打开到实例 host:port 的通道 (连接断开时先重连)"""
+        self.connect()
+        try:
+            return self._transport.open_channel("direct-tcpip", (host, port), origin, timeout=self.connect_timeout)
+        except (paramiko.SSHException, OSError, EOFError) as e:
+            raise SSHError(f"实例上的端口 {port} 无法连接 (服务可能未启动): {e}") from e
+
+    def check_port(self, port, host="127.0.0.1"):
+        """确认实例上的服务端口可连接"""
+        self.open_channel(host, port).close()
+
+    def forward(self, remote_port, remote_host="127.0.0.1"):
+        """返回到远程端口的本地转发 (同一端口复用已有的转发)"""
+        with self._lock:
+            forward = self.forwards.get((remote_host, remote_port))
+            if forward is None:
+                forward = self.forwards[(remote_host, remote_port)] = LocalForward(self, remote_port, remote_host)
+                log.info("本地端口 %d -> 实例端口 %d", forward.local_port, remote_port)
+            return forward
+
+    def run(self, command, timeout=30):
+        """在实例上执行命令，返回 (退出码, 标准输出, 标准错误)"""
+        self.connect()
+        try:
+            channel = self._transport.open_session(timeout=self.connect_timeout)
+            channel.settimeout(timeout)
+            channel.exec_command(command)
+            stdout = channel.makefile("rb").read()
+            stderr = channel.makefile_stderr("rb").read()
+            status = channel.recv_exit_status()
+            channel.close()
+        except (paramiko.SSHException, OSError, EOFError) as e:
+            raise SSHError(f"执行命令失败: {e}") from e
+        return status, stdout.decode("utf-8", "replace"), stderr.decode("utf-8", "replace")
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            for forward in self.forwards.values():
+                forward.close()
+            self.forwards.clear()
+            if self._transport is not None:
+                self._transport.close()
+                self._transport = None
+
+
+class SSHManager(QObject):
+    """
+    按实例 ID 管理 SSH 连接 (在主线程中创建和使用)。连接和端口检查在线程池中进行，结果通过信号返回。
+    """
+    forward_ready = Signal(str, int, int) # 实例 ID, 远程端口, 本地端口
+    forward_failed = Signal(str, int, str) # 实例 ID, 远程端口, 错误信息
+    connections_changed = Signal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._connections = {} # 实例 ID -> SSHConnection
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="ssh")
+
+    def connection(self, instance_id, target):
+        """返回实例的连接；连接参数变化 (例如重新开机后端口变了) 时关闭旧连接"""
+        with self._lock:
+            connection = self._connections.get(instance_id)
+            if connection is not None and connection.target == target:
+                return connection
+            self._connections[instance_id] = SSHConnection(target)
+        if connection is not None:
+            connection.close()
+        return self._connections[instance_id]
+
+    def local_port(self, instance_id, remote_port):
+        """已建立的转发的本地端口，没有时返回 None"""
+        with self._lock:
+            connection = self._connections.get(instance_id)
+        forward = connection.forwards.get(("127.0.0.1", remote_port)) if connection is not None else None
+        return forward.local_port if forward is not None else None
+
+    def open_forward(self, instance_id, target, remote_port):
+        """异步建立转发，完成后发出 forward_ready 或 forward_failed"""
+        try:
+            connection = self.connection(instance_id, target)
+        except SSHError as e:
+            self.forward_failed.emit(instance_id, remote_port, str(e))
+            return
+        self._executor.submit(self._open_forward, instance_id, connection, remote_port)
+
+    def _open_forward(self, instance_id, connection, remote_port):
+        """在线程池中执行"""
+        try:
+            connection.check_port(remote_port)
+            forward = connection.forward(remote_port)
+        except SSHError as e:
+            self.forward_failed.emit(instance_id, remote_port, str(e))
+            return
+        except Exception as e: # paramiko 的其他异常等：不能让界面一直等待结果
+            log.exception("建立到端口 %d 的转发时出错", remote_port)
+            self.forward_failed.emit(instance_id, remote_port, str(e) or e.__class__.__name__)
+            return
+        self.forward_ready.emit(instance_id, remote_port, forward.local_port)
+        self.connections_changed.emit()
+
+    def close(self, instance_id):
+        with self._lock:
+            connection = self._connections.pop(instance_id, None)
+        if connection is not None:
+            connection.close()
+            self.connections_changed.emit()
+
+    def retain(self, instance_ids):
+        """实例列表刷新后调用：关闭已关机实例的连接"""
+        with self._lock:
+            stale = [instance_id for instance_id in self._connections if instance_id not in instance_ids]
+        for instance_id in stale:
+            self.close(instance_id)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+        for connection in connections:
+            connection.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="通过一条 SSH 连接转发实例上的服务端口")
+    parser.add_argument("--host", required=True)
+    parser.add_argument("--port", type=int, default=22)
+    parser.add_argument("--user", default="root")
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--forward", type=int, action="append", default=[], help="实例上的端口 (可重复)")
+    parser.add_argument("--run", default=None, help="执行一条远程命令后退出")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    try:
+        connection = SSHConnection(SSHTarget(args.host, args.port, args.user, args.password))
+        if args.run:
+            status, stdout, stderr = connection.run(args.run)
+            sys.stdout.write(stdout)
+            sys.stderr.write(stderr)
+            return status
+        for remote_port in args.forward:
+            connection.check_port(remote_port)
+            forward = connection.forward(remote_port)
+            log.info("http://127.0.0.1:%d/ -> 实例端口 %d", forward.local_port, remote_port)
+    except SSHError as e:
+        log.error("%s", e)
+        return 1
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        connection.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
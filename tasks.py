@@ -0,0 +1,179 @@
+# tasks.py
+import time
+import asyncio
+import logging
+from PySide6.QtCore import QObject, Signal, Slot, QTimer
+
+log = logging.getLogger(__name__)
+
+
+class TaskHandle(QObject):
+    '''
+    后台任务句柄，由 MainWindow._run_task / _run_coroutine 返回。
+    支持 cancel()、超时 (deadline)、状态查询和 then() 链式调用。
+    信号与 WorkerSignals 相同 (success / error / finished)，并且都在主线程中发出：
+    如果任务已取消，或 is_relevant() 返回 False (例如所属页面已不再显示)，
+    结果会在任何界面操作之前被丢弃，只发出 finished。
+    '''
+    PENDING = "pending"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    TIMED_OUT = "timed_out"
+    CANCELLED = "cancelled"
+
+    success = Signal(object)
+    error = Signal(str)
+    finished = Signal()
+
+    # 内部信号：从事件循环线程发出，排队到主线程处理
+    _result_ready = Signal(object)
+    _error_ready = Signal(str, str)
+    _done_ready = Signal()
+
+    def __init__(self, name="", timeout=None, is_relevant=None, parent=None):
+        super().__init__(parent)
+        self.name = name
+        self.timeout = timeout
+        self.is_relevant = is_relevant
+        self.status = self.PENDING
+        self.created_at = time.monotonic()
+        self.deadline = self.created_at + timeout if timeout else None
+        self._future = None
+        self.result = None # 成功时的结果 (then() 在任务完成后调用时使用)
+        self._followed = None # then() 链中正在跟随的任务
+        self._result_ready.connect(self._on_result)
+        self._error_ready.connect(self._on_error)
+        self._done_ready.connect(self._on_done)
+
+    # --- 启动 ---
+    def start(self, loop_thread, coro):
+        """把协程提交到事件循环线程 (由 MainWindow 调用)"""
+        self._future = loop_thread.submit(self._run(coro))
+        self._future.add_done_callback(self._on_future_done)
+        return self
+
+    async def _run(self, coro):
+        if self.status == self.CANCELLED: # 提交后、开始前已被取消
+            coro.close()
+            raise asyncio.CancelledError()
+        self.status = self.RUNNING
+        if self.deadline is None:
+            return await coro
+        return await asyncio.wait_for(coro, max(0.0, self.deadline - time.monotonic()))
+
+    def _on_future_done(self, future):
+        """在事件循环线程中调用"""
+        try:
+            if future.cancelled():
+                return
+            error = future.exception()
+            if isinstance(error, asyncio.TimeoutError):
+                self._error_ready.emit(self.TIMED_OUT, f"操作超时 ({self.timeout} 秒)")
+            elif error is not None:
+                log.warning("Worker Error: %s", error)
+                self._error_ready.emit(self.FAILED, str(error))
+            else:
+                self._result_ready.emit(future.result())
+        finally:
+            self._done_ready.emit()
+
+    # --- 主线程中的结果处理 ---
+    def _should_drop(self):
+        if self.status == self.CANCELLED:
+            return True
+        if self.is_relevant is not None and not self.is_relevant():
+            self.status = self.CANCELLED
+            return True
+        return False
+
+    @Slot(object)
+    def _on_result(self, result):
+        if self._should_drop():
+            return
+        self.status = self.SUCCEEDED
+        self.result = result
+        self.success.emit(result)
+
+    @Slot(str, str)
+    def _on_error(self, status, message):
+        if self._should_drop():
+            return
+        self.status = status
+        self.error.emit(message)
+
+    @Slot()
+    def _on_done(self):
+        self.finished.emit()
+
+    # --- 公共接口 ---
+    def cancel(self):
+        """取消任务：未开始的不再执行，已开始的结果将被丢弃 (finished 仍会发出)"""
+        if self.is_done():
+            return False
+        self.status = self.CANCELLED
+        if self._future is not None:
+            self._future.cancel()
+        if self._followed is not None:
+            self._followed.cancel()
+        return True
+
+    def is_done(self):
+        return self.status in (self.SUCCEEDED, self.FAILED, self.TIMED_OUT, self.CANCELLED)
+
+    def is_cancelled(self):
+        return self.status == self.CANCELLED
+
+    def remaining(self):
+        """距离截止时间的剩余秒数；没有截止时间时返回 None"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def then(self, callback):
+        """
+        链式调用：本任务成功后在主线程中调用 callback(result)。
+        返回新的 TaskHandle —— 如果 callback 返回 TaskHandle，新句柄跟随它的结果，
+        否则以 callback 的返回值作为结果。本任务失败或取消时新句柄也随之失败或取消。
+        本任务已经完成时，在下一轮事件循环中按它的结果处理。
+        """
+        chained = TaskHandle(name=f"{self.name} -> then", is_relevant=self.is_relevant, parent=self.parent())
+        chained.status = self.RUNNING
+
+        def _on_success(result):
+            try:
+                value = callback(result)
+            except Exception as e:
+                chained._on_error(self.FAILED, str(e))
+                chained._on_done()
+                return
+            if isinstance(value, TaskHandle):
+                chained._follow(value)
+            else:
+                chained._on_result(value)
+                chained._on_done()
+
+        def _on_finished():
+            if self.status == self.SUCCEEDED:
+                return # 由 _on_success 处理
+            if self.status == self.CANCELLED:
+                chained.status = self.CANCELLED
+            elif not chained.is_done():
+                chained._on_error(self.status, "前置任务失败")
+            chained._on_done()
+
+        if self.is_done():
+            if self.status == self.SUCCEEDED:
+                QTimer.singleShot(0, lambda: _on_success(self.result))
+            else:
+                QTimer.singleShot(0, _on_finished)
+            return chained
+        self.success.connect(_on_success)
+        self.finished.connect(_on_finished)
+        return chained
+
+    def _follow(self, other):
+        self._followed = other
+        other.success.connect(self._on_result)
+        other.error.connect(lambda message: self._on_error(other.status, message))
+        other.finished.connect(self._on_done)
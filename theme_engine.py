@@ -0,0 +1,93 @@
+# theme_engine.py
+from PySide6.QtCore import Qt
+from PySide6.QtGui import QPalette, QColor
+
+# 主题色板 (设计令牌)。调色板和应用级样式表都由这里生成，新增颜色时只改这一处。
+LIGHT_TOKENS = {
+    "window": "#f0f0f0",
+    "window_text": "#000000",
+    "base": "#ffffff",
+    "alternate_base": "#f0f0f0",
+    "tooltip_base": "#ffffff",
+    "tooltip_text": "#000000",
+    "text": "#000000",
+    "button": "#f0f0f0",
+    "button_text": "#000000",
+    "bright_text": "#ff0000",
+    "link": "#0000ff",
+    "highlight": "#0078d7",
+    "highlighted_text": "#ffffff",
+    "disabled_text": "#808080",
+    "disabled_highlight": "#d3d3d3",
+    "tooltip_border": "#767676",
+}
+
+DARK_TOKENS = {
+    "window": "#353535",
+    "window_text": "#ffffff",
+    "base": "#2a2a2a",
+    "alternate_base": "#424242",
+    "tooltip_base": "#ffffff",
+    "tooltip_text": "#000000",
+    "text": "#ffffff",
+    "button": "#4b4b4b",
+    "button_text": "#ffffff",
+    "bright_text": "#ff0000",
+    "link": "#2a82da",
+    "highlight": "#2a82da",
+    "highlighted_text": "#000000",
+    "disabled_text": "#a0a0a4",
+    "disabled_highlight": "#505050",
+    "tooltip_border": "#767676",
+}
+
+# 调色板角色 -> 令牌名
+_PALETTE_ROLES = {
+    QPalette.ColorRole.Window: "window",
+    QPalette.ColorRole.WindowText: "window_text",
+    QPalette.ColorRole.Base: "base",
+    QPalette.ColorRole.AlternateBase: "alternate_base",
+    QPalette.ColorRole.ToolTipBase: "tooltip_base",
+    QPalette.ColorRole.ToolTipText: "tooltip_text",
+    QPalette.ColorRole.Text: "text",
+    QPalette.ColorRole.Button: "button",
+    QPalette.ColorRole.ButtonText: "button_text",
+    QPalette.ColorRole.BrightText: "bright_text",
+    QPalette.ColorRole.Link: "link",
+    QPalette.ColorRole.Highlight: "highlight",
+    QPalette.ColorRole.HighlightedText: "highlighted_text",
+}
+
+_DISABLED_ROLES = {
+    QPalette.ColorRole.WindowText: "disabled_text",
+    QPalette.ColorRole.Text: "disabled_text",
+    QPalette.ColorRole.ButtonText: "disabled_text",
+    QPalette.ColorRole.Highlight: "disabled_highlight",
+    QPalette.ColorRole.HighlightedText: "disabled_text",
+}
+
+# 应用级样式表模板，占位符为令牌名。
+# 只能引用两套主题取值相同的令牌：切换主题时只替换调色板，样式表文本不变就不会重新设置；
+# 一旦样式表内容随主题变化，Qt 会对所有部件重新 polish，主题切换会慢一个数量级。
+# (样式表中的 palette(...) 引用只在 polish 时解析，也不会随调色板更新。)
+STYLESHEET_TEMPLATE = """
+QToolTip {{ color: {tooltip_text}; background-color: {tooltip_base}; border: 1px solid {tooltip_border}; padding: 4px; }}
+"""
+
+
+def build_palette(tokens):
+    palette = QPalette()
+    for role, name in _PALETTE_ROLES.items():
+        palette.setColor(role, QColor(tokens[name]))
+    for role, name in _DISABLED_ROLES.items():
+        palette.setColor(QPalette.ColorGroup.Disabled, role, QColor(tokens[name]))
+    return palette
+
+
+def build_stylesheet(tokens):
+    return STYLESHEET_TEMPLATE.format(**tokens).strip() + "\n"
+
+
+def system_prefers_dark(app):
+    hints = app.styleHints() if hasattr(app, "styleHints") else None
+    return hints is not None and hints.colorScheme() == Qt.ColorScheme.Dark
@@ -0,0 +1,372 @@
+# ui_benchmark.py
+"""
+界面渲染基准 (无窗口，QT_QPA_PLATFORM=offscreen)：
+在 1 / 10 / 100 / 1000 条数据下测量实例卡片、镜像卡片、公共镜像列表和主题切换的
+耗时、Python 内存峰值 (tracemalloc) 和部件数量，并与保存的基线比较，出现回退时返回非零退出码。
+
+    python ui_benchmark.py                      # 与基线比较
+    python ui_benchmark.py --update-baseline    # 重新生成基线 (优化合入后执行)
+    python ui_benchmark.py --case theme_change_theme --case theme_change_theme_legacy --sizes 10,100
+
+测试数据来自 mock_api_server.MockState，不访问网络；API 调用使用空的离线回放，
+配置写入临时目录，不会影响本机保存的令牌和设置。
+"""
+import os
+import sys
+import gc
+import json
+import time
+import logging
+import argparse
+import tempfile
+import tracemalloc
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6.QtCore import QCoreApplication, QEvent, QSettings, QStandardPaths
+from PySide6.QtWidgets import QApplication, QWidget, QMessageBox
+
+log = logging.getLogger(__name__)
+
+DEFAULT_SIZES = (1, 10, 100, 1000)
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ui_benchmark_baseline.json")
+
+# 判定为回退的阈值：相对增幅超过容差，且绝对差值超过下限 (避免小数值上的计时噪声)
+TIME_TOLERANCE = 0.30
+MEMORY_TOLERANCE = 0.30
+MIN_TIME_DELTA = 0.005 # 秒
+MIN_MEMORY_DELTA = 64 * 1024 # 字节
+
+
+# ------------------------------------------------------------------------------
+# 测试数据
+# ------------------------------------------------------------------------------
+def make_instances(count):
+    """用模拟服务器的状态生成 count 个格式与 Open API 相同的实例"""
+    from mock_api_server import MockState, DEFAULT_GPU_MODELS
+    state = MockState(capacity={(DEFAULT_GPU_MODELS[0], 1): count})
+    for n in range(count):
+        state.deploy({"name": f"bench-{n}", "gpu_model": DEFAULT_GPU_MODELS[0], "data_center_id": 1})
+    return state.list_instances()["list"]
+
+
+def make_images(count):
+    from mock_api_server import MockState, DEFAULT_GPU_MODELS
+    state = MockState(capacity={(DEFAULT_GPU_MODELS[0], 1): 1})
+    instance_id = state.deploy({"name": "bench", "gpu_model": DEFAULT_GPU_MODELS[0], "data_center_id": 1})["id"]
+    for n in range(count):
+        state.save_image(instance_id, image_name=f"bench-image-{n}")
+    return state.list_images()["list"]
+
+
+def make_custom_images(count):
+    return [{"id": f"bench-{n:04d}-0000-0000-0000-000000000000", "name": f"收藏镜像 {n}"} for n in range(count)]
+
+
+# ------------------------------------------------------------------------------
+# 主窗口 (所有测试共用一个，每次测量前恢复到空列表)
+# ------------------------------------------------------------------------------
+def flush_events():
+    """处理挂起的事件和 deleteLater，使被移除的部件真正销毁"""
+    app = QApplication.instance()
+    for _ in range(2):
+        QCoreApplication.sendPostedEvents(None, QEvent.Type.DeferredDelete)
+        app.processEvents()
+
+
+def prepare_app():
+    """创建 QApplication；配置和数据文件写到临时目录，避免读取或修改用户的令牌和设置"""
+    settings_dir = tempfile.mkdtemp(prefix="ui-bench-settings-")
+    QSettings.setDefaultFormat(QSettings.Format.IniFormat)
+    QSettings.setPath(QSettings.Format.IniFormat, QSettings.Scope.UserScope, settings_dir)
+    QStandardPaths.setTestModeEnabled(True)
+    app = QApplication.instance() or QApplication(sys.argv)
+    for name in ("question", "information", "warning", "critical"): # 基准运行期间不弹出模态对话框
+        setattr(QMessageBox, name, staticmethod(lambda *a, **k: QMessageBox.StandardButton.Ok))
+    return app
+
+
+def create_window():
+    from cassette import Cassette, ReplayApiHandler
+    import main
+    # 空的离线回放：启动时的请求立即失败，不访问网络
+    handler = ReplayApiHandler(Cassette(tempfile.mkdtemp(prefix="ui-bench-cassette-")), latency=0)
+    window = main.MainWindow(api_handler=handler, offline=True)
+    window.refresh_timer.stop()
+    window.resize(1280, 800)
+    window.show()
+    flush_events()
+    return window
+
+
+def reset_instances(window):
+    window._handle_get_instances_success({"success": True, "data": {"list": [], "total": 0}})
+    flush_events()
+
+
+def reset_images(window):
+    window.image_cards.clear()
+    window.image_view_stale = True
+    flush_events()
+
+
+def reset_public_images(window, records):
+    from image_registry import CustomImageRegistry
+    layout = window.public_image_list_layout
+    while layout.count() > 1: # 保留底部伸缩项
+        widget = layout.takeAt(0).widget()
+        if widget:
+            widget.deleteLater()
+    window.public_image_rows.clear()
+    window._public_images_built = False
+    window.custom_images = CustomImageRegistry(records) # 只替换内存中的列表，不保存
+    flush_events()
+
+
+def reset_all(window):
+    """清空所有列表，使每个用例的测量不受前一个用例留下的部件影响"""
+    reset_instances(window)
+    reset_images(window)
+    reset_public_images(window, [])
+
+
+def count_widgets(root):
+    return len(root.findChildren(QWidget))
+
+
+# ------------------------------------------------------------------------------
+# 测试用例：setup(window, size) 返回传给 run 的参数，run 是被测量的部分，
+# widgets(window, result) 返回测量后的部件数量
+# ------------------------------------------------------------------------------
+def _setup_create_instance(window, size):
+    return make_instances(size)
+
+
+def _run_create_instance(window, instances):
+    return [window._create_instance_widget(data) for data in instances]
+
+
+def _widgets_create_instance(window, frames):
+    count = sum(count_widgets(frame) + 1 for frame in frames)
+    for frame in frames:
+        frame.deleteLater()
+    return count
+
+
+def _setup_instances(window, size):
+    reset_instances(window)
+    instances = make_instances(size)
+    return {"success": True, "data": {"list": instances, "total": len(instances)}}
+
+
+def _setup_images(window, size):
+    reset_images(window)
+    images = make_images(size)
+    return {"success": True, "data": {"list": images, "total": len(images)}}
+
+
+def _setup_public_images(window, size):
+    reset_public_images(window, make_custom_images(size))
+
+
+def _setup_theme(window, size):
+    """
+    主题切换的成本与界面上的部件数量有关，先填充 size 个实例卡片；
+    返回与当前主题相反的主题，使每次测量都是一次真正的切换。
+    """
+    from main import ThemeManager
+    window._handle_get_instances_success(_setup_instances(window, size))
+    flush_events()
+    manager = ThemeManager()
+    target = ThemeManager.Light if manager.current_theme != ThemeManager.Light else ThemeManager.Dark
+    manager.current_theme = target
+    return target
+
+
+def _run_apply_theme(window, _):
+    from main import ThemeManager
+    ThemeManager().apply_theme()
+
+
+def _legacy_change_theme(window, theme):
+    """
+    改版前的主题切换，用于对比：每次重新设置 Fusion 样式并清空样式表，
+    然后对应用、主窗口和每个子部件 unpolish/polish，处理事件后再逐个 update()。
+    """
+    from PySide6.QtWidgets import QStyleFactory
+    from main import ThemeManager
+    from theme_engine import LIGHT_TOKENS, DARK_TOKENS, build_palette
+    app = QApplication.instance()
+    app.setStyle(QStyleFactory.create("Fusion"))
+    app.setPalette(build_palette(LIGHT_TOKENS if theme == ThemeManager.Light else DARK_TOKENS))
+    app.setStyleSheet("")
+    app.style().unpolish(app)
+    app.style().polish(app)
+    window.style().unpolish(window)
+    window.style().polish(window)
+    for child in window.findChildren(QWidget):
+        child.style().unpolish(child)
+        child.style().polish(child)
+    window.update()
+    app.processEvents()
+    for child in window.findChildren(QWidget):
+        child.update()
+    ThemeManager()._applied_tokens = None # 样式表已被清空，之后的 apply_theme 需要重新应用
+
+
+CASES = {
+    "create_instance_widget": (
+        _setup_create_instance, _run_create_instance, _widgets_create_instance),
+    "handle_get_instances_success": (
+        _setup_instances, lambda w, result: w._handle_get_instances_success(result),
+        lambda w, _: count_widgets(w.instance_scroll_area.widget())),
+    "handle_get_images_success": (
+        _setup_images, lambda w, result: w._handle_get_images_success(result),
+        lambda w, _: count_widgets(w.image_scroll_area.widget())),
+    "get_and_display_public_images": (
+        _setup_public_images, lambda w, _: w.get_and_display_public_images(),
+        lambda w, _: count_widgets(w.public_image_scroll_area.widget())),
+    "theme_apply_theme": (
+        _setup_theme, _run_apply_theme, lambda w, _: count_widgets(w)),
+    "theme_change_theme": (
+        _setup_theme, lambda w, theme: w.change_theme(theme), lambda w, _: count_widgets(w)),
+    "theme_change_theme_legacy": (
+        _setup_theme, _legacy_change_theme, lambda w, _: count_widgets(w)),
+}
+
+
+def measure(window, case, size, repeat):
+    """返回 {"time": 中位耗时秒, "peak_bytes": 内存峰值, "widgets": 部件数量}"""
+    setup, run, widgets = CASES[case]
+    times = []
+    for _ in range(repeat):
+        args = setup(window, size)
+        gc.collect()
+        start = time.perf_counter()
+        result = run(window, args)
+        flush_events() # 包含布局和重绘等延迟到事件循环中的工作
+        times.append(time.perf_counter() - start)
+        widgets(window, result)
+        del result
+
+    # 单独测一次内存：tracemalloc 会拖慢执行，不与计时混在一起
+    args = setup(window, size)
+    gc.collect()
+    tracemalloc.start()
+    result = run(window, args)
+    flush_events()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    widget_count = widgets(window, result)
+    flush_events()
+    return {"time": sorted(times)[len(times) // 2], "peak_bytes": peak, "widgets": widget_count}
+
+
+# ------------------------------------------------------------------------------
+# 基线比较
+# ------------------------------------------------------------------------------
+def load_baseline(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f).get("results", {})
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        log.warning("基线文件 %s 无法读取: %s", path, e)
+        return None
+
+
+def save_baseline(path, results):
+    content = {"generated_at": time.strftime("%Y-%m-%d %H:%M:%S"), "platform": sys.platform,
+               "python": sys.version.split()[0], "results": results}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(content, f, ensure_ascii=False, indent=1, sort_keys=True)
+        f.write("\n")
+
+
+def find_regressions(results, baseline, time_tolerance, memory_tolerance):
+    """返回回退描述列表；基线中没有的测量项跳过"""
+    regressions = []
+    for key, current in sorted(results.items()):
+        base = baseline.get(key)
+        if not base:
+            continue
+        if (current["time"] > base["time"] * (1 + time_tolerance)
+                and current["time"] - base["time"] > MIN_TIME_DELTA):
+            regressions.append(f"{key}: 耗时 {base['time'] * 1000:.1f} ms -> {current['time'] * 1000:.1f} ms")
+        if (current["peak_bytes"] > base["peak_bytes"] * (1 + memory_tolerance)
+                and current["peak_bytes"] - base["peak_bytes"] > MIN_MEMORY_DELTA):
+            regressions.append(f"{key}: 内存峰值 {base['peak_bytes'] // 1024} KB -> {current['peak_bytes'] // 1024} KB")
+        if current["widgets"] > base["widgets"]:
+            regressions.append(f"{key}: 部件数量 {base['widgets']} -> {current['widgets']}")
+    return regressions
+
+
+def _display_width(text):
+    return sum(2 if ord(ch) > 0x2E80 else 1 for ch in text) # 中文字符在终端中占两列
+
+
+def format_report(results, baseline):
+    headers = [("用例@条数", 40), ("耗时(ms)", 12), ("基线(ms)", 12), ("内存峰值(KB)", 14), ("部件数", 9)]
+    padding = [" " * (width - _display_width(text)) for text, width in headers]
+    lines = [headers[0][0] + padding[0] + "".join(pad + text for (text, _), pad in zip(headers[1:], padding[1:]))]
+    for key, current in results.items():
+        base = (baseline or {}).get(key)
+        base_time = f"{base['time'] * 1000:.1f}" if base else "-"
+        lines.append(f"{key:<40}{current['time'] * 1000:>12.1f}{base_time:>12}"
+                     f"{current['peak_bytes'] // 1024:>14}{current['widgets']:>9}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="界面渲染基准 (offscreen)")
+    parser.add_argument("--case", action="append", choices=sorted(CASES), help="只运行指定用例 (可重复)")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="数据条数，逗号分隔")
+    parser.add_argument("--repeat", type=int, default=3, help="每项计时的重复次数 (取中位数)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true", help="把本次结果写入基线文件")
+    parser.add_argument("--time-tolerance", type=float, default=TIME_TOLERANCE)
+    parser.add_argument("--memory-tolerance", type=float, default=MEMORY_TOLERANCE)
+    parser.add_argument("--json", metavar="PATH", help="另外把结果写入 JSON 文件")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(name)s: %(message)s")
+    app = prepare_app()
+    window = create_window()
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    results = {}
+    for case in args.case or list(CASES):
+        for size in sizes:
+            results[f"{case}@{size}"] = measure(window, case, size, max(1, args.repeat))
+            reset_all(window)
+            log.info("%s@%d 完成", case, size)
+
+    baseline = load_baseline(args.baseline)
+    print(format_report(results, baseline))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=1)
+
+    window.close()
+    app.processEvents()
+    if args.update_baseline:
+        merged = dict(baseline or {}, **results)
+        merged = {key: value for key, value in merged.items() if key.partition("@")[0] in CASES} # 去掉已删除的用例
+        save_baseline(args.baseline, merged)
+        print(f"\n基线已更新: {args.baseline}")
+        return 0
+    if baseline is None:
+        print(f"\n没有基线文件 ({args.baseline})，使用 --update-baseline 生成")
+        return 0
+    regressions = find_regressions(results, baseline, args.time_tolerance, args.memory_tolerance)
+    if regressions:
+        print("\n性能回退:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print("\n未发现性能回退")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
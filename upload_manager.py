@@ -0,0 +1,598 @@
+# upload_manager.py
+"""
+把本地文件上传到实例的文件服务：
+- 使用 tus 1.0 断点续传协议 (creation 扩展；服务端支持 concatenation 扩展时，大文件切成几段并行上传后再合并)；
+- 每段按 chunk_size 分块 PATCH，网络中断后用 HEAD 查询服务端已收到的偏移，从断点继续；
+- 上传前计算 sha256，与远程的 <文件名>.sha256 旁注文件比较，一致 (且大小一致) 时跳过；
+- 上传队列 (包括各段的上传地址) 保存在 AppDataLocation/upload_queue.json，程序重启后继续未完成的上传。
+
+本地测试可用 fake_file_service.py 作为文件服务:
+    python fake_file_service.py --root ./remote --port 8090 --fail-every 7
+    python upload_manager.py --files-url http://127.0.0.1:8090/files/ --upload-url http://127.0.0.1:8090/tus/ \
+        --remote-dir uploads/ big_model.safetensors ./datasets
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import base64
+import hashlib
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+from urllib.parse import urljoin, quote
+import requests
+from PySide6.QtCore import QObject, Signal, QStandardPaths, QCoreApplication
+
+log = logging.getLogger(__name__)
+
+QUEUE_FILE_NAME = "upload_queue.json"
+TUS_VERSION = "1.0.0"
+# 上传接口相对文件服务根地址 (不含 files/) 的路径
+TUS_PATH = "tus/"
+HASH_SUFFIX = ".sha256"
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+# 文件小于 2 块时不拆分，省掉合并请求
+MIN_PARTS_SIZE = 2 * DEFAULT_CHUNK_SIZE
+# 单个 PATCH 请求失败后的重试次数 (每次重试前先查询断点)
+CHUNK_RETRIES = 5
+
+
+class UploadError(Exception):
+    """上传失败 (服务端拒绝、重试次数用完等)"""
+
+
+class UploadStopped(Exception):
+    """上传被暂停或程序退出；已上传的部分保留，之后可继续"""
+
+
+def file_sha256(path, should_stop=None, block_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            if should_stop is not None and should_stop():
+                raise UploadStopped()
+            block = f.read(block_size)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _encode_metadata(metadata):
+    return ",".join(f"{key} {base64.b64encode(value.encode('utf-8')).decode('ascii')}"
+                    for key, value in metadata.items())
+
+
+# ------------------------------------------------------------------------------
+# tus 客户端
+# ------------------------------------------------------------------------------
+class TusClient:
+    """一个上传接口 (endpoint) 的 tus 请求；session 在多个线程间共享"""
+
+    def __init__(self, endpoint, timeout=60, pool_size=8):
+        self.endpoint = endpoint if endpoint.endswith("/") else endpoint + "/"
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers["Tus-Resumable"] = TUS_VERSION
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._extensions = None
+
+    def extensions(self):
+        """服务端支持的扩展 (OPTIONS 的 Tus-Extension)，查询失败时按只支持 creation 处理"""
+        if self._extensions is None:
+            try:
+                response = self.session.options(self.endpoint, timeout=self.timeout)
+                response.raise_for_status()
+                header = response.headers.get("Tus-Extension", "")
+                self._extensions = {name.strip() for name in header.split(",") if name.strip()}
+            except requests.RequestException as e:
+                log.debug("查询 tus 扩展失败: %s", e)
+                return {"creation"}
+        return self._extensions
+
+    def create(self, length, metadata=None, partial=False):
+        """创建上传，返回上传地址"""
+        headers = {"Upload-Length": str(length)}
+        if metadata:
+            headers["Upload-Metadata"] = _encode_metadata(metadata)
+        if partial:
+            headers["Upload-Concat"] = "partial"
+        return self._post(headers)
+
+    def concat(self, part_urls, metadata):
+        """把已上传完的各段合并为最终文件"""
+        return self._post({"Upload-Concat": "final;" + " ".join(part_urls),
+                           "Upload-Metadata": _encode_metadata(metadata)})
+
+    def _post(self, headers):
+        response = self.session.post(self.endpoint, headers=headers, timeout=self.timeout)
+        if response.status_code != 201 or "Location" not in response.headers:
+            raise UploadError(f"创建上传失败: HTTP {response.status_code}")
+        return urljoin(self.endpoint, response.headers["Location"])
+
+    def offset(self, url):
+        """服务端已收到的字节数；上传地址已失效 (过期或被清理) 时返回 None"""
+        response = self.session.head(url, timeout=self.timeout)
+        if response.status_code in (404, 410):
+            return None
+        response.raise_for_status()
+        return int(response.headers["Upload-Offset"])
+
+    def patch(self, url, offset, data):
+        """从 offset 处写入 data，返回新的偏移"""
+        response = self.session.patch(url, data=data, timeout=self.timeout, headers={
+            "Upload-Offset": str(offset), "Content-Type": "application/offset+octet-stream"})
+        if response.status_code == 409:
+            raise requests.ConnectionError("偏移不一致") # 按断线处理：重新查询偏移
+        if response.status_code in (404, 410):
+            raise UploadError("上传地址已失效")
+        response.raise_for_status()
+        return int(response.headers["Upload-Offset"])
+
+
+# ------------------------------------------------------------------------------
+# 持久化队列
+# ------------------------------------------------------------------------------
+class UploadTask:
+    """队列中的一个文件；parts 为 [{"offset", "length", "url"}]，上传完成后清空"""
+    QUEUED = "queued"
+    HASHING = "hashing"
+    UPLOADING = "uploading"
+    PAUSED = "paused"
+    DONE = "done"
+    SKIPPED = "skipped"
+    FAILED = "failed"
+    FIELDS = ("id", "local_path", "remote_path", "files_url", "upload_url", "size", "mtime", "sha256", "parts",
+              "status", "error", "created")
+
+    def __init__(self, local_path, remote_path, files_url, upload_url, **fields):
+        self.id = fields.get("id") or uuid.uuid4().hex
+        self.local_path = local_path
+        self.remote_path = remote_path
+        self.files_url = files_url
+        self.upload_url = upload_url
+        self.size = fields.get("size")
+        self.mtime = fields.get("mtime")
+        self.sha256 = fields.get("sha256")
+        self.parts = fields.get("parts") or []
+        self.status = fields.get("status", self.QUEUED)
+        self.error = fields.get("error", "")
+        self.created = fields.get("created") or time.time()
+        self.bytes_done = 0 # 运行时统计，不保存
+
+    @property
+    def finished(self):
+        return self.status in (self.DONE, self.SKIPPED)
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, data):
+        data = dict(data)
+        return cls(data.pop("local_path"), data.pop("remote_path"), data.pop("files_url"), data.pop("upload_url"),
+                   **data)
+
+
+class UploadQueue:
+    """上传队列，每次状态变化后整体写盘 (先写临时文件再替换)"""
+
+    def __init__(self, queue_dir=None):
+        if queue_dir is None:
+            queue_dir = QStandardPaths.writableLocation(QStandardPaths.StandardLocation.AppDataLocation)
+        self.path = os.path.join(queue_dir, QUEUE_FILE_NAME)
+        self._lock = threading.Lock()
+        self.tasks = self._read()
+
+    def _read(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return [UploadTask.from_dict(item) for item in data.get("tasks", [])]
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            log.warning("上传队列文件无法读取，将忽略: %s", e)
+        return []
+
+    def save(self):
+        with self._lock:
+            data = {"version": 1, "tasks": [task.to_dict() for task in self.tasks]}
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                tmp_path = self.path + ".tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                log.warning("写入上传队列失败: %s", e)
+
+    def add(self, tasks):
+        with self._lock:
+            self.tasks.extend(tasks)
+        self.save()
+
+    def remove(self, task_ids):
+        task_ids = set(task_ids)
+        with self._lock:
+            self.tasks = [task for task in self.tasks if task.id not in task_ids]
+        self.save()
+
+    def get(self, task_id):
+        with self._lock:
+            return next((task for task in self.tasks if task.id == task_id), None)
+
+    def unfinished(self):
+        with self._lock:
+            return [task for task in self.tasks if task.status in (UploadTask.QUEUED, UploadTask.HASHING,
+                                                                   UploadTask.UPLOADING)]
+
+
+# ------------------------------------------------------------------------------
+# 上传一个文件
+# ------------------------------------------------------------------------------
+class FileUploader:
+    """
+    执行单个任务的上传 (在后台线程中调用 upload)。
+    :param parallel_parts: 服务端支持合并时，一个文件同时上传的段数
+    :param max_files: 同时调用 upload 的线程数，用于确定段线程池的大小
+    """
+
+    def __init__(self, queue, chunk_size=DEFAULT_CHUNK_SIZE, parallel_parts=4, max_files=2, timeout=60):
+        self.queue = queue
+        self.chunk_size = chunk_size
+        self.parallel_parts = max(1, parallel_parts)
+        self.timeout = timeout
+        self._clients = {}
+        self._clients_lock = threading.Lock()
+        self._part_executor = ThreadPoolExecutor(max_workers=self.parallel_parts * max(1, max_files),
+                                                 thread_name_prefix="upload-part")
+
+    def client(self, endpoint):
+        with self._clients_lock:
+            client = self._clients.get(endpoint)
+            if client is None:
+                client = self._clients[endpoint] = TusClient(endpoint, self.timeout, pool_size=self.parallel_parts * 2)
+            return client
+
+    def shutdown(self):
+        self._part_executor.shutdown(wait=False, cancel_futures=True)
+
+    def upload(self, task, should_stop, on_status=None, on_progress=None):
+        """返回最终状态 (DONE / SKIPPED)；暂停时抛出 UploadStopped，失败时抛出 UploadError 或 requests 异常"""
+        on_status = on_status or (lambda task: None)
+        on_progress = on_progress or (lambda task: None)
+        stat = os.stat(task.local_path)
+        if task.size != stat.st_size or task.mtime != stat.st_mtime:
+            # 文件在排队期间被修改：之前的哈希和已上传的段都作废
+            task.size, task.mtime, task.sha256, task.parts = stat.st_size, stat.st_mtime, None, []
+        if not task.sha256:
+            task.status = UploadTask.HASHING
+            on_status(task)
+            task.sha256 = file_sha256(task.local_path, should_stop)
+            self.queue.save()
+        if not task.parts and self.remote_matches(task):
+            return UploadTask.SKIPPED
+
+        task.status = UploadTask.UPLOADING
+        on_status(task)
+        client = self.client(task.upload_url)
+        if not task.parts:
+            task.parts = self._plan_parts(client, task)
+            self.queue.save()
+        directory, _, name = task.remote_path.rpartition("/")
+        metadata = {"filename": name, "path": directory}
+        single = len(task.parts) == 1
+
+        lock = threading.Lock()
+        progress = {}
+
+        def report(index, done):
+            with lock:
+                progress[index] = done
+                task.bytes_done = sum(progress.values())
+            on_progress(task)
+
+        # 任一段失败则整个任务失败 (已上传的段保留，重试时继续)：其余段在下一块之前停下，
+        # 等所有段都结束后再抛出，避免任务已记为失败时仍有线程在上传或改写 task.parts
+        part_failed = threading.Event()
+        part_should_stop = lambda: part_failed.is_set() or should_stop()
+        futures = [self._part_executor.submit(self._upload_part, client, task, index, metadata if single else None,
+                                              part_should_stop, report)
+                   for index in range(len(task.parts))]
+        done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+        if any(not future.cancelled() and future.exception() for future in done):
+            part_failed.set()
+            wait(futures)
+        # 线程池关闭时被取消的段按暂停处理；其余段因 part_failed 抛出的 UploadStopped 不掩盖真正的错误
+        errors = [UploadStopped() if future.cancelled() else future.exception() for future in futures]
+        errors = [error for error in errors if error is not None]
+        if errors:
+            raise next((error for error in errors if not isinstance(error, UploadStopped)), errors[0])
+        if not single:
+            self._retry(lambda: client.concat([part["url"] for part in task.parts], metadata), should_stop)
+
+        # 上传旁注哈希文件，之后再上传同样的文件时可直接跳过
+        digest = task.sha256.encode("ascii")
+        hash_metadata = {"filename": name + HASH_SUFFIX, "path": directory}
+        self._retry(lambda: client.patch(client.create(len(digest), hash_metadata), 0, digest), should_stop)
+        task.parts = []
+        return UploadTask.DONE
+
+    @staticmethod
+    def _retry(request, should_stop):
+        """单个请求遇到网络错误时重试 (合并、旁注文件等)"""
+        for attempt in range(CHUNK_RETRIES + 1):
+            try:
+                return request()
+            except requests.RequestException as e:
+                if attempt == CHUNK_RETRIES or should_stop():
+                    raise
+                log.debug("请求失败，%d 秒后重试: %s", attempt + 1, e)
+                time.sleep(min(2 ** attempt, 10))
+
+    def _plan_parts(self, client, task):
+        """服务端支持 concatenation 且文件足够大时按 parallel_parts 拆分，每段长度取整到块大小"""
+        size = task.size
+        if self.parallel_parts > 1 and size >= MIN_PARTS_SIZE and "concatenation" in client.extensions():
+            chunks = -(-size // self.chunk_size)
+            per_part = -(-chunks // min(self.parallel_parts, chunks)) * self.chunk_size
+            bounds = list(range(0, size, per_part))
+            return [{"offset": start, "length": min(per_part, size - start), "url": None} for start in bounds]
+        return [{"offset": 0, "length": size, "url": None}]
+
+    def _upload_part(self, client, task, index, metadata, should_stop, report):
+        part = task.parts[index]
+        failures = 0
+        with open(task.local_path, "rb") as f:
+            while True:
+                try:
+                    offset = client.offset(part["url"]) if part["url"] else None
+                    if offset is None: # 新的段，或服务端已清理了之前的上传
+                        part["url"] = client.create(part["length"], metadata, partial=metadata is None)
+                        self.queue.save()
+                        offset = 0
+                    report(index, offset)
+                    while offset < part["length"]:
+                        if should_stop():
+                            raise UploadStopped()
+                        f.seek(part["offset"] + offset)
+                        data = f.read(min(self.chunk_size, part["length"] - offset))
+                        offset = client.patch(part["url"], offset, data)
+                        failures = 0
+                        report(index, offset)
+                    return
+                except requests.RequestException as e:
+                    failures += 1
+                    if failures > CHUNK_RETRIES:
+                        raise UploadError(f"第 {index + 1} 段上传失败: {e}") from e
+                    log.debug("%s 第 %d 段中断，%d 秒后从断点继续: %s", task.remote_path, index + 1, failures, e)
+                    if should_stop():
+                        raise UploadStopped()
+                    time.sleep(min(2 ** (failures - 1), 10))
+
+    def remote_matches(self, task):
+        """远程已有同样内容的文件 (旁注哈希一致且大小一致)"""
+        url = urljoin(task.files_url, quote(task.remote_path))
+        client = self.client(task.upload_url)
+        try:
+            response = client.session.get(url + HASH_SUFFIX, timeout=self.timeout)
+            if response.status_code != 200 or response.text.strip() != task.sha256:
+                return False
+            response = client.session.head(url, timeout=self.timeout)
+            return response.status_code == 200 and response.headers.get("Content-Length") == str(task.size)
+        except requests.RequestException as e:
+            log.debug("查询远程哈希失败，按需要上传处理: %s", e)
+            return False
+
+
+# ------------------------------------------------------------------------------
+# 上传管理器
+# ------------------------------------------------------------------------------
+class UploadManager(QObject):
+    """
+    管理上传队列 (在主线程中创建和使用)：同时上传 max_files 个文件，每个文件最多 parallel_parts 段并行。
+    信号从后台线程发出，连接到界面时自动排队到主线程。
+    """
+    task_changed = Signal(str) # 任务 ID (状态变化、加入或移除)
+    task_progress = Signal(str, object, object) # 任务 ID, 已上传字节数, 总字节数 (可能超过 int32)
+    log_message = Signal(str)
+
+    def __init__(self, queue=None, max_files=2, parallel_parts=4, chunk_size=DEFAULT_CHUNK_SIZE, parent=None):
+        super().__init__(parent)
+        self.queue = queue if queue is not None else UploadQueue()
+        self.uploader = FileUploader(self.queue, chunk_size=chunk_size, parallel_parts=parallel_parts,
+                                     max_files=max_files)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_files), thread_name_prefix="upload")
+        self._active = {} # 任务 ID -> threading.Event (置位表示暂停)
+        self._lock = threading.Lock()
+        self._closed = False
+
+    @staticmethod
+    def endpoint_for(service_root):
+        """文件服务根地址 (build_service_url 不带服务名的结果) 对应的上传接口"""
+        return urljoin(service_root if service_root.endswith("/") else service_root + "/", TUS_PATH)
+
+    def add_paths(self, paths, files_url, upload_url, remote_dir=""):
+        """加入文件或文件夹 (文件夹保留相对目录结构)，返回新任务数"""
+        remote_dir = "/".join(part for part in remote_dir.replace("\\", "/").split("/") if part not in ("", ".", ".."))
+        tasks = []
+        for path in paths:
+            path = os.path.abspath(path)
+            if os.path.isdir(path):
+                base = os.path.dirname(path)
+                for folder, _, names in os.walk(path):
+                    for name in sorted(names):
+                        local = os.path.join(folder, name)
+                        tasks.append(self._new_task(local, os.path.relpath(local, base), files_url, upload_url,
+                                                    remote_dir))
+            elif os.path.isfile(path):
+                tasks.append(self._new_task(path, os.path.basename(path), files_url, upload_url, remote_dir))
+        # 同一文件已在队列中等待上传时不重复加入
+        pending = {(task.local_path, task.upload_url, task.remote_path) for task in self.queue.tasks
+                   if not task.finished}
+        tasks = [task for task in tasks if (task.local_path, task.upload_url, task.remote_path) not in pending]
+        if tasks:
+            self.queue.add(tasks)
+            self.log_message.emit(f"加入 {len(tasks)} 个文件到上传队列")
+            for task in tasks:
+                self.task_changed.emit(task.id)
+                self._submit(task)
+        return len(tasks)
+
+    @staticmethod
+    def _new_task(local_path, relative, files_url, upload_url, remote_dir):
+        relative = relative.replace(os.sep, "/")
+        remote_path = f"{remote_dir}/{relative}" if remote_dir else relative
+        return UploadTask(local_path, remote_path, files_url, upload_url)
+
+    def resume_pending(self):
+        """程序启动时继续上次未完成的任务，返回任务数"""
+        tasks = self.queue.unfinished()
+        for task in tasks:
+            task.status = UploadTask.QUEUED
+            self._submit(task)
+        if tasks:
+            self.log_message.emit(f"继续上次未完成的 {len(tasks)} 个上传")
+        return len(tasks)
+
+    def pause(self, task_ids):
+        for task_id in task_ids:
+            task = self.queue.get(task_id)
+            with self._lock:
+                stop_event = self._active.get(task_id)
+            if stop_event is not None:
+                stop_event.set() # 正在执行的任务在下一块之前停下，由 _run 改为 PAUSED
+            elif task is not None and task.status == UploadTask.QUEUED:
+                task.status = UploadTask.PAUSED # 还在线程池中排队，轮到时直接跳过
+                self.task_changed.emit(task_id)
+        self.queue.save()
+
+    def resume(self, task_ids):
+        """继续暂停的任务或重试失败的任务"""
+        for task_id in task_ids:
+            task = self.queue.get(task_id)
+            if task is not None and task.status in (UploadTask.PAUSED, UploadTask.FAILED):
+                task.status = UploadTask.QUEUED
+                task.error = ""
+                self.task_changed.emit(task_id)
+                self._submit(task)
+        self.queue.save()
+
+    def remove(self, task_ids):
+        """移除任务 (正在上传的先暂停)"""
+        self.pause(task_ids)
+        self.queue.remove(task_ids)
+        for task_id in task_ids:
+            self.task_changed.emit(task_id)
+
+    def clear_finished(self):
+        self.remove([task.id for task in self.queue.tasks if task.finished])
+
+    def shutdown(self):
+        """程序退出：停止所有上传，已上传的段保留在队列中，下次启动继续"""
+        self._closed = True
+        with self._lock:
+            events = list(self._active.values())
+        for stop_event in events:
+            stop_event.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.uploader.shutdown()
+        self.queue.save()
+
+    @property
+    def active_count(self):
+        with self._lock:
+            return len(self._active)
+
+    # --- 执行 ---
+    def _submit(self, task):
+        if not self._closed:
+            self._executor.submit(self._run, task)
+
+    def _run(self, task):
+        """在线程池中执行"""
+        stop_event = threading.Event()
+        with self._lock:
+            if task.status != UploadTask.QUEUED or task.id in self._active or self._closed:
+                return
+            self._active[task.id] = stop_event
+        should_stop = lambda: stop_event.is_set() or self._closed
+        started = time.monotonic()
+        try:
+            task.status = self.uploader.upload(task, should_stop, self._emit_status, self._emit_progress)
+            task.error = ""
+            seconds = time.monotonic() - started
+            if task.status == UploadTask.SKIPPED:
+                self.log_message.emit(f"{task.remote_path} 远程已是相同内容，跳过")
+            else:
+                speed = task.size / 1024 ** 2 / seconds if seconds > 0 else 0
+                self.log_message.emit(f"{task.remote_path} 上传完成 ({task.size / 1024 ** 2:.1f} MB，"
+                                      f"{speed:.1f} MB/s)")
+        except UploadStopped:
+            # 程序退出时保持 UPLOADING，下次启动由 resume_pending 继续
+            task.status = UploadTask.UPLOADING if self._closed else UploadTask.PAUSED
+        except FileNotFoundError:
+            task.status = UploadTask.FAILED
+            task.error = "本地文件不存在"
+        except (UploadError, requests.RequestException, OSError) as e:
+            task.status = UploadTask.FAILED
+            task.error = str(e)
+            self.log_message.emit(f"{task.remote_path} 上传失败: {e}")
+        finally:
+            with self._lock:
+                self._active.pop(task.id, None)
+            self.queue.save()
+            self.task_changed.emit(task.id)
+
+    def _emit_status(self, task):
+        self.task_changed.emit(task.id)
+
+    def _emit_progress(self, task):
+        self.task_progress.emit(task.id, task.bytes_done, task.size)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="分块、断点续传上传文件到实例文件服务")
+    parser.add_argument("paths", nargs="*", help="要上传的文件或文件夹；为空时只继续队列中未完成的上传")
+    parser.add_argument("--files-url", help="文件服务地址，例如 https://xxx-<端口>.<域名>/files/")
+    parser.add_argument("--upload-url", help="tus 上传接口，默认为文件服务根地址下的 tus/")
+    parser.add_argument("--remote-dir", default="", help="远程目标目录")
+    parser.add_argument("--queue-dir", default=None, help="上传队列文件所在目录 (默认为应用数据目录)")
+    parser.add_argument("--files", type=int, default=2, help="同时上传的文件数")
+    parser.add_argument("--parts", type=int, default=4, help="每个文件并行上传的段数")
+    parser.add_argument("--chunk-mb", type=int, default=8, help="分块大小 (MB)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    app = QCoreApplication.instance() or QCoreApplication(sys.argv)
+    manager = UploadManager(UploadQueue(args.queue_dir), max_files=args.files, parallel_parts=args.parts,
+                            chunk_size=args.chunk_mb * 1024 * 1024)
+    manager.log_message.connect(log.info)
+    manager.resume_pending()
+    if args.paths:
+        if not args.files_url:
+            parser.error("上传新文件需要 --files-url")
+        upload_url = args.upload_url or UploadManager.endpoint_for(urljoin(args.files_url, ".."))
+        manager.add_paths(args.paths, args.files_url, upload_url, args.remote_dir)
+    try:
+        while manager.active_count or manager.queue.unfinished():
+            app.processEvents()
+            time.sleep(0.2)
+    except KeyboardInterrupt:
+        log.info("已中断，下次运行时继续")
+    manager.shutdown()
+    app.processEvents()
+    failed = [task for task in manager.queue.tasks if task.status == UploadTask.FAILED]
+    for task in failed:
+        log.error("%s: %s", task.remote_path, task.error)
+    return 0 if not failed else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())